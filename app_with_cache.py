@@ -2,13 +2,15 @@
 from flask import Flask, render_template, request, jsonify, send_file
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import os
+import json
 from io import BytesIO
 from datetime import datetime
-import threading
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from config import START_DATE, END_DATE, STRATEGY_PARAMS, MAX_STOCKS, SECTORS, STRATEGY_MAP, DEFAULT_STRATEGY
+from config import START_DATE, END_DATE, STRATEGY_PARAMS, MAX_STOCKS, SECTORS, STRATEGY_MAP, DEFAULT_STRATEGY, STREAM_MIN_SYMBOLS
+from config import BACKTEST_TRADES_PAGE_SIZE, BACKTEST_TRADES_MAX_PAGE_SIZE, KLINE_WINDOW_MAX_DAYS
 from demo_test_debug import generate_better_mock_data
 from strategy import VolumeBreakoutStrategy, SteadyTrendStrategy, AggressiveMomentumStrategy, BalancedMultiFactorStrategy
 
@@ -24,9 +26,16 @@ except ImportError:
 from export_to_excel import export_detailed_trades_to_excel, export_batch_results_to_excel
 from backtest_history import save_record, get_records, delete_record as delete_history_record
 from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig
+from streaming_backtest import run_streaming_backtest
 from data_manager import DataManager
 from data_fetcher import get_index_constituents
 from config_manager import ConfigManager
+from param_optimizer import optimize_strategy, portfolio_engine_factory, SEARCH_METHODS
+from optimization_store import OptimizationResultStore, params_key
+from backtest_cache import BacktestResultCache, backtest_cache_key, CACHE_DIR
+from job_manager import JobManager, JobCancelled
+from single_flight import SingleFlight
+from signal_store import SignalStore
 
 app = Flask(__name__)
 CORS(app)
@@ -35,24 +44,109 @@ CORS(app)
 manager = DataManager()
 config_manager = ConfigManager()
 
+# 回测结果缓存（内存 LRU + 磁盘），重复回测与导出直接复用
+backtest_cache = BacktestResultCache()
+# 组合撮合断点（事件驱动模式），每日更新后的回测只需处理新 K 线带来的事件
+snapshot_cache = BacktestResultCache(CACHE_DIR / 'snapshots')
+
+# 后台任务（回测、参数优化、数据获取与更新），通过 /api/jobs/<job_id> 查询进度、结果与取消
+jobs = JobManager()
+
+# 相同的并发回测 / 信号扫描只计算一次，其余请求共享结果
+# （执行者所在的后台任务被取消时，等待的请求重新计算而不是一起失败）
+backtest_flight = SingleFlight(retry_on=(JobCancelled,))
+scan_flight = SingleFlight()
+# 进行中回测的最新进度（缓存键 -> (已处理股票数, 股票总数, 阶段)），合并等待的后台任务据此汇报进度
+backtest_progress = {}
+
+# 买入信号物化表：扫描按日期范围查询，每日更新后增量刷新
+signal_store = SignalStore()
+
+
+def _strategy_class(strategy_key: str):
+    """策略标识 -> 策略类"""
+    strategy_classes = {
+        'VolumeBreakoutStrategy': VolumeBreakoutStrategy,
+        'SteadyTrendStrategy': SteadyTrendStrategy,
+        'AggressiveMomentumStrategy': AggressiveMomentumStrategy,
+        'BalancedMultiFactorStrategy': BalancedMultiFactorStrategy,
+    }
+
+    # 添加新策略（如果可用）
+    if NEW_STRATEGIES_AVAILABLE:
+        strategy_classes['DoubleMACrossStrategy'] = DoubleMACrossStrategy
+        strategy_classes['GridTradingStrategy'] = GridTradingStrategy
+        strategy_classes['TurtleTradingStrategy'] = TurtleTradingStrategy
+
+    return strategy_classes[STRATEGY_MAP[strategy_key]['class_name']]
+
+
+def _saved_signal_params() -> list:
+    """
+    每日更新后刷新信号的 [(策略, 参数)]：当前策略的已保存参数、各策略默认参数，
+    以及按当前策略加载的参数预设（与页面加载预设的方式相同）
+    """
+    current = config_manager.get_current_strategy()
+    saved = config_manager.get_params()
+    candidates = [(current, saved)]
+    candidates += [(key, config_manager.get_strategy_params(key)) for key in STRATEGY_MAP]
+    candidates += [(current, {**saved, **preset}) for preset in config_manager.get_all_presets().values()]
+    unique = {}
+    for strategy_key, params in candidates:
+        unique.setdefault((strategy_key, params_key(params)), (strategy_key, params))
+    return list(unique.values())
+
+
+def _refresh_signals_job(job) -> dict:
+    """增量刷新已保存策略参数与预设的买入信号（后台任务，只重算数据有变化的股票）"""
+    data_versions = manager.get_data_versions(manager.get_all_cached_stocks())
+    param_sets = _saved_signal_params()
+    computed = 0
+    for i, (strategy_key, params) in enumerate(param_sets, 1):
+        job.progress(0, 0, 'signals', param_set=f'{i}/{len(param_sets)}', strategy=strategy_key)
+        try:
+            strategy = _strategy_class(strategy_key)(params)
+        except Exception as e:
+            print(f"[信号刷新] {strategy_key} 参数无效，跳过: {e}")
+            continue
+        computed += signal_store.refresh(
+            strategy_key, params, strategy, data_versions, manager.get_data_from_cache,
+            progress_callback=lambda done, total: job.progress(done, total))
+    print(f"[信号刷新] 完成：{len(param_sets)} 组参数，重算 {computed} 只股票")
+    return {'param_sets': len(param_sets), 'computed': computed}
+
+
+def _update_all_job(job, symbols: list, label: str) -> dict:
+    """逐只增量更新股票数据（后台任务）"""
+    ok, fail = 0, 0
+    job.progress(0, len(symbols), 'updating', ok=ok, fail=fail)
+    for i, symbol in enumerate(symbols, 1):
+        try:
+            manager.update_single_stock(symbol)
+            ok += 1
+        except Exception as e:
+            print(f"[{label}] 更新 {symbol} 失败: {e}")
+            fail += 1
+        job.progress(i, ok=ok, fail=fail)
+    print(f"[{label}] 完成：{ok} 成功，{fail} 失败")
+    # 数据更新后在单独的后台任务中增量刷新信号表（已有刷新任务时不重复提交，扫描时也会补算落后的股票）
+    jobs.submit('signal_refresh', _refresh_signals_job, exclusive=True)
+    return {'ok': ok, 'fail': fail}
+
 
 # ── 定时任务：每日收盘后自动更新所有已缓存股票 ──────────────────────────────
 def _auto_update_all_stocks():
-    """每日 17:30 自动增量更新所有已缓存的股票数据"""
+    """每日 17:30 自动增量更新所有已缓存的股票数据（与手动更新共用同一类后台任务，不会重叠执行）"""
     try:
         symbols = manager.get_all_cached_stocks()
         if not symbols:
             return
+        job = jobs.submit('update_all', _update_all_job, symbols, '定时任务', info={'ok': 0, 'fail': 0},
+                           exclusive=True)
+        if job is None:
+            print(f"[定时任务 {datetime.now():%H:%M}] 已有更新任务在运行，跳过")
+            return
         print(f"[定时任务 {datetime.now():%H:%M}] 开始自动更新 {len(symbols)} 只股票...")
-        ok, fail = 0, 0
-        for symbol in symbols:
-            try:
-                manager.update_single_stock(symbol)
-                ok += 1
-            except Exception as e:
-                print(f"[定时任务] 更新 {symbol} 失败: {e}")
-                fail += 1
-        print(f"[定时任务] 完成：{ok} 成功，{fail} 失败")
     except Exception as e:
         print(f"[定时任务] 运行出错: {e}")
 
@@ -61,47 +155,33 @@ _scheduler = BackgroundScheduler(timezone='Asia/Shanghai')
 _scheduler.add_job(_auto_update_all_stocks, 'cron', hour=17, minute=30, id='daily_update')
 _scheduler.start()
 
-# 后台任务状态
-background_tasks = {}
-
 # ── 手动触发全量更新 ────────────────────────────────────────────────────────
-_update_all_task = {'status': 'idle', 'ok': 0, 'fail': 0, 'total': 0, 'done': 0}
-
 @app.route('/api/cache/update-all', methods=['POST'])
 def trigger_update_all():
     """手动触发所有已缓存股票的增量更新（后台执行）"""
-    if _update_all_task.get('status') == 'running':
-        return jsonify({'success': False, 'error': '更新任务已在运行中，请稍后再试'})
-
     symbols = manager.get_all_cached_stocks()
     if not symbols:
         return jsonify({'success': False, 'error': '缓存中没有任何股票数据'})
 
-    _update_all_task.update(status='running', ok=0, fail=0, total=len(symbols), done=0)
-
-    def _run():
-        for symbol in symbols:
-            try:
-                manager.update_single_stock(symbol)
-                _update_all_task['ok'] += 1
-            except Exception as e:
-                print(f"[手动更新] {symbol} 失败: {e}")
-                _update_all_task['fail'] += 1
-            _update_all_task['done'] += 1
-        _update_all_task['status'] = 'done'
-        print(f"[手动更新] 完成：{_update_all_task['ok']} 成功，{_update_all_task['fail']} 失败")
-
-    import threading
-    threading.Thread(target=_run, daemon=True).start()
-    return jsonify({'success': True, 'total': len(symbols),
+    job = jobs.submit('update_all', _update_all_job, symbols, '手动更新', info={'ok': 0, 'fail': 0},
+                       exclusive=True)
+    if job is None:
+        return jsonify({'success': False, 'error': '更新任务已在运行中，请稍后再试'})
+    return jsonify({'success': True, 'job_id': job.id, 'total': len(symbols),
                     'message': f'已开始后台更新 {len(symbols)} 只股票'})
 
 @app.route('/api/cache/update-all/status', methods=['GET'])
 def update_all_status():
-    """查询更新进度"""
-    t = _update_all_task
-    pct = round(t['done'] / t['total'] * 100, 1) if t['total'] else 0
-    return jsonify({**t, 'progress_pct': pct})
+    """查询最近一次全量更新的进度"""
+    job = jobs.latest('update_all')
+    if job is None:
+        return jsonify({'status': 'idle', 'ok': 0, 'fail': 0, 'total': 0, 'done': 0, 'progress_pct': 0})
+    state = job.to_dict()
+    # 页面按 'done' 判断结束：完成、失败、取消都报告为 'done'，具体状态见 job_status
+    state['job_status'] = state['status']
+    if job.finished:
+        state['status'] = 'done'
+    return jsonify(state)
 
 @app.route('/')
 def index():
@@ -121,7 +201,7 @@ def parameters_visual_page():
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """获取配置信息"""
-    from config import BACKTEST_START, BACKTEST_END, DATA_FETCH_START, DATA_FETCH_END, TURNOVER_RANK_TOP_N
+    from config import BACKTEST_START, BACKTEST_END, DATA_FETCH_START, DATA_FETCH_END, TURNOVER_RANK_TOP_N, PORTFOLIO_EVENT_DRIVEN
     return jsonify({
         'start_date': START_DATE,
         'end_date': END_DATE,
@@ -132,6 +212,7 @@ def get_config():
         'data_fetch_start': DATA_FETCH_START,
         'data_fetch_end': DATA_FETCH_END,
         'turnover_rank_top_n': TURNOVER_RANK_TOP_N,
+        'event_driven': PORTFOLIO_EVENT_DRIVEN,
     })
 
 @app.route('/api/cache/status', methods=['GET'])
@@ -299,6 +380,14 @@ def get_cached_stocks():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def _batch_fetch_job(job, stocks: list) -> dict:
+    """批量获取并缓存数据（后台任务）"""
+    all_data = manager.batch_fetch_and_cache(
+        stocks, force_refresh=False,
+        progress_callback=lambda done, total: job.progress(done, total, 'fetching'))
+    return {'fetched': len(all_data), 'failed': [symbol for symbol in stocks if symbol not in all_data]}
+
+
 @app.route('/api/cache/batch-fetch', methods=['POST'])
 def batch_fetch_data():
     """批量获取数据"""
@@ -311,23 +400,11 @@ def batch_fetch_data():
             return jsonify({'success': False, 'error': '无法获取成分股'}), 400
 
         # 后台批量获取
-        def fetch_batch():
-            manager.batch_fetch_and_cache(stocks, force_refresh=False)
-
-        # 如果支持后台任务
-        task_id = f'batch_fetch_{int(datetime.now().timestamp())}'
-        background_tasks[task_id] = {
-            'status': 'running',
-            'progress': 0,
-            'total': len(stocks)
-        }
-
-        thread = threading.Thread(target=fetch_batch)
-        thread.start()
+        job = jobs.submit('batch_fetch', _batch_fetch_job, stocks)
 
         return jsonify({
             'success': True,
-            'task_id': task_id,
+            'task_id': job.id,
             'stocks': stocks,
             'message': '已开始批量获取，请稍候...'
         })
@@ -360,31 +437,16 @@ def batch_fetch_sector_data():
             return jsonify({'success': False, 'error': '无法获取成分股列表，请检查网络连接'}), 400
 
         # 后台批量获取
-        def fetch_sector_batch():
-            try:
-                manager.batch_fetch_and_cache(stocks, force_refresh=False)
-            except Exception as e:
-                background_tasks[task_id]['status'] = 'failed'
-                background_tasks[task_id]['error'] = str(e)
-
-        # 创建后台任务
-        task_id = f'batch_sector_{sector}_{int(datetime.now().timestamp())}'
-        background_tasks[task_id] = {
-            'status': 'running',
-            'progress': 0,
-            'total': len(stocks),
+        job = jobs.submit('batch_fetch', _batch_fetch_job, stocks, info={
             'sector': sector,
             'start_date': start_date,
             'end_date': end_date,
             'limit': limit
-        }
-
-        thread = threading.Thread(target=fetch_sector_batch)
-        thread.start()
+        })
 
         return jsonify({
             'success': True,
-            'task_id': task_id,
+            'task_id': job.id,
             'sector': sector,
             'stocks_count': len(stocks),
             'start_date': start_date,
@@ -462,212 +524,437 @@ def get_strategy_params_endpoint(strategy_key):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/api/backtest/cache', methods=['POST'])
-def run_backtest_with_cache():
-    """使用本地缓存数据进行回测（支持策略选择）"""
-    try:
-        data = request.json
-        symbols = data.get('symbols', [])
-        strategy_key = data.get('strategy', None)  # 新增：允许指定策略
-        custom_params = data.get('params', None)   # 新增：允许自定义参数
-
-        # 确定使用的策略和参数
-        if strategy_key is None:
-            strategy_key = config_manager.get_current_strategy()
-
-        if custom_params is None:
-            # 当前策略用用户保存的参数（含页面上的修改），其他策略用默认值
-            if strategy_key == config_manager.get_current_strategy():
-                params = config_manager.get_params()
-            else:
-                params = config_manager.get_strategy_params(strategy_key)
+def _daily_series_payload(daily_series):
+    """每日净值序列（numpy 数组）转换为可 JSON 序列化的列表"""
+    if daily_series is None:
+        return None
+    return {
+        'dates': pd.DatetimeIndex(daily_series['dates']).strftime('%Y-%m-%d').tolist(),
+        'nav': np.round(daily_series['nav'], 2).tolist(),
+        'cash': np.round(daily_series['cash'], 2).tolist(),
+        'exposure': np.round(daily_series['exposure'] * 100, 2).tolist(),
+        'drawdown': np.round(daily_series['drawdown'] * 100, 2).tolist(),
+        'open_positions': daily_series['open_positions'].tolist(),
+    }
+
+
+def _backtest_setup(data: dict) -> dict:
+    """解析回测请求：策略、参数、时间配置与引擎交易设置（回测与导出共用）"""
+    from config import DATA_FETCH_START, DATA_FETCH_END, BACKTEST_START, BACKTEST_END, MAX_POSITION_RATIO, TURNOVER_RANK_TOP_N, PORTFOLIO_EVENT_DRIVEN
+
+    strategy_key = data.get('strategy', None)  # 允许指定策略
+    custom_params = data.get('params', None)   # 允许自定义参数
+
+    # 确定使用的策略和参数
+    if strategy_key is None:
+        strategy_key = config_manager.get_current_strategy()
+
+    if custom_params is None:
+        # 当前策略用用户保存的参数（含页面上的修改），其他策略用默认值
+        if strategy_key == config_manager.get_current_strategy():
+            params = config_manager.get_params()
         else:
-            params = custom_params
+            params = config_manager.get_strategy_params(strategy_key)
+    else:
+        params = custom_params
+
+    # 动态导入策略类
+    StrategyClass = _strategy_class(strategy_key)
+
+    # 支持前端传入自定义回测起止日期，未传则使用 config.py 全局配置
+    backtest_start = data.get('backtest_start') or BACKTEST_START
+    backtest_end   = data.get('backtest_end')   or BACKTEST_END
+
+    # 成交额排名过滤参数（0 = 不过滤）
+    turnover_rank_top_n = int(data.get('turnover_rank_top_n') or TURNOVER_RANK_TOP_N)
+
+    # 组合撮合方式（事件驱动 / 逐只股票）
+    event_driven = bool(data.get('event_driven', PORTFOLIO_EVENT_DRIVEN))
+
+    time_config = BacktestTimeConfig(
+        data_start=DATA_FETCH_START,
+        data_end=DATA_FETCH_END,
+        backtest_start=backtest_start,
+        backtest_end=backtest_end
+    )
+
+    trading_settings = config_manager.get_trading_settings()
+    engine_settings = {
+        'initial_capital': trading_settings['initial_capital'],
+        'position_ratio': trading_settings['position_ratio'],
+        'commission_rate': trading_settings['commission_rate'],
+        'slippage': trading_settings['slippage'],
+        'max_position_ratio': MAX_POSITION_RATIO,
+        'turnover_rank_top_n': turnover_rank_top_n,
+        'event_driven': event_driven,
+    }
+
+    return {
+        'strategy_key': strategy_key,
+        'params': params,
+        'streaming': bool(data.get('streaming', False)),  # 结果与普通模式一致，不参与缓存键
+        'strategy': StrategyClass(params),
+        'time_config': time_config,
+        'engine_settings': engine_settings,
+        'backtest_start': backtest_start,
+        'backtest_end': backtest_end,
+        'turnover_rank_top_n': turnover_rank_top_n,
+    }
+
+
+def _run_cached_backtest(setup: dict, symbols: list, progress_callback=None):
+    """
+    运行组合回测，优先使用回测结果缓存
+
+    缓存键包含各股票的数据版本（只查询 SQLite 汇总，不加载行情），
+    命中时不读取行情数据、不运行引擎；未命中时相同键的并发请求只运行一次回测。
+    progress_callback(已处理股票数, 股票总数, 阶段) 在加载与回测过程中调用（后台任务用于汇报进度和取消）。
+
+    Returns:
+        (results, 参与回测的股票数, 缓存键)；没有任何缓存数据时返回 (None, 0, None)
+    """
+    data_versions = manager.get_data_versions(symbols)
+    symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol in data_versions]
+    if not symbols:
+        return None, 0, None
+
+    key = backtest_cache_key(setup['strategy_key'], setup['params'], symbols, setup['time_config'],
+                             setup['engine_settings'], data_versions)
+    results = backtest_cache.get(key)
+    if results is None:
+        wait_callback = None
+        if progress_callback is not None:
+            # 合并到其他请求的计算时转发它的进度（job.progress 同时检查取消）
+            def wait_callback():
+                progress_callback(*backtest_progress.get(key, (0, len(symbols), 'waiting')))
+        results = backtest_flight.do(key, _compute_backtest, key, setup, symbols, progress_callback,
+                                     wait_callback=wait_callback)
+        if results is None:
+            return None, 0, None
+    return results, len(symbols), key
+
+
+def _compute_backtest(key: str, setup: dict, symbols: list, progress_callback=None):
+    """运行回测并写入缓存（_run_cached_backtest 未命中时调用）；没有行情数据时返回 None"""
+    # 等待合并期间上一次计算可能刚写入缓存
+    results = backtest_cache.get(key)
+    if results is not None:
+        return results
+
+    def report(done, total, phase):
+        backtest_progress[key] = (done, total, phase)
+        if progress_callback is not None:
+            progress_callback(done, total, phase)
 
-        # 动态导入策略类
-        strategy_classes = {
-            'VolumeBreakoutStrategy': VolumeBreakoutStrategy,
-            'SteadyTrendStrategy': SteadyTrendStrategy,
-            'AggressiveMomentumStrategy': AggressiveMomentumStrategy,
-            'BalancedMultiFactorStrategy': BalancedMultiFactorStrategy,
-        }
+    try:
+        return _run_backtest_engine(key, setup, symbols, report)
+    finally:
+        backtest_progress.pop(key, None)
+
+
+def _run_backtest_engine(key: str, setup: dict, symbols: list, progress_callback):
+    """加载行情、运行引擎并写入回测缓存与撮合断点；progress_callback 必须提供"""
+    # 数据更新后从上一次回测的断点恢复组合撮合（键不含数据版本与回测终点）
+    time_config = setup['time_config']
+    snapshot_key = backtest_cache_key(
+        setup['strategy_key'], setup['params'], symbols,
+        {'data_start': time_config.data_start, 'backtest_start': time_config.backtest_start},
+        setup['engine_settings'], {})
+    resume_from = snapshot_cache.get(snapshot_key)
+
+    # 运行回测 - 使用增强版引擎
+    engine = EnhancedBacktestEngine(time_config=time_config, **setup['engine_settings'])
+    if setup['streaming'] or len(symbols) >= STREAM_MIN_SYMBOLS:
+        # 大股票池：分块加载行情，降低峰值内存
+        results = run_streaming_backtest(engine, symbols, manager.get_data_from_cache,
+                                         setup['strategy'], resume_from=resume_from,
+                                         progress_callback=progress_callback)
+    else:
+        all_data = {}
+        for i, symbol in enumerate(symbols, 1):
+            df = manager.get_data_from_cache(symbol)
+            if df is not None and len(df) > 0:
+                all_data[symbol] = df
+            progress_callback(i, len(symbols), 'loading')
+        if not all_data:
+            return None
+        progress_callback(len(symbols), len(symbols), 'portfolio')
+        results = engine.run_multiple_stocks_with_portfolio(all_data, setup['strategy'],
+                                                            resume_from=resume_from)
+    backtest_cache.put(key, results)
+    if results.get('snapshot') is not None:
+        snapshot_cache.put(snapshot_key, results['snapshot'])
+    return results
+
+
+def _trades_cursor(key: str, offset: int, total: int):
+    """交易明细游标（回测缓存键 + 偏移）；没有后续页时为 None"""
+    return f'{key}:{offset}' if offset < total else None
+
+
+def _trades_page(round_trips: list, key: str, offset: int = 0, limit: int = BACKTEST_TRADES_PAGE_SIZE) -> dict:
+    """往返交易列表的一页"""
+    end = offset + limit
+    return {
+        'trades': round_trips[offset:end],
+        'trades_total': len(round_trips),
+        'trades_cursor': _trades_cursor(key, end, len(round_trips)),
+    }
+
+
+def _backtest_response(setup: dict, results: dict, stocks_tested: int, key: str) -> dict:
+    """
+    回测结果 -> 接口返回数据，并保存历史记录（同步接口与后台任务共用）
+
+    交易明细只返回第一页（引擎已按 trade_id 配对的往返交易），trades_cursor 用于
+    从 /api/backtest/trades 获取后续页。
+    """
+    strategy_key = setup['strategy_key']
+    backtest_start = setup['backtest_start']
+    backtest_end = setup['backtest_end']
+    turnover_rank_top_n = setup['turnover_rank_top_n']
+
+    # 提取投资组合总结
+    portfolio_summary = results.get('portfolio_summary', {})
+
+    # ── 统计数据：使用策略原始输出，与 Excel 导出口径一致 ──────────────
+    # total_trades_count = 策略产生的所有信号数（含未平仓），与 Excel 行数一致
+    ledger = results['ledger']
+    total_trades_count = len(ledger)
+
+    # 总收益率：使用 PortfolioManager 按市值计算的真实组合收益
+    # （已平仓 P&L 体现在现金；未平仓持仓按末日收盘价市值计）
+    total_return_pct = portfolio_summary.get('total_return_pct', 0)
+
+    # 胜率 & 平均收益：基于策略原始信号（与 Excel 口径一致），直接在账本列上计算
+    strategy_returns = ledger.filled('收益率%', 0.0)
+    wins = int((strategy_returns > 0).sum())
+    win_rate = (wins / total_trades_count * 100) if total_trades_count > 0 else 0
+    avg_return = float(strategy_returns.mean()) if total_trades_count > 0 else 0
+
+    response_data = {
+        'success': True,
+        'strategy': strategy_key,
+        'strategy_name': STRATEGY_MAP[strategy_key]['name'],
+        'stocks_tested': stocks_tested,
+        'portfolio_summary': portfolio_summary,
+        'total_trades': total_trades_count,
+        'total_return': round(total_return_pct, 2),
+        'avg_return': round(avg_return, 4),
+        'win_rate': round(win_rate, 1),
+        'final_capital': round(portfolio_summary.get('final_total_value', 0), 2),
+        'rejected_trades': portfolio_summary.get('num_trades_rejected', 0),
+        'max_drawdown': portfolio_summary.get('max_drawdown_pct', 0),
+        'risk_metrics': results.get('risk_metrics', {}),
+        'daily_series': _daily_series_payload(results.get('daily_series')),
+        **_trades_page(results['round_trips'], key),
+    }
+
+    # ── 自动保存历史记录 ───────────────────────────────────────────────────
+    try:
+        save_record({
+            'id': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'strategy_key': strategy_key,
+            'strategy_name': STRATEGY_MAP[strategy_key]['name'],
+            'stocks_count': stocks_tested,
+            'backtest_start': backtest_start,
+            'backtest_end': backtest_end,
+            'turnover_rank_top_n': turnover_rank_top_n,
+            'total_trades': total_trades_count,
+            'total_return': round(total_return_pct, 2),
+            'win_rate': round(win_rate, 1),
+            'avg_return': round(avg_return, 4),
+            'initial_capital': portfolio_summary.get('initial_capital', 0),
+            'final_capital': round(portfolio_summary.get('final_total_value', 0), 2),
+            'rejected_trades': portfolio_summary.get('num_trades_rejected', 0),
+        })
+    except Exception:
+        pass  # 保存失败不影响主流程
 
-        # 添加新策略（如果可用）
-        if NEW_STRATEGIES_AVAILABLE:
-            strategy_classes['DoubleMACrossStrategy'] = DoubleMACrossStrategy
-            strategy_classes['GridTradingStrategy'] = GridTradingStrategy
-            strategy_classes['TurtleTradingStrategy'] = TurtleTradingStrategy
+    return response_data
 
-        class_name = STRATEGY_MAP[strategy_key]['class_name']
-        StrategyClass = strategy_classes[class_name]
 
-        # 创建策略实例
-        strategy = StrategyClass(params)
+def _backtest_job(job, setup: dict, symbols: list) -> dict:
+    """组合回测（后台任务）"""
+    results, stocks_tested, key = _run_cached_backtest(setup, symbols, progress_callback=job.progress)
+    if results is None:
+        raise ValueError('没有可用的缓存数据，请先获取数据')
+    return _backtest_response(setup, results, stocks_tested, key)
 
-        if not symbols:
-            # 使用所有缓存的数据
-            pass
 
-        # 加载缓存数据
-        all_data = {}
-        for symbol in symbols or ['000001']:  # 默认测试 000001
-            df = manager.get_data_from_cache(symbol)
-            if df is not None and len(df) > 0:
-                all_data[symbol] = df
+@app.route('/api/backtest/cache', methods=['POST'])
+def run_backtest_with_cache():
+    """使用本地缓存数据进行回测（支持策略选择；大股票池请使用 /api/backtest/jobs 后台执行）"""
+    try:
+        data = request.json
+        symbols = data.get('symbols', [])
+        setup = _backtest_setup(data)
 
-        if not all_data:
+        # 加载缓存数据并回测（相同请求且数据未更新时直接复用结果）
+        results, stocks_tested, key = _run_cached_backtest(setup, symbols or ['000001'])  # 默认测试 000001
+        if results is None:
             return jsonify({
                 'success': False,
                 'error': '没有可用的缓存数据，请先获取数据'
             }), 400
 
-        # 获取交易设置
-        trading_settings = config_manager.get_trading_settings()
+        return jsonify(_backtest_response(setup, results, stocks_tested, key))
 
-        # 运行回测 - 使用增强版引擎
-        from config import DATA_FETCH_START, DATA_FETCH_END, BACKTEST_START, BACKTEST_END, MAX_POSITION_RATIO, TURNOVER_RANK_TOP_N
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-        # 支持前端传入自定义回测起止日期，未传则使用 config.py 全局配置
-        backtest_start = data.get('backtest_start') or BACKTEST_START
-        backtest_end   = data.get('backtest_end')   or BACKTEST_END
 
-        # 成交额排名过滤参数（0 = 不过滤）
-        turnover_rank_top_n = int(data.get('turnover_rank_top_n') or TURNOVER_RANK_TOP_N)
+@app.route('/api/backtest/trades', methods=['GET'])
+def get_backtest_trades():
+    """按游标分页获取回测的往返交易（游标来自回测结果的 trades_cursor）"""
+    key, _, offset = request.args.get('cursor', '').rpartition(':')
+    try:
+        offset = int(offset)
+        limit = min(max(int(request.args.get('limit', BACKTEST_TRADES_PAGE_SIZE)), 1),
+                    BACKTEST_TRADES_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'error': '无效的游标或分页参数'}), 400
+    if not key or offset < 0:
+        return jsonify({'success': False, 'error': '无效的游标或分页参数'}), 400
+
+    # 游标指向的回测结果因数据更新或缓存淘汰失效时需重新回测
+    results = backtest_cache.get(key)
+    if results is None:
+        return jsonify({'success': False, 'error': '回测结果已失效，请重新运行回测'}), 404
+    return jsonify({'success': True, 'offset': offset, **_trades_page(results['round_trips'], key, offset, limit)})
+
+
+@app.route('/api/backtest/jobs', methods=['POST'])
+def submit_backtest_job():
+    """提交后台回测任务，立即返回任务 ID；通过 /api/jobs/<job_id> 查询进度与结果"""
+    try:
+        data = request.json or {}
+        symbols = data.get('symbols') or ['000001']
+        setup = _backtest_setup(data)
+        job = jobs.submit('backtest', _backtest_job, setup, symbols,
+                          info={'strategy': setup['strategy_key'], 'stocks_count': len(symbols)})
+        return jsonify({'success': True, 'job_id': job.id, 'status': job.status}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 
-        time_config = BacktestTimeConfig(
-            data_start=DATA_FETCH_START,
-            data_end=DATA_FETCH_END,
-            backtest_start=backtest_start,
-            backtest_end=backtest_end
-        )
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """后台任务列表（可按 kind 过滤）"""
+    return jsonify({'success': True, 'jobs': jobs.list(request.args.get('kind'))})
 
-        engine = EnhancedBacktestEngine(
-            initial_capital=trading_settings['initial_capital'],
-            position_ratio=trading_settings['position_ratio'],
-            commission_rate=trading_settings['commission_rate'],
-            slippage=trading_settings['slippage'],
-            time_config=time_config,
-            max_position_ratio=MAX_POSITION_RATIO,
-            turnover_rank_top_n=turnover_rank_top_n,
-        )
-        results = engine.run_multiple_stocks_with_portfolio(all_data, strategy)
-
-        # 提取投资组合总结
-        portfolio_summary = results.get('portfolio_summary', {})
-        stock_results = results.get('stock_results', {})
-        trade_history = results.get('trade_history', [])
-        initial_capital = portfolio_summary.get('initial_capital', 100000)
-
-        # 从 trade_history 中提取每笔卖出交易的收益
-        all_trades = []
-        wins = 0
-
-        for i, trade_record in enumerate(trade_history):
-            if trade_record.get('action') == 'SELL':
-                # 找配对的买入交易
-                buy_index = i - 1
-                while buy_index >= 0 and trade_record.get('symbol') != trade_history[buy_index].get('symbol'):
-                    buy_index -= 1
-
-                if buy_index >= 0:
-                    buy_trade = trade_history[buy_index]
-                    sell_trade = trade_record
-
-                    # 从策略中获取更多信息
-                    stock_trades = stock_results.get(trade_record.get('symbol'), {}).get('trades', [])
-                    matching_trade = None
-                    for st in stock_trades:
-                        if (str(st.get('买入日期')).split()[0] == str(buy_trade['date']).split()[0] and
-                            str(st.get('卖出日期')).split()[0] == str(sell_trade['date']).split()[0]):
-                            matching_trade = st
-                            break
-
-                    # 优先用策略自带的收益率（直接基于买卖价，准确）
-                    if matching_trade and '收益率%' in matching_trade:
-                        trade_return = matching_trade['收益率%']
-                    else:
-                        trade_return = sell_trade.get('profit_pct', 0)
-
-                    all_trades.append({
-                        'symbol': trade_record.get('symbol'),
-                        'buy_date': str(buy_trade['date']).split()[0],
-                        'buy_price': round(buy_trade['price'], 2),
-                        'sell_date': str(sell_trade['date']).split()[0],
-                        'sell_price': round(sell_trade['price'], 2),
-                        'return': round(trade_return, 4),
-                        'status': matching_trade.get('状态', '平仓') if matching_trade else '平仓',
-                        'open_positions': sell_trade.get('open_positions', 0),
-                        'position_ratio': round(sell_trade.get('position_ratio', 0) * 100, 1),
-                    })
 
-                    if trade_return > 0:
-                        wins += 1
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务进度；完成后包含结果"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    return jsonify({'success': True, **job.to_dict(include_result=True)})
 
-        # ── 统计数据：使用策略原始输出，与 Excel 导出口径一致 ──────────────
-        # total_trades_count = 策略产生的所有信号数（含未平仓），与 Excel 行数一致
-        total_trades_count = sum(sr.get('num_trades', 0) for sr in stock_results.values())
 
-        # 总收益率：使用 PortfolioManager 按市值计算的真实组合收益
-        # （已平仓 P&L 体现在现金；未平仓持仓按末日收盘价市值计）
-        total_return_pct = portfolio_summary.get('total_return_pct', 0)
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消后台任务（执行中的任务在下一次汇报进度时停止）"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    if not jobs.cancel(job_id):
+        return jsonify({'success': False, 'error': '任务已结束', **job.to_dict()})
+    return jsonify({'success': True, **job.to_dict()})
 
-        # 胜率 & 平均收益：基于策略原始信号（与 Excel 口径一致）
-        all_strategy_trades = [
-            trade
-            for sr in stock_results.values()
-            for trade in sr.get('trades', [])
-        ]
-        wins = sum(1 for t in all_strategy_trades if t.get('收益率%', 0) > 0)
-        win_rate = (wins / total_trades_count * 100) if total_trades_count > 0 else 0
-        avg_return = (
-            sum(t.get('收益率%', 0) for t in all_strategy_trades) / total_trades_count
-            if total_trades_count > 0 else 0
+@app.route('/api/optimize', methods=['POST'])
+def start_optimization():
+    """启动参数优化（后台执行，组合模式回测），通过 /api/optimize/<task_id> 查询进度"""
+    try:
+        data = request.json or {}
+        strategy_key = data.get('strategy') or config_manager.get_current_strategy()
+        if strategy_key not in STRATEGY_MAP:
+            return jsonify({'success': False, 'error': f'策略 {strategy_key} 不存在'}), 400
+        method = data.get('method', 'random')  # 默认按预算随机搜索，完整网格通常过大
+        if method not in SEARCH_METHODS:
+            return jsonify({'success': False, 'error': f'未知的搜索方法: {method}'}), 400
+
+        # 只查询数据版本判断是否有缓存数据，行情在后台任务中加载
+        symbols = data.get('symbols') or manager.get_all_cached_stocks()
+        data_versions = manager.get_data_versions(symbols)
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol in data_versions]
+        if not symbols:
+            return jsonify({'success': False, 'error': '没有可用的缓存数据，请先获取数据'}), 400
+
+        engine_factory = portfolio_engine_factory(
+            trading_settings=config_manager.get_trading_settings(),
+            backtest_start=data.get('backtest_start'),
+            backtest_end=data.get('backtest_end'),
+            turnover_rank_top_n=(int(data['turnover_rank_top_n'])
+                                 if data.get('turnover_rank_top_n') is not None else None),
+            event_driven=data.get('event_driven'),
         )
 
-        response_data = {
-            'success': True,
+        job = jobs.submit('optimize', _optimize_job, strategy_key, method, symbols, data, engine_factory, info={
             'strategy': strategy_key,
-            'strategy_name': STRATEGY_MAP[strategy_key]['name'],
-            'stocks_tested': len(all_data),
-            'portfolio_summary': portfolio_summary,
-            'total_trades': total_trades_count,
-            'total_return': round(total_return_pct, 2),
-            'avg_return': round(avg_return, 4),
-            'win_rate': round(win_rate, 1),
-            'final_capital': round(portfolio_summary.get('final_total_value', 0), 2),
-            'rejected_trades': portfolio_summary.get('num_trades_rejected', 0),
-            'trades': all_trades[:20]
-        }
-
-        # ── 自动保存历史记录 ───────────────────────────────────────────────────
-        try:
-            save_record({
-                'id': datetime.now().strftime('%Y%m%d_%H%M%S'),
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'strategy_key': strategy_key,
-                'strategy_name': STRATEGY_MAP[strategy_key]['name'],
-                'stocks_count': len(all_data),
-                'backtest_start': backtest_start,
-                'backtest_end': backtest_end,
-                'turnover_rank_top_n': turnover_rank_top_n,
-                'total_trades': total_trades_count,
-                'total_return': round(total_return_pct, 2),
-                'win_rate': round(win_rate, 1),
-                'avg_return': round(avg_return, 4),
-                'initial_capital': portfolio_summary.get('initial_capital', 0),
-                'final_capital': round(portfolio_summary.get('final_total_value', 0), 2),
-                'rejected_trades': portfolio_summary.get('num_trades_rejected', 0),
-            })
-        except Exception:
-            pass  # 保存失败不影响主流程
+            'method': method,
+            'stocks_count': len(symbols),
+            'best_so_far': None,
+            'best_params': None,
+        })
 
-        return jsonify(response_data)
+        return jsonify({
+            'success': True,
+            'task_id': job.id,
+            'strategy': strategy_key,
+            'stocks_count': len(symbols),
+            'message': '已开始参数优化，请稍候...'
+        })
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+
+def _optimize_job(job, strategy_key: str, method: str, symbols: list, data: dict, engine_factory) -> dict:
+    """参数优化（后台任务）"""
+    all_data = {}
+    for i, symbol in enumerate(symbols, 1):
+        df = manager.get_data_from_cache(symbol)
+        if df is not None and len(df) > 0:
+            all_data[symbol] = df
+        job.progress(i, len(symbols), 'loading')
+
+    def on_progress(entry):
+        job.progress(entry['evaluations'], entry['total'], 'searching', best_so_far=entry['best_so_far'])
+
+    results_df, history_df = optimize_strategy(
+        strategy_key, all_data,
+        param_names=data.get('param_names'),
+        param_ranges=data.get('param_ranges'),
+        points=int(data.get('points', 3)),
+        method=method,
+        budget=int(data['budget']) if data.get('budget') else None,
+        objective=data.get('objective', 'total_return'),
+        engine_factory=engine_factory,
+        config_manager=config_manager,
+        store=OptimizationResultStore(),
+        progress_callback=on_progress,
+    )
+    # to_json 统一处理 NaN 与 numpy 类型
+    results = json.loads(results_df.head(20).to_json(orient='records', force_ascii=False))
+    best_params = results[0] if results else None
+    job.progress(len(history_df), len(history_df), best_params=best_params)
+    return {'results': results, 'best_params': best_params}
+
+
+@app.route('/api/optimize/<task_id>', methods=['GET'])
+def get_optimization_status(task_id):
+    """查询参数优化进度与结果"""
+    job = jobs.get(task_id)
+    if job is None or job.kind != 'optimize':
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    return jsonify({'success': True, 'task_id': task_id, **job.to_dict(), **(job.result or {})})
+
+
 @app.route('/api/cache/clear', methods=['POST'])
 def clear_cache():
     """清空缓存"""
@@ -676,10 +963,13 @@ def clear_cache():
         symbol = data.get('symbol')
 
         manager.clear_cache(symbol)
+        if not symbol:
+            backtest_cache.clear()
+            snapshot_cache.clear()
 
         return jsonify({
             'success': True,
-            'message': f'已清空{"'" + symbol + "'" if symbol else "所有"}缓存'
+            'message': f"已清空'{symbol}'缓存" if symbol else '已清空所有缓存'
         })
 
     except Exception as e:
@@ -720,136 +1010,83 @@ def scan_signals():
             params = config_manager.get_strategy_params(strategy_key)
 
         # 3. 实例化策略
-        strategy_classes = {
-            'VolumeBreakoutStrategy': VolumeBreakoutStrategy,
-            'SteadyTrendStrategy': SteadyTrendStrategy,
-            'AggressiveMomentumStrategy': AggressiveMomentumStrategy,
-            'BalancedMultiFactorStrategy': BalancedMultiFactorStrategy,
-        }
-        if NEW_STRATEGIES_AVAILABLE:
-            strategy_classes['DoubleMACrossStrategy'] = DoubleMACrossStrategy
-            strategy_classes['GridTradingStrategy'] = GridTradingStrategy
-            strategy_classes['TurtleTradingStrategy'] = TurtleTradingStrategy
+        strategy = _strategy_class(strategy_key)(params)
 
-        class_name = STRATEGY_MAP[strategy_key]['class_name']
-        strategy = strategy_classes[class_name](params)
-        strategy_name = STRATEGY_MAP[strategy_key].get('name', strategy_key)
+        # 4. 查询信号表（相同策略、参数与日期范围的并发请求只执行一次）
+        key = params_key({'strategy_key': strategy_key, 'params': params_key(params or {}),
+                          'start_date': start_date, 'end_date': end_date})
+        return jsonify(scan_flight.do(key, _scan_signals, strategy_key, params, strategy, start_date, end_date))
 
-        # 4. 扫描所有股票，收集 (date, symbol, ...) 结果
-        symbols = manager.get_all_cached_stocks()
-        total_scanned = 0
-        all_hits = []   # 每条代表一个 (stock, signal_date)
-
-        for symbol in symbols:
-            try:
-                df = manager.get_data_from_cache(symbol)
-                if df is None or df.empty:
-                    continue
-                total_scanned += 1
-
-                try:
-                    signals = strategy.calculate_signals(df)
-                except Exception:
-                    continue
-
-                if signals is None or signals.empty or 'Buy_Signal' not in signals.columns:
-                    continue
-
-                date_col = pd.to_datetime(signals['日期'], errors='coerce').dt.strftime('%Y-%m-%d')
-                mask = (
-                    (date_col >= start_date) &
-                    (date_col <= end_date) &
-                    (signals['Buy_Signal'] == True)
-                )
-                matched_rows = signals[mask]
-
-                for _, row in matched_rows.iterrows():
-                    signal_date = pd.to_datetime(row['日期']).strftime('%Y-%m-%d')
-                    ma5  = round(float(row['MA5']),  2) if 'MA5'  in signals.columns and pd.notna(row.get('MA5'))  else None
-                    ma30 = round(float(row['MA30']), 2) if 'MA30' in signals.columns and pd.notna(row.get('MA30')) else None
-                    all_hits.append({
-                        'date':         signal_date,
-                        'symbol':       symbol,
-                        'close':        round(float(row['收盘']),           2) if pd.notna(row.get('收盘'))    else None,
-                        'change_pct':   round(float(row['涨跌幅']),         2) if pd.notna(row.get('涨跌幅'))  else None,
-                        'ma5':          ma5,
-                        'ma30':         ma30,
-                        'volume':       int(row['成交量'])                     if pd.notna(row.get('成交量'))  else None,
-                        'turnover_yi':  round(float(row['成交额']) / 1e8,   2) if pd.notna(row.get('成交额'))  else None,
-                    })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-            except Exception:
-                continue
 
-        # 按日期降序排列，最多返回 10 条
-        all_hits.sort(key=lambda x: x['date'], reverse=True)
-        stocks = all_hits[:10]
+def _scan_signals(strategy_key: str, params: dict, strategy, start_date: str, end_date: str) -> dict:
+    """
+    在信号表上按日期范围查询买入信号
 
-        return jsonify({
-            'success':      True,
-            'start_date':   start_date,
-            'end_date':     end_date,
-            'strategy_name': strategy_name,
-            'total_scanned': total_scanned,
-            'matched':      len(all_hits),
-            'stocks':       stocks,
-        })
+    先补算数据版本落后的股票（首次使用的参数组合会计算全部股票），随后只做索引查询。
+    """
+    data_versions = manager.get_data_versions(manager.get_all_cached_stocks())
+    signal_store.refresh(strategy_key, params, strategy, data_versions, manager.get_data_from_cache)
+    found = signal_store.query(strategy_key, params, start_date, end_date, limit=10)
 
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+    return {
+        'success':      True,
+        'start_date':   start_date,
+        'end_date':     end_date,
+        'strategy_name': STRATEGY_MAP[strategy_key].get('name', strategy_key),
+        'total_scanned': found['scanned'],
+        'matched':      found['matched'],
+        'stocks':       found['stocks'],   # 按日期降序排列，最多 10 条
+    }
 
 
 @app.route('/api/signals/kline/<symbol>', methods=['GET'])
 def get_signal_kline(symbol):
-    """获取某只股票在指定日期前后的K线数据（用于弹窗图表）"""
+    """获取某只股票在指定日期前后的K线数据（用于弹窗图表；支持 ETag 条件请求）"""
     try:
         date_str = request.args.get('date')
         if not date_str:
             return jsonify({'success': False, 'error': '缺少 date 参数'}), 400
-        days = int(request.args.get('days', 10))
+        days = min(max(int(request.args.get('days', 10)), 1), KLINE_WINDOW_MAX_DAYS)
 
-        df = manager.get_data_from_cache(symbol)
-        if df is None or df.empty:
+        # ETag 由请求参数与该股票的数据版本决定：数据未更新时直接返回 304，不查询行情
+        version = manager.get_data_versions([symbol]).get(symbol)
+        if version is None:
             return jsonify({'success': False, 'error': f'未找到股票 {symbol} 的缓存数据'}), 400
+        etag = params_key({'symbol': symbol, 'date': date_str, 'days': days, 'version': version})
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            window, signal_date_actual = manager.get_kline_window(symbol, date_str, days)
+            if window is None:
+                return jsonify({'success': False, 'error': f'未找到股票 {symbol} 的缓存数据'}), 400
+
+            def rounded(column):
+                return [round(value, 2) if pd.notna(value) else None for value in window[column].tolist()]
+
+            dates = window['日期'].tolist()
+            columns = {
+                'date': dates,
+                'open': rounded('开盘'),
+                'close': rounded('收盘'),
+                'high': rounded('高'),
+                'low': rounded('低'),
+                'volume': [int(value) if pd.notna(value) else None for value in window['成交量'].tolist()],
+                'is_signal': [date == signal_date_actual for date in dates],
+            }
+            kline = [dict(zip(columns, row)) for row in zip(*columns.values())]
 
-        # 过滤无效日期行
-        df = df[pd.to_datetime(df['日期'], errors='coerce').notna()].copy()
-        df['_date_dt'] = pd.to_datetime(df['日期'], errors='coerce')
-        df = df.reset_index(drop=True)
-
-        target_dt = pd.to_datetime(date_str)
-
-        # 找最近的行索引
-        diffs = (df['_date_dt'] - target_dt).abs()
-        idx = int(diffs.argmin())
-
-        # 实际对应的信号日期
-        signal_date_actual = df.iloc[idx]['_date_dt'].strftime('%Y-%m-%d')
-
-        # 取前后 days 行，边界 clamp
-        start_idx = max(0, idx - days)
-        end_idx = min(len(df), idx + days + 1)
-        subset = df.iloc[start_idx:end_idx]
-
-        kline = []
-        for _, row in subset.iterrows():
-            row_date = row['_date_dt'].strftime('%Y-%m-%d')
-            kline.append({
-                'date': row_date,
-                'open': round(float(row['开盘']), 2) if pd.notna(row.get('开盘')) else None,
-                'close': round(float(row['收盘']), 2) if pd.notna(row.get('收盘')) else None,
-                'high': round(float(row['高']), 2) if pd.notna(row.get('高')) else None,
-                'low': round(float(row['低']), 2) if pd.notna(row.get('低')) else None,
-                'volume': int(row['成交量']) if pd.notna(row.get('成交量')) else None,
-                'is_signal': row_date == signal_date_actual,
+            response = jsonify({
+                'success': True,
+                'symbol': symbol,
+                'signal_date': signal_date_actual,
+                'kline': kline,
             })
-
-        return jsonify({
-            'success': True,
-            'symbol': symbol,
-            'signal_date': signal_date_actual,
-            'kline': kline,
-        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'  # 每次都用 ETag 向服务端确认
+        return response
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1010,41 +1247,6 @@ def export_trades_to_excel():
     try:
         data = request.json
         symbols = data.get('symbols', [])
-        strategy_key = data.get('strategy', None)
-        custom_params = data.get('params', None)
-
-        # 确定使用的策略和参数
-        if strategy_key is None:
-            strategy_key = config_manager.get_current_strategy()
-
-        if custom_params is None:
-            # 当前策略用用户保存的参数（含页面上的修改），其他策略用默认值
-            if strategy_key == config_manager.get_current_strategy():
-                params = config_manager.get_params()
-            else:
-                params = config_manager.get_strategy_params(strategy_key)
-        else:
-            params = custom_params
-
-        # 动态导入策略类
-        strategy_classes = {
-            'VolumeBreakoutStrategy': VolumeBreakoutStrategy,
-            'SteadyTrendStrategy': SteadyTrendStrategy,
-            'AggressiveMomentumStrategy': AggressiveMomentumStrategy,
-            'BalancedMultiFactorStrategy': BalancedMultiFactorStrategy,
-        }
-
-        # 添加新策略（如果可用）
-        if NEW_STRATEGIES_AVAILABLE:
-            strategy_classes['DoubleMACrossStrategy'] = DoubleMACrossStrategy
-            strategy_classes['GridTradingStrategy'] = GridTradingStrategy
-            strategy_classes['TurtleTradingStrategy'] = TurtleTradingStrategy
-
-        class_name = STRATEGY_MAP[strategy_key]['class_name']
-        StrategyClass = strategy_classes[class_name]
-
-        # 创建策略实例
-        strategy = StrategyClass(params)
 
         if not symbols:
             return jsonify({
@@ -1052,86 +1254,51 @@ def export_trades_to_excel():
                 'error': '没有可导出的股票数据'
             }), 400
 
-        # 加载缓存数据并运行回测
-        all_data = {}
-        for symbol in symbols:
-            df = manager.get_data_from_cache(symbol)
-            if df is not None and len(df) > 0:
-                all_data[symbol] = df
-
-        if not all_data:
+        # 与页面回测使用同一缓存键：刚回测过的组合直接复用同一次结果
+        setup = _backtest_setup(data)
+        backtest_start = setup['backtest_start']
+        backtest_end = setup['backtest_end']
+        results, _, _ = _run_cached_backtest(setup, symbols)
+        if results is None:
             return jsonify({
                 'success': False,
                 'error': '没有可用的缓存数据'
             }), 400
 
-        # 获取交易设置
-        trading_settings = config_manager.get_trading_settings()
-
-        # 运行回测 - 使用增强版引擎
-        from config import DATA_FETCH_START, DATA_FETCH_END, BACKTEST_START, BACKTEST_END, MAX_POSITION_RATIO, TURNOVER_RANK_TOP_N
-
-        # 支持前端传入自定义回测起止日期，未传则使用 config.py 全局配置
-        backtest_start = data.get('backtest_start') or BACKTEST_START
-        backtest_end   = data.get('backtest_end')   or BACKTEST_END
-
-        # 成交额排名过滤参数（0 = 不过滤）
-        turnover_rank_top_n = int(data.get('turnover_rank_top_n') or TURNOVER_RANK_TOP_N)
-
-        time_config = BacktestTimeConfig(
-            data_start=DATA_FETCH_START,
-            data_end=DATA_FETCH_END,
-            backtest_start=backtest_start,
-            backtest_end=backtest_end
-        )
-
-        engine = EnhancedBacktestEngine(
-            initial_capital=trading_settings['initial_capital'],
-            position_ratio=trading_settings['position_ratio'],
-            commission_rate=trading_settings['commission_rate'],
-            slippage=trading_settings['slippage'],
-            time_config=time_config,
-            max_position_ratio=MAX_POSITION_RATIO,
-            turnover_rank_top_n=turnover_rank_top_n,
-        )
-        results = engine.run_multiple_stocks_with_portfolio(all_data, strategy)
-
         # 生成Excel文件
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'回测交易明细_{timestamp}.xlsx'
         filepath = os.path.join(os.getcwd(), filename)
 
-        # 将 stock_results 转换为 export_batch_results_to_excel 所需格式
+        # 将交易账本按股票拆分为 export_batch_results_to_excel 所需格式
         # {symbol: {trades, num_trades, trades_df, total_return, avg_return}}
-        stock_results = results.get('stock_results', {})
+        # 使用策略原始信号，与 UI 显示口径一致
         export_data = {}
-        for symbol, sr in stock_results.items():
-            trades = sr.get('trades', [])  # 使用策略原始信号，与 UI 显示口径一致
-            if not trades:
+        for symbol, symbol_ledger in results['ledger'].split_by_symbol().items():
+            if len(symbol_ledger) == 0:
                 export_data[symbol] = {
                     'trades': [], 'num_trades': 0,
                     'trades_df': pd.DataFrame(),
                     'total_return': 0, 'avg_return': 0,
                 }
                 continue
-            trades_df = pd.DataFrame(trades)
-            total_ret = trades_df['收益率%'].sum() if '收益率%' in trades_df.columns else 0
-            avg_ret = trades_df['收益率%'].mean() if '收益率%' in trades_df.columns else 0
+            returns = symbol_ledger.column('收益率%') if '收益率%' in symbol_ledger else np.zeros(1)
             export_data[symbol] = {
-                'trades': trades,
-                'num_trades': len(trades),
-                'trades_df': trades_df,
-                'total_return': round(total_ret, 2),
-                'avg_return': round(avg_ret, 2),
+                'trades': symbol_ledger.to_dicts(),
+                'num_trades': len(symbol_ledger),
+                'trades_df': symbol_ledger.to_frame(),
+                'total_return': round(float(np.nansum(returns)), 2),
+                'avg_return': round(float(np.nanmean(returns)), 2),
             }
 
         export_batch_results_to_excel(
             export_data,
             output_file=filepath,
             trade_history=results.get('trade_history', []),
-            all_data=all_data,
+            all_data=None,  # 仓位图表使用结果中的每日净值序列
             backtest_start=backtest_start,
             backtest_end=backtest_end,
+            daily_series=results.get('daily_series'),
         )
 
         # 发送文件
@@ -1193,7 +1360,12 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'cache_status': manager.get_cache_status()
+        'cache_status': manager.get_cache_status(),
+        'backtest_cache': backtest_cache.info(),
+        'coalescing': {
+            'backtest': backtest_flight.info(),
+            'signals_scan': scan_flight.info(),
+        },
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,157 @@
+"""回测结果缓存 - 内存 LRU + 本地磁盘两级
+
+同一组 (策略, 参数, 股票列表, 时间配置, 交易设置, 各股票数据版本) 的回测结果是确定的：
+- 页面刷新、查看历史后重复回测，直接返回上次的结果
+- 导出 Excel 复用页面上刚跑过的同一次回测，而不是重新计算
+- 任一股票的行情数据更新后数据版本变化，自动视为新的回测
+
+内存层保存最近使用的若干次结果对象（返回的是同一个对象，调用方不应修改）；
+磁盘层以 pickle 文件保存，进程重启后仍可命中，超出上限时删除最久未使用的文件。
+"""
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from optimization_store import params_key
+
+CACHE_DIR = Path("./data_cache") / "backtest_results"
+
+# 回测引擎输出格式变化时递增，使旧的磁盘缓存失效
+CACHE_FORMAT_VERSION = 2
+
+
+def backtest_cache_key(strategy: str, params: dict, symbols: list, time_config,
+                       trading_settings: dict, data_versions: dict) -> str:
+    """
+    回测结果缓存键
+
+    Args:
+        strategy: 策略标识
+        params: 策略参数（键顺序无关）
+        symbols: 股票列表（保持提交顺序：同日信号按股票顺序撮合，顺序会影响结果）
+        time_config: BacktestTimeConfig 或日期字典
+        trading_settings: 引擎交易设置（资金、仓位、费率、过滤条件等）
+        data_versions: {symbol: 数据版本}，见 DataManager.get_data_versions
+    """
+    if not isinstance(time_config, dict):
+        time_config = {name: getattr(time_config, name)
+                       for name in ('data_start', 'data_end', 'backtest_start', 'backtest_end')}
+    return params_key({
+        'format': CACHE_FORMAT_VERSION,
+        'strategy': strategy,
+        'params': params_key(params or {}),
+        'symbols': list(symbols),
+        'time_config': time_config,
+        'trading_settings': trading_settings,
+        'data_versions': [data_versions.get(symbol) for symbol in symbols],
+    })
+
+
+class BacktestResultCache:
+    """回测结果缓存（内存 LRU + 磁盘 pickle）"""
+
+    def __init__(self, cache_dir=None, max_memory_entries: int = 8, max_disk_entries: int = 64,
+                 persist: bool = True):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录（默认 ./data_cache/backtest_results）
+            max_memory_entries: 内存中保留的结果数
+            max_disk_entries: 磁盘上保留的结果文件数
+            persist: False 时只使用内存层
+        """
+        self.cache_dir = (Path(cache_dir) if cache_dir is not None else CACHE_DIR) if persist else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def _remember(self, key: str, results: dict):
+        """放入内存层并淘汰最久未使用的结果（调用方持有锁）"""
+        self._memory[key] = results
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        """查询缓存，未命中返回 None"""
+        with self._lock:
+            results = self._memory.get(key)
+            if results is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return results
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    results = pickle.load(f)
+                path.touch()  # 更新修改时间，作为磁盘层的最近使用时间
+            except FileNotFoundError:
+                results = None
+            except Exception as e:
+                print(f"警告: 回测缓存文件损坏，已忽略: {path.name} ({e})")
+                path.unlink(missing_ok=True)
+                results = None
+
+        with self._lock:
+            if results is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._remember(key, results)
+            return results
+
+    def put(self, key: str, results: dict):
+        """写入缓存（内存 + 磁盘）"""
+        with self._lock:
+            self._remember(key, results)
+        if self.cache_dir is None:
+            return
+
+        # 先写临时文件再改名，避免并发读到写了一半的文件
+        path = self._path(key)
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(path)
+        except Exception as e:
+            print(f"警告: 回测结果写入磁盘缓存失败: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """磁盘层超出上限时删除最久未使用的文件"""
+        files = []
+        for path in self.cache_dir.glob('*.pkl'):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue  # 并发删除
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.max_disk_entries)]:
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob('*.pkl'):
+                path.unlink(missing_ok=True)
+
+    def info(self) -> dict:
+        """缓存状态（条目数与命中统计）"""
+        with self._lock:
+            info = {'memory_entries': len(self._memory), **self.stats}
+        info['disk_entries'] = len(list(self.cache_dir.glob('*.pkl'))) if self.cache_dir is not None else 0
+        return info
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any
 from trading_cost import get_cost_summary
+from trade_ledger import TradeLedger
 
 
 class BacktestEngine:
@@ -142,6 +143,71 @@ class BacktestEngine:
 
         return trade_copy
 
+    def _cost_columns(self, buy_prices, sell_prices) -> dict:
+        """
+        列式成本计算（与 apply_trading_costs 逐笔公式相同）
+
+        Args:
+            buy_prices: 原始买入价数组
+            sell_prices: 原始卖出价数组
+
+        Returns:
+            {列名: 数组}，列名与 apply_trading_costs 写入的字段一致
+        """
+        # 1. 应用滑点
+        buy_price = np.asarray(buy_prices, dtype=float) * (1 + self.slippage)
+        sell_price = np.asarray(sell_prices, dtype=float) * (1 - self.slippage)
+
+        # 2. 计算持仓数量（按手取整，价格非正时为 0）
+        safe_price = np.where(buy_price > 0, buy_price, 1.0)
+        position_size = np.where(
+            buy_price > 0, (self.initial_capital * self.position_ratio / safe_price) // 100 * 100, 0
+        ).astype(np.int64)
+
+        # 3. 计算交易金额和成本
+        buy_amount = buy_price * position_size
+        sell_amount = sell_price * position_size
+        buy_cost = self.calculate_trade_cost(buy_amount)
+        sell_cost = self.calculate_trade_cost(sell_amount)
+
+        # 4. 重新计算收益率
+        total_cost = buy_amount + buy_cost + sell_cost
+        profit = sell_amount - buy_amount - buy_cost - sell_cost
+        safe_total = np.where(total_cost > 0, total_cost, 1.0)
+        return_rate = np.where(total_cost > 0, profit / safe_total * 100, 0.0)
+
+        return {
+            '买入价': buy_price,
+            '卖出价': sell_price,
+            '持仓数量': position_size,
+            '买入成本': np.round(buy_cost, 2),
+            '卖出成本': np.round(sell_cost, 2),
+            '收益率%': return_rate,
+        }
+
+    def apply_trading_costs_batch(self, trades: list) -> list:
+        """
+        对一批交易应用成本计算（列式计算，结果与逐笔 apply_trading_costs 相同）
+
+        Args:
+            trades: 原始交易记录列表
+
+        Returns:
+            更新后的交易记录列表（顺序不变）
+        """
+        if not trades:
+            return []
+
+        columns = self._cost_columns([trade['买入价'] for trade in trades],
+                                     [trade['卖出价'] for trade in trades])
+        names = list(columns)
+        rows = zip(*(columns[name].tolist() for name in names))
+        return [{**trade, **dict(zip(names, row))} for trade, row in zip(trades, rows)]
+
+    def apply_trading_costs_ledger(self, ledger: TradeLedger) -> TradeLedger:
+        """对交易账本应用成本计算，返回增加/更新成本列后的新账本"""
+        return ledger.with_columns(self._cost_columns(ledger.column('买入价'), ledger.column('卖出价')))
+
     def run_single_stock(self, symbol: str, df: pd.DataFrame, strategy: Any) -> dict:
         """
         对单只股票运行回测
@@ -151,8 +217,10 @@ class BacktestEngine:
         2. 对每笔交易应用成本计算（滑点、手续费）
         3. 计算回测统计指标
         """
-        trades = strategy.get_trades(df)
+        return self.evaluate_trades(symbol, strategy.get_trades(df))
 
+    def evaluate_trades(self, symbol: str, trades: list) -> dict:
+        """对已生成的交易记录应用成本计算并统计指标（run_single_stock 的后半段）"""
         if not trades:
             return {
                 'symbol': symbol,
@@ -166,36 +234,38 @@ class BacktestEngine:
                 'backtest_settings': self.backtest_settings,
             }
 
-        # 应用成本计算到每笔交易
-        trades_with_costs = [self.apply_trading_costs(trade) for trade in trades]
-
-        trades_df = pd.DataFrame(trades_with_costs)
+        # 列式账本：成本计算与收益统计都在数组上完成
+        ledger = self.apply_trading_costs_ledger(TradeLedger.from_records(trades))
+        returns = ledger.column('收益率%')
 
         # 计算收益统计
-        total_return = trades_df['收益率%'].sum()
-        num_trades = len(trades_with_costs)
-        wins = len(trades_df[trades_df['收益率%'] > 0])
-        losses = len(trades_df[trades_df['收益率%'] <= 0])
+        total_return = np.nansum(returns)
+        num_trades = len(ledger)
+        win_mask = returns > 0
+        loss_mask = returns <= 0
+        wins = int(win_mask.sum())
+        losses = int(loss_mask.sum())
         win_rate = wins / num_trades * 100 if num_trades > 0 else 0
 
         # 盈亏比
-        avg_profit = trades_df[trades_df['收益率%'] > 0]['收益率%'].mean() if wins > 0 else 0
-        avg_loss = abs(trades_df[trades_df['收益率%'] <= 0]['收益率%'].mean()) if losses > 0 else 0
+        avg_profit = returns[win_mask].mean() if wins > 0 else 0
+        avg_loss = abs(returns[loss_mask].mean()) if losses > 0 else 0
         profit_factor = avg_profit / avg_loss if avg_loss > 0 else (1 if avg_profit > 0 else 0)
 
         # 最大单笔亏损
-        max_loss = trades_df['收益率%'].min() if len(trades_df) > 0 else 0
+        max_loss = np.nanmin(returns) if num_trades > 0 else 0
 
         return {
             'symbol': symbol,
-            'trades': trades_with_costs,
+            'trades': ledger.to_dicts(),
             'total_return': total_return,
             'num_trades': num_trades,
             'win_rate': win_rate,
-            'avg_return': trades_df['收益率%'].mean(),
+            'avg_return': np.nanmean(returns),
             'max_loss': max_loss,
             'profit_factor': profit_factor,
-            'trades_df': trades_df,
+            'trades_df': ledger.to_frame(),
+            'ledger': ledger,
             'backtest_settings': self.backtest_settings,
         }
 
@@ -214,6 +284,30 @@ class BacktestEngine:
 
         return results
 
+    def run_param_batch(self, stocks_data: Dict[str, pd.DataFrame], strategy_class: Any,
+                        param_sets: List[dict]) -> List[Dict[str, dict]]:
+        """
+        对多组参数批量运行回测
+
+        策略类需提供 get_trades_batch(df, param_sets)，每只股票的指标在各参数组间只计算一次。
+
+        Returns:
+            与 param_sets 等长的列表，每项结构同 run_multiple_stocks 的返回值
+        """
+        batch_results = [{} for _ in param_sets]
+
+        for symbol, df in stocks_data.items():
+            if df is None or len(df) < 50:  # 数据不足跳过
+                continue
+
+            trades_per_param = strategy_class.get_trades_batch(df, param_sets)
+            for results, trades in zip(batch_results, trades_per_param):
+                result = self.evaluate_trades(symbol, trades)
+                if result['num_trades'] > 0:  # 只记录有交易的
+                    results[symbol] = result
+
+        return batch_results
+
     @staticmethod
     def aggregate_results(results: Dict[str, dict]) -> dict:
         """聚合所有股票的回测结果"""
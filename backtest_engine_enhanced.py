@@ -5,8 +5,14 @@ import pandas as pd
 import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 import bisect
+import hashlib
+import heapq
+
+from parallel_signals import generate_trades
+from risk_metrics import nav_risk_metrics
+from trade_ledger import TradeLedger
 
 
 class PortfolioManager:
@@ -23,17 +29,32 @@ class PortfolioManager:
         self.initial_capital = initial_capital
         self.current_cash = initial_capital
         self.max_position_ratio = max_position_ratio
-        self.positions = defaultdict(list)  # {symbol: [pos1, pos2, ...]}
+        self.positions = defaultdict(deque)  # {symbol: deque([pos1, pos2, ...])}，FIFO
         self.trade_history = []
         self.rejected_trades = []  # 被风险控制阻止的交易
 
+        # 增量维护的汇总值，买卖时 O(1) 更新（可用 check_invariants 校验）
+        self._invested_cost = 0.0   # 持仓总成本
+        self._open_lots = 0         # 持仓笔数
+        self._next_trade_id = 0     # 下一笔买入的 trade_id（买入与对应卖出记录共用，用于配对）
+
     def get_total_position_value(self) -> float:
         """获取当前持仓总成本"""
-        total = 0
-        for pos_list in self.positions.values():
-            for pos in pos_list:
-                total += pos['entry_cost']
-        return total
+        return self._invested_cost
+
+    def get_open_lots(self) -> int:
+        """获取当前持仓笔数"""
+        return self._open_lots
+
+    def check_invariants(self, tol: float = 1e-6):
+        """校验增量汇总值与逐笔持仓重新计算的结果一致（用于测试）"""
+        lots = [pos for pos_list in self.positions.values() for pos in pos_list]
+        assert self._open_lots == len(lots), \
+            f"持仓笔数不一致: {self._open_lots} != {len(lots)}"
+        invested = sum(pos['entry_cost'] for pos in lots)
+        assert abs(self._invested_cost - invested) <= tol * max(1.0, self.initial_capital), \
+            f"持仓成本不一致: {self._invested_cost} != {invested}"
+        assert all(isinstance(pos_list, deque) for pos_list in self.positions.values())
 
     def get_position_ratio(self) -> float:
         """获取当前仓位比例 (持仓值 / 初始资金)"""
@@ -82,7 +103,10 @@ class PortfolioManager:
             })
             return False
 
+        trade_id = self._next_trade_id
+        self._next_trade_id += 1
         self.positions[symbol].append({
+            'trade_id': trade_id,
             'shares': shares,
             'entry_price': entry_price,
             'entry_cost': total_cost,
@@ -90,9 +114,12 @@ class PortfolioManager:
             'status': 'open'
         })
         self.current_cash -= total_cost
+        self._invested_cost += total_cost
+        self._open_lots += 1
 
-        open_lots = sum(len(v) for v in self.positions.values())
+        open_lots = self._open_lots
         self.trade_history.append({
+            'trade_id': trade_id,
             'date': buy_date,
             'symbol': symbol,
             'action': 'BUY',
@@ -108,19 +135,38 @@ class PortfolioManager:
         return True
 
     def sell(self, symbol: str, shares: int, exit_price: float,
-             exit_cost: float, sell_date: str) -> bool:
+             exit_cost: float, sell_date: str, trade_id: int = None) -> bool:
         """
-        卖出股票 - FIFO 出队
+        卖出股票 - 整笔平仓
+
+        Args:
+            shares: 卖出数量，必须等于平仓那笔持仓的持股数（不支持部分平仓）
+            trade_id: 平仓的往返交易（对应买入记录的 trade_id）。同一股票有多笔持仓时移除该笔持仓，
+                      收益按其自身的持股数与买入成本计算；默认 FIFO 出队最早建仓的一笔
 
         Returns:
             成功返回True，失败返回False
         """
-        if not self.positions[symbol]:
+        lots = self.positions[symbol]
+        if not lots:
             return False
 
-        position = self.positions[symbol].pop(0)  # FIFO: 弹出最早建仓的那笔
-        if not self.positions[symbol]:
-            del self.positions[symbol]  # 清理空列表，避免内存残留
+        if trade_id is None:
+            index = 0  # FIFO: 最早建仓的那笔
+        else:
+            # 同一股票多笔持仓（网格/海龟加仓）可能不按建仓顺序卖出，移除实际平仓的那笔
+            index = next((i for i, lot in enumerate(lots) if lot['trade_id'] == trade_id), None)
+            if index is None:
+                return False
+        position = lots[index]
+        if shares != position['shares']:
+            raise ValueError(f"{symbol} 卖出数量{shares}与持仓{position['shares']}不一致，不支持部分平仓")
+        del lots[index]
+        if not lots:
+            del self.positions[symbol]  # 清理空队列，避免内存残留
+        self._open_lots -= 1
+        # 全部平仓时归零，避免浮点累计误差
+        self._invested_cost = self._invested_cost - position['entry_cost'] if self._open_lots else 0.0
 
         sell_income = shares * exit_price - exit_cost
         entry_cost = position['entry_cost']
@@ -129,8 +175,9 @@ class PortfolioManager:
 
         self.current_cash += sell_income
 
-        open_lots = sum(len(v) for v in self.positions.values())
+        open_lots = self._open_lots
         self.trade_history.append({
+            'trade_id': position['trade_id'],
             'date': sell_date,
             'symbol': symbol,
             'action': 'SELL',
@@ -179,25 +226,35 @@ class PortfolioManager:
 class TradingCostCalculator:
     """A股真实交易成本计算"""
 
-    def __init__(self, commission_rate: float = 0.0001, include_stamp_duty: bool = True):
+    def __init__(self, commission_rate: float = 0.0001, include_stamp_duty: bool = True,
+                 min_commission: float = 0.0):
         """
         Args:
             commission_rate: 手续费率 (0.01%-0.03%, 默认0.01%)
             include_stamp_duty: 是否计入印花税 (卖出时0.1%)
+            min_commission: 单边最低佣金（元，默认0 = 不设下限）
         """
         self.commission_rate = commission_rate
         self.stamp_duty_sell = 0.001 if include_stamp_duty else 0  # 印花税 (卖出 0.1%)
         self.transfer_fee_rate = 0.000001  # 过户费
+        self.min_commission = min_commission
 
-    def calculate_buy_cost(self, amount: float) -> float:
-        """计算买入成本"""
+    def _commission(self, amount):
+        """佣金（amount 可为标量或数组）"""
         commission = amount * self.commission_rate
+        if self.min_commission:
+            commission = np.maximum(commission, self.min_commission)
+        return commission
+
+    def calculate_buy_cost(self, amount: float) -> float:
+        """计算买入成本（amount 可为标量或数组）"""
+        commission = self._commission(amount)
         transfer_fee = amount * self.transfer_fee_rate
         return commission + transfer_fee
 
     def calculate_sell_cost(self, amount: float) -> float:
-        """计算卖出成本"""
-        commission = amount * self.commission_rate
+        """计算卖出成本（amount 可为标量或数组）"""
+        commission = self._commission(amount)
         stamp_duty = amount * self.stamp_duty_sell
         transfer_fee = amount * self.transfer_fee_rate
         return commission + stamp_duty + transfer_fee
@@ -267,55 +324,271 @@ class BacktestTimeConfig:
         }
 
 
-def _build_prev_day_turnover_ranks(all_data: dict) -> tuple:
+class TurnoverRankTable:
+    """
+    成交额横截面排名矩阵（交易日 × 股票）
+
+    ranks[i, j] 为第 i 个交易日股票 j 的成交额降序排名（rank=1 为最高，并列取最小名次），
+    当日无该股票数据为 MISSING_RANK。按日期查询前一交易日排名为 O(1) 数组索引。
+    """
+
+    MISSING_RANK = 999999
+
+    def __init__(self, days: np.ndarray, symbols: list, ranks: np.ndarray):
+        self.days = days                    # 全局交易日（int64 纳秒，升序）
+        self.symbols = symbols
+        self.ranks = ranks                  # int32 (交易日数, 股票数)
+        self.day_index = {int(day): i for i, day in enumerate(days.tolist())}
+        self.symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+
+    def prev_day_index(self, date) -> int:
+        """date 之前最近一个交易日的行号，没有则返回 -1"""
+        day_ns = pd.Timestamp(date).normalize().value
+        i = self.day_index.get(day_ns)
+        if i is None:
+            # 非交易日：定位到第一个晚于它的交易日
+            i = int(np.searchsorted(self.days, day_ns, side='left'))
+        return i - 1
+
+    def prev_day_rank(self, date, symbol: str) -> int:
+        """前一交易日的成交额排名；无前一交易日或当日无数据时返回 MISSING_RANK"""
+        i = self.prev_day_index(date)
+        j = self.symbol_index.get(symbol)
+        if i < 0 or j is None:
+            return self.MISSING_RANK
+        return int(self.ranks[i, j])
+
+
+# 排名矩阵缓存：同一份行情数据（数据版本相同）的多次回测复用
+_TURNOVER_RANK_CACHE = OrderedDict()
+_TURNOVER_RANK_CACHE_SIZE = 4
+
+
+_NS_PER_DAY = 86_400 * 10**9
+
+
+def _day_ns(dates) -> np.ndarray:
+    """日期列 -> 当日零点的 int64 纳秒（已是 datetime64 类型时跳过逐个解析）"""
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    values = np.asarray(dates, dtype='datetime64[ns]').astype(np.int64)
+    return values - values % _NS_PER_DAY
+
+
+def _turnover_data_version(frames: list) -> str:
+    """(股票, 日期, 成交额) 的内容哈希"""
+    digest = hashlib.sha1()
+    for symbol, dates, turnover in frames:
+        digest.update(symbol.encode('utf-8'))
+        digest.update(dates.tobytes())
+        digest.update(turnover.tobytes())
+    return digest.hexdigest()
+
+
+def _turnover_frame(symbol: str, df: pd.DataFrame) -> tuple:
+    """(股票, 日期 int64 纳秒, 成交额) —— 排名与断点核对只需要这两列"""
+    turnover = pd.to_numeric(df['成交额'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    return symbol, _day_ns(df['日期']), turnover
+
+
+def _build_prev_day_turnover_ranks(all_data: dict) -> TurnoverRankTable:
+    """
+    为所有股票构建成交额横截面排名矩阵，用于「前一交易日成交额排名」过滤
+
+    相同数据版本的结果会被缓存复用。
+    """
+    return _build_turnover_rank_table([_turnover_frame(symbol, df) for symbol, df in all_data.items()])
+
+
+def _build_turnover_rank_table(frames: list) -> TurnoverRankTable:
+    """由 _turnover_frame 列表构建排名矩阵（股票按代码排序，与输入顺序无关）"""
+    frames = sorted(frames, key=lambda frame: frame[0])
+    version = _turnover_data_version(frames)
+    table = _TURNOVER_RANK_CACHE.get(version)
+    if table is not None:
+        _TURNOVER_RANK_CACHE.move_to_end(version)
+        return table
+
+    symbols = [symbol for symbol, _, _ in frames]
+    days = np.unique(np.concatenate([dates for _, dates, _ in frames])) if frames \
+        else np.empty(0, dtype=np.int64)
+
+    # 无数据的位置为 NaN，不参与当日排名
+    turnover_matrix = np.full((len(days), len(symbols)), np.nan)
+    for j, (_, dates, turnover) in enumerate(frames):
+        turnover_matrix[np.searchsorted(days, dates), j] = turnover
+
+    ranks = pd.DataFrame(turnover_matrix).rank(axis=1, ascending=False, method='min').to_numpy()
+    ranks = np.where(np.isnan(ranks), TurnoverRankTable.MISSING_RANK, ranks).astype(np.int32)
+
+    table = TurnoverRankTable(days, symbols, ranks)
+    _TURNOVER_RANK_CACHE[version] = table
+    while len(_TURNOVER_RANK_CACHE) > _TURNOVER_RANK_CACHE_SIZE:
+        _TURNOVER_RANK_CACHE.popitem(last=False)
+    return table
+
+
+def build_daily_series(trade_history: list, closes: dict, initial_capital: float) -> Optional[dict]:
     """
-    为所有股票构建「前一交易日成交额横截面排名」查询表。
+    由组合成交记录与收盘价面板计算逐日净值序列（全部为数组运算）
+
+    持仓矩阵 holdings[i, j] 为第 i 个交易日收盘时股票 j 的持股数（成交记录按日累加），
+    收盘价面板向前填充停牌日；面板只包含有过成交的股票。
+
+    Args:
+        trade_history: PortfolioManager.trade_history
+        closes: {symbol: (日期 int64 纳秒数组, 收盘价数组)}，回测区间内的行情
+        initial_capital: 初始资金
 
     Returns:
-        (rank_map, sorted_dates)
-        rank_map: {date_str: {symbol: rank}}  —— rank=1 表示当日成交额最高
-        sorted_dates: 全局所有交易日列表（已排序），用于查找前一交易日
+        {'dates', 'nav', 'cash', 'position_value', 'exposure', 'drawdown',
+         'open_positions', 'position_ratio'}，均为等长数组；closes 为空时返回 None
+    """
+    if not closes:
+        return None
+
+    days = np.unique(np.concatenate([dates for dates, _ in closes.values()]))
+    n = len(days)
+    cash_delta = np.zeros(n)
+    cost_delta = np.zeros(n)
+    lots_delta = np.zeros(n, dtype=np.int64)
+
+    symbols = []
+    position_value = np.zeros(n)
+    if trade_history:
+        is_buy = np.array([t['action'] == 'BUY' for t in trade_history])
+        shares = np.array([t['shares'] for t in trade_history], dtype=float)
+        # 买入：现金减少 total_cost；卖出：现金增加 income，释放成本 income - profit
+        amount = np.array([t['total_cost'] if buy else t['income']
+                           for t, buy in zip(trade_history, is_buy)], dtype=float)
+        released = np.array([0.0 if buy else t['income'] - t['profit']
+                             for t, buy in zip(trade_history, is_buy)], dtype=float)
+        # 成交日映射到不晚于该日的最近交易日
+        day_idx = np.searchsorted(days, _day_ns([t['date'] for t in trade_history]), side='right') - 1
+        day_idx = np.maximum(day_idx, 0)
+
+        np.add.at(cash_delta, day_idx, np.where(is_buy, -amount, amount))
+        np.add.at(cost_delta, day_idx, np.where(is_buy, amount, -released))
+        np.add.at(lots_delta, day_idx, np.where(is_buy, 1, -1))
+
+        symbols = list(dict.fromkeys(t['symbol'] for t in trade_history))
+        symbol_idx = {symbol: j for j, symbol in enumerate(symbols)}
+        col_idx = np.array([symbol_idx[t['symbol']] for t in trade_history])
+
+        holdings = np.zeros((n, len(symbols)))
+        np.add.at(holdings, (day_idx, col_idx), np.where(is_buy, shares, -shares))
+        holdings = np.cumsum(holdings, axis=0)
+
+        # 收盘价面板（停牌日向前填充，上市前为 0）
+        close_panel = np.full((n, len(symbols)), np.nan)
+        for symbol, j in symbol_idx.items():
+            if symbol in closes:
+                dates, close = closes[symbol]
+                close_panel[np.searchsorted(days, dates), j] = close
+        filled = np.where(np.isnan(close_panel), 0, np.arange(n)[:, None])
+        np.maximum.accumulate(filled, axis=0, out=filled)
+        close_panel = np.nan_to_num(close_panel[filled, np.arange(len(symbols))])
+
+        position_value = (holdings * close_panel).sum(axis=1)
+
+    cash = initial_capital + np.cumsum(cash_delta)
+    nav = cash + position_value
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = np.where(nav > 0, position_value / nav, 0.0)
+    drawdown = nav / np.maximum.accumulate(nav) - 1 if n else nav
+
+    return {
+        'dates': days.astype('datetime64[ns]'),
+        'nav': nav,
+        'cash': cash,
+        'position_value': position_value,
+        'exposure': exposure,
+        'drawdown': drawdown,
+        'open_positions': np.cumsum(lots_delta),
+        'position_ratio': np.cumsum(cost_delta) / initial_capital,
+    }
+
+
+def pair_round_trips(trade_history: list, ledger: TradeLedger = None) -> list:
     """
-    records = []
-    for symbol, df in all_data.items():
-        sub = df[['日期', '成交额']].copy()
-        sub.columns = ['date', 'turnover']
-        sub['symbol'] = symbol
-        records.append(sub)
+    组合成交记录 -> 已平仓的往返交易（按卖出顺序）
 
-    if not records:
-        return {}, []
+    买入与卖出记录按 trade_id 配对（引擎撮合时卖出记录指向同一笔策略交易的买入记录）；
+    收益率与出场状态取自账本中 (股票, 买入日, 卖出日) 相同的第一笔策略交易（哈希索引），
+    账本中没有对应交易时使用组合按成交价计算的 profit_pct。整体为线性复杂度。
 
-    all_df = pd.concat(records, ignore_index=True)
-    all_df['date'] = pd.to_datetime(all_df['date']).dt.normalize()
-    all_df['turnover'] = pd.to_numeric(all_df['turnover'], errors='coerce').fillna(0)
+    Args:
+        trade_history: PortfolioManager.trade_history
+        ledger: 全部策略交易的 TradeLedger（需要 'symbol' 列）
 
-    # 每个交易日对所有股票按成交额降序排名（rank=1 为最高）
-    all_df['rank'] = all_df.groupby('date')['turnover'].rank(
-        ascending=False, method='min'
-    ).astype(int)
+    Returns:
+        [{'trade_id', 'symbol', 'buy_date', 'buy_price', 'sell_date', 'sell_price',
+          'return', 'status', 'open_positions', 'position_ratio'}]
+    """
+    strategy_trades = {}
+    if ledger is not None and len(ledger) and all(key in ledger for key in ('symbol', '买入日期', '卖出日期')):
+        returns = ledger.column('收益率%').tolist() if '收益率%' in ledger else [None] * len(ledger)
+        has_return = (ledger.present.get('收益率%', np.ones(len(ledger), dtype=bool)).tolist()
+                      if '收益率%' in ledger else [False] * len(ledger))
+        statuses = ledger.values('状态').tolist() if '状态' in ledger else [None] * len(ledger)
+        keys = zip(ledger.values('symbol').tolist(), _day_ns(ledger.values('买入日期')).tolist(),
+                   _day_ns(ledger.values('卖出日期')).tolist())
+        for key, value, present, status in zip(keys, returns, has_return, statuses):
+            strategy_trades.setdefault(key, (value if present else None, status))
+
+    sells = [t for t in trade_history if t['action'] == 'SELL']
+    buys = {t['trade_id']: t for t in trade_history if t['action'] == 'BUY'}
+    buy_days = _day_ns([buys[t['trade_id']]['date'] for t in sells]).tolist() if sells else []
+    sell_days = _day_ns([t['date'] for t in sells]).tolist() if sells else []
+
+    round_trips = []
+    for sell, buy_day, sell_day in zip(sells, buy_days, sell_days):
+        buy = buys[sell['trade_id']]
+        trade_return, status = strategy_trades.get((sell['symbol'], buy_day, sell_day), (None, None))
+        if trade_return is None:
+            trade_return = sell.get('profit_pct', 0)
+        round_trips.append({
+            'trade_id': sell['trade_id'],
+            'symbol': sell['symbol'],
+            'buy_date': str(buy['date']).split()[0],
+            'buy_price': round(buy['price'], 2),
+            'sell_date': str(sell['date']).split()[0],
+            'sell_price': round(sell['price'], 2),
+            'return': round(trade_return, 4),
+            'status': status or '平仓',
+            'open_positions': sell.get('open_positions', 0),
+            'position_ratio': round(sell.get('position_ratio', 0) * 100, 1),
+        })
+    return round_trips
 
-    # 全局交易日列表（升序）
-    sorted_dates = sorted(all_df['date'].dt.strftime('%Y-%m-%d').unique().tolist())
 
-    # 构建快查字典
-    rank_map: dict = {}
-    for row in all_df.itertuples(index=False):
-        d = row.date.strftime('%Y-%m-%d')
-        if d not in rank_map:
-            rank_map[d] = {}
-        rank_map[d][row.symbol] = row.rank
+class PortfolioSnapshot:
+    """
+    事件驱动组合撮合的断点：截止日 cut_ns 之前的事件全部处理完毕时的组合状态
 
-    return rank_map, sorted_dates
+    本仓库的策略对整段行情做矢量化计算，没有逐根 K 线的流式状态，新增 K 线后仍需重新生成信号；
+    可以复用的是组合撮合这一串行阶段。恢复前逐只股票核对截止日之前的交易（买入日期/价格、
+    已处理的卖出）与快照一致，一致时截止日之前的资金、持仓、成交记录与撮合状态必然与全量重跑相同，
+    只需处理截止日及之后的事件；任何一项不一致都退回全量撮合。
+    """
 
+    def __init__(self, cut_ns: int, settings: dict, symbols: list, pm_state: dict,
+                 symbol_states: list, turnover_digest: Optional[str]):
+        self.cut_ns = cut_ns                    # 截止日（int64 纳秒），早于它的事件均已处理
+        self.settings = settings                # 引擎设置、回测起点与策略参数，不同则不能恢复
+        self.symbols = symbols                  # 股票顺序（决定同日事件的先后）
+        self.pm_state = pm_state                # 现金、持仓、成交记录与被拒交易
+        self.symbol_states = symbol_states      # 每只股票截止日前的交易与撮合状态
+        self.turnover_digest = turnover_digest  # 截止日前成交额数据的哈希（启用排名过滤时）
 
-def _get_prev_trading_day(buy_date_str: str, sorted_dates: list) -> str | None:
-    """返回 buy_date_str 在 sorted_dates 中的前一个交易日，找不到返回 None。"""
-    idx = bisect.bisect_left(sorted_dates, buy_date_str)
-    if idx > 0:
-        return sorted_dates[idx - 1]
-    return None
 
+def _turnover_prefix_digest(frames: list, cut_ns: int) -> str:
+    """截止日之前 (股票, 日期, 成交额) 的内容哈希：相同则截止日前的成交额排名相同"""
+    prefix = []
+    for symbol, dates, turnover in sorted(frames, key=lambda frame: frame[0]):
+        mask = dates < cut_ns
+        prefix.append((symbol, dates[mask], turnover[mask]))
+    return _turnover_data_version(prefix)
 
 class EnhancedBacktestEngine:
     """增强版回测引擎 - 支持时间范围和仓位管理"""
@@ -324,7 +597,11 @@ class EnhancedBacktestEngine:
                  commission_rate: float = None, slippage: float = None,
                  time_config: BacktestTimeConfig = None,
                  max_position_ratio: float = 0.80,
-                 turnover_rank_top_n: int = 0):
+                 turnover_rank_top_n: int = 0,
+                 event_driven: bool = False,
+                 n_jobs: int = None,
+                 chunk_size: int = None,
+                 min_commission: float = 0.0):
         """
         初始化增强版回测引擎
 
@@ -335,6 +612,12 @@ class EnhancedBacktestEngine:
             slippage: 滑点（0-1），默认0.0
             time_config: 回测时间配置
             max_position_ratio: 最大仓位比例（默认0.80 = 80%）
+            turnover_rank_top_n: 前一日成交额排名前N才允许建仓（0 = 不过滤）
+            event_driven: 组合撮合方式：False 逐只股票处理（原有方式），
+                          True 所有股票的买卖事件按时间顺序处理
+            n_jobs: 多股票回测时信号生成的进程数（默认 config.SIGNAL_WORKERS）
+            chunk_size: 每个进程任务包含的股票数（默认 config.SIGNAL_CHUNK_SIZE）
+            min_commission: 单边最低佣金（元，默认0 = 不设下限）
         """
         from config import (
             INITIAL_CAPITAL_DEFAULT, POSITION_RATIO_DEFAULT,
@@ -347,12 +630,15 @@ class EnhancedBacktestEngine:
         self.slippage = slippage or SLIPPAGE_DEFAULT
         self.max_position_ratio = max_position_ratio
         self.turnover_rank_top_n = int(turnover_rank_top_n or 0)
+        self.event_driven = bool(event_driven)
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
 
         # 时间配置
         self.time_config = time_config or BacktestTimeConfig()
 
         # 成本计算器
-        self.cost_calculator = TradingCostCalculator(self.commission_rate)
+        self.cost_calculator = TradingCostCalculator(self.commission_rate, min_commission=min_commission)
 
         # 记录回测设置
         self.backtest_settings = {
@@ -360,7 +646,9 @@ class EnhancedBacktestEngine:
             'position_ratio': self.position_ratio,
             'commission_rate': self.commission_rate,
             'slippage': self.slippage,
+            'min_commission': min_commission,
             'max_position_ratio': self.max_position_ratio,
+            'event_driven': self.event_driven,
             'time_config': self.time_config.to_dict()
         }
 
@@ -410,6 +698,63 @@ class EnhancedBacktestEngine:
 
         return trade_copy
 
+    def _cost_columns(self, buy_prices, sell_prices) -> dict:
+        """
+        列式成本计算：滑点、按手取整、佣金（含最低佣金）与印花税对所有交易一次性做数组运算
+
+        Returns:
+            {列名: 数组}，列名与取整口径与 apply_trading_costs 写入的字段一致
+        """
+        buy_price = np.asarray(buy_prices, dtype=float) * (1 + self.slippage)
+        sell_price = np.asarray(sell_prices, dtype=float) * (1 - self.slippage)
+
+        # 按手取整（价格非正时为 0 股）
+        safe_price = np.where(buy_price > 0, buy_price, 1.0)
+        position_size = np.where(
+            buy_price > 0, (self.initial_capital * self.position_ratio / safe_price) // 100 * 100, 0
+        ).astype(np.int64)
+
+        buy_amount = buy_price * position_size
+        sell_amount = sell_price * position_size
+        buy_cost = self.cost_calculator.calculate_buy_cost(buy_amount)
+        sell_cost = self.cost_calculator.calculate_sell_cost(sell_amount)
+        stamp_duty = sell_amount * 0.001  # 印花税
+
+        total_cost = buy_amount + buy_cost + sell_cost
+        profit = sell_amount - buy_amount - buy_cost - sell_cost
+        safe_total = np.where(total_cost > 0, total_cost, 1.0)
+        return_rate = np.where(total_cost > 0, profit / safe_total * 100, 0.0)
+
+        return {
+            '买入价': np.round(buy_price, 2),
+            '卖出价': np.round(sell_price, 2),
+            '持仓数量': position_size,
+            '买入成本': np.round(buy_cost, 2),
+            '卖出成本': np.round(sell_cost, 2),
+            '印花税': np.round(stamp_duty, 2),
+            '总手续费': np.round(buy_cost + sell_cost, 2),
+            '收益率%': np.round(return_rate, 2),
+        }
+
+    def apply_trading_costs_batch(self, trades: list) -> list:
+        """
+        对一批交易应用成本计算（列式计算，结果与逐笔 apply_trading_costs 相同）
+
+        最后按原顺序生成带成本字段的交易记录副本。
+        """
+        if not trades:
+            return []
+
+        columns = self._cost_columns([trade['买入价'] for trade in trades],
+                                     [trade['卖出价'] for trade in trades])
+        names = list(columns)
+        rows = zip(*(columns[name].tolist() for name in names))
+        return [{**trade, **dict(zip(names, row))} for trade, row in zip(trades, rows)]
+
+    def apply_trading_costs_ledger(self, ledger: TradeLedger) -> TradeLedger:
+        """对交易账本应用成本计算，返回增加/更新成本列后的新账本"""
+        return ledger.with_columns(self._cost_columns(ledger.column('买入价'), ledger.column('卖出价')))
+
     def run_single_stock(self, symbol: str, df: pd.DataFrame, strategy: Any) -> dict:
         """对单只股票运行回测（带时间过滤）"""
         # 按时间范围过滤数据
@@ -453,34 +798,36 @@ class EnhancedBacktestEngine:
                 }
             }
 
-        # 应用成本计算到每笔交易
-        trades_with_costs = [self.apply_trading_costs(trade) for trade in trades]
-
-        trades_df = pd.DataFrame(trades_with_costs)
+        # 列式账本：成本计算与收益统计都在数组上完成
+        ledger = self.apply_trading_costs_ledger(TradeLedger.from_records(trades))
+        returns = ledger.column('收益率%')
 
         # 计算收益统计
-        total_return = trades_df['收益率%'].sum()
-        num_trades = len(trades_with_costs)
-        wins = len(trades_df[trades_df['收益率%'] > 0])
-        losses = len(trades_df[trades_df['收益率%'] <= 0])
+        total_return = np.nansum(returns)
+        num_trades = len(ledger)
+        win_mask = returns > 0
+        loss_mask = returns <= 0
+        wins = int(win_mask.sum())
+        losses = int(loss_mask.sum())
         win_rate = wins / num_trades * 100 if num_trades > 0 else 0
 
-        avg_profit = trades_df[trades_df['收益率%'] > 0]['收益率%'].mean() if wins > 0 else 0
-        avg_loss = abs(trades_df[trades_df['收益率%'] <= 0]['收益率%'].mean()) if losses > 0 else 0
+        avg_profit = returns[win_mask].mean() if wins > 0 else 0
+        avg_loss = abs(returns[loss_mask].mean()) if losses > 0 else 0
         profit_factor = avg_profit / avg_loss if avg_loss > 0 else (1 if avg_profit > 0 else 0)
 
-        max_loss = trades_df['收益率%'].min() if len(trades_df) > 0 else 0
+        max_loss = np.nanmin(returns) if num_trades > 0 else 0
 
         return {
             'symbol': symbol,
-            'trades': trades_with_costs,
+            'trades': ledger.to_dicts(),
             'total_return': round(total_return, 2),
             'num_trades': num_trades,
             'win_rate': round(win_rate, 2),
-            'avg_return': round(trades_df['收益率%'].mean(), 2),
+            'avg_return': round(np.nanmean(returns), 2),
             'max_loss': round(max_loss, 2),
             'profit_factor': round(profit_factor, 2),
-            'trades_df': trades_df,
+            'trades_df': ledger.to_frame(),
+            'ledger': ledger,
             'backtest_settings': self.backtest_settings,
             'backtest_period': {
                 'start': self.time_config.backtest_start,
@@ -490,98 +837,406 @@ class EnhancedBacktestEngine:
             }
         }
 
-    def run_multiple_stocks_with_portfolio(self, all_data: dict, strategy: Any) -> dict:
+    def run_multiple_stocks_with_portfolio(self, all_data: dict, strategy: Any,
+                                           resume_from: PortfolioSnapshot = None) -> dict:
         """
         多只股票回测 - 带真实的投资组合管理
 
+        Args:
+            all_data: {symbol: 行情 DataFrame}
+            strategy: 策略对象
+            resume_from: 上一次回测结果中的 'snapshot'（仅事件驱动撮合）。行情追加了新 K 线时，
+                         从快照恢复截止日之前的组合状态，结果与全量重跑完全一致
+
+        Returns:
+            包含投资组合总结和每只股票详细结果；'ledger' 为全部策略交易的 TradeLedger；
+            'round_trips' 为已平仓的往返交易（见 pair_round_trips）；
+            事件驱动撮合时 'snapshot' 为本次回测末日的断点，'resumed' 表示是否从快照恢复
+        """
+        backtest_data = {}
+        last_prices = {}
+        closes = {}
+        for symbol, df in all_data.items():
+            df_backtest = self.time_config.filter_data(df)
+            if len(df_backtest) == 0:
+                continue
+
+            backtest_data[symbol] = df_backtest
+            # 末日收盘价，供 MTM 计算
+            last_prices[symbol] = float(df_backtest.iloc[-1]['收盘'])
+            # 逐日收盘价，供每日净值序列计算
+            closes[symbol] = (_day_ns(df_backtest['日期']), df_backtest['收盘'].to_numpy(dtype=float))
+
+        # 第一阶段：各股票交易信号（可多进程并行，顺序与 all_data 一致）
+        trades_by_symbol = generate_trades(backtest_data, strategy, self.n_jobs, self.chunk_size)
+
+        # ── 成交额排名筛选：预构建前一交易日横截面排名表 ─────────────────────
+        turnover_ranks = None
+        turnover_frames = None
+        if self.turnover_rank_top_n > 0:
+            turnover_frames = [_turnover_frame(symbol, df) for symbol, df in all_data.items()]
+            turnover_ranks = _build_turnover_rank_table(turnover_frames)
+
+        snapshot_context = self._snapshot_context(strategy, closes, turnover_frames, resume_from)
+
+        # 第二阶段：串行组合撮合
+        results = self.run_portfolio(trades_by_symbol, last_prices, turnover_ranks, closes,
+                                     resume_from=resume_from, snapshot_context=snapshot_context)
+
+        # 全部交易的列式账本（含 portfolio_status），供 UI 统计与 Excel 导出使用
+        results['ledger'] = TradeLedger.from_trades_by_symbol(trades_by_symbol)
+        # 已平仓的往返交易（买卖按 trade_id 配对），供接口分页返回
+        results['round_trips'] = pair_round_trips(results['trade_history'], results['ledger'])
+        return results
+
+    def run_portfolio(self, trades_by_symbol: dict, last_prices: dict,
+                      turnover_ranks: TurnoverRankTable = None, closes: dict = None,
+                      resume_from: PortfolioSnapshot = None, snapshot_context: dict = None) -> dict:
+        """
+        按已生成的交易信号撮合投资组合
+
+        Args:
+            trades_by_symbol: {symbol: 策略交易列表}
+            last_prices: {symbol: 末日收盘价}，用于未平仓持仓按市值估值
+            turnover_ranks: _build_prev_day_turnover_ranks 的结果（turnover_rank_top_n > 0 时需要）
+            closes: {symbol: (日期 int64 纳秒, 收盘价)}，提供时结果包含 daily_series 每日净值序列
+            resume_from / snapshot_context: 断点恢复与保存（仅事件驱动撮合，见 run_portfolio_events）
+
         Returns:
-            包含投资组合总结和每只股票详细结果
+            与 run_multiple_stocks_with_portfolio 相同
         """
+        if self.event_driven:
+            return self.run_portfolio_events(trades_by_symbol, last_prices, turnover_ranks, closes,
+                                             resume_from, snapshot_context)
+
         pm = PortfolioManager(
             initial_capital=self.initial_capital,
             max_position_ratio=self.max_position_ratio
         )
 
-        results = {}
-        stock_results = {}
+        self._match_sequential(pm, trades_by_symbol, turnover_ranks)
+        return self._portfolio_results(pm, trades_by_symbol, last_prices, closes)
 
-        # ── 成交额排名筛选：预构建前一交易日横截面排名表 ─────────────────────
-        rank_map: dict = {}
-        rank_sorted_dates: list = []
-        if self.turnover_rank_top_n > 0:
-            rank_map, rank_sorted_dates = _build_prev_day_turnover_ranks(all_data)
+    def _match_sequential(self, pm: PortfolioManager, trades_by_symbol: dict,
+                          turnover_ranks: TurnoverRankTable = None):
+        """逐只股票撮合：每笔交易买入后立即按卖出日期平仓（可按股票分批多次调用）"""
+        for symbol, trades in trades_by_symbol.items():
+            for trade in trades:
+                if '买入日期' in trade and '卖出日期' in trade:
+                    position = self._enter_trade(pm, symbol, trade, turnover_ranks)
+                    # 处理卖出（兼容所有策略的状态：'平仓'/'止盈'/'死叉'/'网格止盈'/'ATR止损' 等）
+                    if position is not None and trade.get('状态') != '未平仓':
+                        self._exit_trade(pm, symbol, trade, position)
 
-        for symbol, df in all_data.items():
-            df_backtest = self.time_config.filter_data(df)
-            if len(df_backtest) == 0:
+    def run_portfolio_events(self, trades_by_symbol: dict, last_prices: dict,
+                             turnover_ranks: TurnoverRankTable = None, closes: dict = None,
+                             resume_from: PortfolioSnapshot = None, snapshot_context: dict = None) -> dict:
+        """
+        事件驱动的组合撮合：所有股票的买入/卖出事件按时间顺序处理
+
+        各股票的买入事件按日期多路归并进优先队列，买入成交后再把对应的卖出事件入队，
+        队列长度不超过「股票数 + 持仓数」，每个事件 O(log n)。
+        同一交易日内先处理卖出（释放资金）再处理买入；同日同类事件按股票顺序、交易顺序处理。
+        当日买入当日卖出的交易，卖出排在当日买入之后。
+
+        断点：提供 snapshot_context（cut_ns / settings / turnover_digest）时，在处理第一个不早于
+        cut_ns 的事件之前保存 PortfolioSnapshot 到结果的 'snapshot'；提供 resume_from 且核对通过时，
+        从快照恢复截止日之前的状态，只处理之后的事件（结果 'resumed' 为 True）。
+
+        Returns:
+            与 run_multiple_stocks_with_portfolio 相同（trade_history 按时间排序）
+        """
+        pm = PortfolioManager(
+            initial_capital=self.initial_capital,
+            max_position_ratio=self.max_position_ratio
+        )
+
+        # 事件：(日期 ns, 类型, 股票序号, 交易序号)；类型 0=卖出 1=买入 2=当日买入的卖出
+        entries = []
+        for trades in trades_by_symbol.values():
+            valid = [t for t, trade in enumerate(trades) if '买入日期' in trade and '卖出日期' in trade]
+            if not valid:
+                entries.append(None)
+                continue
+            entry_ns = pd.to_datetime(pd.Series([trades[t]['买入日期'] for t in valid])).values
+            entry_ns = entry_ns.astype('datetime64[ns]').astype(np.int64)
+            # 稳定排序：网格等策略的交易列表按卖出日期排列，这里按买入日期重排
+            order = np.argsort(entry_ns, kind='stable')
+            entries.append((entry_ns[order].tolist(), [valid[k] for k in order]))
+
+        symbols = list(trades_by_symbol.keys())
+        trade_lists = list(trades_by_symbol.values())
+        heap = []
+        open_sizes = {}  # {(股票序号, 交易序号): (持仓数量, trade_id)}，已买入尚未卖出的交易
+        start = [0] * len(symbols)
+
+        resumed = False
+        if resume_from is not None and self._can_resume(resume_from, snapshot_context, symbols,
+                                                        trade_lists, entries):
+            start = self._restore_snapshot(pm, resume_from, trade_lists, heap, open_sizes)
+            resumed = True
+
+        for s, entry in enumerate(entries):
+            if entry is not None and start[s] < len(entry[0]):
+                k = start[s]
+                heap.append((entry[0][k], 1, s, entry[1][k], k))
+        heapq.heapify(heap)
+
+        snapshot = None
+        cut_ns = snapshot_context['cut_ns'] if snapshot_context is not None else None
+        while heap:
+            if snapshot is None and cut_ns is not None and heap[0][0] >= cut_ns:
+                snapshot = self._capture_snapshot(pm, snapshot_context, symbols, trade_lists,
+                                                  entries, open_sizes)
+            date_ns, kind, s, t, payload = heapq.heappop(heap)
+            symbol, trade = symbols[s], trade_lists[s][t]
+
+            if kind != 1:
+                self._exit_trade(pm, symbol, trade, payload)
+                open_sizes.pop((s, t), None)
                 continue
 
-            trades = strategy.get_trades(df_backtest)
+            # 同一股票的下一笔买入入队
+            k = payload + 1
+            entry_dates, entry_trades = entries[s]
+            if k < len(entry_dates):
+                heapq.heappush(heap, (entry_dates[k], 1, s, entry_trades[k], k))
+
+            position = self._enter_trade(pm, symbol, trade, turnover_ranks)
+            if position is not None:
+                open_sizes[(s, t)] = position
+                if trade.get('状态') != '未平仓':
+                    exit_ns = pd.Timestamp(trade['卖出日期']).value
+                    heapq.heappush(heap, (exit_ns, 2 if exit_ns == date_ns else 0, s, t, position))
+
+        if snapshot is None and cut_ns is not None:
+            snapshot = self._capture_snapshot(pm, snapshot_context, symbols, trade_lists,
+                                              entries, open_sizes)
+
+        results = self._portfolio_results(pm, trades_by_symbol, last_prices, closes)
+        results['snapshot'] = snapshot
+        results['resumed'] = resumed
+        return results
 
-            for trade in trades:
-                # 处理买入
-                if '买入日期' in trade and '卖出日期' in trade:
+    def _snapshot_context(self, strategy: Any, closes: dict, turnover_frames: list = None,
+                          resume_from: PortfolioSnapshot = None) -> Optional[dict]:
+        """
+        断点范围：截止到本次数据的最后一个交易日（该日及之后的事件可能随新 K 线变化）
 
-                    # ── 前一日成交额排名过滤 ──────────────────────────────────
-                    if self.turnover_rank_top_n > 0:
-                        buy_date_str = str(trade['买入日期'])[:10]
-                        prev_day = _get_prev_trading_day(buy_date_str, rank_sorted_dates)
-                        if prev_day:
-                            cur_rank = rank_map.get(prev_day, {}).get(symbol, 999999)
-                        else:
-                            cur_rank = 999999  # 无前一日数据，不能入场
-                        if cur_rank > self.turnover_rank_top_n:
-                            trade['portfolio_status'] = 'FILTERED_TURNOVER'
-                            trade['rejection_reason'] = (
-                                f"前日成交额排名第{cur_rank}，超出前{self.turnover_rank_top_n}名限制"
-                            )
-                            continue
-
-                    buy_price_with_slip = self.apply_slippage_to_price(trade['买入价'], is_buy=True)
-                    position_size = self.calculate_position_size(buy_price_with_slip)
-                    buy_amount = buy_price_with_slip * position_size
-                    buy_cost = self.cost_calculator.calculate_buy_cost(buy_amount)
-
-                    # 检查是否可以建仓
-                    buy_accepted = pm.buy(
-                        symbol=symbol,
-                        shares=position_size,
-                        entry_price=buy_price_with_slip,
-                        entry_cost=buy_cost,
-                        buy_date=trade['买入日期']
-                    )
-
-                    if not buy_accepted:
-                        trade['portfolio_status'] = 'REJECTED'
-                        trade['rejection_reason'] = f"仓位超限或现金不足"
-                        continue
-
-                    trade['portfolio_status'] = 'ACCEPTED'
+        仅事件驱动撮合支持断点；启用成交额排名过滤时需提供 turnover_frames。
+        """
+        if not self.event_driven or not closes:
+            return None
+        cut_ns = int(max(dates[-1] for dates, _ in closes.values()))
+        context = {
+            'cut_ns': cut_ns,
+            'settings': self._snapshot_settings(strategy),
+            'turnover_digest': (_turnover_prefix_digest(turnover_frames, cut_ns)
+                                if self.turnover_rank_top_n > 0 else None),
+        }
+        if resume_from is not None:
+            # 按快照的截止日计算本次数据的成交额哈希，用于核对截止日前的排名未变
+            context['resume_turnover_digest'] = (
+                _turnover_prefix_digest(turnover_frames, resume_from.cut_ns)
+                if self.turnover_rank_top_n > 0 else None)
+        return context
+
+    def _snapshot_settings(self, strategy: Any) -> dict:
+        """断点适用范围：引擎交易设置、数据与回测起点、策略及其参数（回测终点不影响截止日之前的撮合）"""
+        settings = {key: value for key, value in self.backtest_settings.items() if key != 'time_config'}
+        settings.update({
+            'turnover_rank_top_n': self.turnover_rank_top_n,
+            'data_start': self.time_config.data_start,
+            'backtest_start': self.time_config.backtest_start,
+            'strategy': type(strategy).__name__,
+            'strategy_params': {key: value for key, value in vars(strategy).items()
+                                if isinstance(value, (bool, int, float, str, tuple, list, type(None)))},
+        })
+        return settings
+
+    def _capture_snapshot(self, pm: PortfolioManager, snapshot_context: dict, symbols: list,
+                          trade_lists: list, entries: list, open_sizes: dict) -> PortfolioSnapshot:
+        """保存截止日之前的组合状态（成交记录等只追加的列表做浅拷贝）"""
+        cut_ns = snapshot_context['cut_ns']
+        symbol_states = []
+        for s, entry in enumerate(entries):
+            if entry is None:
+                symbol_states.append(None)
+                continue
+            entry_dates, entry_trades = entry
+            k = bisect.bisect_left(entry_dates, cut_ns)
+            trades = trade_lists[s]
+            state = {
+                'entries': list(zip(entry_dates[:k], entry_trades[:k])),
+                'buy_prices': [trades[t]['买入价'] for t in entry_trades[:k]],
+                'exits': {},      # 已处理卖出的交易：{交易序号: (卖出日期 ns, 卖出价)}
+                'open': {},       # 尚未卖出的持仓：{交易序号: (持仓数量, trade_id)}
+                'statuses': {},   # 撮合状态：{交易序号: (portfolio_status, rejection_reason)}
+            }
+            for t in entry_trades[:k]:
+                trade = trades[t]
+                state['statuses'][t] = (trade.get('portfolio_status'), trade.get('rejection_reason'))
+                if (s, t) in open_sizes:
+                    state['open'][t] = open_sizes[(s, t)]
+                elif trade.get('portfolio_status') == 'ACCEPTED':
+                    state['exits'][t] = (pd.Timestamp(trade['卖出日期']).value, trade['卖出价'])
+            symbol_states.append(state)
+
+        pm_state = {
+            'current_cash': pm.current_cash,
+            'invested_cost': pm._invested_cost,
+            'open_lots': pm._open_lots,
+            'next_trade_id': pm._next_trade_id,
+            'positions': {symbol: list(lots) for symbol, lots in pm.positions.items()},
+            'trade_history': list(pm.trade_history),
+            'rejected_trades': list(pm.rejected_trades),
+        }
+        return PortfolioSnapshot(cut_ns, snapshot_context['settings'], list(symbols), pm_state,
+                                 symbol_states, snapshot_context['turnover_digest'])
 
-                    # 处理卖出（兼容所有策略的状态：'平仓'/'止盈'/'死叉'/'网格止盈'/'ATR止损' 等）
-                    if trade.get('状态') != '未平仓':
-                        sell_price_with_slip = self.apply_slippage_to_price(trade['卖出价'], is_buy=False)
-                        sell_amount = sell_price_with_slip * position_size
-                        sell_cost = self.cost_calculator.calculate_sell_cost(sell_amount)
-
-                        pm.sell(
-                            symbol=symbol,
-                            shares=position_size,
-                            exit_price=sell_price_with_slip,
-                            exit_cost=sell_cost,
-                            sell_date=trade['卖出日期']
-                        )
-
-            # 存储每只股票的结果（含末日收盘价，供 MTM 计算）
-            last_close = float(df_backtest.iloc[-1]['收盘']) if len(df_backtest) > 0 else 0.0
-            stock_results[symbol] = {
+    def _can_resume(self, snapshot: PortfolioSnapshot, snapshot_context: dict, symbols: list,
+                    trade_lists: list, entries: list) -> bool:
+        """核对快照截止日之前的交易与本次生成的交易一致（组合撮合只读取买卖日期、价格与状态）"""
+        if snapshot_context is None or snapshot_context['cut_ns'] < snapshot.cut_ns:
+            return False
+        if (snapshot.settings != snapshot_context['settings'] or snapshot.symbols != symbols
+                or snapshot.turnover_digest != snapshot_context.get('resume_turnover_digest')):
+            return False
+
+        cut_ns = snapshot.cut_ns
+        for s, state in enumerate(snapshot.symbol_states):
+            prefix = state['entries'] if state is not None else []
+            entry_dates, entry_trades = entries[s] if entries[s] is not None else ([], [])
+            k = len(prefix)
+            if list(zip(entry_dates[:k], entry_trades[:k])) != prefix:
+                return False
+            if k < len(entry_dates) and entry_dates[k] < cut_ns:
+                return False  # 截止日前出现了新的交易
+            if state is None:
+                continue
+
+            trades = trade_lists[s]
+            if [trades[t]['买入价'] for _, t in prefix] != state['buy_prices']:
+                return False
+            for t, (exit_ns, sell_price) in state['exits'].items():
+                trade = trades[t]
+                if (trade.get('状态') == '未平仓' or pd.Timestamp(trade['卖出日期']).value != exit_ns
+                        or trade['卖出价'] != sell_price):
+                    return False
+            for t in state['open']:
+                trade = trades[t]
+                if trade.get('状态') != '未平仓' and pd.Timestamp(trade['卖出日期']).value < cut_ns:
+                    return False  # 原本未卖出的持仓改为在截止日前卖出
+        return True
+
+    def _restore_snapshot(self, pm: PortfolioManager, snapshot: PortfolioSnapshot, trade_lists: list,
+                          heap: list, open_sizes: dict) -> list:
+        """
+        从快照恢复组合状态、交易撮合状态与未卖出持仓的卖出事件
+
+        Returns:
+            每只股票下一笔待处理买入在 entries 中的位置
+        """
+        state = snapshot.pm_state
+        pm.current_cash = state['current_cash']
+        pm._invested_cost = state['invested_cost']
+        pm._open_lots = state['open_lots']
+        pm._next_trade_id = state['next_trade_id']
+        for symbol, lots in state['positions'].items():
+            pm.positions[symbol] = deque(lots)
+        pm.trade_history = list(state['trade_history'])
+        pm.rejected_trades = list(state['rejected_trades'])
+
+        start = []
+        for s, symbol_state in enumerate(snapshot.symbol_states):
+            if symbol_state is None:
+                start.append(0)
+                continue
+            trades = trade_lists[s]
+            for t, (status, reason) in symbol_state['statuses'].items():
+                trades[t]['portfolio_status'] = status
+                if reason is not None:
+                    trades[t]['rejection_reason'] = reason
+            for t, position in symbol_state['open'].items():
+                open_sizes[(s, t)] = position
+                if trades[t].get('状态') != '未平仓':
+                    # 买入早于截止日、卖出不早于截止日，不会是当日买卖
+                    heap.append((pd.Timestamp(trades[t]['卖出日期']).value, 0, s, t, position))
+            start.append(len(symbol_state['entries']))
+        return start
+
+    def _enter_trade(self, pm: PortfolioManager, symbol: str, trade: dict,
+                     turnover_ranks: TurnoverRankTable = None):
+        """
+        处理一笔交易的买入（成交额排名过滤 + 仓位/现金检查）
+
+        Returns:
+            成交的持仓 (持仓数量, trade_id)；被过滤或拒绝时返回 None
+        """
+        # ── 前一日成交额排名过滤 ──────────────────────────────────
+        if self.turnover_rank_top_n > 0:
+            # 无前一日数据时为 MISSING_RANK，不能入场
+            if turnover_ranks is not None:
+                cur_rank = turnover_ranks.prev_day_rank(trade['买入日期'], symbol)
+            else:
+                cur_rank = TurnoverRankTable.MISSING_RANK
+            if cur_rank > self.turnover_rank_top_n:
+                trade['portfolio_status'] = 'FILTERED_TURNOVER'
+                trade['rejection_reason'] = (
+                    f"前日成交额排名第{cur_rank}，超出前{self.turnover_rank_top_n}名限制"
+                )
+                return None
+
+        buy_price_with_slip = self.apply_slippage_to_price(trade['买入价'], is_buy=True)
+        position_size = self.calculate_position_size(buy_price_with_slip)
+        buy_amount = buy_price_with_slip * position_size
+        buy_cost = self.cost_calculator.calculate_buy_cost(buy_amount)
+
+        # 检查是否可以建仓
+        buy_accepted = pm.buy(
+            symbol=symbol,
+            shares=position_size,
+            entry_price=buy_price_with_slip,
+            entry_cost=buy_cost,
+            buy_date=trade['买入日期']
+        )
+
+        if not buy_accepted:
+            trade['portfolio_status'] = 'REJECTED'
+            trade['rejection_reason'] = f"仓位超限或现金不足"
+            return None
+
+        trade['portfolio_status'] = 'ACCEPTED'
+        return position_size, pm.trade_history[-1]['trade_id']
+
+    def _exit_trade(self, pm: PortfolioManager, symbol: str, trade: dict, position: tuple):
+        """处理一笔已成交交易的卖出（position 为 _enter_trade 的返回值）"""
+        position_size, trade_id = position
+        sell_price_with_slip = self.apply_slippage_to_price(trade['卖出价'], is_buy=False)
+        sell_amount = sell_price_with_slip * position_size
+        sell_cost = self.cost_calculator.calculate_sell_cost(sell_amount)
+
+        pm.sell(
+            symbol=symbol,
+            shares=position_size,
+            exit_price=sell_price_with_slip,
+            exit_cost=sell_cost,
+            sell_date=trade['卖出日期'],
+            trade_id=trade_id
+        )
+
+    def _portfolio_results(self, pm: PortfolioManager, trades_by_symbol: dict, last_prices: dict,
+                           closes: dict = None) -> dict:
+        """汇总组合撮合结果（未平仓持仓按末日收盘价估值）"""
+        results = {}
+        stock_results = {
+            symbol: {
                 'trades': trades,
                 'num_trades': len(trades),
-                'last_close': last_close,
+                'last_close': last_prices[symbol],
             }
-
-        # 收集所有股票末日价格，用于未平仓持仓的按市价估值（mark-to-market）
-        last_prices = {sym: sr['last_close'] for sym, sr in stock_results.items()}
+            for symbol, trades in trades_by_symbol.items()
+        }
 
         # 生成投资组合总结
         pm_report = pm.get_report()
@@ -615,6 +1270,15 @@ class EnhancedBacktestEngine:
         results['trade_history'] = pm_report['trade_history']
         results['rejected_trades'] = pm_report['rejected_trades']
 
+        # 每日净值/现金/仓位/回撤序列，UI、Excel 导出与风险指标直接使用
+        daily_series = build_daily_series(pm.trade_history, closes, self.initial_capital)
+        results['daily_series'] = daily_series
+        if daily_series is not None:
+            results['risk_metrics'] = nav_risk_metrics(daily_series['nav'])
+            results['portfolio_summary']['max_drawdown_pct'] = round(
+                results['risk_metrics']['max_drawdown'] * 100, 2
+            )
+
         return results
 
     def run_multiple_stocks(self, all_data: dict, strategy: Any) -> dict:
@@ -9,6 +9,8 @@ import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 from risk_metrics import RiskMetricsCalculator, aggregate_risk_metrics
 from trading_cost_v2 import TradingCostCalculator
+from parallel_signals import generate_trades
+from trade_ledger import TradeLedger
 
 
 class BacktestEngineV2:
@@ -29,7 +31,9 @@ class BacktestEngineV2:
                  commission_rate: float = None,
                  stamp_tax: float = None,
                  slippage: float = None,
-                 min_commission: float = None):
+                 min_commission: float = None,
+                 n_jobs: int = None,
+                 chunk_size: int = None):
         """
         初始化回测引擎
 
@@ -41,8 +45,12 @@ class BacktestEngineV2:
             stamp_tax: 印花税率（为None时使用默认值）
             slippage: 滑点率（为None时使用默认值）
             min_commission: 最低手续费（为None时使用默认值）
+            n_jobs: 多股票回测时信号生成的进程数（默认 config.SIGNAL_WORKERS）
+            chunk_size: 每个进程任务包含的股票数（默认 config.SIGNAL_CHUNK_SIZE）
         """
         self.initial_capital = initial_capital
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
         self.trading_days_per_year = trading_days_per_year
         self.risk_free_rate = risk_free_rate
 
@@ -76,7 +84,15 @@ class BacktestEngineV2:
         """
         # 获取交易信号
         trades = strategy.get_trades(df)
+        return self.evaluate_trades(symbol, trades)
 
+    def evaluate_trades(self, symbol: str, trades: List[Dict]) -> Dict[str, Any]:
+        """
+        对已生成的交易计算收益统计与风险指标
+
+        Returns:
+            与 run_single_stock 相同
+        """
         # 如果没有交易，返回空结果
         if not trades:
             return {
@@ -87,11 +103,11 @@ class BacktestEngineV2:
                 'cost_summary': self.cost_calculator.get_cost_summary(),
             }
 
-        # 转换为DataFrame便于计算
-        trades_df = pd.DataFrame(trades)
+        # 转换为列式账本便于计算
+        ledger = TradeLedger.from_records(trades)
 
         # 确保有收益率列
-        if '收益率%' not in trades_df.columns:
+        if '收益率%' not in ledger:
             return {
                 'symbol': symbol,
                 'trades': trades,
@@ -102,7 +118,7 @@ class BacktestEngineV2:
 
         # 计算风险指标
         calculator = RiskMetricsCalculator(
-            trades_df,
+            ledger,
             initial_capital=self.initial_capital,
             trading_days_per_year=self.trading_days_per_year,
             risk_free_rate=self.risk_free_rate
@@ -111,8 +127,9 @@ class BacktestEngineV2:
 
         return {
             'symbol': symbol,
-            'trades': trades,
-            'trades_df': trades_df,
+            'trades': ledger.to_dicts(),
+            'trades_df': ledger.to_frame(),
+            'ledger': ledger,
             'trades_count': len(trades),
             'metrics': metrics,
             'cost_summary': self.cost_calculator.get_cost_summary(),
@@ -133,15 +150,21 @@ class BacktestEngineV2:
         Returns:
             dict: 每只股票的回测结果字典
         """
-        results = {}
+        # 检查数据有效性
+        valid_data = {
+            symbol: df for symbol, df in stocks_data.items()
+            if df is not None and len(df) >= min_data_points
+        }
 
-        for symbol, df in stocks_data.items():
-            # 检查数据有效性
-            if df is None or len(df) < min_data_points:
-                continue
+        # 第一阶段：各股票交易信号（可多进程并行，顺序与 stocks_data 一致）
+        trades_by_symbol = generate_trades(valid_data, strategy, self.n_jobs, self.chunk_size,
+                                           skip_errors=True)
 
+        # 第二阶段：串行计算指标
+        results = {}
+        for symbol, trades in trades_by_symbol.items():
             try:
-                result = self.run_single_stock(symbol, df, strategy)
+                result = self.evaluate_trades(symbol, trades)
 
                 # 只记录有交易的股票
                 if result['trades_count'] > 0:
@@ -169,21 +192,29 @@ class BacktestEngineV2:
         # 收集所有交易
         all_trades = []
         all_trades_dfs = []
+        ledgers = []
 
         for symbol, result in results.items():
             if 'trades_df' in result:
                 all_trades_dfs.append(result['trades_df'])
                 all_trades.extend(result['trades'])
+                if 'ledger' in result:
+                    ledgers.append(result['ledger'])
 
         if not all_trades:
             return self._empty_aggregated_metrics()
 
-        # 合并所有交易的DataFrame
-        combined_trades_df = pd.concat(all_trades_dfs, ignore_index=True)
+        # 合并所有交易（引擎结果直接合并列式账本，否则合并DataFrame）
+        if len(ledgers) == len(all_trades_dfs):
+            combined = TradeLedger.concat(ledgers)
+            returns_array = combined.column('收益率%')
+        else:
+            combined = pd.concat(all_trades_dfs, ignore_index=True)
+            returns_array = combined['收益率%'].values
 
         # 计算聚合的风险指标
         calculator = RiskMetricsCalculator(
-            combined_trades_df,
+            combined,
             initial_capital=self.initial_capital,
             trading_days_per_year=self.trading_days_per_year,
             risk_free_rate=self.risk_free_rate
@@ -191,8 +222,6 @@ class BacktestEngineV2:
         risk_metrics = calculator.all_metrics()
 
         # 基础统计
-        returns_array = combined_trades_df['收益率%'].values
-
         aggregated = {
             'stocks_count': len(results),
             'total_trades': len(all_trades),
@@ -346,6 +346,11 @@ BACKTEST_END = _dt.now().strftime("%Y-%m-%d")            # ⭐ 回测结束日
 OOS_START = "2025-02-01"                                 # OOS期开始
 OOS_END = _dt.now().strftime("%Y-%m-%d")                 # OOS期结束（动态：今天）
 
+# 滚动样本外（Walk-Forward）窗口，单位为交易日：
+# OOS 期按测试窗口切分，每个测试窗口之前的训练窗口用于优化参数
+WALK_FORWARD_TRAIN_DAYS = 120         # 训练窗口
+WALK_FORWARD_TEST_DAYS = 20           # 测试窗口（同时也是滚动步长）
+
 # 最大仓位限制（风险管理）
 MAX_POSITION_RATIO = 0.80             # 最大总仓位 80%（保留20%现金）
 
@@ -353,6 +358,31 @@ MAX_POSITION_RATIO = 0.80             # 最大总仓位 80%（保留20%现金）
 # 排名基于当前回测中所有已缓存股票的成交额横截面排名
 TURNOVER_RANK_TOP_N = 0               # 默认不过滤
 
+# 组合撮合方式：False = 逐只股票处理（原有方式）；
+# True = 事件驱动，所有股票的买卖按时间顺序处理，资金与仓位检查符合真实时序
+PORTFOLIO_EVENT_DRIVEN = False
+
+# 多股票回测的信号生成进程数（1 = 串行；0 = 使用全部 CPU 核数）
+# 各股票的交易信号在进程池中并行生成，组合撮合仍串行进行
+SIGNAL_WORKERS = 1
+SIGNAL_CHUNK_SIZE = 0                 # 每个进程任务包含的股票数（0 = 自动）
+
+# 流式回测（大股票池）：按分块从缓存加载行情，生成交易后立即释放原始行情
+STREAM_MIN_SYMBOLS = 500              # 股票数达到该值时 Web 回测自动使用流式模式
+STREAM_CHUNK_SIZE = 200               # 每次加载的股票数
+STREAM_MEMORY_BUDGET_MB = 2048        # 进程内存（RSS）软预算，超出时交易分块写入磁盘并缩小加载分块（不是硬上限）
+
+# Web 后台任务（回测、参数优化、数据更新）：提交后由线程池执行，按任务 ID 查询进度与结果
+JOB_WORKERS = 2                       # 同时执行的后台任务数
+JOB_HISTORY_SIZE = 50                 # 内存中保留的已结束任务数（超出时丢弃最早结束的）
+
+# 回测交易明细分页：回测接口返回第一页与游标，后续页按游标从 /api/backtest/trades 获取
+BACKTEST_TRADES_PAGE_SIZE = 20        # 每页往返交易数
+BACKTEST_TRADES_MAX_PAGE_SIZE = 500   # 单次请求的上限
+
+# 信号 K 线弹窗：前后各取的交易日数上限（/api/signal-kline 的 days 参数限制在 1 ~ 该值）
+KLINE_WINDOW_MAX_DAYS = 250
+
 # 成本结构配置
 TRADING_COST_CONFIG = {
     'commission_rate': 0.0001,         # 手续费 0.01%
@@ -1,5 +1,6 @@
 """参数配置管理模块 - 支持动态修改策略参数"""
 import json
+import math
 from pathlib import Path
 from config import STRATEGY_PARAMS, START_DATE, END_DATE, STRATEGY_MAP, DEFAULT_STRATEGY, get_default_trading_settings
 
@@ -176,16 +177,50 @@ class ConfigManager:
         else:
             return False, "✗ 重置失败"
 
-    def get_param_ranges(self):
-        """获取参数范围（用于前端验证）"""
-        return {
-            'ma_period': {'min': 5, 'max': 250, 'step': 1, 'type': 'integer'},
-            'volume_multiplier': {'min': 0.5, 'max': 10, 'step': 0.1, 'type': 'number'},
-            'retest_period': {'min': 3, 'max': 20, 'step': 1, 'type': 'integer'},
-            'hold_days': {'min': 1, 'max': 10, 'step': 1, 'type': 'integer'},
-            'turnover_min': {'min': 0.01, 'max': 1000, 'step': 1, 'type': 'number'},
-            'turnover_max': {'min': 0.01, 'max': 1000, 'step': 1, 'type': 'number'},
-        }
+    def get_param_ranges(self, strategy_key: str = None):
+        """
+        获取参数范围（用于前端验证和参数优化）
+
+        Args:
+            strategy_key: 策略键，默认为量能突破策略（兼容原有前端）；
+                          其他策略按默认参数自动推导范围
+
+        Returns:
+            {参数名: {'min', 'max', 'step', 'type'}}
+        """
+        if strategy_key is None or strategy_key == 'volume_breakout':
+            return {
+                'ma_period': {'min': 5, 'max': 250, 'step': 1, 'type': 'integer'},
+                'volume_multiplier': {'min': 0.5, 'max': 10, 'step': 0.1, 'type': 'number'},
+                'retest_period': {'min': 3, 'max': 20, 'step': 1, 'type': 'integer'},
+                'hold_days': {'min': 1, 'max': 10, 'step': 1, 'type': 'integer'},
+                'turnover_min': {'min': 0.01, 'max': 1000, 'step': 1, 'type': 'number'},
+                'turnover_max': {'min': 0.01, 'max': 1000, 'step': 1, 'type': 'number'},
+            }
+
+        if strategy_key not in STRATEGY_MAP:
+            return {}
+
+        # 其他策略：以默认值为中心取 [0.5x, 2x]
+        # - 整数参数至少为 1，RSI 阈值不超过 100
+        # - 默认值不超过 1 的比例类参数（止损、仓位、权重、评分）上限为 1
+        # - rsi_period 不参与：指标模块只预计算 RSI_6/14/24 三列
+        ranges = {}
+        for key, value in STRATEGY_MAP[strategy_key]['params'].items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                continue
+            if key == 'rsi_period':
+                continue
+            if isinstance(value, int):
+                upper = min(100, value * 2) if key.startswith('rsi_') else value * 2
+                ranges[key] = {'min': max(1, value // 2), 'max': max(2, upper),
+                               'step': 1, 'type': 'integer'}
+            else:
+                upper = min(1.0, value * 2) if value <= 1 else value * 2
+                step = 10 ** (math.floor(math.log10(value)) - 1)
+                ranges[key] = {'min': round(value * 0.5, 6), 'max': round(upper, 6),
+                               'step': round(step, 6), 'type': 'number'}
+        return ranges
 
     def get_param_descriptions(self):
         """获取参数描述"""
@@ -19,6 +19,21 @@ CACHE_DIR = DATA_DIR / "cache"
 DATA_DIR.mkdir(exist_ok=True)
 CACHE_DIR.mkdir(exist_ok=True)
 
+def _convert_date_format(date_str: str) -> str:
+    """将 YYYYMMDD 格式转换为 YYYY-MM-DD 格式"""
+    if len(date_str) == 8 and date_str.isdigit():
+        return f"{date_str[0:4]}-{date_str[4:6]}-{date_str[6:8]}"
+    return date_str  # 已经是正确格式
+
+
+# 列名映射（数据库列 -> 中文列）
+_COLUMN_NAMES = {'date': '日期', 'close': '收盘', 'open': '开盘',
+                 'high': '高', 'low': '低', 'volume': '成交量',
+                 'amount': '成交额', 'amplitude': '振幅',
+                 'pct_change': '涨跌幅', 'change': '涨跌',
+                 'turnover_rate': '换手率'}
+
+
 class DataManager:
     """数据管理类 - 处理本地缓存和网络获取"""
 
@@ -74,14 +89,8 @@ class DataManager:
             end_date = END_DATE
 
         # 转换日期格式从 YYYYMMDD 到 YYYY-MM-DD（用于数据库查询）
-        def convert_date_format(date_str: str) -> str:
-            """将 YYYYMMDD 格式转换为 YYYY-MM-DD 格式"""
-            if len(date_str) == 8 and date_str.isdigit():
-                return f"{date_str[0:4]}-{date_str[4:6]}-{date_str[6:8]}"
-            return date_str  # 已经是正确格式
-
-        start_date = convert_date_format(start_date)
-        end_date = convert_date_format(end_date)
+        start_date = _convert_date_format(start_date)
+        end_date = _convert_date_format(end_date)
 
         conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
         query = f'''
@@ -115,14 +124,75 @@ class DataManager:
             print(f"错误: {symbol} 日期转换失败 - {e}")
             return None
 
-        df = df.rename(columns={'date': '日期', 'close': '收盘', 'open': '开盘',
-                                'high': '高', 'low': '低', 'volume': '成交量',
-                                'amount': '成交额', 'amplitude': '振幅',
-                                'pct_change': '涨跌幅', 'change': '涨跌',
-                                'turnover_rate': '换手率'})
+        df = df.rename(columns=_COLUMN_NAMES)
 
         return df
 
+    def get_kline_window(self, symbol: str, date: str, days: int = 10,
+                         start_date: str = None, end_date: str = None):
+        """
+        取离指定日期最近的交易日及其前后各 days 个交易日的行情（不加载完整历史）
+
+        在 (symbol, date) 唯一索引上做限定条数的范围查询；最近交易日与在 get_data_from_cache
+        全量数据上按日期差绝对值取最小（相同时取较早日期）的结果一致。
+
+        Args:
+            symbol: 股票代码
+            date: 目标日期（YYYY-MM-DD 或 YYYYMMDD）
+            days: 前后各取的交易日数（不能为负）
+            start_date / end_date: 数据范围（默认与 get_data_from_cache 相同）
+
+        Returns:
+            (行情 DataFrame（日期为 YYYY-MM-DD 字符串，列名同 get_data_from_cache）, 最近交易日)；
+            没有数据时返回 (None, None)
+        """
+        days = int(days)
+        if days < 0:
+            raise ValueError(f'days 不能为负: {days}')  # SQLite 的 LIMIT -n 表示不限条数
+        start_date = _convert_date_format(start_date or START_DATE)
+        end_date = _convert_date_format(end_date or END_DATE)
+        target = pd.Timestamp(_convert_date_format(date)).strftime('%Y-%m-%d')
+
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            # 目标日期两侧最近的交易日
+            before = conn.execute('''
+                SELECT MAX(date) FROM stock_data WHERE symbol = ? AND date >= ? AND date <= ?
+            ''', (symbol, start_date, min(target, end_date))).fetchone()[0]
+            after = conn.execute('''
+                SELECT MIN(date) FROM stock_data WHERE symbol = ? AND date > ? AND date >= ? AND date <= ?
+            ''', (symbol, target, start_date, end_date)).fetchone()[0]
+            if before is None and after is None:
+                return None, None
+
+            target_ts = pd.Timestamp(target)
+            if before is None or (after is not None and
+                                  pd.Timestamp(after) - target_ts < target_ts - pd.Timestamp(before)):
+                signal_date = after
+            else:
+                signal_date = before
+
+            columns = ', '.join(_COLUMN_NAMES)
+            df = pd.read_sql_query(f'''
+                SELECT * FROM (
+                    SELECT {columns} FROM stock_data
+                    WHERE symbol = ? AND date >= ? AND date < ?
+                    ORDER BY date DESC LIMIT ?
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT {columns} FROM stock_data
+                    WHERE symbol = ? AND date >= ? AND date <= ?
+                    ORDER BY date LIMIT ?
+                )
+                ORDER BY date
+            ''', conn, params=(symbol, start_date, signal_date, days,
+                               symbol, signal_date, end_date, days + 1))
+        finally:
+            conn.close()
+
+        return df.rename(columns=_COLUMN_NAMES), signal_date
+
     def save_data_to_cache(self, symbol: str, df: pd.DataFrame):
         """将数据保存到本地缓存"""
         if df is None or df.empty:
@@ -333,17 +403,20 @@ class DataManager:
             return cached_df
 
     def batch_fetch_and_cache(self, symbols: list, start_date: str = None,
-                             end_date: str = None, force_refresh: bool = False) -> dict:
-        """批量获取和缓存数据"""
+                             end_date: str = None, force_refresh: bool = False,
+                             progress_callback=None) -> dict:
+        """批量获取和缓存数据（progress_callback(已处理数, 总数) 在每只股票处理后调用）"""
         all_data = {}
         failed = []
 
-        for symbol in symbols:
+        for i, symbol in enumerate(symbols, 1):
             df = self.fetch_and_cache(symbol, start_date, end_date, force_refresh)
             if df is not None and len(df) > 0:
                 all_data[symbol] = df
             else:
                 failed.append(symbol)
+            if progress_callback is not None:
+                progress_callback(i, len(symbols))
 
         print(f"\n📊 批量获取结果: 成功 {len(all_data)}, 失败 {len(failed)}")
         return all_data
@@ -392,6 +465,33 @@ class DataManager:
 
         return [stock[0] for stock in stocks]
 
+    def get_data_versions(self, symbols: list) -> dict:
+        """
+        各股票缓存数据的版本号（不加载行情数据）
+
+        行情按 (symbol, date) 只插入不修改，清空后重新获取会分配新的行 id，
+        因此 (记录数, 首末日期, 最大行 id) 可以唯一标识一只股票的缓存内容。
+
+        Returns:
+            {symbol: 版本字符串}，没有缓存数据的股票不出现
+        """
+        versions = {}
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            # 分批查询，避免超过 SQLite 参数数量上限
+            for start in range(0, len(symbols), 500):
+                batch = list(symbols[start:start + 500])
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(f'''
+                    SELECT symbol, COUNT(*), MIN(date), MAX(date), MAX(id) FROM stock_data
+                    WHERE symbol IN ({placeholders}) GROUP BY symbol
+                ''', batch)
+                versions.update({symbol: f'{count}:{first}:{last}:{max_id}'
+                                 for symbol, count, first, last, max_id in rows})
+        finally:
+            conn.close()
+        return versions
+
     def get_cache_status(self) -> dict:
         """获取缓存状态"""
         conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
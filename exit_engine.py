@@ -0,0 +1,189 @@
+"""
+通用出场引擎 - 基于NumPy数组的止损/止盈/移动止盈状态机
+
+将各策略中重复的逐行 df.iloc[i] 持仓循环抽取为统一实现：
+- 入场：buy_signal 为 True 且当前空仓，以当日收盘价买入（买入当日不检查出场）
+- 出场：按 rules 给定的优先级依次检查，命中第一条即以当日收盘价卖出
+- 输出：交易以数组形式返回（入场行号、出场行号、出场原因编码）
+
+空仓期间直接跳到下一个买入信号，只有持仓K线才进入逐bar检查。
+"""
+import numpy as np
+import pandas as pd
+
+# 出场规则类型
+STOP_LOSS = 'stop_loss'            # 收益率 <= -value
+TAKE_PROFIT = 'take_profit'        # 收益率 >= value
+TRAILING_STOP = 'trailing_stop'    # 收盘价 < 持仓期最高收盘价 × (1 - value)
+ATR_STOP = 'atr_stop'              # ATR > 0 且 收盘价 <= 买入价 - ATR × value
+TIME_STOP = 'time_stop'            # 自然日持有天数 >= value
+SIGNAL = 'signal'                  # sell_signal 为 True
+
+_RULE_CODES = {
+    STOP_LOSS: 0,
+    TAKE_PROFIT: 1,
+    TRAILING_STOP: 2,
+    ATR_STOP: 3,
+    TIME_STOP: 4,
+    SIGNAL: 5,
+}
+
+OPEN_LABEL = '未平仓'
+NS_PER_DAY = 86_400 * 10**9
+
+
+def dates_to_ns(dates) -> np.ndarray:
+    """将日期列转换为 int64 纳秒时间戳（用于计算自然日持有天数）"""
+    values = pd.to_datetime(pd.Series(dates)).values.astype('datetime64[ns]')
+    return values.astype(np.int64)
+
+
+def simulate_exits(close, buy_signal, sell_signal=None, atr=None, dates=None,
+                   rules=(), max_hold_bars: int = 0,
+                   max_hold_label: str = '超期卖出',
+                   close_open: bool = False) -> dict:
+    """
+    在数组上模拟单一持仓的入场/出场
+
+    Args:
+        close: 收盘价数组
+        buy_signal: 买入信号布尔数组
+        sell_signal: 卖出信号布尔数组（SIGNAL 规则需要）
+        atr: ATR 数组（ATR_STOP 规则需要）
+        dates: int64 纳秒时间戳数组（TIME_STOP 规则需要，见 dates_to_ns）
+        rules: 出场规则序列 [(规则类型, 阈值, 出场原因), ...]，顺序即优先级
+        max_hold_bars: 持有K线数上限（0 = 不限制）；达到上限且当日未卖出时，
+                       下一交易日以最高优先级强制卖出
+        max_hold_label: 超期强制卖出的出场原因
+        close_open: 数据结束时仍持仓是否记为一笔「未平仓」交易
+
+    Returns:
+        {'entry_idx': 入场行号, 'exit_idx': 出场行号,
+         'reason': 出场原因编码, 'labels': 编码对应的出场原因列表}
+    """
+    close_l = np.asarray(close, dtype=float).tolist()
+    n = len(close_l)
+    buy_idx = np.flatnonzero(np.asarray(buy_signal, dtype=bool))
+
+    compiled = []
+    labels = []
+    for kind, value, label in rules:
+        if kind not in _RULE_CODES:
+            raise ValueError(f"未知的出场规则类型: {kind}")
+        compiled.append((_RULE_CODES[kind], value))
+        labels.append(label)
+    hold_code = len(labels)
+    labels.append(max_hold_label)
+    open_code = len(labels)
+    labels.append(OPEN_LABEL)
+
+    kinds = {code for code, _ in compiled}
+    sell_l = np.asarray(sell_signal, dtype=bool).tolist() if 5 in kinds else None
+    atr_l = np.asarray(atr, dtype=float).tolist() if 3 in kinds else None
+    dates_l = np.asarray(dates, dtype=np.int64).tolist() if 4 in kinds else None
+
+    entries, exits, reasons = [], [], []
+    k = 0
+    while k < len(buy_idx):
+        e = int(buy_idx[k])
+        entry_price = close_l[e]
+        highest = entry_price
+        bars = 0
+        force_exit = False
+        x = -1
+        reason = -1
+
+        for j in range(e + 1, n):
+            c = close_l[j]
+            bars += 1
+            if c > highest:
+                highest = c
+
+            if force_exit:
+                x, reason = j, hold_code
+                break
+
+            profit = (c - entry_price) / entry_price
+            for r, (code, value) in enumerate(compiled):
+                if code == 0:
+                    hit = profit <= -value
+                elif code == 1:
+                    hit = profit >= value
+                elif code == 2:
+                    hit = c < highest * (1 - value)
+                elif code == 3:
+                    a = atr_l[j]
+                    hit = a > 0 and c <= entry_price - a * value
+                elif code == 4:
+                    hit = (dates_l[j] - dates_l[e]) // NS_PER_DAY >= value
+                else:
+                    hit = sell_l[j]
+                if hit:
+                    reason = r
+                    break
+
+            if reason >= 0:
+                x = j
+                break
+
+            if max_hold_bars > 0 and bars >= max_hold_bars:
+                force_exit = True
+
+        if x < 0:
+            # 持仓至数据末尾
+            if close_open:
+                entries.append(e)
+                exits.append(n - 1)
+                reasons.append(open_code)
+            break
+
+        entries.append(e)
+        exits.append(x)
+        reasons.append(reason)
+        k = int(np.searchsorted(buy_idx, x, side='right'))
+
+    return {
+        'entry_idx': np.asarray(entries, dtype=np.int64),
+        'exit_idx': np.asarray(exits, dtype=np.int64),
+        'reason': np.asarray(reasons, dtype=np.int16),
+        'labels': labels,
+    }
+
+
+def build_trade_records(dates, close, result: dict, fee_pct: float = 0.1) -> list:
+    """
+    将 simulate_exits 的数组结果转换为策略统一的交易记录列表
+
+    Args:
+        dates: 日期列（保留原始对象作为 买入日期/卖出日期）
+        close: 收盘价数组
+        result: simulate_exits 的返回值
+        fee_pct: 每笔交易扣除的手续费（百分点）
+    """
+    entry_idx = result['entry_idx']
+    exit_idx = result['exit_idx']
+    if len(entry_idx) == 0:
+        return []
+
+    close = np.asarray(close, dtype=float)
+    date_values = pd.Series(dates).tolist()
+    date_ns = dates_to_ns(dates)
+
+    buy_prices = close[entry_idx]
+    sell_prices = close[exit_idx]
+    profits = (sell_prices - buy_prices) / buy_prices * 100 - fee_pct
+    hold_days = (date_ns[exit_idx] - date_ns[entry_idx]) // NS_PER_DAY
+    labels = result['labels']
+
+    trades = []
+    for t in range(len(entry_idx)):
+        trades.append({
+            '买入日期': date_values[entry_idx[t]],
+            '买入价': buy_prices[t],
+            '卖出日期': date_values[exit_idx[t]],
+            '卖出价': sell_prices[t],
+            '持有天数': int(hold_days[t]),
+            '收益率%': profits[t],
+            '状态': labels[result['reason'][t]],
+        })
+    return trades
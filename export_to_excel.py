@@ -1,5 +1,6 @@
 """导出回测结果到Excel - 详细交易明细和条件检查"""
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
@@ -226,12 +227,26 @@ def _safe_float(val, default=0.0) -> float:
 
 
 def _build_daily_position_series(trade_history: list, all_data: dict,
-                                  backtest_start: str, backtest_end: str) -> pd.DataFrame:
+                                  backtest_start: str, backtest_end: str,
+                                  daily_series: dict = None) -> pd.DataFrame:
     """
-    从交易历史重建每个交易日的仓位状态（向前填充）。
+    每个交易日的仓位状态。
 
-    返回 DataFrame，列: 日期 | 持仓笔数 | 仓位比例%
+    提供 daily_series（EnhancedBacktestEngine 结果中的每日净值序列）时直接取用，
+    返回 DataFrame，列: 日期 | 持仓笔数 | 仓位比例% | 净值 | 回撤%；
+    否则从交易历史重建（向前填充），列: 日期 | 持仓笔数 | 仓位比例%
     """
+    if daily_series is not None:
+        dates = pd.DatetimeIndex(daily_series['dates'])
+        mask = (dates >= pd.Timestamp(backtest_start)) & (dates <= pd.Timestamp(backtest_end))
+        return pd.DataFrame({
+            '日期': dates[mask].strftime('%Y-%m-%d'),
+            '持仓笔数': np.asarray(daily_series['open_positions'])[mask].astype(int),
+            '仓位比例%': np.round(np.asarray(daily_series['position_ratio'])[mask] * 100, 2),
+            '净值': np.round(np.asarray(daily_series['nav'])[mask], 2),
+            '回撤%': np.round(np.asarray(daily_series['drawdown'])[mask] * 100, 2),
+        })
+
     # 收集回测区间内所有交易日
     all_dates = set()
     for df in (all_data or {}).values():
@@ -280,27 +295,28 @@ def _add_position_chart_sheet(wb: Workbook, daily_df: pd.DataFrame) -> None:
     """
     ws = wb.create_sheet("仓位变化")
     n = len(daily_df)
+    headers = list(daily_df.columns) if n else ['日期', '持仓笔数', '仓位比例%']
 
     # ── 表头 ──────────────────────────────────────────────────────────────────
-    for col, header in enumerate(['日期', '持仓笔数', '仓位比例%'], 1):
+    for col, header in enumerate(headers, 1):
         cell = ws.cell(row=1, column=col, value=header)
         cell.font = Font(bold=True, color="FFFFFF")
         cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
         cell.alignment = Alignment(horizontal="center")
 
     ws.column_dimensions['A'].width = 14
-    ws.column_dimensions['B'].width = 12
-    ws.column_dimensions['C'].width = 12
+    for col in range(2, len(headers) + 1):
+        ws.column_dimensions[chr(64 + col)].width = 12
 
     if n == 0:
         return
 
     # ── 数据行 ────────────────────────────────────────────────────────────────
-    for i, row in daily_df.iterrows():
-        r = i + 2
-        ws.cell(row=r, column=1, value=row['日期'])
-        ws.cell(row=r, column=2, value=int(row['持仓笔数']))
-        ws.cell(row=r, column=3, value=float(row['仓位比例%']))
+    for r, values in enumerate(daily_df.itertuples(index=False), 2):
+        ws.cell(row=r, column=1, value=values[0])
+        ws.cell(row=r, column=2, value=int(values[1]))
+        for col in range(3, len(headers) + 1):
+            ws.cell(row=r, column=col, value=float(values[col - 1]))
 
     cats = Reference(ws, min_col=1, min_row=2, max_row=n + 1)
 
@@ -343,17 +359,40 @@ def _add_position_chart_sheet(wb: Workbook, daily_df: pd.DataFrame) -> None:
 
     ws.add_chart(chart2, "E32")
 
+    # ── 图表③: 每日净值 折线图（有净值序列时）────────────────────────────────
+    if '净值' in headers:
+        chart3 = LineChart()
+        chart3.title = "每日净值"
+        chart3.style = 10
+        chart3.y_axis.title = "净值 (元)"
+        chart3.x_axis.title = "日期"
+        chart3.width = 28
+        chart3.height = 14
+
+        nav_col = headers.index('净值') + 1
+        data3 = Reference(ws, min_col=nav_col, min_row=1, max_row=n + 1)
+        chart3.add_data(data3, titles_from_data=True)
+        chart3.set_categories(cats)
+
+        s3 = chart3.series[0]
+        s3.smooth = False
+        s3.marker.symbol = "none"
+
+        ws.add_chart(chart3, "E62")
+
 
 def export_batch_results_to_excel(all_results: dict, index_names: list = None,
                                   output_file: str = "回测结果汇总.xlsx",
                                   trade_history: list = None,
                                   all_data: dict = None,
                                   backtest_start: str = None,
-                                  backtest_end: str = None):
+                                  backtest_end: str = None,
+                                  daily_series: dict = None):
     """
     批量导出多个股票的回测结果到Excel
 
     all_results: {股票代码: {'trades': [...], 'num_trades': ..., ...}}
+    daily_series: 组合回测的每日净值序列（可选），提供时仓位变化 Sheet 直接使用
     """
 
     wb = Workbook()
@@ -430,10 +469,10 @@ def export_batch_results_to_excel(all_results: dict, index_names: list = None,
         for col in range(1, 9):
             ws.column_dimensions[chr(64 + col)].width = 14
 
-    # ── 仓位变化图表 Sheet（可选，需要 trade_history + all_data）─────────────
-    if trade_history and all_data and backtest_start and backtest_end:
+    # ── 仓位变化图表 Sheet（可选，需要 daily_series 或 trade_history + all_data）──
+    if (daily_series is not None or (trade_history and all_data)) and backtest_start and backtest_end:
         daily_df = _build_daily_position_series(
-            trade_history, all_data, backtest_start, backtest_end
+            trade_history, all_data, backtest_start, backtest_end, daily_series
         )
         _add_position_chart_sheet(wb, daily_df)
 
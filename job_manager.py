@@ -0,0 +1,227 @@
+"""后台任务管理 - 提交、进度查询、协作式取消
+
+Web 接口中耗时的操作（组合回测、参数优化、批量获取与更新数据）不在请求线程中执行：
+- submit 立即返回任务 ID，任务在线程池中排队执行
+- 任务函数通过 job.progress(...) 汇报进度（已完成数、总数、阶段及附加信息），可随时查询
+- cancel 只设置取消标记，任务函数在下一次 job.progress / job.check_cancelled 时抛出 JobCancelled 结束
+- 结束后的任务（含结果）保留在内存中，按 ID 取回；超出上限时丢弃最早结束的任务
+"""
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from config import JOB_WORKERS, JOB_HISTORY_SIZE
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """任务已被取消（由 Job.progress / Job.check_cancelled 抛出）"""
+
+
+class Job:
+    """单个后台任务的状态；任务函数的第一个参数"""
+
+    def __init__(self, job_id: str, kind: str, info: dict = None):
+        self.id = job_id
+        self.kind = kind
+        self.status = QUEUED
+        self.phase = None
+        self.done = 0
+        self.total = 0
+        self.info = dict(info or {})   # 附加信息（如成功/失败数、当前最优结果），随状态一起返回
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def check_cancelled(self):
+        """已请求取消时抛出 JobCancelled"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def progress(self, done: int = None, total: int = None, phase: str = None, **info):
+        """
+        汇报进度并检查取消
+
+        Args:
+            done / total: 已完成数与总数（None = 不变）
+            phase: 当前阶段（如 'loading' / 'signals' / 'portfolio'）
+            info: 更新附加信息
+        """
+        with self._lock:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if phase is not None:
+                self.phase = phase
+            self.info.update(info)
+        self.check_cancelled()
+
+    def to_dict(self, include_result: bool = False) -> dict:
+        """可 JSON 序列化的任务状态"""
+        with self._lock:
+            state = {
+                **self.info,
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'phase': self.phase,
+                'done': self.done,
+                'total': self.total,
+                'progress_pct': round(self.done / self.total * 100, 1) if self.total else 0,
+                'cancel_requested': self.cancel_requested,
+                'error': self.error,
+                'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+                'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+            }
+        if include_result and self.status == COMPLETED:
+            state['result'] = self.result
+        return state
+
+
+class JobManager:
+    """后台任务管理器（线程池执行）"""
+
+    def __init__(self, max_workers: int = None, history_size: int = None):
+        """
+        Args:
+            max_workers: 同时执行的任务数（默认 config.JOB_WORKERS）
+            history_size: 保留的已结束任务数（默认 config.JOB_HISTORY_SIZE）
+        """
+        self.history_size = JOB_HISTORY_SIZE if history_size is None else history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or JOB_WORKERS,
+                                            thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, func, *args, info: dict = None, exclusive: bool = False, **kwargs):
+        """
+        提交任务
+
+        Args:
+            kind: 任务类型（如 'backtest' / 'optimize' / 'update_all'）
+            func: func(job, *args, **kwargs)，返回值作为任务结果
+            info: 初始附加信息
+            exclusive: True 时同类任务已在排队或执行中则不提交，返回 None
+
+        Returns:
+            Job（exclusive 冲突时为 None）
+        """
+        with self._lock:
+            if exclusive and self._active(kind) is not None:
+                return None
+            job = Job(f'{kind}_{uuid.uuid4().hex[:12]}', kind, info)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func, args, kwargs):
+        with job._lock:
+            if job.status != QUEUED:
+                return  # 排队中已被取消
+            job.status = RUNNING
+            job.started_at = datetime.now()
+        try:
+            job.result = func(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            self._finish(job, FAILED)
+        else:
+            self._finish(job, COMPLETED)
+
+    def _finish(self, job: Job, status: str):
+        with self._lock:
+            with job._lock:
+                job.status = status
+                job.finished_at = datetime.now()
+            self._prune()
+
+    def _prune(self):
+        """丢弃最早结束的任务（调用方持有锁）"""
+        finished = [item for item in self._jobs.values() if item.finished]
+        finished.sort(key=lambda item: item.finished_at)
+        for item in finished[:max(0, len(finished) - self.history_size)]:
+            del self._jobs[item.id]
+
+    def _active(self, kind: str):
+        """排队或执行中的同类任务（调用方持有锁）"""
+        for job in self._jobs.values():
+            if job.kind == kind and not job.finished:
+                return job
+        return None
+
+    def get(self, job_id: str):
+        """按 ID 查询任务，不存在（或已被丢弃）返回 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self, kind: str):
+        """最近提交的同类任务"""
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job.kind == kind:
+                    return job
+        return None
+
+    def list(self, kind: str = None) -> list:
+        """任务状态列表（最近提交的在前）"""
+        with self._lock:
+            jobs = [job for job in reversed(self._jobs.values()) if kind is None or job.kind == kind]
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        请求取消任务
+
+        排队中的任务不再执行；执行中的任务在下一次汇报进度时结束。
+
+        Returns:
+            任务存在且尚未结束时为 True
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            with job._lock:
+                if job.finished:
+                    return False
+                job._cancel_event.set()
+                if job.status == QUEUED:
+                    job.status = CANCELLED
+                    job.finished_at = datetime.now()
+            self._prune()
+        return True
+
+    def shutdown(self, wait: bool = True):
+        """取消全部未结束的任务并关闭线程池"""
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,179 @@
+"""参数优化结果存储 - 断点续跑与跨批次复用
+
+每条记录以 (策略, 参数, 股票池, 数据版本, 回测设置) 为键保存回测指标，写入本地 SQLite：
+- 优化过程中每完成一批组合即落盘，进程中断后重跑只计算剩余组合
+- 扩大参数网格后再次运行，已评估过的组合直接读取
+- 行情数据有变化（数据版本不同）时自动视为新的评估点
+- 评估方式或引擎设置（回测区间、交易设置、成交额过滤、撮合方式等）不同的结果互不复用
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_FILE = Path("./data_cache") / "optimization_results.db"
+
+# 参与数据版本计算的行情列
+_VERSION_COLUMNS = ['开盘', '收盘', '高', '低', '成交量', '成交额']
+
+
+def _json_default(value):
+    """numpy 标量等转换为可 JSON 序列化的值"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def params_key(params: dict) -> str:
+    """参数字典的稳定哈希（键排序后序列化）"""
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def settings_key(settings: dict = None) -> str:
+    """回测设置指纹：评估方式与引擎/时间设置的稳定哈希（None 视为空设置）"""
+    return params_key(settings or {})
+
+
+def universe_key(stocks_data: dict) -> str:
+    """股票池哈希（与股票顺序无关）"""
+    symbols = sorted(symbol for symbol, df in stocks_data.items() if df is not None)
+    return hashlib.sha1(','.join(symbols).encode('utf-8')).hexdigest()
+
+
+def data_version(stocks_data: dict) -> str:
+    """
+    行情数据版本：对每只股票的日期与行情数值做内容哈希
+
+    数据更新（新增交易日、修正历史数据）都会得到新的版本号。
+    """
+    digest = hashlib.sha1()
+    for symbol in sorted(s for s, df in stocks_data.items() if df is not None):
+        df = stocks_data[symbol]
+        digest.update(symbol.encode('utf-8'))
+        digest.update(pd.to_datetime(df['日期']).values.astype('datetime64[ns]').tobytes())
+        columns = [c for c in _VERSION_COLUMNS if c in df.columns]
+        digest.update(','.join(columns).encode('utf-8'))
+        digest.update(np.ascontiguousarray(df[columns].to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+class OptimizationResultStore:
+    """参数优化结果存储（SQLite）"""
+
+    def __init__(self, db_file=None):
+        self.db_file = Path(db_file) if db_file is not None else STORE_FILE
+        self.db_timeout = 30.0
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        """初始化数据库（旧版表没有回测设置指纹，无法判断结果来自哪种评估方式，直接重建）"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(optimization_results)')]
+        if columns and 'settings_hash' not in columns:
+            conn.execute('DROP TABLE optimization_results')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS optimization_results (
+                strategy TEXT NOT NULL,
+                params_hash TEXT NOT NULL,
+                universe_hash TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                settings_hash TEXT NOT NULL,
+                params TEXT NOT NULL,
+                metrics TEXT NOT NULL,
+                created_at TEXT,
+                PRIMARY KEY (strategy, params_hash, universe_hash, data_version, settings_hash)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def context(self, strategy: str, stocks_data: dict, settings: dict = None) -> dict:
+        """
+        计算一次 (策略, 股票池, 数据版本, 回测设置) 上下文，供 get_many / put_many 复用
+
+        Args:
+            settings: 评估方式与引擎设置（如 {'evaluator': 'portfolio', 'backtest_start': ..., ...}），
+                      只要有一项不同就不会命中其他设置下的结果
+        """
+        return {
+            'strategy': strategy,
+            'universe_hash': universe_key(stocks_data),
+            'data_version': data_version(stocks_data),
+            'settings_hash': settings_key(settings),
+        }
+
+    def get_many(self, context: dict, param_sets: list) -> list:
+        """
+        批量查询已评估结果
+
+        Returns:
+            与 param_sets 等长的列表，已评估的为指标字典，未评估的为 None
+        """
+        keys = [params_key(params) for params in param_sets]
+        found = {}
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            # 分批查询，避免超过 SQLite 参数数量上限
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(f'''
+                    SELECT params_hash, metrics FROM optimization_results
+                    WHERE strategy = ? AND universe_hash = ? AND data_version = ? AND settings_hash = ?
+                      AND params_hash IN ({placeholders})
+                ''', (context['strategy'], context['universe_hash'], context['data_version'],
+                      context['settings_hash'], *batch))
+                found.update({key: json.loads(metrics) for key, metrics in rows})
+        finally:
+            conn.close()
+        return [found.get(key) for key in keys]
+
+    def put_many(self, context: dict, param_sets: list, metrics_list: list):
+        """批量写入评估结果（同键覆盖），单个事务提交"""
+        now = datetime.now().isoformat()
+        records = [
+            (context['strategy'], params_key(params), context['universe_hash'], context['data_version'],
+             context['settings_hash'],
+             json.dumps(params, sort_keys=True, ensure_ascii=False, default=_json_default),
+             json.dumps(metrics, ensure_ascii=False, default=_json_default), now)
+            for params, metrics in zip(param_sets, metrics_list)
+        ]
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO optimization_results
+                (strategy, params_hash, universe_hash, data_version, settings_hash, params, metrics, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def count(self, strategy: str = None) -> int:
+        """已存储的记录数"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            if strategy is None:
+                return conn.execute('SELECT COUNT(*) FROM optimization_results').fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM optimization_results WHERE strategy = ?',
+                                (strategy,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def clear(self, strategy: str = None):
+        """清空记录（可按策略）"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            if strategy is None:
+                conn.execute('DELETE FROM optimization_results')
+            else:
+                conn.execute('DELETE FROM optimization_results WHERE strategy = ?', (strategy,))
+            conn.commit()
+        finally:
+            conn.close()
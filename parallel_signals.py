@@ -0,0 +1,75 @@
+"""
+多进程信号生成 - 回测第一阶段
+
+各股票的 strategy.get_trades 互不依赖，可按股票分块交给进程池并行计算；
+组合撮合、指标汇总等需要全局状态的部分仍由调用方串行完成。
+输出顺序始终与输入 stocks_data 的顺序一致，与进程数、分块大小无关。
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from config import SIGNAL_WORKERS, SIGNAL_CHUNK_SIZE
+
+
+def resolve_workers(n_jobs: int = None) -> int:
+    """进程数：None 取 config.SIGNAL_WORKERS；0 或负数表示使用全部 CPU 核数"""
+    n_jobs = SIGNAL_WORKERS if n_jobs is None else n_jobs
+    if n_jobs <= 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def _trades_chunk(strategy, items: list, skip_errors: bool) -> list:
+    """子进程任务：一个股票分块的交易，返回 [(symbol, trades, 错误信息), ...]"""
+    results = []
+    for symbol, df in items:
+        if skip_errors:
+            try:
+                results.append((symbol, strategy.get_trades(df), None))
+            except Exception as e:
+                results.append((symbol, None, str(e)))
+        else:
+            results.append((symbol, strategy.get_trades(df), None))
+    return results
+
+
+def generate_trades(stocks_data: dict, strategy, n_jobs: int = None, chunk_size: int = None,
+                    skip_errors: bool = False) -> dict:
+    """
+    为每只股票生成交易信号
+
+    Args:
+        stocks_data: {symbol: DataFrame}
+        strategy: 策略对象（需可 pickle，并有 get_trades(df) 方法）
+        n_jobs: 进程数（默认 config.SIGNAL_WORKERS；1 = 串行）
+        chunk_size: 每个任务包含的股票数（默认 config.SIGNAL_CHUNK_SIZE；0 = 按进程数自动划分）
+        skip_errors: True 时出错的股票打印警告并跳过；False 时异常直接抛出
+
+    Returns:
+        {symbol: trades}，顺序与 stocks_data 一致
+    """
+    items = list(stocks_data.items())
+    n_jobs = resolve_workers(n_jobs)
+
+    if n_jobs <= 1 or len(items) < 2:
+        chunks_results = [_trades_chunk(strategy, items, skip_errors)]
+    else:
+        chunk_size = SIGNAL_CHUNK_SIZE if chunk_size is None else chunk_size
+        if chunk_size <= 0:
+            # 每个进程约 4 个分块，兼顾负载均衡与进程间传输开销
+            chunk_size = max(1, math.ceil(len(items) / (n_jobs * 4)))
+        chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+            futures = [executor.submit(_trades_chunk, strategy, chunk, skip_errors) for chunk in chunks]
+            # 按提交顺序取结果，保证输出顺序确定
+            chunks_results = [future.result() for future in futures]
+
+    trades_by_symbol = {}
+    for chunk_result in chunks_results:
+        for symbol, trades, error in chunk_result:
+            if error is not None:
+                print(f"警告: 股票{symbol}回测失败: {error}")
+                continue
+            trades_by_symbol[symbol] = trades
+    return trades_by_symbol
@@ -1,13 +1,273 @@
 """参数优化脚本 - 网格搜索找到最优参数"""
+import math
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from itertools import product
-from config import START_DATE, END_DATE, STRATEGY_PARAMS
+from multiprocessing import shared_memory
+from config import (
+    START_DATE, END_DATE, STRATEGY_PARAMS, STRATEGY_MAP,
+    DATA_FETCH_START, DATA_FETCH_END, BACKTEST_START, BACKTEST_END,
+    OOS_START, OOS_END, WALK_FORWARD_TRAIN_DAYS, WALK_FORWARD_TEST_DAYS,
+    MAX_POSITION_RATIO, TURNOVER_RANK_TOP_N, PORTFOLIO_EVENT_DRIVEN, get_default_trading_settings,
+)
 from data_fetcher import get_batch_stock_data, get_index_constituents
+import strategy as strategy_module
 from strategy import VolumeBreakoutStrategy
 from backtest_engine import BacktestEngine
+from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig, _build_prev_day_turnover_ranks
+from config_manager import ConfigManager
+from optimization_store import OptimizationResultStore
 
+# 结果库中的策略标识（STRATEGY_MAP 键）
+STRATEGY_KEY = 'volume_breakout'
 
-def optimize_parameters(stocks_data: dict, param_ranges: dict):
+# 结果行中的指标列
+METRIC_COLUMNS = ['trades', 'total_return', 'avg_return', 'win_rate', 'profit_factor']
+
+# 使用结果库时串行模式每批落盘的组合数
+CHECKPOINT_CHUNK = 50
+
+# 网格搜索未给出预算时允许的最大组合数（更大的空间请用 random / halving / model）
+GRID_SEARCH_MAX_COMBOS = 2000
+
+# 有大小关系的参数对 (较小者, 较大者)：搜索时跳过取值倒挂的组合
+ORDERED_PARAM_PAIRS = [
+    ('turnover_min', 'turnover_max'),
+    ('ma_short', 'ma_long'),
+    ('macd_fast', 'macd_slow'),
+    ('rsi_oversold', 'rsi_overbought'),
+    ('take_profit_1', 'take_profit_2'),
+    ('take_profit_2', 'take_profit_final'),
+]
+
+# 按交易日截取子样本时，评估区间之前额外保留的预热交易日（覆盖常用指标周期与回测的最少数据要求）
+HALVING_WARMUP_DAYS = 120
+
+# 共享给子进程的行情列：OHLC、成交量、成交额与换手率（日期单独以 int64 纳秒存放；缺失列以 NaN 填充）
+SHARED_COLUMNS = ['开盘', '收盘', '高', '低', '成交量', '成交额', '换手率']
+
+# 子进程内从共享内存重建的行情数据（由 _init_worker 设置）
+_worker_shm = None
+_worker_stocks_data = None
+
+
+def _share_stocks_data(stocks_data: dict):
+    """
+    将 stocks_data 打包写入一块共享内存
+
+    布局：[日期 int64 × 总行数][SHARED_COLUMNS float64 × 总行数 × 列数]，
+    各股票按 stocks_data 的顺序首尾相接。
+
+    Returns:
+        (SharedMemory, layout)，layout 为 [(symbol, 起始行, 行数), ...]
+    """
+    frames = [(symbol, df) for symbol, df in stocks_data.items() if df is not None]
+    total_rows = sum(len(df) for _, df in frames)
+    date_bytes = total_rows * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(date_bytes + total_rows * len(SHARED_COLUMNS) * 8, 1))
+
+    dates = np.ndarray((total_rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((total_rows, len(SHARED_COLUMNS)), dtype=np.float64, buffer=shm.buf, offset=date_bytes)
+
+    layout = []
+    row = 0
+    for symbol, df in frames:
+        n = len(df)
+        dates[row:row + n] = pd.to_datetime(df['日期']).values.astype('datetime64[ns]').astype(np.int64)
+        for c, column in enumerate(SHARED_COLUMNS):
+            values[row:row + n, c] = df[column].to_numpy(dtype=float) if column in df.columns else np.nan
+        layout.append((symbol, row, n))
+        row += n
+
+    return shm, layout
+
+
+def _attach_stocks_data(shm, layout) -> dict:
+    """按 layout 从共享内存重建 {symbol: DataFrame}（列直接引用共享内存，不复制）"""
+    total_rows = sum(n for _, _, n in layout)
+    date_bytes = total_rows * 8
+    dates = np.ndarray((total_rows,), dtype=np.int64, buffer=shm.buf)
+    values = np.ndarray((total_rows, len(SHARED_COLUMNS)), dtype=np.float64, buffer=shm.buf, offset=date_bytes)
+
+    stocks_data = {}
+    for symbol, row, n in layout:
+        columns = {'日期': pd.to_datetime(dates[row:row + n])}
+        for c, column in enumerate(SHARED_COLUMNS):
+            columns[column] = values[row:row + n, c]
+        stocks_data[symbol] = pd.DataFrame(columns, copy=False)
+    return stocks_data
+
+
+def _init_worker(shm_name: str, layout: list):
+    """子进程初始化：连接共享内存并重建行情数据（每个进程只做一次）"""
+    global _worker_shm, _worker_stocks_data
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_stocks_data = _attach_stocks_data(_worker_shm, layout)
+
+
+def _run_chunk(start: int, param_sets: list) -> list:
+    """子进程任务：回测一个参数分块，返回 [(组合序号, 结果行), ...]"""
+    rows = _evaluate_param_sets(BacktestEngine(), _worker_stocks_data, param_sets)
+    return list(enumerate(rows, start))
+
+
+def _make_row(params: dict, metrics: dict, param_keys: list = None) -> dict:
+    """参数 + 指标 -> 结果行（param_keys 默认 ma_period / volume_multiplier / hold_days）"""
+    if param_keys is None:
+        param_keys = ['ma_period', 'volume_multiplier', 'hold_days']
+    row = {key: params.get(key, STRATEGY_PARAMS.get(key)) for key in param_keys}
+    row.update({column: metrics[column] for column in METRIC_COLUMNS})
+    return row
+
+
+def _metrics_of(row: dict) -> dict:
+    """结果行 -> 指标字典（写入结果库的部分）"""
+    return {column: row[column] for column in METRIC_COLUMNS}
+
+
+def _evaluate_param_sets(engine: BacktestEngine, stocks_data: dict, param_sets: list,
+                         param_keys: list = None) -> list:
+    """批量回测一组参数，返回每组参数的汇总结果行"""
+    batch_results = engine.run_param_batch(stocks_data, VolumeBreakoutStrategy, param_sets)
+
+    rows = []
+    for params, backtest_results in zip(param_sets, batch_results):
+        aggregated = BacktestEngine.aggregate_results(backtest_results)
+        rows.append(_make_row(params, {
+            'trades': aggregated['total_trades'],
+            'total_return': aggregated['total_return'],
+            'avg_return': aggregated['avg_return_per_trade'],
+            'win_rate': aggregated['win_rate'],
+            'profit_factor': aggregated['profit_factor'],
+        }, param_keys))
+    return rows
+
+
+def _legacy_evaluate(stocks_data: dict, param_sets: list, param_keys: list = None) -> list:
+    """默认评估方式：量能突破策略 + 旧版 BacktestEngine 批量回测"""
+    return _evaluate_param_sets(BacktestEngine(), stocks_data, param_sets, param_keys)
+
+
+def _legacy_settings() -> dict:
+    """默认评估方式的结果库设置指纹（评估方式 + BacktestEngine 交易设置）"""
+    return {'evaluator': 'backtest_engine', **BacktestEngine().backtest_settings}
+
+
+def _portfolio_settings(engine_factory) -> dict:
+    """组合模式的结果库设置指纹（评估方式 + 引擎交易设置、回测区间、成交额过滤与撮合方式）"""
+    engine = engine_factory()
+    return {
+        'evaluator': 'portfolio',
+        **engine.backtest_settings,
+        'turnover_rank_top_n': engine.turnover_rank_top_n,
+    }
+
+
+class _Evaluator:
+    """
+    参数组合评估器：先查结果库，只回测未评估过的组合并写回结果库
+
+    Args:
+        evaluate: 回测函数 evaluate(stocks_data, param_sets, param_keys) -> 结果行列表
+        strategy_key: 结果库中的策略标识
+        base_params: 未搜索参数的取值
+        store: 结果库（None = 不持久化）
+        settings: 结果库设置指纹（默认评估方式为 _legacy_settings()，自定义 evaluate 时为其限定名）；
+                  评估方式或引擎设置不同的结果互不复用
+        chunk_size: 每批回测的组合数（None = 一次回测全部待评估组合）；
+                    每批完成后落盘并回调 on_evaluated
+        on_evaluated: 进度回调 on_evaluated(本批组合数)，结果库命中的组合也会计入
+    """
+
+    def __init__(self, evaluate=None, strategy_key: str = STRATEGY_KEY, base_params: dict = None,
+                 store: OptimizationResultStore = None, chunk_size: int = None, on_evaluated=None,
+                 settings: dict = None):
+        if settings is None:
+            settings = (_legacy_settings() if evaluate is None
+                        else {'evaluator': f"{evaluate.__module__}.{evaluate.__qualname__}"})
+        self.evaluate = evaluate or _legacy_evaluate
+        self.strategy_key = strategy_key
+        self.base_params = base_params if base_params is not None else STRATEGY_PARAMS
+        self.store = store
+        self.settings = settings
+        self.chunk_size = chunk_size
+        self.on_evaluated = on_evaluated
+
+    def context(self, stocks_data: dict):
+        """结果库上下文（同一份行情多次评估时复用，避免重复计算数据版本）"""
+        if self.store is None:
+            return None
+        return self.store.context(self.strategy_key, stocks_data, self.settings)
+
+    def __call__(self, stocks_data: dict, param_sets: list, param_keys: list = None,
+                 context: dict = None) -> list:
+        rows = [None] * len(param_sets)
+        if self.store is not None:
+            if context is None:
+                context = self.context(stocks_data)
+            for i, metrics in enumerate(self.store.get_many(context, param_sets)):
+                if metrics is not None:
+                    rows[i] = _make_row(param_sets[i], metrics, param_keys)
+        pending = [i for i, row in enumerate(rows) if row is None]
+        if self.on_evaluated is not None and len(pending) < len(param_sets):
+            self.on_evaluated(len(param_sets) - len(pending))
+
+        chunk_size = self.chunk_size or max(len(pending), 1)
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            chunk_params = [param_sets[i] for i in chunk]
+            new_rows = self.evaluate(stocks_data, chunk_params, param_keys)
+            if self.store is not None:
+                self.store.put_many(context, chunk_params, [_metrics_of(row) for row in new_rows])
+            for i, row in zip(chunk, new_rows):
+                rows[i] = row
+            if self.on_evaluated is not None:
+                self.on_evaluated(len(chunk))
+        return rows
+
+
+def _evaluate_parallel(stocks_data: dict, param_combinations: list, n_jobs: int, chunk_size: int,
+                       on_chunk=None) -> list:
+    """
+    多进程回测所有参数组合
+
+    行情数据写入共享内存后由各子进程只读引用，任务只传递参数分块；
+    结果按组合序号归并，与串行执行顺序一致。
+
+    on_chunk: 每完成一个分块的回调 on_chunk(组合序号列表, 结果行列表)，用于落盘断点
+    """
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(param_combinations) / (n_jobs * 4)))
+
+    shm, layout = _share_stocks_data(stocks_data)
+    rows = [None] * len(param_combinations)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(shm.name, layout)) as executor:
+            futures = [
+                executor.submit(_run_chunk, start, param_combinations[start:start + chunk_size])
+                for start in range(0, len(param_combinations), chunk_size)
+            ]
+            done = 0
+            for future in as_completed(futures):
+                chunk = future.result()
+                for idx, row in chunk:
+                    rows[idx] = row
+                done += len(chunk)
+                if on_chunk is not None:
+                    on_chunk([idx for idx, _ in chunk], [row for _, row in chunk])
+                print(f"   进度: {done}/{len(param_combinations)}")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return rows
+
+
+def optimize_parameters(stocks_data: dict, param_ranges: dict, n_jobs: int = 1, chunk_size: int = None,
+                        store: OptimizationResultStore = None):
     """
     参数网格搜索优化
 
@@ -17,6 +277,15 @@ def optimize_parameters(stocks_data: dict, param_ranges: dict):
         "volume_multiplier": [1.5, 2.0, 2.5],
         "hold_days": [2, 3, 4],
     }
+
+    Args:
+        stocks_data: {symbol: DataFrame}
+        param_ranges: 参数搜索范围
+        n_jobs: 并行进程数（1 = 当前进程串行执行）
+        chunk_size: 每批回测的参数组合数（并行时默认按进程数自动分块；
+                    使用结果库时默认每 CHECKPOINT_CHUNK 个组合落盘一次）
+        store: 结果库。传入后已评估过的组合直接读取，新结果每完成一批即写入，
+               中断后重跑可从断点继续
     """
     print("🔍 开始参数优化...")
 
@@ -34,32 +303,40 @@ def optimize_parameters(stocks_data: dict, param_ranges: dict):
 
     print(f"   共{len(param_combinations)}个参数组合待测试\n")
 
-    results_list = []
-    engine = BacktestEngine()
+    results_list = [None] * len(param_combinations)
+    context = None
+    if store is not None:
+        context = store.context(STRATEGY_KEY, stocks_data, _legacy_settings())
+        for idx, metrics in enumerate(store.get_many(context, param_combinations)):
+            if metrics is not None:
+                results_list[idx] = _make_row(param_combinations[idx], metrics)
+    pending = [idx for idx, row in enumerate(results_list) if row is None]
+    if store is not None:
+        print(f"   结果库已有{len(param_combinations) - len(pending)}个组合，本次需回测{len(pending)}个\n")
 
-    for idx, params in enumerate(param_combinations, 1):
-        print(f"[{idx}/{len(param_combinations)}] 测试参数: {params}")
+    def save_chunk(positions: list, rows: list):
+        """结果写回 results_list，并落盘到结果库"""
+        for pos, row in zip(positions, rows):
+            results_list[pending[pos]] = row
+        if store is not None:
+            store.put_many(context, [param_combinations[pending[pos]] for pos in positions],
+                           [_metrics_of(row) for row in rows])
 
-        # 创建策略
-        strategy = VolumeBreakoutStrategy(params)
-
-        # 运行回测
-        backtest_results = engine.run_multiple_stocks(stocks_data, strategy)
-        aggregated = BacktestEngine.aggregate_results(backtest_results)
-
-        # 记录结果
-        result = {
-            'ma_period': params.get('ma_period', STRATEGY_PARAMS['ma_period']),
-            'volume_multiplier': params.get('volume_multiplier', STRATEGY_PARAMS['volume_multiplier']),
-            'hold_days': params.get('hold_days', STRATEGY_PARAMS['hold_days']),
-            'trades': aggregated['total_trades'],
-            'total_return': aggregated['total_return'],
-            'avg_return': aggregated['avg_return_per_trade'],
-            'win_rate': aggregated['win_rate'],
-            'profit_factor': aggregated['profit_factor'],
-        }
-        results_list.append(result)
-        print(f"   结果: 交易数={result['trades']}, 总收益={result['total_return']:.2f}%, 胜率={result['win_rate']:.1f}%\n")
+    pending_params = [param_combinations[idx] for idx in pending]
+    if n_jobs > 1 and len(pending_params) > 1:
+        _evaluate_parallel(stocks_data, pending_params, n_jobs, chunk_size, on_chunk=save_chunk)
+    elif pending_params:
+        # 批量回测：每只股票的指标只按不同参数值各计算一次
+        if chunk_size is None:
+            chunk_size = CHECKPOINT_CHUNK if store is not None else len(pending_params)
+        engine = BacktestEngine()
+        for start in range(0, len(pending_params), chunk_size):
+            chunk_params = pending_params[start:start + chunk_size]
+            rows = _evaluate_param_sets(engine, stocks_data, chunk_params)
+            save_chunk(list(range(start, start + len(rows))), rows)
+            for offset, (params, result) in enumerate(zip(chunk_params, rows), start + 1):
+                print(f"[{offset}/{len(pending_params)}] 测试参数: {params}")
+                print(f"   结果: 交易数={result['trades']}, 总收益={result['total_return']:.2f}%, 胜率={result['win_rate']:.1f}%\n")
 
     # 转换为DataFrame并排序
     results_df = pd.DataFrame(results_list)
@@ -82,6 +359,795 @@ def optimize_parameters(stocks_data: dict, param_ranges: dict):
     return results_df
 
 
+# ==================== 预算受限的参数搜索 ====================
+
+class _SearchSpace:
+    """
+    参数网格的索引空间：按混合进制编号，不展开全部组合
+
+    size 为网格组合总数；ORDERED_PARAM_PAIRS 中取值倒挂的组合无效，抽样与遍历时跳过。
+    """
+
+    def __init__(self, param_ranges: dict, base_params: dict = None):
+        self.base_params = base_params if base_params is not None else STRATEGY_PARAMS
+        self.keys = list(param_ranges.keys())
+        self.values = [list(v) for v in param_ranges.values()]
+        self.shape = tuple(len(v) for v in self.values)
+        self.size = int(np.prod(self.shape)) if self.shape else 0
+        known = set(self.base_params) | set(self.keys)
+        self.ordered_pairs = [(low, high) for low, high in ORDERED_PARAM_PAIRS
+                              if low in known and high in known and (low in self.keys or high in self.keys)]
+
+    def is_valid(self, flat_idx: int) -> bool:
+        """组合是否满足参数间的大小关系"""
+        if not self.ordered_pairs:
+            return True
+        params = self.params_at(flat_idx)
+        return all(params[low] <= params[high] for low, high in self.ordered_pairs)
+
+    def iter_valid(self, chunk_size: int):
+        """按编号顺序逐块产出有效组合的编号（不展开全部组合）"""
+        chunk = []
+        for idx in range(self.size):
+            if self.is_valid(idx):
+                chunk.append(idx)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def params_at(self, flat_idx: int) -> dict:
+        """组合编号 -> 完整参数字典（未搜索的参数取 base_params）"""
+        coords = np.unravel_index(flat_idx, self.shape)
+        params = dict(self.base_params)
+        params.update({key: self.values[d][c] for d, (key, c) in enumerate(zip(self.keys, coords))})
+        return params
+
+    def coords(self, flat_indices) -> np.ndarray:
+        """组合编号 -> 归一化到 [0, 1] 的坐标（用于代理模型）"""
+        coords = np.array(np.unravel_index(np.asarray(flat_indices, dtype=np.int64), self.shape),
+                          dtype=float).T
+        scale = np.array([max(n - 1, 1) for n in self.shape], dtype=float)
+        return coords / scale
+
+    def sample(self, rng, k: int, exclude=()) -> np.ndarray:
+        """无放回随机抽取 k 个未评估过的有效组合编号（有效组合不足时返回全部）"""
+        exclude = set(exclude)
+        k = min(k, self.size - len(exclude))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if self.size <= 4 * (k + len(exclude)):
+            pool = np.setdiff1d(np.arange(self.size), np.fromiter(exclude, dtype=np.int64, count=len(exclude)))
+            pool = np.asarray([idx for idx in pool if self.is_valid(idx)], dtype=np.int64)
+            return rng.choice(pool, size=min(k, len(pool)), replace=False)
+        picked = []
+        seen = set(exclude)
+        while len(picked) < k and len(seen) < self.size:
+            idx = int(rng.integers(self.size))
+            if idx not in seen:
+                seen.add(idx)
+                if self.is_valid(idx):
+                    picked.append(idx)
+        return np.asarray(picked, dtype=np.int64)
+
+
+class _SearchTracker:
+    """记录评估消耗与最优结果（best-so-far 曲线）"""
+
+    def __init__(self, objective: str, progress_callback=None):
+        self.objective = objective
+        self.progress_callback = progress_callback
+        self.spent = 0.0
+        self.best_score = -np.inf
+        self.results = []
+        self.history = []
+
+    def record(self, rows: list, cost: float = 1.0, full: bool = True, rung: int = None):
+        """
+        登记一批评估结果
+
+        cost: 每次评估的消耗（全样本回测计1，子样本按比例计）
+        full: 是否为全样本评估（只有全样本结果参与最优值与最终排名）
+        """
+        for row in rows:
+            self.spent += cost
+            score = row[self.objective]
+            if full:
+                self.results.append(row)
+                if score > self.best_score:
+                    self.best_score = score
+            self.history.append({
+                'evaluations': round(self.spent, 6),
+                'score': score,
+                'best_so_far': self.best_score if np.isfinite(self.best_score) else np.nan,
+                'full_sample': full,
+                'rung': rung,
+            })
+        if self.progress_callback is not None and rows:
+            self.progress_callback(self.history[-1])
+
+    def to_frames(self):
+        results_df = pd.DataFrame(self.results)
+        if len(results_df) > 0:
+            results_df = results_df.sort_values(
+                by=['total_return', 'win_rate', 'profit_factor'],
+                ascending=[False, False, False]
+            )
+        return results_df, pd.DataFrame(self.history)
+
+
+def _setup_search(param_ranges: dict, objective: str, store, evaluator, progress_callback):
+    """构造搜索空间、评估器和记录器（各搜索方法共用）"""
+    if evaluator is None:
+        evaluator = _Evaluator(store=store)
+    space = _SearchSpace(param_ranges, evaluator.base_params)
+    return space, evaluator, _SearchTracker(objective, progress_callback)
+
+
+def grid_search(stocks_data: dict, param_ranges: dict, budget: int = None,
+                objective: str = 'total_return', seed: int = 0,
+                store: OptimizationResultStore = None, evaluator: _Evaluator = None,
+                progress_callback=None):
+    """
+    网格搜索：按 itertools.product 顺序评估全部有效组合（逐块生成，不展开整个网格）
+
+    budget 为组合数上限（None = GRID_SEARCH_MAX_COMBOS），超出时报错，请改用预算受限的搜索方法。
+    其余参数与返回值同 random_search。
+    """
+    space, evaluator, tracker = _setup_search(param_ranges, objective, store, evaluator, progress_callback)
+    limit = GRID_SEARCH_MAX_COMBOS if budget is None else budget
+    if space.size > limit:
+        raise ValueError(f"网格共{space.size}个组合，超过上限{limit}，请改用 random / halving / model")
+
+    context = evaluator.context(stocks_data)
+    evaluated = 0
+    for chunk in space.iter_valid(evaluator.chunk_size or CHECKPOINT_CHUNK):
+        tracker.record(evaluator(stocks_data, [space.params_at(idx) for idx in chunk], space.keys, context))
+        evaluated += len(chunk)
+
+    print(f"🔍 网格搜索完成: 评估{evaluated}/{space.size}个组合, 最优{objective}={tracker.best_score:.2f}")
+    return tracker.to_frames()
+
+
+def random_search(stocks_data: dict, param_ranges: dict, budget: int = 50,
+                  objective: str = 'total_return', seed: int = 0,
+                  store: OptimizationResultStore = None, evaluator: _Evaluator = None,
+                  progress_callback=None):
+    """
+    随机搜索：在参数网格中无放回抽取 budget 个组合
+
+    Args:
+        store: 结果库（evaluator 为 None 时使用）
+        evaluator: 参数评估器（默认量能突破策略 + BacktestEngine）
+        progress_callback: 每登记一批结果后回调 progress_callback(最新一条 history 记录)
+
+    Returns:
+        (results_df, history_df)
+        results_df: 已评估组合按收益排序（列同 optimize_parameters）
+        history_df: 每次评估后的消耗与 best_so_far
+    """
+    space, evaluator, tracker = _setup_search(param_ranges, objective, store, evaluator, progress_callback)
+    rng = np.random.default_rng(seed)
+
+    indices = space.sample(rng, budget)
+    param_sets = [space.params_at(idx) for idx in indices]
+    context = evaluator.context(stocks_data)
+    chunk_size = evaluator.chunk_size or max(len(param_sets), 1)
+    for start in range(0, len(param_sets), chunk_size):
+        chunk = param_sets[start:start + chunk_size]
+        tracker.record(evaluator(stocks_data, chunk, space.keys, context))
+
+    print(f"🎲 随机搜索完成: 评估{len(param_sets)}/{space.size}个组合, 最优{objective}={tracker.best_score:.2f}")
+    return tracker.to_frames()
+
+
+def _subsample(stocks_data: dict, fraction: float, resource: str, symbol_order: list) -> dict:
+    """
+    按股票数量（symbols）或交易日长度（days）截取子样本
+
+    days：评估最近一段交易日，并在其之前保留 HALVING_WARMUP_DAYS 个交易日供指标预热，
+    避免子样本短于指标周期或回测的最少数据要求而全部得分为 0。
+    """
+    if fraction >= 1:
+        return stocks_data
+    if resource == 'symbols':
+        k = max(1, math.ceil(len(symbol_order) * fraction))
+        return {symbol: stocks_data[symbol] for symbol in symbol_order[:k]}
+    if resource == 'days':
+        return {symbol: df.iloc[-(math.ceil(len(df) * fraction) + HALVING_WARMUP_DAYS):] if df is not None else None
+                for symbol, df in stocks_data.items()}
+    raise ValueError(f"未知的子样本维度: {resource}")
+
+
+def successive_halving(stocks_data: dict, param_ranges: dict, budget: int = 50,
+                       objective: str = 'total_return', eta: int = 3, min_fraction: float = None,
+                       resource: str = 'symbols', seed: int = 0,
+                       store: OptimizationResultStore = None, evaluator: _Evaluator = None,
+                       progress_callback=None):
+    """
+    逐次减半搜索
+
+    先在小比例子样本（部分股票或最近一段交易日）上评估大量候选，每一轮保留前 1/eta
+    晋级，样本比例同时扩大 eta 倍，最后一轮在全样本上评估。
+
+    budget 以「全样本评估次数」计：子样本评估按样本比例折算消耗。
+
+    Args:
+        eta: 每轮淘汰比例
+        min_fraction: 第一轮样本比例（默认 1/eta²）
+        resource: 'symbols'（按股票数）或 'days'（按交易日长度）
+        store / evaluator / progress_callback: 同 random_search
+
+    Returns:
+        (results_df, history_df)，results_df 只包含全样本评估的组合
+    """
+    space, evaluator, tracker = _setup_search(param_ranges, objective, store, evaluator, progress_callback)
+    rng = np.random.default_rng(seed)
+
+    if min_fraction is None:
+        min_fraction = 1 / eta ** 2
+    rungs = max(0, math.ceil(math.log(1 / min_fraction, eta) - 1e-9))
+    fractions = [min(1.0, min_fraction * eta ** rung) for rung in range(rungs + 1)]
+
+    def total_cost(n):
+        cost = 0.0
+        for fraction in fractions:
+            cost += n * fraction
+            n = max(1, math.ceil(n / eta))
+        return cost
+
+    # 每轮 候选数 × 样本比例 ≈ n0 × min_fraction；晋级数向上取整，按实际消耗收缩到预算内
+    n0 = min(max(1, int(budget / (min_fraction * (rungs + 1)))), space.size)
+    while n0 > 1 and total_cost(n0) > budget:
+        n0 -= 1
+    candidates = space.sample(rng, n0)
+
+    symbol_order = list(stocks_data.keys())
+    rng.shuffle(symbol_order)
+
+    for rung, fraction in enumerate(fractions):
+        subset = _subsample(stocks_data, fraction, resource, symbol_order)
+        rows = evaluator(subset, [space.params_at(idx) for idx in candidates], space.keys)
+        tracker.record(rows, cost=fraction, full=fraction >= 1, rung=rung)
+        print(f"   第{rung + 1}轮: 样本比例{fraction:.0%}, 候选{len(candidates)}个")
+
+        if fraction >= 1:
+            break
+        # 晋级：按目标值取前 1/eta（同分按组合编号，保证确定性）
+        keep = max(1, math.ceil(len(candidates) / eta))
+        scores = np.array([row[objective] for row in rows], dtype=float)
+        order = np.lexsort((candidates, -np.nan_to_num(scores, nan=-np.inf)))
+        candidates = candidates[order[:keep]]
+
+    print(f"✂️ 逐次减半完成: 消耗{tracker.spent:.1f}次全样本评估, 最优{objective}={tracker.best_score:.2f}")
+    return tracker.to_frames()
+
+
+def model_based_search(stocks_data: dict, param_ranges: dict, budget: int = 50,
+                       objective: str = 'total_return', n_initial: int = None,
+                       n_candidates: int = 500, kappa: float = 1.0, seed: int = 0,
+                       store: OptimizationResultStore = None, evaluator: _Evaluator = None,
+                       progress_callback=None):
+    """
+    基于代理模型的序贯搜索
+
+    先随机评估 n_initial 个组合，之后每一步用核回归（高斯核加权平均）预测未评估
+    组合的目标值，并按与已评估点的距离加上探索项，选择采集值最高的组合评估。
+
+    Args:
+        n_initial: 初始随机评估数（默认 budget 的 1/5，至少 3 个）
+        n_candidates: 每步参与打分的候选组合数（网格较小时为全部未评估组合）
+        kappa: 探索项权重
+        store / evaluator / progress_callback: 同 random_search
+
+    Returns:
+        (results_df, history_df)
+    """
+    space, evaluator, tracker = _setup_search(param_ranges, objective, store, evaluator, progress_callback)
+    rng = np.random.default_rng(seed)
+
+    budget = min(budget, space.size)
+    if n_initial is None:
+        n_initial = max(3, budget // 5)
+    n_initial = min(n_initial, budget)
+
+    context = evaluator.context(stocks_data)
+    evaluated = list(space.sample(rng, n_initial))
+    rows = evaluator(stocks_data, [space.params_at(idx) for idx in evaluated], space.keys, context)
+    tracker.record(rows)
+    scores = [row[objective] for row in rows]
+
+    bandwidth = 0.25 * math.sqrt(max(len(space.shape), 1))
+    while len(evaluated) < budget:
+        candidates = space.sample(rng, n_candidates, exclude=evaluated)
+        if len(candidates) == 0:
+            break
+
+        x_seen = space.coords(evaluated)
+        x_cand = space.coords(candidates)
+        y_seen = np.nan_to_num(np.asarray(scores, dtype=float))
+
+        dist = np.sqrt(((x_cand[:, None, :] - x_seen[None, :, :]) ** 2).sum(axis=2))
+        weights = np.exp(-0.5 * (dist / bandwidth) ** 2) + 1e-12
+        predicted = (weights * y_seen).sum(axis=1) / weights.sum(axis=1)
+        spread = y_seen.std() if len(y_seen) > 1 else 1.0
+        acquisition = predicted + kappa * spread * dist.min(axis=1) / bandwidth
+
+        best = int(candidates[int(np.argmax(acquisition))])
+        row = evaluator(stocks_data, [space.params_at(best)], space.keys, context)[0]
+        tracker.record([row])
+        evaluated.append(best)
+        scores.append(row[objective])
+
+    print(f"🧭 序贯搜索完成: 评估{len(evaluated)}个组合, 最优{objective}={tracker.best_score:.2f}")
+    return tracker.to_frames()
+
+
+SEARCH_METHODS = {
+    'grid': grid_search,
+    'random': random_search,
+    'halving': successive_halving,
+    'model': model_based_search,
+}
+
+
+def search_parameters(stocks_data: dict, param_ranges: dict, method: str = 'random',
+                      budget: int = 50, **kwargs):
+    """
+    按指定方法在固定评估预算内搜索参数
+
+    method: 'grid' / 'random' / 'halving' / 'model'，
+            其余参数（seed / objective / store / evaluator 等）透传给对应函数
+
+    Returns:
+        (results_df, history_df)
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"未知的搜索方法: {method}，可选: {list(SEARCH_METHODS)}")
+    return SEARCH_METHODS[method](stocks_data, param_ranges, budget=budget, **kwargs)
+
+
+# ==================== 任意策略的组合模式优化 ====================
+
+def get_strategy_class(strategy_key: str):
+    """按 STRATEGY_MAP 键查找策略类（strategy.py / strategy_new.py）"""
+    if strategy_key not in STRATEGY_MAP:
+        raise ValueError(f"策略 {strategy_key} 不存在")
+    class_name = STRATEGY_MAP[strategy_key]['class_name']
+    if hasattr(strategy_module, class_name):
+        return getattr(strategy_module, class_name)
+    import strategy_new
+    return getattr(strategy_new, class_name)
+
+
+def ranges_to_grid(param_specs: dict, points: int = 3, defaults: dict = None) -> dict:
+    """
+    将 ConfigManager.get_param_ranges 的范围定义转换为搜索网格
+
+    每个参数在 [min, max] 上等距取 points 个点（按 step 取整后截断到 [min, max]、去重）；
+    默认值落在范围内时一并加入，保证基准参数被评估。
+    取值倒挂的参数对（ORDERED_PARAM_PAIRS）由搜索空间跳过。
+
+    Returns:
+        {参数名: [取值, ...]}
+    """
+    defaults = defaults or {}
+    grid = {}
+    for key, spec in param_specs.items():
+        low, high, step = spec['min'], spec['max'], spec.get('step') or 0
+        raw = np.linspace(low, high, max(points, 1)) if points > 1 else np.array([defaults.get(key, low)])
+        if step:
+            raw = np.clip(low + np.round((raw - low) / step) * step, low, high)
+        if spec.get('type') == 'integer':
+            values = {int(round(v)) for v in raw}
+        else:
+            values = {round(float(v), 10) for v in raw}
+        if key in defaults and low <= defaults[key] <= high:
+            values.add(defaults[key])
+        grid[key] = sorted(values)
+    return grid
+
+
+def _make_portfolio_engine(settings: dict, backtest_start: str, backtest_end: str,
+                           turnover_rank_top_n: int, data_start: str, data_end: str,
+                           event_driven: bool = None):
+    """按给定设置创建 EnhancedBacktestEngine（模块级函数，便于子进程序列化）"""
+    time_config = BacktestTimeConfig(
+        data_start=data_start or DATA_FETCH_START,
+        data_end=data_end or DATA_FETCH_END,
+        backtest_start=backtest_start or BACKTEST_START,
+        backtest_end=backtest_end or BACKTEST_END,
+    )
+    return EnhancedBacktestEngine(
+        initial_capital=settings['initial_capital'],
+        position_ratio=settings['position_ratio'],
+        commission_rate=settings['commission_rate'],
+        slippage=settings['slippage'],
+        time_config=time_config,
+        max_position_ratio=MAX_POSITION_RATIO,
+        turnover_rank_top_n=TURNOVER_RANK_TOP_N if turnover_rank_top_n is None else turnover_rank_top_n,
+        event_driven=PORTFOLIO_EVENT_DRIVEN if event_driven is None else event_driven,
+    )
+
+
+def portfolio_engine_factory(trading_settings: dict = None, backtest_start: str = None,
+                             backtest_end: str = None, turnover_rank_top_n: int = None,
+                             data_start: str = None, data_end: str = None,
+                             event_driven: bool = None):
+    """返回创建 EnhancedBacktestEngine 的工厂函数（参数缺省时取 config.py / 默认交易设置）"""
+    return partial(_make_portfolio_engine, trading_settings or get_default_trading_settings(),
+                   backtest_start, backtest_end, turnover_rank_top_n, data_start, data_end, event_driven)
+
+
+def _portfolio_metrics(results: dict) -> dict:
+    """组合回测结果 -> 指标（总收益为组合市值口径，其余按策略交易统计，与回测页面一致）"""
+    summary = results.get('portfolio_summary', {})
+    returns = np.array([
+        trade.get('收益率%', 0)
+        for stock_result in results.get('stock_results', {}).values()
+        for trade in stock_result.get('trades', [])
+    ], dtype=float)
+    wins = returns[returns > 0]
+    losses = returns[returns <= 0]
+    return {
+        'trades': int(len(returns)),
+        'total_return': summary.get('total_return_pct', 0),
+        'avg_return': float(returns.mean()) if len(returns) > 0 else 0,
+        'win_rate': float(len(wins) / len(returns) * 100) if len(returns) > 0 else 0,
+        'profit_factor': (float(wins.mean() / abs(losses.mean()))
+                          if len(wins) > 0 and len(losses) > 0 and losses.mean() != 0 else 0),
+    }
+
+
+def make_portfolio_evaluate(strategy_key: str, engine_factory=None):
+    """
+    返回组合模式的回测函数：每组参数用 EnhancedBacktestEngine.run_multiple_stocks_with_portfolio 回测
+
+    可作为 _Evaluator 的 evaluate 参数。
+    """
+    strategy_class = get_strategy_class(strategy_key)
+    engine_factory = engine_factory or portfolio_engine_factory()
+
+    def evaluate(stocks_data: dict, param_sets: list, param_keys: list = None) -> list:
+        rows = []
+        for params in param_sets:
+            results = engine_factory().run_multiple_stocks_with_portfolio(stocks_data, strategy_class(params))
+            rows.append(_make_row(params, _portfolio_metrics(results), param_keys))
+        return rows
+
+    return evaluate
+
+
+def optimize_strategy(strategy_key: str, stocks_data: dict, param_names: list = None,
+                      param_ranges: dict = None, points: int = 3, method: str = 'grid',
+                      budget: int = None, objective: str = 'total_return', seed: int = 0,
+                      engine_factory=None, config_manager: ConfigManager = None,
+                      store: OptimizationResultStore = None, progress_callback=None):
+    """
+    任意 STRATEGY_MAP 策略的参数优化（EnhancedBacktestEngine 组合模式）
+
+    Args:
+        strategy_key: STRATEGY_MAP 键
+        stocks_data: {symbol: DataFrame}
+        param_names: 参与优化的参数（默认为该策略全部可调参数）
+        param_ranges: 显式搜索网格 {参数名: [取值]}；为 None 时由
+                      config_manager.get_param_ranges(strategy_key) 按 points 生成
+        points: 每个参数的取点数
+        method: 'grid' / 'random' / 'halving' / 'model'
+        budget: 评估预算（grid 默认上限 GRID_SEARCH_MAX_COMBOS，超出时报错；其余默认 50）
+        engine_factory: 回测引擎工厂（默认 portfolio_engine_factory()）
+        store: 结果库（断点续跑；只复用相同评估方式与引擎设置下的结果）
+        progress_callback: 进度回调 progress_callback({'evaluations', 'best_so_far', 'total', ...})
+
+    Returns:
+        (results_df, history_df)
+    """
+    if strategy_key not in STRATEGY_MAP:
+        raise ValueError(f"策略 {strategy_key} 不存在")
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"未知的搜索方法: {method}，可选: {list(SEARCH_METHODS)}")
+    base_params = STRATEGY_MAP[strategy_key]['params']
+
+    if param_ranges is None:
+        config_manager = config_manager or ConfigManager()
+        specs = config_manager.get_param_ranges(strategy_key)
+        if param_names:
+            unknown = [name for name in param_names if name not in specs]
+            if unknown:
+                raise ValueError(f"策略 {strategy_key} 没有可优化参数: {unknown}")
+            specs = {name: specs[name] for name in param_names}
+        param_ranges = ranges_to_grid(specs, points, base_params)
+    elif param_names:
+        param_ranges = {name: param_ranges[name] for name in param_names}
+
+    if budget is None and method != 'grid':
+        budget = 50
+    total = int(np.prod([len(v) for v in param_ranges.values()]))
+    if budget is not None:
+        total = min(total, budget)
+
+    callback = None
+    if progress_callback is not None:
+        def callback(entry):
+            progress_callback({**entry, 'total': total})
+
+    engine_factory = engine_factory or portfolio_engine_factory()
+    evaluator = _Evaluator(make_portfolio_evaluate(strategy_key, engine_factory), strategy_key,
+                           base_params, store, chunk_size=1,
+                           settings=_portfolio_settings(engine_factory))
+    print(f"🔍 开始优化 {STRATEGY_MAP[strategy_key]['name']}: {method}, 参数 {list(param_ranges)}")
+    return SEARCH_METHODS[method](stocks_data, param_ranges, budget=budget, objective=objective,
+                                  seed=seed, evaluator=evaluator, progress_callback=callback)
+
+
+# ==================== 滚动样本外（Walk-Forward）优化 ====================
+#
+# 每组参数的信号只在全时段数据上计算一次（指标无需在每个窗口重新预热），
+# 各窗口按买入日期截取交易后做组合撮合：
+# - 训练窗口：评估全部参数组合，按 objective 选出最优参数
+# - 测试窗口：用最优参数回测，窗口末仍持仓的交易按窗口末收盘价估值
+# 测试窗口首尾相接，收益率连乘得到样本外净值。
+
+def make_walk_forward_windows(trading_days, train_days: int = None, test_days: int = None,
+                              oos_start: str = None, oos_end: str = None) -> list:
+    """
+    按交易日切分训练/测试窗口
+
+    测试窗口从 oos_start 起每 test_days 个交易日一段（最后一段可不足），
+    训练窗口为其之前的 train_days 个交易日；训练数据不足的测试窗口跳过。
+
+    Returns:
+        [{'train_start', 'train_end', 'test_start', 'test_end'}, ...]（Timestamp）
+    """
+    train_days = train_days or WALK_FORWARD_TRAIN_DAYS
+    test_days = test_days or WALK_FORWARD_TEST_DAYS
+    days = pd.DatetimeIndex(sorted(set(pd.to_datetime(trading_days))))
+    first = days.searchsorted(pd.Timestamp(oos_start or OOS_START))
+    last = days.searchsorted(pd.Timestamp(oos_end or OOS_END), side='right')
+
+    windows = []
+    for start in range(first, last, test_days):
+        if start < train_days:
+            continue
+        end = min(start + test_days, last) - 1
+        windows.append({
+            'train_start': days[start - train_days],
+            'train_end': days[start - 1],
+            'test_start': days[start],
+            'test_end': days[end],
+        })
+    return windows
+
+
+def _full_span_trades(strategy_class, stocks_data: dict, param_sets: list) -> list:
+    """每组参数在全时段数据上生成交易，返回 [{symbol: trades}, ...]"""
+    return [
+        {symbol: strategy_class(params).get_trades(df) for symbol, df in stocks_data.items()}
+        for params in param_sets
+    ]
+
+
+def _run_full_span_chunk(start: int, strategy_key: str, param_sets: list) -> list:
+    """子进程任务：一个参数分块的全时段交易"""
+    tables = _full_span_trades(get_strategy_class(strategy_key), _worker_stocks_data, param_sets)
+    return list(enumerate(tables, start))
+
+
+class _WalkForwardData:
+    """
+    Walk-Forward 各窗口共享的只读数据
+
+    trade_tables[p][symbol] = (交易列表, 买入日期 ns 数组, 卖出日期 ns 数组)
+    prices[symbol] = (日期 ns 数组, 收盘价数组)
+    """
+
+    def __init__(self, stocks_data: dict, trade_tables: list, turnover_ranks=None):
+        self.prices = {
+            symbol: (pd.to_datetime(df['日期']).values.astype('datetime64[ns]').astype(np.int64),
+                     df['收盘'].to_numpy(dtype=float))
+            for symbol, df in stocks_data.items()
+        }
+        self.trade_tables = [
+            {symbol: (trades, self._dates_ns(trades, '买入日期'), self._dates_ns(trades, '卖出日期'))
+             for symbol, trades in table.items()}
+            for table in trade_tables
+        ]
+        self.turnover_ranks = turnover_ranks
+
+    @staticmethod
+    def _dates_ns(trades: list, column: str) -> np.ndarray:
+        if not trades:
+            return np.empty(0, dtype=np.int64)
+        values = pd.to_datetime(pd.Series([trade[column] for trade in trades]))
+        return values.values.astype('datetime64[ns]').astype(np.int64)
+
+    def slice(self, p: int, start, end) -> tuple:
+        """
+        截取第 p 组参数在 [start, end] 内买入的交易
+
+        Returns:
+            (trades_by_symbol, last_prices)，窗口内无行情的股票不参与
+        """
+        start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+        trades_by_symbol = {}
+        last_prices = {}
+        for symbol, (trades, entry_ns, exit_ns) in self.trade_tables[p].items():
+            dates_ns, close = self.prices[symbol]
+            lo = int(np.searchsorted(dates_ns, start_ns, side='left'))
+            hi = int(np.searchsorted(dates_ns, end_ns, side='right'))
+            if hi <= lo:
+                continue
+            last_prices[symbol] = float(close[hi - 1])
+
+            window_trades = []
+            for t in np.flatnonzero((entry_ns >= start_ns) & (entry_ns <= end_ns)):
+                trade = dict(trades[t])
+                if exit_ns[t] > end_ns:
+                    # 窗口末仍持仓：按未平仓处理（组合按窗口末收盘价估值）
+                    trade['卖出日期'] = pd.Timestamp(dates_ns[hi - 1])
+                    trade['卖出价'] = close[hi - 1]
+                    trade['状态'] = '未平仓'
+                window_trades.append(trade)
+            trades_by_symbol[symbol] = window_trades
+        return trades_by_symbol, last_prices
+
+
+def _evaluate_window(engine, data: _WalkForwardData, param_sets: list, window: dict,
+                     objective: str) -> dict:
+    """训练窗口选参 + 测试窗口回测"""
+    best_p, best_value, best_metrics = None, None, None
+    for p in range(len(param_sets)):
+        trades_by_symbol, last_prices = data.slice(p, window['train_start'], window['train_end'])
+        metrics = _portfolio_metrics(engine.run_portfolio(trades_by_symbol, last_prices, data.turnover_ranks))
+        value = metrics[objective]
+        if value is not None and not pd.isna(value) and (best_value is None or value > best_value):
+            best_p, best_value, best_metrics = p, value, metrics
+
+    result = dict(window)
+    if best_p is None:
+        result.update(best_params=None, train_return=np.nan, test_return=0.0, test_trades=0)
+        return result
+
+    trades_by_symbol, last_prices = data.slice(best_p, window['test_start'], window['test_end'])
+    test_metrics = _portfolio_metrics(engine.run_portfolio(trades_by_symbol, last_prices, data.turnover_ranks))
+    result.update(
+        best_params=param_sets[best_p],
+        train_return=best_metrics['total_return'],
+        test_return=test_metrics['total_return'],
+        test_trades=test_metrics['trades'],
+        test_win_rate=test_metrics['win_rate'],
+    )
+    return result
+
+
+# 子进程内的窗口评估上下文（由 _init_window_worker 设置）
+_wf_engine = None
+_wf_data = None
+_wf_param_sets = None
+_wf_objective = None
+
+
+def _init_window_worker(engine_factory, data: _WalkForwardData, param_sets: list, objective: str):
+    """子进程初始化：共享数据只随初始化参数传递一次"""
+    global _wf_engine, _wf_data, _wf_param_sets, _wf_objective
+    _wf_engine, _wf_data, _wf_param_sets, _wf_objective = engine_factory(), data, param_sets, objective
+
+
+def _run_window(k: int, window: dict) -> tuple:
+    """子进程任务：评估一个窗口"""
+    return k, _evaluate_window(_wf_engine, _wf_data, _wf_param_sets, window, _wf_objective)
+
+
+def walk_forward_optimize(strategy_key: str, stocks_data: dict, param_ranges: dict = None,
+                          param_names: list = None, points: int = 3, budget: int = 50, seed: int = 0,
+                          train_days: int = None, test_days: int = None,
+                          oos_start: str = None, oos_end: str = None,
+                          objective: str = 'total_return', n_jobs: int = 1,
+                          engine_factory=None, config_manager: ConfigManager = None) -> dict:
+    """
+    滚动样本外优化
+
+    Args:
+        strategy_key: STRATEGY_MAP 键
+        stocks_data: {symbol: DataFrame}，需覆盖首个训练窗口到 OOS 期末
+        param_ranges / param_names / points: 参数网格，同 optimize_strategy
+        budget: 参与选参的参数组合数上限；网格更大时按 seed 无放回随机抽取（None = 评估全部有效组合，
+                网格超过 GRID_SEARCH_MAX_COMBOS 时报错）。每组参数的全时段交易会常驻内存并传给各窗口进程
+        train_days / test_days: 训练/测试窗口交易日数（默认 config.WALK_FORWARD_*）
+        oos_start / oos_end: 样本外区间（默认 config.OOS_START / OOS_END）
+        n_jobs: 并行进程数（信号生成按参数分块并行，窗口评估按窗口并行）
+        engine_factory: 组合引擎工厂（默认 portfolio_engine_factory()，只使用其资金与成本设置）
+
+    Returns:
+        {'windows': 各窗口 DataFrame（最优参数、训练/测试收益），
+         'oos_equity': 样本外净值 DataFrame（测试窗口末日期、净值），
+         'oos_total_return_pct': 样本外累计收益率%}
+    """
+    if strategy_key not in STRATEGY_MAP:
+        raise ValueError(f"策略 {strategy_key} 不存在")
+    if objective not in METRIC_COLUMNS:
+        raise ValueError(f"未知的优化目标: {objective}")
+    base_params = STRATEGY_MAP[strategy_key]['params']
+    if param_ranges is None:
+        config_manager = config_manager or ConfigManager()
+        specs = config_manager.get_param_ranges(strategy_key)
+        if param_names:
+            specs = {name: specs[name] for name in param_names}
+        param_ranges = ranges_to_grid(specs, points, base_params)
+    space = _SearchSpace(param_ranges, base_params)
+    if budget is None and space.size > GRID_SEARCH_MAX_COMBOS:
+        raise ValueError(f"网格共{space.size}个组合，超过上限{GRID_SEARCH_MAX_COMBOS}，请设置 budget")
+    if budget is None or space.size <= budget:
+        indices = [idx for chunk in space.iter_valid(CHECKPOINT_CHUNK) for idx in chunk]
+    else:
+        indices = sorted(space.sample(np.random.default_rng(seed), budget).tolist())
+    param_sets = [space.params_at(idx) for idx in indices]
+
+    stocks_data = {symbol: df for symbol, df in stocks_data.items() if df is not None and len(df) > 0}
+    trading_days = np.concatenate([pd.to_datetime(df['日期']).values for df in stocks_data.values()])
+    windows = make_walk_forward_windows(trading_days, train_days, test_days, oos_start, oos_end)
+    if not windows:
+        raise ValueError("没有可用的 Walk-Forward 窗口（检查数据范围与 OOS 区间）")
+
+    engine_factory = engine_factory or portfolio_engine_factory()
+    engine = engine_factory()
+    print(f"🔍 Walk-Forward: {STRATEGY_MAP[strategy_key]['name']}，"
+          f"{len(param_sets)} 组参数 × {len(windows)} 个窗口")
+
+    # 第一步：每组参数的全时段信号（只计算一次，所有窗口共享）
+    if n_jobs > 1 and len(param_sets) > 1:
+        chunk = max(1, math.ceil(len(param_sets) / (n_jobs * 4)))
+        trade_tables = [None] * len(param_sets)
+        shm, layout = _share_stocks_data(stocks_data)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(shm.name, layout)) as executor:
+                futures = [executor.submit(_run_full_span_chunk, start, strategy_key,
+                                           param_sets[start:start + chunk])
+                           for start in range(0, len(param_sets), chunk)]
+                for future in as_completed(futures):
+                    for p, table in future.result():
+                        trade_tables[p] = table
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        trade_tables = _full_span_trades(get_strategy_class(strategy_key), stocks_data, param_sets)
+
+    turnover_ranks = None
+    if engine.turnover_rank_top_n > 0:
+        turnover_ranks = _build_prev_day_turnover_ranks(stocks_data)
+    data = _WalkForwardData(stocks_data, trade_tables, turnover_ranks)
+
+    # 第二步：各窗口选参与样本外回测（窗口之间相互独立）
+    if n_jobs > 1 and len(windows) > 1:
+        results = [None] * len(windows)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_window_worker,
+                                 initargs=(engine_factory, data, param_sets, objective)) as executor:
+            futures = [executor.submit(_run_window, k, window) for k, window in enumerate(windows)]
+            for future in as_completed(futures):
+                k, result = future.result()
+                results[k] = result
+    else:
+        results = [_evaluate_window(engine, data, param_sets, window, objective) for window in windows]
+
+    for result in results:
+        if result['best_params'] is not None:
+            result['best_params'] = {key: result['best_params'][key] for key in space.keys}
+    windows_df = pd.DataFrame(results)
+    equity = np.cumprod(1 + windows_df['test_return'].to_numpy(dtype=float) / 100)
+    oos_equity = pd.DataFrame({'日期': windows_df['test_end'], '净值': equity})
+    oos_total_return_pct = round((equity[-1] - 1) * 100, 2)
+    print(f"✓ 样本外累计收益: {oos_total_return_pct}%")
+
+    return {
+        'windows': windows_df,
+        'oos_equity': oos_equity,
+        'oos_total_return_pct': oos_total_return_pct,
+    }
+
+
 if __name__ == "__main__":
     print("=" * 60)
     print("  A股交易策略 - 参数优化")
@@ -7,6 +7,8 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Union, Optional
 
+from trade_ledger import TradeLedger
+
 
 class RiskMetricsCalculator:
     """
@@ -16,7 +18,7 @@ class RiskMetricsCalculator:
     """
 
     def __init__(self,
-                 trades_data: Union[List[Dict], pd.DataFrame],
+                 trades_data: Union[List[Dict], pd.DataFrame, TradeLedger],
                  initial_capital: float = 100000,
                  trading_days_per_year: int = 252,
                  risk_free_rate: float = 0.02):
@@ -24,13 +26,15 @@ class RiskMetricsCalculator:
         初始化风险指标计算器
 
         Args:
-            trades_data: 交易记录列表或DataFrame，包含'收益率%'列
+            trades_data: 交易记录列表、DataFrame 或 TradeLedger，包含'收益率%'列
             initial_capital: 初始资本（元）
             trading_days_per_year: 年交易天数（默认252天）
             risk_free_rate: 无风险利率（默认2%）
         """
         # 将交易数据转换为DataFrame
-        if isinstance(trades_data, list):
+        if isinstance(trades_data, TradeLedger):
+            self.trades_df = trades_data.to_frame()  # 零拷贝视图
+        elif isinstance(trades_data, list):
             self.trades_df = pd.DataFrame(trades_data)
         else:
             self.trades_df = trades_data.copy()
@@ -316,6 +320,56 @@ def aggregate_risk_metrics(all_trades: List[Dict]) -> Dict[str, float]:
     return calculator.all_metrics()
 
 
+def nav_risk_metrics(nav: Union[np.ndarray, List[float]],
+                     trading_days_per_year: int = 252,
+                     risk_free_rate: float = 0.02) -> Dict[str, float]:
+    """
+    基于每日净值序列计算组合风险指标
+
+    与按单笔交易收益计算的 RiskMetricsCalculator 不同，这里使用逐日盯市的净值，
+    回撤包含持仓期间的浮亏，年化按实际交易日数计算。
+
+    Args:
+        nav: 每日净值（组合总市值）数组
+        trading_days_per_year: 年交易天数（默认252天）
+        risk_free_rate: 无风险利率（默认2%）
+
+    Returns:
+        dict: total_return / annual_return / annual_volatility / sharpe_ratio /
+              calmar_ratio / max_drawdown（比例值）
+    """
+    nav = np.asarray(nav, dtype=float)
+    metrics = {
+        'num_days': len(nav),
+        'total_return': 0.0,
+        'annual_return': 0.0,
+        'annual_volatility': 0.0,
+        'sharpe_ratio': 0.0,
+        'calmar_ratio': 0.0,
+        'max_drawdown': 0.0,
+    }
+    if len(nav) < 2 or nav[0] <= 0:
+        return metrics
+
+    daily_returns = nav[1:] / nav[:-1] - 1
+    total_return = nav[-1] / nav[0] - 1
+    num_years = len(daily_returns) / trading_days_per_year
+    annual_ret = (1 + total_return) ** (1 / num_years) - 1 if total_return > -1 else -1.0
+    annual_vol = float(np.std(daily_returns, ddof=1) * np.sqrt(trading_days_per_year)) \
+        if len(daily_returns) > 1 else 0.0
+    max_dd = float(abs(np.min(nav / np.maximum.accumulate(nav) - 1)))
+
+    metrics.update({
+        'total_return': float(total_return),
+        'annual_return': float(annual_ret),
+        'annual_volatility': annual_vol,
+        'sharpe_ratio': float((annual_ret - risk_free_rate) / annual_vol) if annual_vol > 0 else 0.0,
+        'calmar_ratio': float(annual_ret / max_dd) if max_dd > 0 else 0.0,
+        'max_drawdown': max_dd,
+    })
+    return metrics
+
+
 if __name__ == "__main__":
     # 测试示例
     print("=" * 70)
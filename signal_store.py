@@ -0,0 +1,214 @@
+"""买入信号物化表 - 信号扫描改为按日期范围的索引查询
+
+每次扫描都重新加载全部股票的完整行情并计算 calculate_signals，只为返回最近 10 条信号。
+这里把计算结果按 (策略, 参数哈希, 股票, 日期) 保存到本地 SQLite：
+- 每只股票记录计算时的数据版本（见 DataManager.get_data_versions），版本未变的股票不再计算
+- 每日更新后对已保存的策略参数与预设增量刷新：只重算数据有变化的股票
+- 扫描时只补算版本落后的股票（首次使用的参数组合即全部计算），随后在 (策略, 参数, 日期) 索引上查询
+"""
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from optimization_store import params_key, _json_default
+
+STORE_FILE = Path("./data_cache") / "signals.db"
+
+# 信号行保存的字段（与扫描接口返回的字段一致）
+_SIGNAL_FIELDS = ['close', 'change_pct', 'ma5', 'ma30', 'volume', 'turnover_yi']
+
+
+def signal_rows(symbol: str, signals: pd.DataFrame) -> list:
+    """
+    策略信号 DataFrame -> 买入信号行
+
+    Returns:
+        [(symbol, date, close, change_pct, ma5, ma30, volume, turnover_yi)]，按日期升序
+    """
+    if signals is None or signals.empty or 'Buy_Signal' not in signals.columns:
+        return []
+    matched = signals[(signals['Buy_Signal'] == True).to_numpy()]
+    if matched.empty:
+        return []
+    dates = pd.to_datetime(matched['日期'], errors='coerce')
+    keep = dates.notna().to_numpy()
+    matched = matched[keep]
+    dates = dates[keep].dt.strftime('%Y-%m-%d').tolist()
+
+    def values(column, convert):
+        if column not in matched.columns:
+            return [None] * len(matched)
+        return [convert(value) if pd.notna(value) else None for value in matched[column].tolist()]
+
+    columns = [
+        values('收盘', lambda v: round(float(v), 2)),
+        values('涨跌幅', lambda v: round(float(v), 2)),
+        values('MA5', lambda v: round(float(v), 2)),
+        values('MA30', lambda v: round(float(v), 2)),
+        values('成交量', int),
+        values('成交额', lambda v: round(float(v) / 1e8, 2)),
+    ]
+    return [(symbol, date, *row) for date, *row in zip(dates, *columns)]
+
+
+class SignalStore:
+    """买入信号物化表（SQLite）"""
+
+    def __init__(self, db_file=None):
+        self.db_file = Path(db_file) if db_file is not None else STORE_FILE
+        self.db_timeout = 30.0
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        """初始化数据库"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS signals (
+                strategy TEXT NOT NULL,
+                params_hash TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                date TEXT NOT NULL,
+                close REAL,
+                change_pct REAL,
+                ma5 REAL,
+                ma30 REAL,
+                volume INTEGER,
+                turnover_yi REAL,
+                PRIMARY KEY (strategy, params_hash, symbol, date)
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_signals_date
+            ON signals (strategy, params_hash, date)
+        ''')
+        # 每个 (策略, 参数, 股票) 计算时的数据版本
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS signal_coverage (
+                strategy TEXT NOT NULL,
+                params_hash TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                params TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (strategy, params_hash, symbol)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def coverage(self, strategy: str, params: dict) -> dict:
+        """{symbol: 计算时的数据版本}"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            rows = conn.execute('''
+                SELECT symbol, data_version FROM signal_coverage WHERE strategy = ? AND params_hash = ?
+            ''', (strategy, params_key(params or {})))
+            return dict(rows)
+        finally:
+            conn.close()
+
+    def refresh(self, strategy_key: str, params: dict, strategy, data_versions: dict, load_data,
+                progress_callback=None) -> int:
+        """
+        增量刷新一组 (策略, 参数) 的信号：只计算数据版本有变化（或从未计算）的股票
+
+        Args:
+            strategy_key: 策略标识
+            params: 策略参数（与 strategy 一致，用于计算参数哈希）
+            strategy: 策略对象（calculate_signals）
+            data_versions: {symbol: 当前数据版本}，即当前全部缓存股票
+            load_data: load_data(symbol) -> 行情 DataFrame 或 None
+            progress_callback: progress_callback(已处理数, 需计算数)
+
+        Returns:
+            重新计算的股票数
+        """
+        params_hash = params_key(params or {})
+        params_text = json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=_json_default)
+        covered = self.coverage(strategy_key, params)
+        stale = [symbol for symbol, version in data_versions.items() if covered.get(symbol) != version]
+        removed = [symbol for symbol in covered if symbol not in data_versions]
+
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            # 已不在缓存中的股票
+            for symbol in removed:
+                conn.execute('DELETE FROM signals WHERE strategy = ? AND params_hash = ? AND symbol = ?',
+                             (strategy_key, params_hash, symbol))
+                conn.execute('DELETE FROM signal_coverage WHERE strategy = ? AND params_hash = ? AND symbol = ?',
+                             (strategy_key, params_hash, symbol))
+            conn.commit()
+
+            for i, symbol in enumerate(stale, 1):
+                rows = []
+                df = load_data(symbol)
+                if df is not None and not df.empty:
+                    try:
+                        rows = signal_rows(symbol, strategy.calculate_signals(df))
+                    except Exception:
+                        rows = []  # 与扫描一致：计算失败的股票视为无信号
+                # 每只股票单独提交：整体替换该股票的信号并记录数据版本
+                conn.execute('DELETE FROM signals WHERE strategy = ? AND params_hash = ? AND symbol = ?',
+                             (strategy_key, params_hash, symbol))
+                conn.executemany(f'''
+                    INSERT OR REPLACE INTO signals (strategy, params_hash, symbol, date, {', '.join(_SIGNAL_FIELDS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(strategy_key, params_hash, *row) for row in rows])
+                conn.execute('''
+                    INSERT OR REPLACE INTO signal_coverage
+                    (strategy, params_hash, symbol, data_version, params, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (strategy_key, params_hash, symbol, data_versions[symbol], params_text,
+                      datetime.now().isoformat()))
+                conn.commit()
+                if progress_callback is not None:
+                    progress_callback(i, len(stale))
+        finally:
+            conn.close()
+        return len(stale)
+
+    def query(self, strategy_key: str, params: dict, start_date: str, end_date: str,
+              limit: int = 10) -> dict:
+        """
+        日期范围内的买入信号（按日期降序，同日按股票代码）
+
+        Returns:
+            {'scanned': 已计算的股票数, 'matched': 信号总数, 'stocks': 前 limit 条信号字典}
+        """
+        params_hash = params_key(params or {})
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            scanned = conn.execute('''
+                SELECT COUNT(*) FROM signal_coverage WHERE strategy = ? AND params_hash = ?
+            ''', (strategy_key, params_hash)).fetchone()[0]
+            matched = conn.execute('''
+                SELECT COUNT(*) FROM signals
+                WHERE strategy = ? AND params_hash = ? AND date >= ? AND date <= ?
+            ''', (strategy_key, params_hash, start_date, end_date)).fetchone()[0]
+            rows = conn.execute(f'''
+                SELECT date, symbol, {', '.join(_SIGNAL_FIELDS)} FROM signals
+                WHERE strategy = ? AND params_hash = ? AND date >= ? AND date <= ?
+                ORDER BY date DESC, symbol
+                LIMIT ?
+            ''', (strategy_key, params_hash, start_date, end_date, limit)).fetchall()
+        finally:
+            conn.close()
+        keys = ['date', 'symbol', *_SIGNAL_FIELDS]
+        return {'scanned': scanned, 'matched': matched, 'stocks': [dict(zip(keys, row)) for row in rows]}
+
+    def clear(self, strategy: str = None):
+        """清空信号（可按策略）"""
+        conn = sqlite3.connect(self.db_file, timeout=self.db_timeout)
+        try:
+            for table in ('signals', 'signal_coverage'):
+                if strategy is None:
+                    conn.execute(f'DELETE FROM {table}')
+                else:
+                    conn.execute(f'DELETE FROM {table} WHERE strategy = ?', (strategy,))
+            conn.commit()
+        finally:
+            conn.close()
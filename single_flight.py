@@ -0,0 +1,97 @@
+"""请求合并（single-flight）- 相同的并发计算只执行一次
+
+多人同时打开页面时，相同的回测 / 信号扫描请求会并行执行多遍。SingleFlight 按规范化的键合并：
+- 第一个请求执行计算，同一键上并发到达的请求等待它完成并共享同一个结果（或同一个异常）
+- 计算结束即移除，之后到达的请求重新计算（结果复用由回测缓存等负责）
+- 等待者可传入 wait_callback，等待期间定期调用（后台任务借此汇报进度、响应取消）
+- 统计请求数、实际执行数与被合并的请求数，供健康检查展示
+"""
+import threading
+
+# 等待者调用 wait_callback 的间隔（秒）
+WAIT_CALLBACK_INTERVAL = 0.5
+
+
+class _Call:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发的相同计算"""
+
+    def __init__(self, retry_on: tuple = ()):
+        """
+        Args:
+            retry_on: 执行者抛出这些异常时，等待者不共享异常而是重新发起计算
+                      （例如执行者所在的后台任务被取消，不应连带取消其他请求）
+        """
+        self.retry_on = tuple(retry_on)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'executions': 0, 'coalesced': 0, 'errors': 0}
+
+    def do(self, key: str, func, *args, wait_callback=None, **kwargs):
+        """
+        执行 func(*args, **kwargs)；同一 key 已有进行中的计算时等待并返回它的结果
+
+        Args:
+            wait_callback: 等待其他请求的计算期间每 WAIT_CALLBACK_INTERVAL 秒调用一次；
+                           它抛出的异常（如 JobCancelled）结束等待并向调用方抛出，不影响执行者
+
+        Returns:
+            func 的返回值（合并的请求拿到的是同一个对象，调用方不应修改）
+        """
+        while True:
+            with self._lock:
+                self.stats['requests'] += 1
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.stats['executions'] += 1
+                else:
+                    call.waiters += 1
+                    self.stats['coalesced'] += 1
+
+            if leader:
+                return self._execute(key, call, func, args, kwargs)
+
+            if wait_callback is None:
+                call.event.wait()
+            else:
+                while not call.event.wait(WAIT_CALLBACK_INTERVAL):
+                    wait_callback()
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, self.retry_on):
+                raise call.error
+            with self._lock:
+                self.stats['requests'] -= 1  # 重新发起的请求不重复计数
+                self.stats['coalesced'] -= 1
+
+    def _execute(self, key: str, call: _Call, func, args, kwargs):
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def info(self) -> dict:
+        """合并统计（coalesced_pct 为被合并请求的占比）"""
+        with self._lock:
+            info = dict(self.stats, in_flight=len(self._calls))
+        info['coalesced_pct'] = round(info['coalesced'] / info['requests'] * 100, 1) if info['requests'] else 0
+        return info
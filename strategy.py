@@ -2,6 +2,28 @@
 import pandas as pd
 import numpy as np
 from indicators import add_all_indicators, calculate_rsi, calculate_kdj
+from exit_engine import (
+    simulate_exits, build_trade_records, dates_to_ns,
+    STOP_LOSS, TAKE_PROFIT, TRAILING_STOP, ATR_STOP, TIME_STOP, SIGNAL,
+)
+
+
+def _prev_window_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    计算前 window 根（不含当前）的均值，忽略NaN，与 Series.iloc[i-window:i].mean() 一致
+
+    前 window 行及窗口全为NaN时返回NaN。
+    """
+    n = len(values)
+    result = np.full(n, np.nan)
+    if n <= window:
+        return result
+    valid = ~np.isnan(values)
+    windows = np.lib.stride_tricks.sliding_window_view(np.where(valid, values, 0.0), window)[:-1]
+    counts = np.lib.stride_tricks.sliding_window_view(valid, window)[:-1].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[window:] = np.where(counts > 0, windows.sum(axis=1) / counts, np.nan)
+    return result
 
 
 class VolumeBreakoutStrategy:
@@ -62,79 +84,135 @@ class VolumeBreakoutStrategy:
 
         return df
 
-    def get_trades(self, df: pd.DataFrame) -> list:
+    def buy_signal_array(self, df: pd.DataFrame, cache: dict = None) -> np.ndarray:
         """
-        提取买卖点 - 修复版本
+        计算买入信号布尔数组（与 calculate_signals 的 Buy_Signal 一致）
 
-        关键改进：
-        - 使用hold_counter追踪持股天数
-        - 在第hold_days个交易日后卖出
-        - 避免同一天连续买卖
+        Args:
+            df: 行情数据
+            cache: 可选的指标缓存字典。同一只股票的多组参数共享同一个字典时，
+                   相同周期/倍数的均线、量能、成交额条件只计算一次。
         """
-        df_signals = self.calculate_signals(df)
-        trades = []
+        if cache is None:
+            cache = {}
+
+        def cached(key, compute):
+            if key not in cache:
+                cache[key] = compute()
+            return cache[key]
+
+        def ma_up():
+            ma = df['收盘'].rolling(window=self.ma_period).mean()
+            return (ma > ma.shift(1)).to_numpy()
+
+        def volume_surge():
+            recent_sum = cached('recent_vol_sum', lambda: (
+                df['成交量'].rolling(window=self.volume_window).sum()))
+            base_ma = cached('base_vol_ma', lambda: df['成交量'].rolling(window=20).mean())
+            return (recent_sum > (base_ma * self.volume_multiplier)).to_numpy()
+
+        def turnover_check():
+            prev_turnover = cached('prev_turnover_yi', lambda: (df['成交额'] / 1e8).shift(1))
+            return ((prev_turnover >= self.turnover_min) & (prev_turnover <= self.turnover_max)).to_numpy()
+
+        def ma5_retest():
+            ma5 = df['收盘'].rolling(window=5).mean()
+            return ((df['收盘'] < ma5) & (df['收盘'] > ma5 * 0.95)).to_numpy()
+
+        key = ('buy_signal', self.ma_period, self.volume_multiplier,
+               self.turnover_min, self.turnover_max)
+        return cached(key, lambda: (
+            cached(('ma_up', self.ma_period), ma_up)
+            & cached(('volume_surge', self.volume_multiplier), volume_surge)
+            & cached(('turnover_check', self.turnover_min, self.turnover_max), turnover_check)
+            & cached('ma5_retest', ma5_retest)
+        ))
+
+    @classmethod
+    def calculate_signal_matrix(cls, df: pd.DataFrame, param_sets: list,
+                                cache: dict = None) -> np.ndarray:
+        """
+        批量计算多组参数的买入信号
+
+        Returns:
+            (参数组数 × 交易日数) 布尔矩阵，第 p 行对应 param_sets[p]
+        """
+        if cache is None:
+            cache = {}
+        if not param_sets:
+            return np.zeros((0, len(df)), dtype=bool)
+        return np.vstack([cls(params).buy_signal_array(df, cache) for params in param_sets])
+
+    @classmethod
+    def get_trades_batch(cls, df: pd.DataFrame, param_sets: list) -> list:
+        """
+        批量提取多组参数的交易记录
+
+        各参数组共享同一份指标缓存，信号以 (参数 × 交易日) 矩阵一次算出。
+
+        Returns:
+            与 param_sets 等长的列表，每项为该组参数的交易记录列表
+        """
+        strategies = [cls(params) for params in param_sets]
+        signal_matrix = cls.calculate_signal_matrix(df, param_sets)
+        return [strategy._extract_trades(df, signal_matrix[p])
+                for p, strategy in enumerate(strategies)]
+
+    def _extract_trades(self, df: pd.DataFrame, buy_signal: np.ndarray) -> list:
+        """
+        按持股天数从买入信号提取交易
+
+        买入后第 hold_days 个交易日收盘卖出（至少持有1个交易日），
+        卖出当日如有买入信号可重新买入。
+        """
+        n = len(df)
+        if n == 0:
+            return []
 
-        buy_date = None
-        buy_price = None
-        buy_idx = None
-        hold_counter = 0
-
-        for i in range(len(df_signals)):
-            row = df_signals.iloc[i]
-
-            # 如果当前持仓，增加计数器
-            if buy_date is not None:
-                hold_counter += 1
-
-            # 卖出条件1：达到持股天数
-            if buy_date is not None and hold_counter >= self.hold_days:
-                sell_date = row['日期']
-                sell_price = row['收盘']
-
-                profit_pct = (sell_price - buy_price) / buy_price * 100
-                profit_pct_after_fee = profit_pct - 0.1
-
-                trades.append({
-                    '买入日期': buy_date,
-                    '买入价': buy_price,
-                    '卖出日期': sell_date,
-                    '卖出价': sell_price,
-                    '持有天数': hold_counter,
-                    '收益率%': profit_pct_after_fee,
-                    '状态': '平仓',
-                })
-
-                # 重置持仓
-                buy_date = None
-                buy_price = None
-                buy_idx = None
-                hold_counter = 0
-
-            # 买入条件：没有持仓且有买入信号
-            if row['Buy_Signal'] and buy_date is None:
-                buy_date = row['日期']
-                buy_price = row['收盘']
-                buy_idx = i
-                hold_counter = 0
-
-        # 处理未平仓头寸
-        if buy_date is not None:
-            last_price = df_signals.iloc[-1]['收盘']
-            profit_pct = (last_price - buy_price) / buy_price * 100
-            profit_pct_after_fee = profit_pct - 0.1
+        hold = max(self.hold_days, 1)
+        buy_idx = np.flatnonzero(buy_signal)
+        close = df['收盘'].to_numpy()
+        dates = df['日期'].tolist()
 
+        trades = []
+        k = 0
+        while k < len(buy_idx):
+            e = int(buy_idx[k])
+            x = e + hold
+            is_open = x > n - 1
+            if is_open:
+                x = n - 1
+
+            buy_price = close[e]
+            sell_price = close[x]
+            profit_pct = (sell_price - buy_price) / buy_price * 100
             trades.append({
-                '买入日期': buy_date,
+                '买入日期': dates[e],
                 '买入价': buy_price,
-                '卖出日期': df_signals.iloc[-1]['日期'],
-                '卖出价': last_price,
-                '持有天数': hold_counter,
-                '收益率%': profit_pct_after_fee,
-                '状态': '未平仓',
+                '卖出日期': dates[x],
+                '卖出价': sell_price,
+                '持有天数': x - e,
+                '收益率%': profit_pct - 0.1,
+                '状态': '未平仓' if is_open else '平仓',
             })
 
+            if is_open:
+                break
+            k = int(np.searchsorted(buy_idx, x, side='left'))
+
         return trades
 
+    def get_trades(self, df: pd.DataFrame) -> list:
+        """
+        提取买卖点 - 修复版本
+
+        关键改进：
+        - 按交易日计数持股天数（信号数组 + 行号运算，无逐行循环）
+        - 在第hold_days个交易日后卖出
+        - 避免同一天连续买卖
+        """
+        return self._extract_trades(df, self.buy_signal_array(df))
+
 
 class SteadyTrendStrategy:
     """稳健型趋势跟踪策略 - 保持原有逻辑"""
@@ -191,69 +269,21 @@ class SteadyTrendStrategy:
         return df
 
     def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
+        """提取交易记录（基于通用出场引擎）"""
         df_signals = self.calculate_signals(df)
-        trades = []
-
-        position = None
-
-        for i in range(len(df_signals)):
-            row = df_signals.iloc[i]
-
-            # 买入逻辑
-            if row['Buy_Signal'] and position is None:
-                position = {
-                    'buy_date': row['日期'],
-                    'buy_price': row['收盘'],
-                    'highest_price': row['收盘'],
-                }
-                continue
-
-            # 持仓期间更新最高价
-            if position is not None:
-                position['highest_price'] = max(position['highest_price'], row['收盘'])
-
-                current_price = row['收盘']
-                entry_price = position['buy_price']
-                profit_pct = (current_price - entry_price) / entry_price
-
-                sell_reason = None
-
-                # 止损
-                if profit_pct <= -self.stop_loss:
-                    sell_reason = '止损'
-
-                # 固定止盈
-                elif profit_pct >= self.take_profit:
-                    sell_reason = '止盈'
-
-                # 移动止盈
-                elif current_price < position['highest_price'] * (1 - self.trailing_stop):
-                    sell_reason = '移动止盈'
-
-                # 死叉卖出
-                elif row['Sell_Signal']:
-                    sell_reason = '死叉'
-
-                # 执行卖出
-                if sell_reason:
-                    hold_days = (row['日期'] - position['buy_date']).days
-                    profit = (current_price - entry_price) / entry_price * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': position['buy_date'],
-                        '买入价': position['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': sell_reason,
-                    })
-
-                    position = None
-
-        return trades
 
+        result = simulate_exits(
+            df_signals['收盘'].values,
+            df_signals['Buy_Signal'].values,
+            sell_signal=df_signals['Sell_Signal'].values,
+            rules=[
+                (STOP_LOSS, self.stop_loss, '止损'),
+                (TAKE_PROFIT, self.take_profit, '止盈'),
+                (TRAILING_STOP, self.trailing_stop, '移动止盈'),
+                (SIGNAL, None, '死叉'),
+            ],
+        )
+        return build_trade_records(df_signals['日期'], df_signals['收盘'].values, result)
 
 class AggressiveMomentumStrategy:
     """激进型突破动量策略 - 保持原有逻辑"""
@@ -323,68 +353,28 @@ class AggressiveMomentumStrategy:
         return df
 
     def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
+        """提取交易记录（基于通用出场引擎）"""
         df_signals = self.calculate_signals(df)
-        trades = []
-
-        position = None
-
-        for i in range(len(df_signals)):
-            row = df_signals.iloc[i]
-
-            if row['Buy_Signal'] and position is None:
-                position = {
-                    'buy_date': row['日期'],
-                    'buy_price': row['收盘'],
-                    'highest_price': row['收盘'],
-                }
-                continue
-
-            if position is not None:
-                position['highest_price'] = max(position['highest_price'], row['收盘'])
-
-                current_price = row['收盘']
-                entry_price = position['buy_price']
-                atr = row['ATR_14'] if 'ATR_14' in df_signals.columns else 0
-                hold_days = (row['日期'] - position['buy_date']).days
-
-                sell_reason = None
-
-                # ATR动态止损
-                if atr > 0:
-                    atr_stop = entry_price - (atr * self.atr_stop_mult)
-                    if current_price <= atr_stop:
-                        sell_reason = 'ATR止损'
-
-                # 时间止损
-                if sell_reason is None and hold_days >= self.max_hold_days:
-                    sell_reason = '时间止损'
-
-                # KDJ死叉
-                if sell_reason is None and row['Sell_Signal']:
-                    sell_reason = 'KDJ死叉'
-
-                # 移动止盈
-                if sell_reason is None and current_price < position['highest_price'] * (1 - self.trailing_stop):
-                    sell_reason = '移动止盈'
-
-                if sell_reason:
-                    profit = (current_price - entry_price) / entry_price * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': position['buy_date'],
-                        '买入价': position['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': sell_reason,
-                    })
-
-                    position = None
-
-        return trades
 
+        if 'ATR_14' in df_signals.columns:
+            atr = df_signals['ATR_14'].values
+        else:
+            atr = np.zeros(len(df_signals))
+
+        result = simulate_exits(
+            df_signals['收盘'].values,
+            df_signals['Buy_Signal'].values,
+            sell_signal=df_signals['Sell_Signal'].values,
+            atr=atr,
+            dates=dates_to_ns(df_signals['日期']),
+            rules=[
+                (ATR_STOP, self.atr_stop_mult, 'ATR止损'),
+                (TIME_STOP, self.max_hold_days, '时间止损'),
+                (SIGNAL, None, 'KDJ死叉'),
+                (TRAILING_STOP, self.trailing_stop, '移动止盈'),
+            ],
+        )
+        return build_trade_records(df_signals['日期'], df_signals['收盘'].values, result)
 
 class BalancedMultiFactorStrategy:
     """平衡型多因子策略 - 保持原有逻辑（代码略）"""
@@ -466,6 +456,75 @@ class BalancedMultiFactorStrategy:
         total_score = sum(scores.values())
         return total_score
 
+    def calculate_factor_scores(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        向量化计算所有行的多因子评分（与 calculate_factor_score 逐行结果一致）
+
+        Returns:
+            DataFrame，列: Factor_Boll | Factor_RSI | Factor_MACD | Factor_Volume |
+                           Factor_Price | Factor_Score（前20行均为0）
+        """
+        n = len(df)
+        close = df['收盘'].to_numpy(dtype=float)
+        zeros = np.zeros(n)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 布林带位置
+            if 'BOLL_UPPER' in df.columns and 'BOLL_LOWER' in df.columns:
+                lower = df['BOLL_LOWER'].to_numpy(dtype=float)
+                boll_range = df['BOLL_UPPER'].to_numpy(dtype=float) - lower
+                boll_position = (close - lower) / boll_range
+                boll = np.where(boll_range > 0, (1 - boll_position) * self.factor_weight_boll, 0.0)
+            else:
+                boll = zeros
+
+            # RSI超卖
+            rsi_col = f'RSI_{self.rsi_period}'
+            if rsi_col in df.columns:
+                rsi_values = df[rsi_col].to_numpy(dtype=float)
+                rsi_score = (self.rsi_oversold - rsi_values) / self.rsi_oversold
+                rsi = np.where(rsi_values < self.rsi_oversold, rsi_score * self.factor_weight_rsi, 0.0)
+            else:
+                rsi = zeros
+
+            # MACD柱为正 / 递增
+            if 'MACD_HIST' in df.columns:
+                hist = df['MACD_HIST'].to_numpy(dtype=float)
+                macd_positive = (hist > 0).astype(float)
+                macd_increasing = np.zeros(n)
+                macd_increasing[1:] = hist[1:] > hist[:-1]
+                macd = (macd_positive * 0.5 + macd_increasing * 0.5) * self.factor_weight_macd
+            else:
+                macd = zeros
+
+            # 成交量相对前20日均量（不含当日）
+            if 'VOLUME_MA20' in df.columns:
+                volume = df['成交量'].to_numpy(dtype=float)
+                volume_ma20 = _prev_window_mean(volume, 20)
+                volume_ratio = np.where(volume_ma20 > 0, volume / volume_ma20, 0.0)
+                volume_score = np.where((volume_ratio >= 0.8) & (volume_ratio <= 1.5),
+                                        self.factor_weight_volume, 0.0)
+            else:
+                volume_score = zeros
+
+            # 价格在前20日高低区间中的位置（不含当日）
+            low_20 = df['低'].rolling(window=20, min_periods=1).min().shift(1).to_numpy(dtype=float)
+            high_20 = df['高'].rolling(window=20, min_periods=1).max().shift(1).to_numpy(dtype=float)
+            price_position = (close - low_20) / (high_20 - low_20)
+            price = np.where(high_20 > low_20, (1 - price_position) * self.factor_weight_price, 0.0)
+
+        scores = pd.DataFrame({
+            'Factor_Boll': boll,
+            'Factor_RSI': rsi,
+            'Factor_MACD': macd,
+            'Factor_Volume': volume_score,
+            'Factor_Price': price,
+        }, index=df.index)
+        scores.iloc[:20] = 0.0
+        scores['Factor_Score'] = (scores['Factor_Boll'] + scores['Factor_RSI'] + scores['Factor_MACD']
+                                  + scores['Factor_Volume'] + scores['Factor_Price'])
+        return scores
+
     def calculate_signals(self, df: pd.DataFrame) -> pd.DataFrame:
         """计算买卖信号"""
         df = add_all_indicators(df, {
@@ -477,10 +536,9 @@ class BalancedMultiFactorStrategy:
             'atr': False,
         })
 
-        df['Factor_Score'] = 0.0
-        for i in range(len(df)):
-            if i >= 20:
-                df.loc[df.index[i], 'Factor_Score'] = self.calculate_factor_score(df, i)
+        factor_scores = self.calculate_factor_scores(df)
+        for col in factor_scores.columns:
+            df[col] = factor_scores[col]
 
         high_score = df['Factor_Score'] > self.min_factor_score
         near_lower = df['收盘'] < df['BOLL_LOWER'] * 1.02
@@ -496,65 +554,22 @@ class BalancedMultiFactorStrategy:
         return df
 
     def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
+        """提取交易记录（基于通用出场引擎）"""
         df_signals = self.calculate_signals(df)
-        trades = []
-
-        position = None
-
-        for i in range(len(df_signals)):
-            row = df_signals.iloc[i]
-
-            if row['Buy_Signal'] and position is None:
-                position = {
-                    'buy_date': row['日期'],
-                    'buy_price': row['收盘'],
-                    'highest_price': row['收盘'],
-                }
-                continue
-
-            if position is not None:
-                position['highest_price'] = max(position['highest_price'], row['收盘'])
-
-                current_price = row['收盘']
-                entry_price = position['buy_price']
-                profit_pct = (current_price - entry_price) / entry_price
-
-                sell_reason = None
-
-                if profit_pct <= -self.stop_loss:
-                    sell_reason = '止损'
-
-                elif profit_pct >= self.take_profit_final:
-                    sell_reason = '最终止盈'
-
-                elif profit_pct >= self.take_profit_2:
-                    sell_reason = '第二批止盈'
-
-                elif profit_pct >= self.take_profit_1:
-                    sell_reason = '第一批止盈'
-
-                elif row['Sell_Signal']:
-                    sell_reason = '技术信号'
-
-                if sell_reason:
-                    hold_days = (row['日期'] - position['buy_date']).days
-                    profit = (current_price - entry_price) / entry_price * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': position['buy_date'],
-                        '买入价': position['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': sell_reason,
-                    })
-
-                    position = None
-
-        return trades
 
+        result = simulate_exits(
+            df_signals['收盘'].values,
+            df_signals['Buy_Signal'].values,
+            sell_signal=df_signals['Sell_Signal'].values,
+            rules=[
+                (STOP_LOSS, self.stop_loss, '止损'),
+                (TAKE_PROFIT, self.take_profit_final, '最终止盈'),
+                (TAKE_PROFIT, self.take_profit_2, '第二批止盈'),
+                (TAKE_PROFIT, self.take_profit_1, '第一批止盈'),
+                (SIGNAL, None, '技术信号'),
+            ],
+        )
+        return build_trade_records(df_signals['日期'], df_signals['收盘'].values, result)
 
 if __name__ == "__main__":
     from config import STRATEGY_PARAMS
@@ -2,9 +2,14 @@
 新增策略模块 - 经典高成功率策略实现
 包含：双均线交叉策略、网格交易策略、海龟交易法则
 """
+import heapq
 import pandas as pd
 import numpy as np
 from indicators import add_all_indicators, calculate_ma, calculate_atr
+from exit_engine import (
+    simulate_exits, build_trade_records, dates_to_ns, NS_PER_DAY,
+    STOP_LOSS, TAKE_PROFIT, TRAILING_STOP, SIGNAL,
+)
 
 
 class DoubleMACrossStrategy:
@@ -121,95 +126,28 @@ class DoubleMACrossStrategy:
         return df
 
     def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
+        """提取交易记录（基于通用出场引擎）"""
         df_signals = self.calculate_signals(df)
-        trades = []
-
-        position = None
-
-        for i in range(len(df_signals)):
-            row = df_signals.iloc[i]
-
-            # 买入逻辑
-            if row['Buy_Signal'] and position is None:
-                position = {
-                    'buy_date': row['日期'],
-                    'buy_price': row['收盘'],
-                    'highest_price': row['收盘'],
-                    'hold_bars': 0,          # 已持有交易日数
-                    'force_exit_next': False, # 下一交易日强制卖出标记
-                }
-                continue
-
-            # 持仓期间
-            if position is not None:
-                position['hold_bars'] += 1
-                position['highest_price'] = max(position['highest_price'], row['收盘'])
-
-                current_price = row['收盘']
-                entry_price = position['buy_price']
-                profit_pct = (current_price - entry_price) / entry_price
-
-                sell_reason = None
-
-                # 超期强制卖出（最高优先级，上一交易日已达上限）
-                if position['force_exit_next']:
-                    sell_reason = '超期卖出'
-
-                # 止损
-                elif self.use_stop_loss and profit_pct <= -self.stop_loss:
-                    sell_reason = '止损'
-
-                # 固定止盈
-                elif self.use_take_profit and profit_pct >= self.take_profit:
-                    sell_reason = '止盈'
-
-                # 移动止盈
-                elif current_price < position['highest_price'] * (1 - self.trailing_stop):
-                    sell_reason = '移动止盈'
-
-                # 死叉卖出
-                elif row['Sell_Signal']:
-                    sell_reason = '死叉'
-
-                # 尚未卖出时：检查是否到达最大持仓天数，标记下一交易日强制卖出
-                if sell_reason is None and self.max_hold_days > 0 and position['hold_bars'] >= self.max_hold_days:
-                    position['force_exit_next'] = True
-
-                # 执行卖出
-                if sell_reason:
-                    hold_days = (row['日期'] - position['buy_date']).days
-                    profit = (current_price - entry_price) / entry_price * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': position['buy_date'],
-                        '买入价': position['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': sell_reason,
-                    })
 
-                    position = None
-
-        # 处理未平仓头寸
-        if position is not None:
-            last_row = df_signals.iloc[-1]
-            hold_days = (last_row['日期'] - position['buy_date']).days
-            profit = (last_row['收盘'] - position['buy_price']) / position['buy_price'] * 100 - 0.1
-
-            trades.append({
-                '买入日期': position['buy_date'],
-                '买入价': position['buy_price'],
-                '卖出日期': last_row['日期'],
-                '卖出价': last_row['收盘'],
-                '持有天数': hold_days,
-                '收益率%': profit,
-                '状态': '未平仓',
-            })
-
-        return trades
+        rules = []
+        if self.use_stop_loss:
+            rules.append((STOP_LOSS, self.stop_loss, '止损'))
+        if self.use_take_profit:
+            rules.append((TAKE_PROFIT, self.take_profit, '止盈'))
+        rules.append((TRAILING_STOP, self.trailing_stop, '移动止盈'))
+        rules.append((SIGNAL, None, '死叉'))
+
+        # 超期强制卖出：达到 max_hold_days 的下一交易日以最高优先级卖出
+        result = simulate_exits(
+            df_signals['收盘'].values,
+            df_signals['Buy_Signal'].values,
+            sell_signal=df_signals['Sell_Signal'].values,
+            rules=rules,
+            max_hold_bars=self.max_hold_days,
+            max_hold_label='超期卖出',
+            close_open=True,
+        )
+        return build_trade_records(df_signals['日期'], df_signals['收盘'].values, result)
 
 
 class GridTradingStrategy:
@@ -347,99 +285,134 @@ class GridTradingStrategy:
 
         return df
 
-    def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
-        df = df.copy()
+    def _rebalance_grid(self, df: pd.DataFrame, close: np.ndarray) -> tuple:
+        """
+        预计算每根K线所属网格（按 rebalance_days 周期重置）的基准价和格间距
+
+        与 calculate_grid_levels 一致：基准价为重置日收盘价；固定百分比网格的
+        格间距基于重置日及其前 rebalance_days 根收盘价的均值（共 rebalance_days+1 根）。
+
+        Returns:
+            (bars, ref_price, grid_size)，bars 为参与交易的K线行号
+        """
+        n = len(close)
+        rd = self.rebalance_days
+        bars = np.arange(rd, n)
+        if rd > 0:
+            reset_bars = rd + (bars - rd) // rd * rd
+        else:
+            reset_bars = bars
 
-        # 计算ATR（如果需要）
         if self.use_atr:
-            df['ATR_14'] = calculate_atr(df, self.atr_period)
+            atr = calculate_atr(df, self.atr_period).to_numpy(dtype=float)
+            grid_size = atr * self.atr_multiplier
+        else:
+            # 滚动均价（窗口含当日，忽略NaN，与切片 .mean() 结果一致）
+            window = rd + 1
+            base_price = np.full(n, np.nan)
+            if n >= window:
+                valid = ~np.isnan(close)
+                sums = np.lib.stride_tricks.sliding_window_view(np.where(valid, close, 0.0), window).sum(axis=1)
+                counts = np.lib.stride_tricks.sliding_window_view(valid, window).sum(axis=1)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    base_price[window - 1:] = np.where(counts > 0, sums / counts, np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                grid_size = base_price * self.price_range / self.grid_levels
+
+        return bars, close[reset_bars], grid_size[reset_bars]
+
+    def _first_exit(self, close: np.ndarray, start: int, buy_price: float) -> tuple:
+        """
+        从 start（含）开始查找持仓的首个出场K线
+
+        Returns:
+            (出场行号, 是否为止盈)；未出场返回 (-1, False)
+        """
+        n = len(close)
+        j = start
+        block = 32
+        while j < n:
+            seg = close[j:j + block]
+            with np.errstate(invalid='ignore'):
+                profit_pct = (seg - buy_price) / buy_price
+                take_profit = profit_pct >= self.grid_profit
+                hit = take_profit | (-profit_pct >= self.stop_loss)
+            if hit.any():
+                k = int(np.argmax(hit))
+                return j + k, bool(take_profit[k])
+            j += block
+            block *= 2
+        return -1, False
+
+    def get_trades(self, df: pd.DataFrame) -> list:
+        """
+        提取交易记录（数组实现）
 
+        各网格持仓的止盈/止损互不影响，可独立求出场日；只有入场受
+        max_positions 限制，因此按候选入场日顺序推进，并用出场日小顶堆维护持仓数。
+        """
+        n = len(df)
+        if n <= self.rebalance_days or self.grid_levels <= 0:
+            return []
+
+        close = df['收盘'].to_numpy(dtype=float)
+        bars, ref_price, grid_size = self._rebalance_grid(df, close)
+
+        # 价格触及任意一档买入线（各档单调排列，只需比较首末两档）
+        with np.errstate(invalid='ignore'):
+            first_level = ref_price - grid_size * 1
+            last_level = ref_price - grid_size * self.grid_levels
+            current = close[bars]
+            touched = (current <= first_level) | (current <= last_level)
+        candidates = bars[touched]
+
+        entry_idx, exit_idx, is_profit = [], [], []
+        open_exits = []  # 持仓出场行号小顶堆（-1 记为 n，表示持有至末尾）
+        for i in candidates.tolist():
+            while open_exits and open_exits[0] < i:
+                heapq.heappop(open_exits)
+            if len(open_exits) >= self.max_positions:
+                continue
+            x, profit_hit = self._first_exit(close, i, close[i])
+            entry_idx.append(i)
+            exit_idx.append(x)
+            is_profit.append(profit_hit)
+            heapq.heappush(open_exits, x if x >= 0 else n)
+
+        if not entry_idx:
+            return []
+
+        entry_idx = np.asarray(entry_idx, dtype=np.int64)
+        exit_idx = np.asarray(exit_idx, dtype=np.int64)
+        is_profit = np.asarray(is_profit, dtype=bool)
+
+        # 已平仓按出场日排序（同日按建仓顺序），未平仓按建仓顺序排在最后
+        closed = np.flatnonzero(exit_idx >= 0)
+        closed = closed[np.lexsort((entry_idx[closed], exit_idx[closed]))]
+        still_open = np.flatnonzero(exit_idx < 0)
+
+        date_values = df['日期'].tolist()
+        date_ns = dates_to_ns(df['日期'])
         trades = []
-        positions = []  # 多个持仓网格
-        last_rebalance = 0
-        grid_levels = None
-
-        for i in range(self.rebalance_days, len(df)):
-            row = df.iloc[i]
-            current_price = row['收盘']
-
-            # 定期重置网格
-            if i - last_rebalance >= self.rebalance_days or grid_levels is None:
-                grid_levels = self.calculate_grid_levels(df, i)
-                last_rebalance = i
-
-            # 检查买入信号（价格触及买入线）
-            if len(positions) < self.max_positions:
-                for buy_level in grid_levels['buy_levels']:
-                    if current_price <= buy_level:
-                        positions.append({
-                            'buy_date': row['日期'],
-                            'buy_price': current_price,
-                            'target_price': current_price * (1 + self.grid_profit),
-                            'grid_level': buy_level,
-                        })
-                        break
-
-            # 检查卖出信号（达到目标收益 或 触发止损）
-            positions_to_remove = []
-            for pos_idx, pos in enumerate(positions):
-                profit_pct = (current_price - pos['buy_price']) / pos['buy_price']
-
-                # 达到目标收益
-                if profit_pct >= self.grid_profit:
-                    hold_days = (row['日期'] - pos['buy_date']).days
-                    profit = profit_pct * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': pos['buy_date'],
-                        '买入价': pos['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': '网格止盈',
-                    })
-
-                    positions_to_remove.append(pos_idx)
-
-                # 触发止损
-                elif -profit_pct >= self.stop_loss:
-                    hold_days = (row['日期'] - pos['buy_date']).days
-                    profit = profit_pct * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': pos['buy_date'],
-                        '买入价': pos['buy_price'],
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': '止损',
-                    })
-
-                    positions_to_remove.append(pos_idx)
-
-            # 移除已平仓的网格
-            for idx in reversed(positions_to_remove):
-                positions.pop(idx)
-
-        # 处理未平仓头寸
-        if positions:
-            last_row = df.iloc[-1]
-            for pos in positions:
-                hold_days = (last_row['日期'] - pos['buy_date']).days
-                profit = (last_row['收盘'] - pos['buy_price']) / pos['buy_price'] * 100 - 0.1
-
-                trades.append({
-                    '买入日期': pos['buy_date'],
-                    '买入价': pos['buy_price'],
-                    '卖出日期': last_row['日期'],
-                    '卖出价': last_row['收盘'],
-                    '持有天数': hold_days,
-                    '收益率%': profit,
-                    '状态': '未平仓',
-                })
+        for t in closed.tolist() + still_open.tolist():
+            e = entry_idx[t]
+            x = exit_idx[t] if exit_idx[t] >= 0 else n - 1
+            if exit_idx[t] < 0:
+                status = '未平仓'
+            else:
+                status = '网格止盈' if is_profit[t] else '止损'
+
+            buy_price = close[e]
+            sell_price = close[x]
+            trades.append({
+                '买入日期': date_values[e],
+                '买入价': buy_price,
+                '卖出日期': date_values[x],
+                '卖出价': sell_price,
+                '持有天数': int((date_ns[x] - date_ns[e]) // NS_PER_DAY),
+                '收益率%': (sell_price - buy_price) / buy_price * 100 - 0.1,
+                '状态': status,
+            })
 
         return trades
 
@@ -549,98 +522,153 @@ class TurtleTradingStrategy:
 
         return df
 
-    def get_trades(self, df: pd.DataFrame) -> list:
-        """提取交易记录"""
-        df_signals = self.calculate_signals(df)
-        trades = []
+    def prepare_arrays(self, df: pd.DataFrame, cache: dict = None) -> dict:
+        """
+        预计算唐奇安通道、ATR和趋势过滤数组（与 calculate_signals 口径一致）
 
-        position = None
-        units = []  # 记录每个单位的买入信息
-
-        for i in range(max(self.entry_period, self.atr_period), len(df_signals)):
-            row = df_signals.iloc[i]
-            current_price = row['收盘']
-            atr = row['ATR']
-
-            # 入场逻辑
-            if row['Entry_Signal'] and position is None:
-                # 首次建仓
-                position = {
-                    'entry_date': row['日期'],
-                    'entry_price': current_price,
-                    'highest_price': current_price,
-                    'atr': atr,
-                }
-                units = [{
-                    'price': current_price,
-                    'date': row['日期'],
-                }]
-                continue
+        Args:
+            df: 行情数据
+            cache: 可选的指标缓存字典。参数扫描时对同一只股票传入同一个字典，
+                   不同参数组合间相同周期的通道/ATR/均线只计算一次。
 
-            # 加仓逻辑（金字塔式）
-            if position is not None:
-                position['highest_price'] = max(position['highest_price'], current_price)
-
-                # 检查是否可以加仓
-                if len(units) < self.max_units:
-                    last_unit_price = units[-1]['price']
-                    # 价格上涨超过0.5倍ATR，加仓
-                    if current_price > last_unit_price + (atr * self.pyramid_atr):
-                        units.append({
-                            'price': current_price,
-                            'date': row['日期'],
-                        })
-
-                # 计算平均持仓成本
-                avg_price = sum(u['price'] for u in units) / len(units)
-                profit_pct = (current_price - avg_price) / avg_price
-
-                sell_reason = None
-
-                # ATR止损
-                atr_stop = avg_price - (atr * self.atr_stop_mult)
-                if current_price <= atr_stop:
-                    sell_reason = 'ATR止损'
-
-                # 出场信号
-                elif row['Exit_Signal']:
-                    sell_reason = '跌破出场线'
-
-                # 执行卖出
-                if sell_reason:
-                    hold_days = (row['日期'] - position['entry_date']).days
-                    profit = (current_price - avg_price) / avg_price * 100 - 0.1
-
-                    trades.append({
-                        '买入日期': position['entry_date'],
-                        '买入价': avg_price,
-                        '卖出日期': row['日期'],
-                        '卖出价': current_price,
-                        '持有天数': hold_days,
-                        '收益率%': profit,
-                        '状态': sell_reason,
-                        '加仓次数': len(units) - 1,
-                    })
-
-                    position = None
-                    units = []
-
-        # 处理未平仓头寸
-        if position is not None:
-            last_row = df_signals.iloc[-1]
-            avg_price = sum(u['price'] for u in units) / len(units)
-            hold_days = (last_row['日期'] - position['entry_date']).days
-            profit = (last_row['收盘'] - avg_price) / avg_price * 100 - 0.1
+        Returns:
+            {'close', 'entry_signal', 'exit_signal', 'atr', 'dates'}
+        """
+        if cache is None:
+            cache = {}
+
+        def cached(key, compute):
+            if key not in cache:
+                cache[key] = compute()
+            return cache[key]
+
+        close = cached('close', lambda: df['收盘'].to_numpy(dtype=float))
+        # 前一日的N日最高 / M日最低
+        prev_high_n = cached(('high_n', self.entry_period), lambda: (
+            df['高'].rolling(window=self.entry_period).max().shift(1).to_numpy(dtype=float)))
+        prev_low_n = cached(('low_n', self.exit_period), lambda: (
+            df['低'].rolling(window=self.exit_period).min().shift(1).to_numpy(dtype=float)))
+        atr = cached(('atr', self.atr_period), lambda: (
+            calculate_atr(df, self.atr_period).to_numpy(dtype=float)))
+
+        with np.errstate(invalid='ignore'):
+            if self.use_filter:
+                ma = cached(('ma', self.filter_period), lambda: (
+                    calculate_ma(df, self.filter_period).to_numpy(dtype=float)))
+                trend_up = close > ma
+            else:
+                trend_up = np.ones(len(close), dtype=bool)
+
+            entry_signal = (close > prev_high_n) & trend_up
+            exit_signal = close < prev_low_n
 
+        return {
+            'close': close,
+            'entry_signal': entry_signal,
+            'exit_signal': exit_signal,
+            'atr': atr,
+            'dates': df['日期'],
+        }
+
+    def simulate(self, arrays: dict) -> dict:
+        """
+        在数组上运行海龟入场/金字塔加仓/出场状态机
+
+        持仓期间维护单位数与买入价累加和，平均成本 = 累加和 / 单位数，
+        无需每根K线重新遍历所有单位。
+
+        Returns:
+            {'entry_idx', 'exit_idx', 'avg_price', 'units', 'reason'}
+            reason: 0=ATR止损, 1=跌破出场线, 2=未平仓
+        """
+        close = arrays['close'].tolist()
+        atr = arrays['atr'].tolist()
+        exit_signal = arrays['exit_signal'].tolist()
+        n = len(close)
+
+        start = max(self.entry_period, self.atr_period)
+        entry_bars = np.flatnonzero(arrays['entry_signal'])
+        entry_bars = entry_bars[entry_bars >= start]
+
+        entries, exits, avg_prices, unit_counts, reasons = [], [], [], [], []
+        k = 0
+        while k < len(entry_bars):
+            e = int(entry_bars[k])
+            unit_count = 1
+            unit_sum = 0
+            unit_sum += close[e]
+            last_unit_price = close[e]
+            avg_price = unit_sum / unit_count
+            x = -1
+            reason = 2
+
+            for j in range(e + 1, n):
+                c = close[j]
+                a = atr[j]
+
+                # 金字塔加仓：价格较上一单位上涨超过 pyramid_atr 倍ATR
+                if unit_count < self.max_units and c > last_unit_price + (a * self.pyramid_atr):
+                    unit_count += 1
+                    unit_sum += c
+                    last_unit_price = c
+
+                avg_price = unit_sum / unit_count
+
+                if c <= avg_price - (a * self.atr_stop_mult):
+                    x, reason = j, 0
+                    break
+                if exit_signal[j]:
+                    x, reason = j, 1
+                    break
+
+            entries.append(e)
+            avg_prices.append(avg_price)
+            unit_counts.append(unit_count)
+            reasons.append(reason)
+            if x < 0:
+                exits.append(n - 1)
+                break
+            exits.append(x)
+            k = int(np.searchsorted(entry_bars, x, side='right'))
+
+        return {
+            'entry_idx': np.asarray(entries, dtype=np.int64),
+            'exit_idx': np.asarray(exits, dtype=np.int64),
+            'avg_price': np.asarray(avg_prices, dtype=float),
+            'units': np.asarray(unit_counts, dtype=np.int64),
+            'reason': np.asarray(reasons, dtype=np.int8),
+        }
+
+    def get_trades(self, df: pd.DataFrame, cache: dict = None) -> list:
+        """提取交易记录（数组实现，cache 用法见 prepare_arrays）"""
+        if len(df) == 0:
+            return []
+
+        arrays = self.prepare_arrays(df, cache)
+        result = self.simulate(arrays)
+        if len(result['entry_idx']) == 0:
+            return []
+
+        labels = ['ATR止损', '跌破出场线', '未平仓']
+        close = arrays['close']
+        date_values = arrays['dates'].tolist()
+        date_ns = dates_to_ns(arrays['dates'])
+
+        trades = []
+        for t in range(len(result['entry_idx'])):
+            e = result['entry_idx'][t]
+            x = result['exit_idx'][t]
+            avg_price = float(result['avg_price'][t])
+            sell_price = close[x]
             trades.append({
-                '买入日期': position['entry_date'],
+                '买入日期': date_values[e],
                 '买入价': avg_price,
-                '卖出日期': last_row['日期'],
-                '卖出价': last_row['收盘'],
-                '持有天数': hold_days,
-                '收益率%': profit,
-                '状态': '未平仓',
-                '加仓次数': len(units) - 1,
+                '卖出日期': date_values[x],
+                '卖出价': sell_price,
+                '持有天数': int((date_ns[x] - date_ns[e]) // NS_PER_DAY),
+                '收益率%': (sell_price - avg_price) / avg_price * 100 - 0.1,
+                '状态': labels[result['reason'][t]],
+                '加仓次数': int(result['units'][t]) - 1,
             })
 
         return trades
@@ -0,0 +1,238 @@
+"""
+流式组合回测 - 大股票池下降低峰值内存
+
+run_multiple_stocks_with_portfolio 先把全部股票的完整行情读入 all_data，
+并在 stock_results 中保留每只股票的交易列表，内存随股票池线性增长。流式模式：
+- 按分块从缓存加载行情，生成交易后立即释放原始行情，只保留收盘价、成交额等紧凑数组
+- 每个分块的交易转为列式 TradeLedger 暂存；进程内存超出预算时写入临时目录并缩小加载分块
+- 逐只股票撮合按分块逐个读回处理，撮合后的分块同样留在磁盘，直到拼接最终账本
+- 事件驱动撮合需要全局时间顺序，一次性读回全部交易，只构建撮合用到的字段
+
+内存预算是软触发条件而不是硬上限：超出时只会写盘并缩小后续分块，
+收盘价数组、成交额排名、最终账本以及事件驱动撮合的全部交易仍随股票池增长。
+结果与 run_multiple_stocks_with_portfolio 一致，但 stock_results 不含逐笔交易，交易明细统一在 'ledger'。
+"""
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from backtest_engine_enhanced import (
+    EnhancedBacktestEngine,
+    PortfolioManager,
+    _build_turnover_rank_table,
+    _day_ns,
+    _turnover_frame,
+    pair_round_trips,
+)
+from parallel_signals import generate_trades
+from trade_ledger import TradeLedger
+from config import STREAM_CHUNK_SIZE, STREAM_MEMORY_BUDGET_MB
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 组合撮合读取的交易字段
+_MATCH_COLUMNS = ['买入日期', '买入价', '卖出日期', '卖出价', '状态']
+_STATUS_COLUMNS = ['portfolio_status', 'rejection_reason']
+
+
+def current_rss_mb():
+    """当前进程常驻内存（MB）；无法获取时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class LedgerSpill:
+    """按分块暂存交易账本；spill() 把内存中的分块写入临时目录，迭代时逐块读回"""
+
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self._items = []        # TradeLedger 或已写盘的文件路径
+        self._dir = None
+        self.spilled_chunks = 0
+
+    def append(self, ledger: TradeLedger):
+        self._items.append(ledger)
+
+    def spill(self):
+        """把仍在内存中的分块写入磁盘"""
+        if self._dir is None:
+            if self.spill_dir is not None:
+                Path(self.spill_dir).mkdir(parents=True, exist_ok=True)
+            self._dir = Path(tempfile.mkdtemp(prefix='backtest_spill_', dir=self.spill_dir))
+        for i, item in enumerate(self._items):
+            if isinstance(item, TradeLedger):
+                path = self._dir / f'chunk_{i:05d}.pkl'
+                with open(path, 'wb') as f:
+                    pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._items[i] = path
+                self.spilled_chunks += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        for item in self._items:
+            if isinstance(item, TradeLedger):
+                yield item
+            else:
+                with open(item, 'rb') as f:
+                    yield pickle.load(f)
+
+    def cleanup(self):
+        """删除临时文件"""
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+
+def _match_trades(ledger: TradeLedger) -> dict:
+    """账本 -> {symbol: 撮合用交易字典列表}（只含撮合读取的字段，按账本行顺序）"""
+    if 'symbol' not in ledger:
+        return {}
+    return {symbol: part.to_dicts(_MATCH_COLUMNS) for symbol, part in ledger.split_by_symbol().items()}
+
+
+def _with_statuses(ledger: TradeLedger, trades_by_symbol: dict) -> TradeLedger:
+    """把撮合写入的 portfolio_status / rejection_reason 合并回账本"""
+    statuses = TradeLedger.from_records([
+        {key: trade[key] for key in _STATUS_COLUMNS if key in trade}
+        for trades in trades_by_symbol.values() for trade in trades
+    ])
+    if not statuses.columns:
+        return ledger
+    return ledger.with_columns(
+        {key: statuses.data[key] for key in statuses.columns},
+        kinds=statuses.kinds, categories=statuses.categories, present=statuses.present,
+    )
+
+
+def run_streaming_backtest(engine: EnhancedBacktestEngine, symbols: list, load_data, strategy,
+                           chunk_size: int = None, memory_budget_mb: float = None,
+                           spill_dir=None, resume_from=None, progress_callback=None) -> dict:
+    """
+    流式多股票组合回测
+
+    Args:
+        engine: 回测引擎（撮合方式、成交额排名过滤等设置与普通模式相同）
+        symbols: 股票列表（顺序与普通模式的 all_data 顺序含义相同）
+        load_data: load_data(symbol) -> 行情 DataFrame 或 None，例如 DataManager.get_data_from_cache
+        strategy: 策略对象
+        chunk_size: 每次加载的股票数（默认 config.STREAM_CHUNK_SIZE）
+        memory_budget_mb: 进程 RSS 软预算（默认 config.STREAM_MEMORY_BUDGET_MB；0 = 不写盘），
+            超出时写盘并缩小加载分块，不保证峰值内存低于该值
+        spill_dir: 临时文件目录（默认系统临时目录）
+        resume_from: 断点快照（仅事件驱动撮合，见 run_multiple_stocks_with_portfolio）
+        progress_callback: progress_callback(已处理股票数, 股票总数, 阶段)
+
+    Returns:
+        与 run_multiple_stocks_with_portfolio 相同，stock_results 只含 num_trades / last_close；
+        另有 'streaming' 统计（分块数、写盘分块数、撮合后写盘分块数、峰值 RSS）
+    """
+    chunk_size = max(1, int(chunk_size or STREAM_CHUNK_SIZE))
+    budget = STREAM_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+    spill = LedgerSpill(spill_dir)
+    matched = LedgerSpill(spill_dir)
+    last_prices, closes, turnover_frames = {}, {}, []
+    stats = {'chunks': 0, 'spilled_chunks': 0, 'peak_rss_mb': current_rss_mb()}
+
+    def observe_memory():
+        rss = current_rss_mb()
+        if rss is None:
+            return False
+        stats['peak_rss_mb'] = max(stats['peak_rss_mb'] or 0.0, rss)
+        return bool(budget) and rss > budget
+
+    try:
+        # 第一阶段：分块加载 → 生成交易 → 释放行情
+        start = 0
+        while start < len(symbols):
+            chunk = symbols[start:start + chunk_size]
+            start += len(chunk)
+
+            backtest_data = {}
+            for symbol in chunk:
+                df = load_data(symbol)
+                if df is None or len(df) == 0:
+                    continue
+                if engine.turnover_rank_top_n > 0:
+                    turnover_frames.append(_turnover_frame(symbol, df))
+                df_backtest = engine.time_config.filter_data(df)
+                if len(df_backtest) == 0:
+                    continue
+                backtest_data[symbol] = df_backtest
+                last_prices[symbol] = float(df_backtest['收盘'].iloc[-1])
+                closes[symbol] = (_day_ns(df_backtest['日期']), df_backtest['收盘'].to_numpy(dtype=float))
+
+            trades_by_symbol = generate_trades(backtest_data, strategy, engine.n_jobs, engine.chunk_size)
+            del backtest_data
+            spill.append(TradeLedger.from_trades_by_symbol(trades_by_symbol))
+            del trades_by_symbol
+            stats['chunks'] += 1
+
+            if observe_memory():
+                spill.spill()
+                chunk_size = max(1, chunk_size // 2)
+            if progress_callback is not None:
+                progress_callback(start, len(symbols), 'signals')
+
+        turnover_ranks = None
+        if engine.turnover_rank_top_n > 0:
+            turnover_ranks = _build_turnover_rank_table(turnover_frames)
+        snapshot_context = engine._snapshot_context(strategy, closes, turnover_frames, resume_from)
+        del turnover_frames
+
+        # 第二阶段：组合撮合
+        if engine.event_driven:
+            ledger = TradeLedger.concat(list(spill))
+            trades_by_symbol = _match_trades(ledger)
+            results = engine.run_portfolio_events(trades_by_symbol, last_prices, turnover_ranks, closes,
+                                                  resume_from, snapshot_context)
+            ledger = _with_statuses(ledger, trades_by_symbol)
+            del trades_by_symbol
+        else:
+            pm = PortfolioManager(initial_capital=engine.initial_capital,
+                                  max_position_ratio=engine.max_position_ratio)
+            for chunk_ledger in spill:
+                chunk_trades = _match_trades(chunk_ledger)
+                engine._match_sequential(pm, chunk_trades, turnover_ranks)
+                matched.append(_with_statuses(chunk_ledger, chunk_trades))
+                del chunk_ledger, chunk_trades
+                # 输入已写盘时撮合结果也写盘，避免读回的分块在内存中累积
+                if spill.spilled_chunks or observe_memory():
+                    matched.spill()
+            ledger = TradeLedger.concat(list(matched))
+            results = engine._portfolio_results(pm, {}, last_prices, closes)
+        if progress_callback is not None:
+            progress_callback(len(symbols), len(symbols), 'portfolio')
+        observe_memory()
+        stats['spilled_chunks'] = spill.spilled_chunks
+        stats['spilled_matched_chunks'] = matched.spilled_chunks
+    finally:
+        spill.cleanup()
+        matched.cleanup()
+
+    # 每只股票只保留汇总，逐笔交易在账本中
+    symbol_names = ledger.categories.get('symbol', [])
+    counts = np.bincount(ledger.column('symbol'), minlength=len(symbol_names)) if len(ledger) else \
+        np.zeros(len(symbol_names), dtype=np.int64)
+    results['stock_results'] = {
+        symbol: {'num_trades': int(count), 'last_close': last_prices[symbol]}
+        for symbol, count in zip(symbol_names, counts)
+    }
+    results['ledger'] = ledger
+    results['round_trips'] = pair_round_trips(results['trade_history'], ledger)
+    results['streaming'] = stats
+    return results
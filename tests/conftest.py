@@ -97,6 +97,33 @@ def sample_stock_data_with_signals():
     return df
 
 
+def _random_walk_stock(seed: int, n: int = 300, start: str = '2024-01-01', sigma: float = 0.025,
+                       amount: tuple = (100000000, 1000000000), noisy_range: bool = False) -> pd.DataFrame:
+    """按种子生成随机游走行情（收盘价对数收益服从 N(0, sigma)）"""
+    rng = np.random.default_rng(seed)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    if noisy_range:
+        high = close * (1 + np.abs(rng.normal(0, 0.01, n)))
+        low = close * (1 - np.abs(rng.normal(0, 0.01, n)))
+    else:
+        high, low = close * 1.01, close * 0.99
+    return pd.DataFrame({
+        '日期': pd.bdate_range(start, periods=n),
+        '开盘': close,
+        '收盘': close,
+        '高': high,
+        '低': low,
+        '成交量': rng.integers(1000000, 10000000, n).astype(float),
+        '成交额': rng.integers(*amount, n).astype(float),
+    })
+
+
+@pytest.fixture
+def random_walk_stocks():
+    """随机游走行情工厂：random_walk_stocks(seed, n=300, start=..., sigma=..., amount=..., noisy_range=...)"""
+    return _random_walk_stock
+
+
 @pytest.fixture
 def sample_empty_dataframe():
     """创建空的DataFrame"""
@@ -0,0 +1,167 @@
+"""测试app_with_cache.py - 回测交易分页、后台任务与K线 ETag 接口"""
+import threading
+import pytest
+
+import app_with_cache
+import backtest_history
+import data_manager
+from backtest_cache import BacktestResultCache
+from data_manager import DataManager
+from job_manager import JobManager
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """使用临时数据库、回测缓存、任务管理器与历史记录文件的测试客户端"""
+    monkeypatch.setattr(data_manager, 'DB_FILE', tmp_path / 'stock_data.db')
+    monkeypatch.setattr(app_with_cache, 'manager', DataManager())
+    monkeypatch.setattr(app_with_cache, 'backtest_cache', BacktestResultCache(tmp_path / 'results'))
+    monkeypatch.setattr(app_with_cache, 'snapshot_cache', BacktestResultCache(tmp_path / 'snapshots'))
+    monkeypatch.setattr(app_with_cache, 'jobs', JobManager(max_workers=1))
+    monkeypatch.setattr(backtest_history, 'HISTORY_FILE', str(tmp_path / 'history.json'))
+    app_with_cache.app.config['TESTING'] = True
+    return app_with_cache.app.test_client()
+
+
+@pytest.fixture
+def cached_stocks(client, random_walk_stocks):
+    """写入缓存数据库的股票代码"""
+    symbols = [f'{600000 + seed}' for seed in range(3)]
+    for seed, symbol in enumerate(symbols):
+        app_with_cache.manager.save_data_to_cache(symbol, random_walk_stocks(seed, n=600))
+    return symbols
+
+
+def _wait_job(client, job_id):
+    """轮询任务直到结束"""
+    for _ in range(500):
+        state = client.get(f'/api/jobs/{job_id}').get_json()
+        if state['status'] in ('completed', 'failed', 'cancelled'):
+            return state
+        threading.Event().wait(0.02)
+    raise AssertionError('任务未结束')
+
+
+class TestBacktestTrades:
+    """测试 /api/backtest/trades 游标分页"""
+
+    @pytest.fixture
+    def round_trips(self, client):
+        round_trips = [{'trade_id': i} for i in range(45)]
+        app_with_cache.backtest_cache.put('k1', {'round_trips': round_trips})
+        return round_trips
+
+    def test_cursor_walks_all_pages(self, client, round_trips):
+        first = app_with_cache._trades_page(round_trips, 'k1')
+        assert first['trades_cursor'] == 'k1:20'
+        assert first['trades_total'] == 45
+
+        trades, cursor = list(first['trades']), first['trades_cursor']
+        while cursor is not None:
+            page = client.get('/api/backtest/trades', query_string={'cursor': cursor, 'limit': 20}).get_json()
+            assert page['success'] and page['offset'] == int(cursor.rpartition(':')[2])
+            trades += page['trades']
+            cursor = page['trades_cursor']
+        assert trades == round_trips
+
+    @pytest.mark.parametrize('limit, expected', [('0', 1), ('-5', 1), ('3', 3), ('100000', 10)])
+    def test_limit_clamped(self, client, round_trips, monkeypatch, limit, expected):
+        monkeypatch.setattr(app_with_cache, 'BACKTEST_TRADES_MAX_PAGE_SIZE', 10)
+        page = client.get('/api/backtest/trades', query_string={'cursor': 'k1:0', 'limit': limit}).get_json()
+        assert len(page['trades']) == expected
+        assert page['trades_cursor'] == f'k1:{expected}'
+
+    @pytest.mark.parametrize('cursor', ['', 'k1', 'k1:abc', ':5', 'k1:-1'])
+    def test_invalid_cursor(self, client, round_trips, cursor):
+        response = client.get('/api/backtest/trades', query_string={'cursor': cursor})
+        assert response.status_code == 400
+
+    def test_stale_key(self, client, round_trips):
+        """缓存中不存在的回测结果返回 404"""
+        response = client.get('/api/backtest/trades', query_string={'cursor': 'gone:20'})
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
+
+class TestBacktestJobs:
+    """测试后台回测任务的提交、查询与取消"""
+
+    def test_submit_and_fetch_pages(self, client, cached_stocks):
+        response = client.post('/api/backtest/jobs', json={
+            'symbols': cached_stocks, 'strategy': 'grid_trading', 'backtest_start': '2024-03-01'})
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        state = _wait_job(client, job_id)
+        assert state['status'] == 'completed', state['error']
+        result = state['result']
+        assert result['success'] and result['stocks_tested'] == len(cached_stocks)
+        assert state['done'] == state['total'] == len(cached_stocks)
+
+        # 第一页之后的游标指向任务写入的回测缓存
+        assert result['trades_total'] > 20 and len(result['trades']) == 20
+        key, _, offset = result['trades_cursor'].rpartition(':')
+        assert offset == '20' and app_with_cache.backtest_cache.get(key) is not None
+        page = client.get('/api/backtest/trades', query_string={'cursor': result['trades_cursor']}).get_json()
+        assert page['offset'] == 20 and page['trades_total'] == result['trades_total']
+        assert page['trades'] and page['trades'][0] != result['trades'][0]
+
+    def test_submit_without_data_fails(self, client):
+        job_id = client.post('/api/backtest/jobs', json={'symbols': ['999999']}).get_json()['job_id']
+        state = _wait_job(client, job_id)
+        assert state['status'] == 'failed'
+        assert '没有可用的缓存数据' in state['error']
+
+    def test_cancel(self, client):
+        started = threading.Event()
+
+        def work(job):
+            started.set()
+            while True:
+                job.check_cancelled()
+                threading.Event().wait(0.01)
+
+        job = app_with_cache.jobs.submit('backtest', work)
+        assert started.wait(5)
+        response = client.post(f'/api/jobs/{job.id}/cancel').get_json()
+        assert response['success'] and response['cancel_requested']
+        assert _wait_job(client, job.id)['status'] == 'cancelled'
+
+        # 已结束的任务不能再取消
+        response = client.post(f'/api/jobs/{job.id}/cancel').get_json()
+        assert response['success'] is False
+
+    def test_unknown_job(self, client):
+        assert client.get('/api/jobs/missing').status_code == 404
+        assert client.post('/api/jobs/missing/cancel').status_code == 404
+
+
+class TestSignalKline:
+    """测试信号K线的 ETag 条件请求与窗口大小限制"""
+
+    def test_if_none_match_returns_304(self, client, cached_stocks, random_walk_stocks):
+        url = f'/api/signals/kline/{cached_stocks[0]}'
+        first = client.get(url, query_string={'date': '2024-06-03'})
+        assert first.status_code == 200 and first.headers['ETag']
+
+        cached = client.get(url, query_string={'date': '2024-06-03'},
+                            headers={'If-None-Match': first.headers['ETag']})
+        assert cached.status_code == 304
+        assert cached.headers['ETag'] == first.headers['ETag']
+
+        # 参数或数据版本变化时 ETag 失效
+        other = client.get(url, query_string={'date': '2024-06-03', 'days': 5},
+                           headers={'If-None-Match': first.headers['ETag']})
+        assert other.status_code == 200
+        app_with_cache.manager.save_data_to_cache(cached_stocks[0], random_walk_stocks(0, n=601))  # 新增一个交易日
+        updated = client.get(url, query_string={'date': '2024-06-03'},
+                             headers={'If-None-Match': first.headers['ETag']})
+        assert updated.status_code == 200
+
+    @pytest.mark.parametrize('days, expected', [(-5, 3), (0, 3), (2, 5), (100000, 250 + 1 + 250)])
+    def test_days_clamped(self, client, cached_stocks, days, expected):
+        """days 限制在 1 ~ KLINE_WINDOW_MAX_DAYS，负数不会返回全部历史"""
+        response = client.get(f'/api/signals/kline/{cached_stocks[0]}',
+                              query_string={'date': '2025-02-03', 'days': days}).get_json()
+        assert response['success']
+        assert len(response['kline']) == expected
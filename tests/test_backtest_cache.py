@@ -0,0 +1,99 @@
+"""测试backtest_cache.py - 回测结果缓存"""
+import pytest
+import pandas as pd
+import numpy as np
+from backtest_cache import BacktestResultCache, backtest_cache_key
+from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig
+from strategy_new import TurtleTradingStrategy
+
+
+@pytest.fixture
+def time_config():
+    return BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+
+
+@pytest.fixture
+def key_args(time_config):
+    return dict(strategy='turtle', params={'entry_period': 20, 'use_filter': False},
+                symbols=['600000', '600001'], time_config=time_config,
+                trading_settings={'initial_capital': 100000, 'position_ratio': 0.2},
+                data_versions={'600000': 'v1', '600001': 'v1'})
+
+
+class TestCacheKey:
+    """测试缓存键"""
+
+    def test_params_order_irrelevant(self, key_args):
+        reordered = dict(key_args, params={'use_filter': False, 'entry_period': 20})
+        assert backtest_cache_key(**key_args) == backtest_cache_key(**reordered)
+
+    @pytest.mark.parametrize('field, value', [
+        ('strategy', 'grid'),
+        ('params', {'entry_period': 30, 'use_filter': False}),
+        ('symbols', ['600001', '600000']),
+        ('trading_settings', {'initial_capital': 200000, 'position_ratio': 0.2}),
+        ('data_versions', {'600000': 'v1', '600001': 'v2'}),
+    ])
+    def test_any_input_changes_key(self, key_args, field, value):
+        assert backtest_cache_key(**key_args) != backtest_cache_key(**dict(key_args, **{field: value}))
+
+    def test_time_config_object_or_dict(self, key_args, time_config):
+        as_dict = dict(key_args, time_config=vars(time_config).copy())
+        assert backtest_cache_key(**key_args) == backtest_cache_key(**as_dict)
+
+        later = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-04-01', '2025-02-28')
+        assert backtest_cache_key(**key_args) != backtest_cache_key(**dict(key_args, time_config=later))
+
+
+class TestBacktestResultCache:
+    """测试内存与磁盘两级缓存"""
+
+    def test_memory_lru_eviction(self, tmp_path):
+        cache = BacktestResultCache(tmp_path, max_memory_entries=2, persist=False)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, {'key': key})
+        cache.get('b')
+        cache.put('d', {'key': 'd'})
+
+        assert cache.get('c') is None
+        assert cache.get('b') == {'key': 'b'}
+        assert cache.get('d') == {'key': 'd'}
+        assert cache.info()['disk_entries'] == 0
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        BacktestResultCache(tmp_path).put('k', {'total_return': 1.5})
+
+        cache = BacktestResultCache(tmp_path)
+        assert cache.get('k') == {'total_return': 1.5}
+        assert cache.get('k') is cache.get('k')  # 之后从内存层返回同一对象
+        assert cache.stats == {'memory_hits': 2, 'disk_hits': 1, 'misses': 0}
+
+    def test_disk_eviction_and_clear(self, tmp_path):
+        cache = BacktestResultCache(tmp_path, max_memory_entries=1, max_disk_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.put(key, {'key': key})
+
+        assert sorted(p.stem for p in tmp_path.glob('*.pkl')) == ['b', 'c']
+        cache.clear()
+        assert cache.get('c') is None
+        assert cache.info()['disk_entries'] == 0
+
+    def test_corrupt_file_is_miss(self, tmp_path):
+        (tmp_path / 'bad.pkl').write_bytes(b'not a pickle')
+        cache = BacktestResultCache(tmp_path)
+
+        assert cache.get('bad') is None
+        assert not (tmp_path / 'bad.pkl').exists()
+
+    def test_round_trips_engine_results(self, tmp_path, time_config, random_walk_stocks):
+        """组合回测结果（含账本与每日净值序列）经磁盘缓存后保持一致"""
+        stocks_data = {f'{600000 + seed}': random_walk_stocks(seed) for seed in range(3)}
+        engine = EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, time_config=time_config)
+        results = engine.run_multiple_stocks_with_portfolio(stocks_data, TurtleTradingStrategy({'use_filter': False}))
+
+        BacktestResultCache(tmp_path).put('run', results)
+        cached = BacktestResultCache(tmp_path).get('run')
+
+        assert cached['portfolio_summary'] == results['portfolio_summary']
+        assert cached['ledger'].records() == results['ledger'].records()
+        np.testing.assert_array_equal(cached['daily_series']['nav'], results['daily_series']['nav'])
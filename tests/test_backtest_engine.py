@@ -31,6 +31,21 @@ class TestBacktestEngine:
         assert engine.commission_rate == 0.001
 
 
+class TestTradingCostsBatch:
+    """测试列式成本计算"""
+
+    def test_matches_per_trade(self):
+        """批量结果与逐笔 apply_trading_costs 一致（含非正价格）"""
+        rng = np.random.default_rng(0)
+        trades = [{'买入价': float(b), '卖出价': float(s), '状态': '平仓'}
+                  for b, s in zip(rng.uniform(1, 200, 200), rng.uniform(1, 200, 200))]
+        trades[0]['买入价'] = 0.0
+        engine = BacktestEngine(commission_rate=0.0003, slippage=0.001)
+
+        assert engine.apply_trading_costs_batch(trades) == [engine.apply_trading_costs(t) for t in trades]
+        assert engine.apply_trading_costs_batch([]) == []
+
+
 class TestRunSingleStock:
     """测试单只股票回测"""
 
@@ -190,6 +205,40 @@ class TestRunMultipleStocks:
         assert len(results) == 0
 
 
+class TestRunParamBatch:
+    """测试多组参数批量回测"""
+
+    class BatchStrategy:
+        """按参数组返回固定收益交易的模拟策略类"""
+
+        @staticmethod
+        def get_trades_batch(df, param_sets):
+            return [[{'买入价': 10.0, '卖出价': 10.0 * (1 + p['gain'])}] if p['gain'] else []
+                    for p in param_sets]
+
+    def test_results_per_param_set(self, sample_multiple_stocks_data):
+        """每组参数得到一份与 run_multiple_stocks 同结构的结果"""
+        engine = BacktestEngine()
+        param_sets = [{'gain': 0.1}, {'gain': 0}, {'gain': -0.05}]
+
+        batch = engine.run_param_batch(sample_multiple_stocks_data, self.BatchStrategy, param_sets)
+
+        assert len(batch) == 3
+        assert set(batch[0]) == set(sample_multiple_stocks_data)
+        assert batch[1] == {}  # 无交易的股票被跳过
+        assert batch[0]['000001']['total_return'] > 0
+        assert batch[2]['000001']['total_return'] < 0
+
+    def test_skip_insufficient_data(self, sample_stock_data_short):
+        """数据不足的股票被跳过"""
+        engine = BacktestEngine()
+
+        batch = engine.run_param_batch({'000001': sample_stock_data_short, '000002': None},
+                                       self.BatchStrategy, [{'gain': 0.1}])
+
+        assert batch == [{}]
+
+
 class TestAggregateResults:
     """测试结果聚合"""
 
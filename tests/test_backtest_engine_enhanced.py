@@ -0,0 +1,483 @@
+"""测试backtest_engine_enhanced.py - 增强版回测引擎（组合模式）"""
+import pytest
+import pandas as pd
+import numpy as np
+from backtest_engine_enhanced import (
+    PortfolioManager,
+    EnhancedBacktestEngine,
+    BacktestTimeConfig,
+    TurnoverRankTable,
+    _build_prev_day_turnover_ranks,
+    pair_round_trips,
+)
+from trade_ledger import TradeLedger
+from strategy_new import TurtleTradingStrategy, DoubleMACrossStrategy
+
+
+@pytest.fixture
+def portfolio_stocks_data(random_walk_stocks):
+    """多只随机游走股票"""
+    return {f'{600000 + seed}': random_walk_stocks(seed) for seed in range(8)}
+
+
+def _make_engine(turnover_rank_top_n=0):
+    time_config = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+    return EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2,
+                                  time_config=time_config, turnover_rank_top_n=turnover_rank_top_n)
+
+
+class TestPortfolioManager:
+    """测试投资组合仓位管理"""
+
+    def test_running_totals_match_positions(self):
+        """随机买卖序列中增量汇总值始终与逐笔持仓一致"""
+        rng = np.random.default_rng(0)
+        pm = PortfolioManager(initial_capital=1000000, max_position_ratio=0.8)
+        symbols = ['600000', '600001', '600002']
+        for day in range(500):
+            symbol = symbols[rng.integers(len(symbols))]
+            if rng.random() < 0.55:
+                pm.buy(symbol, 100 * int(rng.integers(1, 50)), float(rng.uniform(5, 20)),
+                       float(rng.uniform(1, 10)), day)
+            elif pm.positions.get(symbol):
+                pm.sell(symbol, pm.positions[symbol][0]['shares'], float(rng.uniform(5, 20)), 1.0, day)
+            pm.check_invariants()
+
+        expected = sum(pos['entry_cost'] for lots in pm.positions.values() for pos in lots)
+        assert pm.get_total_position_value() == pytest.approx(expected)
+        assert pm.trade_history[-1]['open_positions'] == pm.get_open_lots()
+
+    def test_fifo_and_reset_when_flat(self):
+        """卖出按 FIFO 出队；全部平仓后持仓成本归零"""
+        pm = PortfolioManager(initial_capital=100000)
+        pm.buy('600000', 100, 10.0, 5.0, '2024-01-02')
+        pm.buy('600000', 100, 11.0, 5.0, '2024-01-03')
+        pm.sell('600000', 100, 12.0, 5.0, '2024-01-04')
+
+        assert pm.trade_history[-1]['profit'] == pytest.approx(1200 - 5 - 1005)
+        assert pm.get_open_lots() == 1
+
+        pm.sell('600000', 100, 12.0, 5.0, '2024-01-05')
+        assert pm.get_total_position_value() == 0.0
+        assert pm.get_open_lots() == 0
+        assert '600000' not in pm.positions
+        pm.check_invariants()
+
+    def test_partial_sell_rejected(self):
+        """卖出数量与持仓不一致时报错，持仓不变"""
+        pm = PortfolioManager(initial_capital=100000)
+        pm.buy('600000', 200, 10.0, 5.0, '2024-01-02')
+        with pytest.raises(ValueError):
+            pm.sell('600000', 100, 12.0, 5.0, '2024-01-04', trade_id=0)
+
+        assert pm.get_open_lots() == 1
+        assert pm.positions['600000'][0]['shares'] == 200
+        pm.check_invariants()
+
+    def test_rejects_over_limit(self):
+        """超过最大仓位限制时拒绝建仓，汇总值不变"""
+        pm = PortfolioManager(initial_capital=100000, max_position_ratio=0.5)
+        assert pm.buy('600000', 4000, 10.0, 5.0, '2024-01-02')
+        assert not pm.buy('600001', 1000, 10.0, 5.0, '2024-01-02')
+
+        assert pm.get_open_lots() == 1
+        assert pm.rejected_trades[0]['symbol'] == '600001'
+        pm.check_invariants()
+
+    def test_trade_ids_link_buy_and_sell(self):
+        """卖出记录默认指向 FIFO 出队持仓的 trade_id，也可指定平仓的往返交易"""
+        pm = PortfolioManager(initial_capital=100000)
+        pm.buy('600000', 100, 10.0, 5.0, '2024-01-02')
+        pm.buy('600000', 100, 11.0, 5.0, '2024-01-03')
+        pm.buy('600001', 100, 12.0, 5.0, '2024-01-03')
+        pm.sell('600000', 100, 12.0, 5.0, '2024-01-04')
+        pm.sell('600000', 100, 12.0, 5.0, '2024-01-05', trade_id=1)
+
+        assert [t['trade_id'] for t in pm.trade_history] == [0, 1, 2, 0, 1]
+        # 指定 trade_id 时按该笔持仓结算成本
+        assert pm.trade_history[-1]['profit'] == pytest.approx(1200 - 5 - 1105)
+
+
+class TestTradingCostsBatch:
+    """测试列式成本计算"""
+
+    @pytest.mark.parametrize('min_commission', [0.0, 5.0])
+    def test_matches_per_trade(self, min_commission):
+        """批量结果与逐笔 apply_trading_costs 字段一致（含最低佣金）"""
+        rng = np.random.default_rng(1)
+        trades = [{'买入日期': i, '买入价': float(b), '卖出价': float(s), '状态': '平仓'}
+                  for i, (b, s) in enumerate(zip(rng.uniform(1, 200, 200), rng.uniform(1, 200, 200)))]
+        engine = EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, commission_rate=0.0003,
+                                        slippage=0.001, min_commission=min_commission)
+
+        batch = engine.apply_trading_costs_batch(trades)
+
+        assert batch == [engine.apply_trading_costs(t) for t in trades]
+        assert all(t.keys() >= {'买入成本', '卖出成本', '印花税', '总手续费', '收益率%'} for t in batch)
+        assert '持仓数量' not in trades[0]  # 不修改输入
+
+    def test_min_commission_applied(self):
+        """小额成交佣金不低于最低佣金"""
+        engine = EnhancedBacktestEngine(initial_capital=10000, position_ratio=0.1, commission_rate=0.0003,
+                                        slippage=0.0, min_commission=5.0)
+
+        trade = engine.apply_trading_costs_batch([{'买入价': 10.0, '卖出价': 10.0}])[0]
+
+        # 1000 元成交：佣金 5 元 + 过户费 0.001 元
+        assert trade['买入成本'] == 5.0
+
+
+class TestTurnoverRankTable:
+    """测试成交额排名矩阵"""
+
+    @pytest.fixture
+    def turnover_data(self):
+        days = pd.bdate_range('2024-03-04', periods=4)   # 周一至周四
+        return {
+            '600000': pd.DataFrame({'日期': days, '成交额': [300.0, 100.0, 200.0, 100.0]}),
+            '600001': pd.DataFrame({'日期': days, '成交额': [300.0, 200.0, 100.0, np.nan]}),
+            # 缺 03-05 的数据，日期为字符串
+            '600002': pd.DataFrame({'日期': ['2024-03-04', '2024-03-06', '2024-03-07'],
+                                    '成交额': [100.0, 300.0, 50.0]}),
+        }
+
+    def test_ranks_and_missing(self, turnover_data):
+        """降序排名、并列取最小名次；当日无数据为 MISSING_RANK"""
+        table = _build_prev_day_turnover_ranks(turnover_data)
+        missing = TurnoverRankTable.MISSING_RANK
+
+        # 03-04：300, 300, 100 -> 1, 1, 3
+        assert [table.prev_day_rank('2024-03-05', s) for s in turnover_data] == [1, 1, 3]
+        # 03-05：600002 无数据
+        assert [table.prev_day_rank('2024-03-06', s) for s in turnover_data] == [2, 1, missing]
+        # 03-07：成交额缺失按 0 参与排名
+        assert [table.prev_day_rank(pd.Timestamp('2024-03-08 15:00'), s)
+                for s in turnover_data] == [1, 3, 2]
+
+    def test_first_day_and_unknown_symbol(self, turnover_data):
+        table = _build_prev_day_turnover_ranks(turnover_data)
+
+        assert table.prev_day_rank('2024-03-04', '600000') == TurnoverRankTable.MISSING_RANK
+        assert table.prev_day_rank('2024-03-05', '688000') == TurnoverRankTable.MISSING_RANK
+
+    def test_non_trading_day_uses_last_trading_day(self, turnover_data):
+        """周末查询返回最近一个交易日的排名"""
+        table = _build_prev_day_turnover_ranks(turnover_data)
+
+        assert table.prev_day_index('2024-03-09') == table.prev_day_index('2024-03-08') == 3
+
+    def test_cached_per_data_version(self, turnover_data):
+        """相同数据复用同一张表，数据变化后重新构建"""
+        table = _build_prev_day_turnover_ranks(turnover_data)
+        assert _build_prev_day_turnover_ranks(dict(reversed(list(turnover_data.items())))) is table
+
+        changed = dict(turnover_data)
+        changed['600000'] = turnover_data['600000'].assign(成交额=[1.0, 2.0, 3.0, 4.0])
+        assert _build_prev_day_turnover_ranks(changed) is not table
+
+
+class TestRunPortfolio:
+    """测试按预生成交易撮合组合"""
+
+    @pytest.mark.parametrize('top_n', [0, 3])
+    def test_matches_run_with_strategy(self, portfolio_stocks_data, top_n):
+        """预生成交易 + run_portfolio 与直接回测结果一致"""
+        engine = _make_engine(top_n)
+        strategy = TurtleTradingStrategy({'entry_period': 10, 'exit_period': 5})
+        expected = engine.run_multiple_stocks_with_portfolio(portfolio_stocks_data, strategy)
+
+        trades_by_symbol, last_prices, closes = {}, {}, {}
+        for symbol, df in portfolio_stocks_data.items():
+            df_backtest = engine.time_config.filter_data(df)
+            trades_by_symbol[symbol] = strategy.get_trades(df_backtest)
+            last_prices[symbol] = float(df_backtest['收盘'].iloc[-1])
+            closes[symbol] = (df_backtest['日期'].values.astype('datetime64[ns]').astype(np.int64),
+                              df_backtest['收盘'].to_numpy())
+        ranks = _build_prev_day_turnover_ranks(portfolio_stocks_data) if top_n else None
+        results = engine.run_portfolio(trades_by_symbol, last_prices, ranks, closes)
+
+        assert results['portfolio_summary'] == expected['portfolio_summary']
+        assert results['trade_history'] == expected['trade_history']
+        np.testing.assert_array_equal(results['daily_series']['nav'], expected['daily_series']['nav'])
+
+    def test_open_trade_marked_to_market(self, portfolio_stocks_data):
+        """未平仓交易只买入不卖出，按末日收盘价估值"""
+        engine = _make_engine()
+        trade = {'买入日期': pd.Timestamp('2024-03-01'), '买入价': 10.0,
+                 '卖出日期': pd.Timestamp('2024-03-29'), '卖出价': 12.0, '状态': '未平仓'}
+
+        results = engine.run_portfolio({'600000': [trade]}, {'600000': 11.0})
+        summary = results['portfolio_summary']
+
+        assert [t['action'] for t in results['trade_history']] == ['BUY']
+        assert summary['final_position_value'] == pytest.approx(11.0 * 2000)
+
+
+class TestEventDrivenPortfolio:
+    """测试事件驱动的组合撮合"""
+
+    def _trade(self, buy, sell, status='平仓'):
+        return {'买入日期': pd.Timestamp(buy), '买入价': 10.0,
+                '卖出日期': pd.Timestamp(sell), '卖出价': 10.5, '状态': status}
+
+    def _engine(self, event_driven):
+        # 单笔 50% 仓位，最多同时持有 1 笔
+        return EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.5,
+                                      max_position_ratio=0.6, event_driven=event_driven)
+
+    def test_capital_goes_to_earliest_signal(self):
+        """资金检查按时间顺序：持仓期重叠的两笔交易只能成交较早的一笔"""
+        trades_by_symbol = {
+            '600000': [self._trade('2024-03-10', '2024-03-20')],
+            '600001': [self._trade('2024-03-01', '2024-03-15')],
+        }
+        last_prices = {'600000': 10.0, '600001': 10.0}
+
+        sequential = self._engine(False).run_portfolio(
+            {s: [dict(t) for t in ts] for s, ts in trades_by_symbol.items()}, last_prices)
+        events = self._engine(True).run_portfolio(trades_by_symbol, last_prices)
+
+        # 逐只股票处理时，600000 的整笔交易先结算，重叠的 600001 也被接受
+        assert [t['symbol'] for t in sequential['trade_history'] if t['action'] == 'BUY'] == \
+            ['600000', '600001']
+        assert [t['symbol'] for t in events['trade_history'] if t['action'] == 'BUY'] == ['600001']
+        assert trades_by_symbol['600000'][0]['portfolio_status'] == 'REJECTED'
+
+    def test_same_day_exit_before_entry(self):
+        """同一交易日先卖出释放资金，再处理买入"""
+        trades_by_symbol = {
+            '600000': [self._trade('2024-03-15', '2024-03-20')],
+            '600001': [self._trade('2024-03-01', '2024-03-15')],
+        }
+        results = self._engine(True).run_portfolio(trades_by_symbol, {'600000': 10.0, '600001': 10.0})
+
+        assert [(t['symbol'], t['action']) for t in results['trade_history']] == [
+            ('600001', 'BUY'), ('600001', 'SELL'), ('600000', 'BUY'), ('600000', 'SELL')]
+
+    def test_same_day_round_trip(self):
+        """当日买入当日卖出的交易，卖出在买入之后处理"""
+        results = self._engine(True).run_portfolio(
+            {'600000': [self._trade('2024-03-01', '2024-03-01')]}, {'600000': 10.0})
+
+        assert [t['action'] for t in results['trade_history']] == ['BUY', 'SELL']
+        assert results['portfolio_summary']['active_positions'] == []
+
+    def test_out_of_order_exit_closes_its_own_lot(self):
+        """同一股票持仓重叠且后买先卖时，平掉的是对应的那笔持仓，期末市值与每日净值一致"""
+        days = pd.bdate_range('2024-03-01', '2024-03-29')
+        close = np.linspace(10.0, 11.0, len(days))
+        trades_by_symbol = {'600000': [
+            {'买入日期': days[0], '买入价': 10.0, '卖出日期': days[-1], '卖出价': 11.0, '状态': '未平仓'},
+            {'买入日期': days[2], '买入价': 8.0, '卖出日期': days[5], '卖出价': 8.5, '状态': '平仓'},
+        ]}
+        engine = EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, event_driven=True)
+        results = engine.run_portfolio(
+            trades_by_symbol, {'600000': close[-1]},
+            closes={'600000': (days.values.astype('datetime64[ns]').astype(np.int64), close)})
+
+        sell = [t for t in results['trade_history'] if t['action'] == 'SELL'][0]
+        buys = {t['trade_id']: t for t in results['trade_history'] if t['action'] == 'BUY'}
+        assert sell['trade_id'] == 1
+        assert sell['shares'] == buys[1]['shares'] != buys[0]['shares']
+        assert sell['profit'] == pytest.approx(sell['income'] - buys[1]['total_cost'])
+        summary = results['portfolio_summary']
+        assert summary['final_position_value'] == pytest.approx(buys[0]['shares'] * close[-1])
+        assert summary['final_total_value'] == pytest.approx(results['daily_series']['nav'][-1], abs=0.01)
+
+    def test_trade_history_chronological(self, portfolio_stocks_data):
+        """多股票策略回测：成交记录按日期排序，汇总口径不变"""
+        engine = EnhancedBacktestEngine(
+            initial_capital=100000, position_ratio=0.2, event_driven=True,
+            time_config=BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28'))
+        results = engine.run_multiple_stocks_with_portfolio(
+            portfolio_stocks_data, TurtleTradingStrategy({'entry_period': 10, 'exit_period': 5}))
+
+        dates = [t['date'] for t in results['trade_history']]
+        assert len(dates) > 0
+        assert dates == sorted(dates)
+        summary = results['portfolio_summary']
+        assert summary['final_total_value'] == pytest.approx(
+            summary['final_cash'] + summary['final_position_value'], abs=0.01)
+
+
+class TestRoundTrips:
+    """测试已平仓往返交易的配对"""
+
+    def _trade(self, buy, sell, ret, status):
+        return {'买入日期': pd.Timestamp(buy), '买入价': 10.0, '卖出日期': pd.Timestamp(sell),
+                '卖出价': 10.0 * (1 + ret / 100), '收益率%': ret, '状态': status}
+
+    def test_overlapping_trades_pair_with_strategy_trade(self):
+        """同一股票持仓重叠时，卖出与同一笔策略交易的买入配对（而非 FIFO 最早的持仓）"""
+        trades_by_symbol = {'600000': [self._trade('2024-03-05', '2024-03-08', 5.0, '止盈'),
+                                       self._trade('2024-03-01', '2024-03-20', -3.0, '止损')]}
+        engine = EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, event_driven=True)
+        results = engine.run_portfolio(trades_by_symbol, {'600000': 10.0})
+        round_trips = pair_round_trips(results['trade_history'],
+                                       TradeLedger.from_trades_by_symbol(trades_by_symbol))
+
+        assert [(r['buy_date'], r['sell_date'], r['return'], r['status']) for r in round_trips] == [
+            ('2024-03-05', '2024-03-08', 5.0, '止盈'), ('2024-03-01', '2024-03-20', -3.0, '止损')]
+        assert [r['open_positions'] for r in round_trips] == [1, 0]
+
+    def test_without_ledger_uses_portfolio_profit(self):
+        """没有对应的策略交易时使用组合按成交价计算的收益率"""
+        pm = PortfolioManager(initial_capital=100000)
+        pm.buy('600000', 100, 10.0, 0.0, pd.Timestamp('2024-03-01'))
+        pm.sell('600000', 100, 11.0, 0.0, pd.Timestamp('2024-03-04'))
+
+        assert pair_round_trips(pm.trade_history) == [{
+            'trade_id': 0, 'symbol': '600000', 'buy_date': '2024-03-01', 'buy_price': 10.0,
+            'sell_date': '2024-03-04', 'sell_price': 11.0, 'return': 10.0, 'status': '平仓',
+            'open_positions': 0, 'position_ratio': 0.0,
+        }]
+
+    def test_out_of_order_close_uses_own_buy(self):
+        """同一股票后买先卖：每笔往返交易的收益率与盈亏都按其自身的买入计算"""
+        pm = PortfolioManager(initial_capital=100000)
+        pm.buy('600000', 100, 10.0, 0.0, pd.Timestamp('2024-03-01'))
+        pm.buy('600000', 200, 20.0, 0.0, pd.Timestamp('2024-03-04'))
+        pm.sell('600000', 200, 22.0, 0.0, pd.Timestamp('2024-03-05'), trade_id=1)
+        pm.sell('600000', 100, 12.0, 0.0, pd.Timestamp('2024-03-06'), trade_id=0)
+        pm.check_invariants()
+
+        round_trips = pair_round_trips(pm.trade_history)
+        assert [(r['trade_id'], r['buy_price'], r['return']) for r in round_trips] == [
+            (1, 20.0, 10.0), (0, 10.0, 20.0)]
+        profits = {t['trade_id']: t['profit'] for t in pm.trade_history if t['action'] == 'SELL'}
+        assert profits == {1: pytest.approx(200 * 22.0 - 200 * 20.0), 0: pytest.approx(100 * 12.0 - 100 * 10.0)}
+
+    @pytest.mark.parametrize('event_driven', [False, True])
+    def test_every_closed_trade_matches_strategy_trade(self, portfolio_stocks_data, event_driven):
+        """每笔往返交易对应一笔已成交且已平仓的策略交易，收益率与状态取自策略"""
+        engine = EnhancedBacktestEngine(
+            initial_capital=100000, position_ratio=0.2, event_driven=event_driven,
+            time_config=BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28'))
+        results = engine.run_multiple_stocks_with_portfolio(
+            portfolio_stocks_data, TurtleTradingStrategy({'entry_period': 10, 'exit_period': 5}))
+
+        closed = {
+            (symbol, str(t['买入日期']).split()[0], str(t['卖出日期']).split()[0]): t
+            for symbol, sr in results['stock_results'].items() for t in sr['trades']
+            if t.get('portfolio_status') == 'ACCEPTED' and t.get('状态') != '未平仓'
+        }
+        round_trips = results['round_trips']
+        assert len(round_trips) == len(closed) == sum(
+            t['action'] == 'SELL' for t in results['trade_history'])
+        for r in round_trips:
+            trade = closed[(r['symbol'], r['buy_date'], r['sell_date'])]
+            assert r['return'] == round(trade['收益率%'], 4)
+            assert r['status'] == trade['状态']
+
+
+class TestDailySeries:
+    """测试每日净值序列"""
+
+    def _reference_nav(self, results, stocks_data, engine):
+        """逐日参考实现：按成交记录重放持仓，收盘价向前填充估值"""
+        frames = {s: engine.time_config.filter_data(df).set_index('日期')['收盘']
+                  for s, df in stocks_data.items()}
+        days = sorted(set().union(*[set(f.index) for f in frames.values()]))
+        history = sorted(results['trade_history'], key=lambda t: pd.Timestamp(t['date']))
+        cash, holdings, navs, k = engine.initial_capital, {}, [], 0
+        for day in days:
+            while k < len(history) and pd.Timestamp(history[k]['date']) <= day:
+                t = history[k]
+                sign = 1 if t['action'] == 'BUY' else -1
+                holdings[t['symbol']] = holdings.get(t['symbol'], 0) + sign * t['shares']
+                cash += -t['total_cost'] if t['action'] == 'BUY' else t['income']
+                k += 1
+            value = sum(shares * frames[s][:day].iloc[-1] for s, shares in holdings.items() if shares)
+            navs.append(cash + value)
+        return np.array(navs)
+
+    @pytest.mark.parametrize('event_driven', [False, True])
+    def test_matches_reference(self, portfolio_stocks_data, event_driven):
+        """向量化净值与逐日重放一致，末日净值等于市值口径总价值"""
+        engine = _make_engine()
+        engine.event_driven = event_driven
+        results = engine.run_multiple_stocks_with_portfolio(
+            portfolio_stocks_data, TurtleTradingStrategy({'use_filter': False}))
+        series = results['daily_series']
+
+        assert len(results['trade_history']) > 0
+        np.testing.assert_allclose(series['nav'], self._reference_nav(results, portfolio_stocks_data, engine))
+        np.testing.assert_allclose(series['nav'], series['cash'] + series['position_value'])
+        assert series['nav'][-1] == pytest.approx(results['portfolio_summary']['final_total_value'], abs=0.01)
+        assert (series['drawdown'] <= 1e-12).all()
+        assert results['risk_metrics']['max_drawdown'] == pytest.approx(-series['drawdown'].min())
+        actions = [t['action'] for t in results['trade_history']]
+        assert series['open_positions'][-1] == actions.count('BUY') - actions.count('SELL')
+
+    def test_no_trades(self, portfolio_stocks_data):
+        """没有成交时净值恒等于初始资金"""
+        engine = _make_engine()
+        results = engine.run_portfolio({}, {}, closes={
+            s: (df['日期'].values.astype('datetime64[ns]').astype(np.int64), df['收盘'].to_numpy())
+            for s, df in portfolio_stocks_data.items()
+        })
+        series = results['daily_series']
+
+        assert (series['nav'] == 100000).all()
+        assert (series['exposure'] == 0).all()
+        assert results['risk_metrics']['max_drawdown'] == 0.0
+
+    def test_without_closes(self, portfolio_stocks_data):
+        """未提供收盘价面板时不生成序列"""
+        assert _make_engine().run_portfolio({}, {})['daily_series'] is None
+
+
+class TestResumeFromSnapshot:
+    """测试事件驱动撮合的断点恢复：结果必须与全量重跑一致"""
+
+    def _engine(self, top_n=0, position_ratio=0.2):
+        time_config = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+        return EnhancedBacktestEngine(initial_capital=100000, position_ratio=position_ratio,
+                                      time_config=time_config, turnover_rank_top_n=top_n,
+                                      event_driven=True, n_jobs=1)
+
+    def _assert_same(self, resumed, full):
+        for key in ('portfolio_summary', 'trade_history', 'rejected_trades', 'round_trips'):
+            assert resumed[key] == full[key], key
+        for symbol, sr in full['stock_results'].items():
+            assert resumed['stock_results'][symbol]['trades'] == sr['trades']
+        np.testing.assert_array_equal(resumed['daily_series']['nav'], full['daily_series']['nav'])
+
+    def _run(self, engine, stocks_data, resume_from=None):
+        return engine.run_multiple_stocks_with_portfolio(
+            stocks_data, DoubleMACrossStrategy({}), resume_from=resume_from)
+
+    @pytest.mark.parametrize('top_n', [0, 3])
+    @pytest.mark.parametrize('new_bars', [1, 10])
+    def test_resume_matches_full_rerun(self, portfolio_stocks_data, top_n, new_bars):
+        """截去末尾 K 线回测得到快照，补齐后从快照恢复"""
+        before = {symbol: df.iloc[:-new_bars] for symbol, df in portfolio_stocks_data.items()}
+        snapshot = self._run(self._engine(top_n), before)['snapshot']
+
+        resumed = self._run(self._engine(top_n), portfolio_stocks_data, snapshot)
+        full = self._run(self._engine(top_n), portfolio_stocks_data)
+
+        assert resumed['resumed'] and not full['resumed']
+        assert len(snapshot.pm_state['trade_history']) <= len(full['trade_history'])
+        self._assert_same(resumed, full)
+        # 恢复后的快照与全量重跑的快照一致，可继续链式恢复
+        assert resumed['snapshot'].pm_state == full['snapshot'].pm_state
+
+    def test_falls_back_when_inputs_differ(self, portfolio_stocks_data):
+        """设置不同或截止日前的数据被修正时不恢复，结果仍与全量重跑一致"""
+        before = {symbol: df.iloc[:-5] for symbol, df in portfolio_stocks_data.items()}
+        snapshot = self._run(self._engine(3), before)['snapshot']
+
+        other_settings = self._run(self._engine(3, position_ratio=0.1), portfolio_stocks_data, snapshot)
+        assert not other_settings['resumed']
+
+        corrected = {symbol: df.copy() for symbol, df in portfolio_stocks_data.items()}
+        corrected['600000'].loc[100, '成交额'] *= 10
+        resumed = self._run(self._engine(3), corrected, snapshot)
+        assert not resumed['resumed']
+        self._assert_same(resumed, self._run(self._engine(3), corrected))
+
+    def test_sequential_mode_has_no_snapshot(self, portfolio_stocks_data):
+        results = _make_engine().run_multiple_stocks_with_portfolio(
+            portfolio_stocks_data, DoubleMACrossStrategy({}))
+        assert results.get('snapshot') is None
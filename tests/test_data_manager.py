@@ -302,6 +302,53 @@ class TestCacheManagement:
         stocks = temp_data_manager.get_all_cached_stocks()
         assert len(stocks) == 0
 
+    def test_get_data_versions(self, temp_data_manager, sample_stock_data):
+        """测试数据版本：新增数据或清空重取后版本变化，无数据的股票不返回"""
+        temp_data_manager.save_data_to_cache("000001", sample_stock_data.iloc[:-1].copy())
+        temp_data_manager.save_data_to_cache("000002", sample_stock_data.copy())
+
+        before = temp_data_manager.get_data_versions(["000001", "000002", "999999"])
+        assert set(before) == {"000001", "000002"}
+
+        temp_data_manager.save_data_to_cache("000001", sample_stock_data.copy())
+        temp_data_manager.clear_cache("000002")
+        temp_data_manager.save_data_to_cache("000002", sample_stock_data.copy())
+
+        after = temp_data_manager.get_data_versions(["000001", "000002"])
+        assert after["000001"] != before["000001"]
+        assert after["000002"] != before["000002"]
+        assert temp_data_manager.get_data_versions(["000001", "000002"]) == after
+
+    @pytest.mark.parametrize('date, days', [
+        ('2024-06-15', 10),     # 周末：前后交易日距离不同，取较近的
+        ('20240617', 3),
+        ('2023-12-01', 5),      # 早于数据起点
+        ('2025-06-01', 10),     # 晚于数据终点
+        ('2024-07-06', 0),      # days=0 只取最近交易日
+    ])
+    def test_get_kline_window(self, temp_data_manager, sample_stock_data, date, days):
+        """测试窗口查询与全量数据上按最近日期取前后 days 行的结果一致"""
+        temp_data_manager.save_data_to_cache("000001", sample_stock_data.copy())
+        full = temp_data_manager.get_data_from_cache("000001", "20240101", "20241231")
+
+        window, signal_date = temp_data_manager.get_kline_window(
+            "000001", date, days, start_date="20240101", end_date="20241231")
+
+        idx = int((full['日期'] - pd.Timestamp(date)).abs().argmin())
+        expected = full.iloc[max(0, idx - days):idx + days + 1]
+        assert signal_date == full['日期'].iloc[idx].strftime('%Y-%m-%d')
+        assert window['日期'].tolist() == expected['日期'].dt.strftime('%Y-%m-%d').tolist()
+        assert window['收盘'].tolist() == pytest.approx(expected['收盘'].tolist())
+
+    def test_get_kline_window_no_data(self, temp_data_manager):
+        assert temp_data_manager.get_kline_window("999999", "2024-06-03") == (None, None)
+
+    def test_get_kline_window_negative_days(self, temp_data_manager, sample_stock_data):
+        """负数 days 不能变成 LIMIT -n 返回全部历史"""
+        temp_data_manager.save_data_to_cache("000001", sample_stock_data.copy())
+        with pytest.raises(ValueError):
+            temp_data_manager.get_kline_window("000001", "2024-06-03", -1)
+
     def test_export_cache_to_csv(self, temp_data_manager, sample_stock_data, tmp_path):
         """测试导出缓存为CSV"""
         # 保存数据
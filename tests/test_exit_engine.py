@@ -0,0 +1,227 @@
+"""测试exit_engine.py - 通用出场引擎"""
+import pytest
+import pandas as pd
+import numpy as np
+from exit_engine import (
+    simulate_exits,
+    build_trade_records,
+    dates_to_ns,
+    STOP_LOSS,
+    TAKE_PROFIT,
+    TRAILING_STOP,
+    ATR_STOP,
+    TIME_STOP,
+    SIGNAL,
+    OPEN_LABEL,
+)
+from strategy import SteadyTrendStrategy, BalancedMultiFactorStrategy
+from strategy_new import DoubleMACrossStrategy
+
+
+def _reference_trades(df_signals, rules, close_open=False):
+    """逐行参考实现（与重构前策略循环一致），用于对照引擎结果"""
+    trades = []
+    position = None
+    for i in range(len(df_signals)):
+        row = df_signals.iloc[i]
+        if row['Buy_Signal'] and position is None:
+            position = {'i': i, 'price': row['收盘'], 'high': row['收盘']}
+            continue
+        if position is not None:
+            position['high'] = max(position['high'], row['收盘'])
+            profit_pct = (row['收盘'] - position['price']) / position['price']
+            reason = None
+            for kind, value, label in rules:
+                if kind == STOP_LOSS and profit_pct <= -value:
+                    reason = label
+                elif kind == TAKE_PROFIT and profit_pct >= value:
+                    reason = label
+                elif kind == TRAILING_STOP and row['收盘'] < position['high'] * (1 - value):
+                    reason = label
+                elif kind == SIGNAL and row['Sell_Signal']:
+                    reason = label
+                if reason:
+                    break
+            if reason:
+                trades.append((position['i'], i, reason))
+                position = None
+    if position is not None and close_open:
+        trades.append((position['i'], len(df_signals) - 1, OPEN_LABEL))
+    return trades
+
+
+class TestSimulateExits:
+    """测试数组出场模拟"""
+
+    def test_no_buy_signal(self):
+        """没有买入信号时没有交易"""
+        close = np.linspace(10, 12, 20)
+        result = simulate_exits(close, np.zeros(20, dtype=bool))
+
+        assert len(result['entry_idx']) == 0
+        assert len(result['exit_idx']) == 0
+
+    def test_stop_loss_priority_over_signal(self):
+        """同一根K线同时满足止损和信号时，按规则顺序取第一条"""
+        close = np.array([10.0, 10.0, 9.0, 9.0])
+        buy = np.array([True, False, False, False])
+        sell = np.array([False, False, True, False])
+
+        result = simulate_exits(close, buy, sell_signal=sell, rules=[
+            (STOP_LOSS, 0.05, '止损'),
+            (SIGNAL, None, '死叉'),
+        ])
+        assert result['exit_idx'].tolist() == [2]
+        assert result['labels'][result['reason'][0]] == '止损'
+
+        result = simulate_exits(close, buy, sell_signal=sell, rules=[
+            (SIGNAL, None, '死叉'),
+            (STOP_LOSS, 0.05, '止损'),
+        ])
+        assert result['labels'][result['reason'][0]] == '死叉'
+
+    def test_no_exit_on_entry_bar(self):
+        """买入当日不检查出场，卖出当日不重新买入"""
+        close = np.array([10.0, 11.0, 12.0, 13.0])
+        buy = np.array([True, True, True, True])
+        sell = np.array([True, True, False, False])
+
+        result = simulate_exits(close, buy, sell_signal=sell, rules=[(SIGNAL, None, '信号')],
+                                close_open=True)
+
+        assert result['entry_idx'].tolist() == [0, 2]
+        assert result['exit_idx'].tolist() == [1, 3]
+
+    def test_trailing_stop_uses_highest_close(self):
+        """移动止盈基于持仓期最高收盘价"""
+        close = np.array([10.0, 12.0, 11.5, 11.3])
+        buy = np.array([True, False, False, False])
+
+        result = simulate_exits(close, buy, rules=[(TRAILING_STOP, 0.05, '移动止盈')])
+
+        # 12 * 0.95 = 11.4，第3根 11.3 < 11.4 触发
+        assert result['exit_idx'].tolist() == [3]
+
+    def test_atr_stop_ignores_nan_atr(self):
+        """ATR为NaN或0时不触发ATR止损"""
+        close = np.array([10.0, 8.0, 8.0])
+        buy = np.array([True, False, False])
+        atr = np.array([np.nan, np.nan, 0.5])
+
+        result = simulate_exits(close, buy, atr=atr, rules=[(ATR_STOP, 2.0, 'ATR止损')])
+
+        assert result['exit_idx'].tolist() == [2]
+
+    def test_time_stop_uses_calendar_days(self):
+        """时间止损按自然日计算"""
+        dates = pd.to_datetime(['2024-01-05', '2024-01-08', '2024-01-09', '2024-01-10'])
+        close = np.full(4, 10.0)
+        buy = np.array([True, False, False, False])
+
+        result = simulate_exits(close, buy, dates=dates_to_ns(dates),
+                                rules=[(TIME_STOP, 4, '时间止损')])
+
+        # 01-05 -> 01-09 为4个自然日
+        assert result['exit_idx'].tolist() == [2]
+
+    def test_max_hold_bars_forces_next_bar_exit(self):
+        """达到最大持有K线数后，下一交易日强制卖出"""
+        close = np.full(10, 10.0)
+        buy = np.zeros(10, dtype=bool)
+        buy[1] = True
+
+        result = simulate_exits(close, buy, max_hold_bars=3, max_hold_label='超期卖出')
+
+        assert result['exit_idx'].tolist() == [5]
+        assert result['labels'][result['reason'][0]] == '超期卖出'
+
+    def test_close_open_position(self):
+        """close_open=True 时末尾持仓记为未平仓"""
+        close = np.array([10.0, 10.5, 11.0])
+        buy = np.array([False, True, False])
+
+        assert len(simulate_exits(close, buy)['entry_idx']) == 0
+
+        result = simulate_exits(close, buy, close_open=True)
+        assert result['entry_idx'].tolist() == [1]
+        assert result['exit_idx'].tolist() == [2]
+        assert result['labels'][result['reason'][0]] == OPEN_LABEL
+
+    def test_unknown_rule_raises(self):
+        """未知规则类型应报错"""
+        with pytest.raises(ValueError):
+            simulate_exits(np.ones(3), np.ones(3, dtype=bool), rules=[('foo', 1, 'x')])
+
+
+class TestBuildTradeRecords:
+    """测试交易记录转换"""
+
+    def test_record_fields(self):
+        """交易记录字段与策略输出一致"""
+        dates = pd.date_range('2024-01-01', periods=4)
+        close = np.array([10.0, 11.0, 12.0, 13.0])
+        result = simulate_exits(close, np.array([True, False, False, False]),
+                                rules=[(TAKE_PROFIT, 0.15, '止盈')])
+
+        trades = build_trade_records(dates, close, result)
+
+        assert len(trades) == 1
+        trade = trades[0]
+        assert trade['买入日期'] == dates[0]
+        assert trade['卖出日期'] == dates[2]
+        assert trade['持有天数'] == 2
+        assert trade['收益率%'] == pytest.approx(19.9)
+        assert trade['状态'] == '止盈'
+
+
+class TestStrategyEquivalence:
+    """重构后的策略与逐行参考实现结果一致"""
+
+    @pytest.fixture
+    def random_walk_data(self, random_walk_stocks):
+        return random_walk_stocks(7, n=600, start='2020-01-01')
+
+    def _assert_same(self, trades, expected, df_signals):
+        assert len(trades) == len(expected)
+        for trade, (i, j, reason) in zip(trades, expected):
+            assert trade['买入日期'] == df_signals['日期'].iloc[i]
+            assert trade['卖出日期'] == df_signals['日期'].iloc[j]
+            assert trade['状态'] == reason
+
+    def test_steady_trend(self, random_walk_data):
+        strategy = SteadyTrendStrategy({'ma_short': 5, 'ma_long': 20, 'ma_filter': 30,
+                                        'volume_multiplier': 0.5})
+        df_signals = strategy.calculate_signals(random_walk_data)
+        expected = _reference_trades(df_signals, [
+            (STOP_LOSS, 0.08, '止损'),
+            (TAKE_PROFIT, 0.15, '止盈'),
+            (TRAILING_STOP, 0.05, '移动止盈'),
+            (SIGNAL, None, '死叉'),
+        ])
+
+        self._assert_same(strategy.get_trades(random_walk_data), expected, df_signals)
+
+    def test_balanced_multi_factor(self, random_walk_data):
+        strategy = BalancedMultiFactorStrategy({'min_factor_score': 0.3})
+        df_signals = strategy.calculate_signals(random_walk_data)
+        expected = _reference_trades(df_signals, [
+            (STOP_LOSS, 0.10, '止损'),
+            (TAKE_PROFIT, 0.15, '最终止盈'),
+            (TAKE_PROFIT, 0.10, '第二批止盈'),
+            (TAKE_PROFIT, 0.05, '第一批止盈'),
+            (SIGNAL, None, '技术信号'),
+        ])
+
+        self._assert_same(strategy.get_trades(random_walk_data), expected, df_signals)
+
+    def test_double_ma_cross(self, random_walk_data):
+        strategy = DoubleMACrossStrategy({'volume_filter': False})
+        df_signals = strategy.calculate_signals(random_walk_data)
+        expected = _reference_trades(df_signals, [
+            (STOP_LOSS, 0.08, '止损'),
+            (TAKE_PROFIT, 0.15, '止盈'),
+            (TRAILING_STOP, 0.05, '移动止盈'),
+            (SIGNAL, None, '死叉'),
+        ], close_open=True)
+
+        self._assert_same(strategy.get_trades(random_walk_data), expected, df_signals)
@@ -0,0 +1,101 @@
+"""测试job_manager.py - 后台任务管理"""
+import threading
+import pytest
+from job_manager import JobManager, JobCancelled, QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED
+
+
+def _wait(job, timeout=5):
+    """等待任务结束"""
+    for _ in range(int(timeout / 0.01)):
+        if job.finished:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f'任务未结束: {job.to_dict()}')
+
+
+@pytest.fixture
+def jobs():
+    manager = JobManager(max_workers=1, history_size=3)
+    yield manager
+    manager.shutdown()
+
+
+class TestJobManager:
+    """测试任务提交、进度、取消与结果保留"""
+
+    def test_result_and_progress(self, jobs):
+        def work(job, n):
+            for i in range(1, n + 1):
+                job.progress(i, n, 'counting', last=i)
+            return {'sum': n * (n + 1) // 2}
+
+        job = _wait(jobs.submit('count', work, 4, info={'label': 'x'}))
+        state = jobs.get(job.id).to_dict(include_result=True)
+
+        assert state['status'] == COMPLETED
+        assert (state['done'], state['total'], state['progress_pct']) == (4, 4, 100.0)
+        assert state['phase'] == 'counting'
+        assert state['label'] == 'x' and state['last'] == 4
+        assert state['result'] == {'sum': 10}
+        assert job.id.startswith('count_')
+
+    def test_failure_keeps_error(self, jobs):
+        def work(job):
+            raise ValueError('没有数据')
+
+        job = _wait(jobs.submit('fail', work))
+        assert job.status == FAILED
+        assert job.to_dict(include_result=True)['error'] == '没有数据'
+        assert 'result' not in job.to_dict(include_result=True)
+
+    def test_cancel_running_and_queued(self, jobs):
+        """执行中的任务在下一次汇报进度时结束；排队中的任务不再执行"""
+        started = threading.Event()
+        ran = []
+
+        def blocking(job):
+            started.set()
+            while True:
+                job.progress(phase='waiting')
+                threading.Event().wait(0.01)
+
+        running = jobs.submit('block', blocking)
+        queued = jobs.submit('other', lambda job: ran.append(job.id))
+        assert started.wait(5)
+        assert running.status == RUNNING and queued.status == QUEUED
+
+        assert jobs.cancel(queued.id)
+        assert queued.status == CANCELLED
+        assert jobs.cancel(running.id)
+        assert _wait(running).status == CANCELLED
+        assert not jobs.cancel(running.id)  # 已结束
+        assert not jobs.cancel('missing')
+
+        jobs.shutdown()
+        assert ran == []
+
+    def test_check_cancelled(self, jobs):
+        job = jobs.submit('noop', lambda job: None)
+        _wait(job)
+        job._cancel_event.set()
+        with pytest.raises(JobCancelled):
+            job.check_cancelled()
+
+    def test_exclusive(self, jobs):
+        """同类任务未结束时不重复提交"""
+        release = threading.Event()
+        first = jobs.submit('update_all', lambda job: release.wait(5), exclusive=True)
+
+        assert jobs.submit('update_all', lambda job: None, exclusive=True) is None
+        assert jobs.latest('update_all') is first
+        release.set()
+        _wait(first)
+        assert jobs.submit('update_all', lambda job: None, exclusive=True) is not None
+
+    def test_history_limit(self, jobs):
+        """只保留最近结束的若干个任务"""
+        submitted = [_wait(jobs.submit('n', lambda job, i=i: i)) for i in range(5)]
+
+        assert [state['job_id'] for state in jobs.list()] == [job.id for job in reversed(submitted[2:])]
+        assert jobs.get(submitted[0].id) is None
+        assert jobs.list('other') == []
@@ -0,0 +1,102 @@
+"""测试optimization_store.py - 参数优化结果存储"""
+import pytest
+import pandas as pd
+import numpy as np
+from optimization_store import OptimizationResultStore, params_key, data_version, universe_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OptimizationResultStore(tmp_path / 'results.db')
+
+
+@pytest.fixture
+def small_stocks_data(sample_stock_data):
+    return {'000001': sample_stock_data.copy(), '000002': sample_stock_data.copy()}
+
+
+class TestKeys:
+    """测试键计算"""
+
+    def test_params_key_ignores_order(self):
+        assert params_key({'a': 1, 'b': 2.0}) == params_key({'b': 2.0, 'a': 1})
+        assert params_key({'a': 1}) != params_key({'a': 2})
+
+    def test_universe_key_ignores_order(self, small_stocks_data):
+        reversed_data = dict(reversed(list(small_stocks_data.items())))
+        assert universe_key(small_stocks_data) == universe_key(reversed_data)
+
+    def test_data_version_changes_with_data(self, small_stocks_data):
+        before = data_version(small_stocks_data)
+        small_stocks_data['000001'].loc[len(small_stocks_data['000001']) - 1, '收盘'] += 0.01
+
+        assert data_version(small_stocks_data) != before
+
+
+class TestOptimizationResultStore:
+    """测试读写"""
+
+    def test_put_and_get(self, store, small_stocks_data):
+        context = store.context('volume_breakout', small_stocks_data)
+        params = [{'ma_period': 20}, {'ma_period': 30}]
+
+        store.put_many(context, params[:1], [{'total_return': np.float64(1.5), 'trades': 3}])
+
+        assert store.get_many(context, params) == [{'total_return': 1.5, 'trades': 3}, None]
+        assert store.count() == 1
+
+    def test_context_isolation(self, store, small_stocks_data):
+        """策略或股票池不同的记录互不可见"""
+        context = store.context('volume_breakout', small_stocks_data)
+        store.put_many(context, [{'ma_period': 20}], [{'total_return': 1.0}])
+
+        other_strategy = store.context('steady_trend', small_stocks_data)
+        other_universe = store.context('volume_breakout', {'000001': small_stocks_data['000001']})
+
+        assert store.get_many(other_strategy, [{'ma_period': 20}]) == [None]
+        assert store.get_many(other_universe, [{'ma_period': 20}]) == [None]
+
+    def test_settings_isolation(self, store, small_stocks_data):
+        """回测设置不同的记录互不可见，设置相同（与键顺序无关）时命中"""
+        settings = {'evaluator': 'portfolio', 'backtest_start': '2024-06-01', 'event_driven': False}
+        context = store.context('volume_breakout', small_stocks_data, settings)
+        store.put_many(context, [{'ma_period': 20}], [{'total_return': 1.0}])
+
+        same = store.context('volume_breakout', small_stocks_data, dict(reversed(list(settings.items()))))
+        legacy = store.context('volume_breakout', small_stocks_data, {'evaluator': 'backtest_engine'})
+        shifted = store.context('volume_breakout', small_stocks_data, {**settings, 'backtest_start': '2024-07-01'})
+
+        assert store.get_many(same, [{'ma_period': 20}]) == [{'total_return': 1.0}]
+        assert store.get_many(legacy, [{'ma_period': 20}]) == [None]
+        assert store.get_many(shifted, [{'ma_period': 20}]) == [None]
+
+    def test_rebuilds_store_without_settings(self, tmp_path, small_stocks_data):
+        """旧版结果库（无回测设置指纹）重建为空表"""
+        import sqlite3
+        db_file = tmp_path / 'old.db'
+        conn = sqlite3.connect(db_file)
+        conn.execute('''
+            CREATE TABLE optimization_results (
+                strategy TEXT NOT NULL, params_hash TEXT NOT NULL, universe_hash TEXT NOT NULL,
+                data_version TEXT NOT NULL, params TEXT NOT NULL, metrics TEXT NOT NULL, created_at TEXT,
+                PRIMARY KEY (strategy, params_hash, universe_hash, data_version)
+            )
+        ''')
+        conn.execute("INSERT INTO optimization_results VALUES ('volume_breakout', 'h', 'u', 'v', '{}', '{}', NULL)")
+        conn.commit()
+        conn.close()
+
+        store = OptimizationResultStore(db_file)
+        assert store.count() == 0
+        context = store.context('volume_breakout', small_stocks_data)
+        store.put_many(context, [{'ma_period': 20}], [{'total_return': 1.0}])
+        assert store.get_many(context, [{'ma_period': 20}]) == [{'total_return': 1.0}]
+
+    def test_clear(self, store, small_stocks_data):
+        context = store.context('volume_breakout', small_stocks_data)
+        store.put_many(context, [{'ma_period': 20}], [{'total_return': 1.0}])
+
+        store.clear('steady_trend')
+        assert store.count() == 1
+        store.clear()
+        assert store.count() == 0
@@ -0,0 +1,91 @@
+"""测试parallel_signals.py - 多进程信号生成"""
+import pytest
+import pandas as pd
+import numpy as np
+from parallel_signals import generate_trades, resolve_workers
+from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig
+from backtest_engine_v2 import BacktestEngineV2
+from strategy_new import TurtleTradingStrategy
+
+
+class FailingStrategy:
+    """对指定股票抛出异常的策略（模块级定义，可在子进程中使用）"""
+
+    def __init__(self, bad_close):
+        self.bad_close = bad_close
+
+    def get_trades(self, df):
+        if df['收盘'].iloc[0] == self.bad_close:
+            raise ValueError('数据异常')
+        return [{'买入日期': df['日期'].iloc[0], '买入价': df['收盘'].iloc[0],
+                 '卖出日期': df['日期'].iloc[-1], '卖出价': df['收盘'].iloc[-1],
+                 '收益率%': 1.0, '状态': '平仓'}]
+
+
+@pytest.fixture
+def signal_stocks_data(random_walk_stocks):
+    return {f'{600010 - seed}': random_walk_stocks(seed) for seed in range(7)}
+
+
+class TestGenerateTrades:
+    """测试信号生成"""
+
+    @pytest.mark.parametrize('n_jobs,chunk_size', [(2, 1), (3, 0), (2, 5)])
+    def test_parallel_matches_serial(self, signal_stocks_data, n_jobs, chunk_size):
+        """并行结果与串行一致，顺序与输入一致"""
+        strategy = TurtleTradingStrategy({'entry_period': 10, 'exit_period': 5})
+        serial = generate_trades(signal_stocks_data, strategy, n_jobs=1)
+        parallel = generate_trades(signal_stocks_data, strategy, n_jobs=n_jobs, chunk_size=chunk_size)
+
+        assert list(parallel) == list(signal_stocks_data)
+        assert parallel == serial
+
+    def test_skip_errors(self, signal_stocks_data, capsys):
+        """skip_errors=True 时出错的股票打印警告并跳过"""
+        bad_symbol = list(signal_stocks_data)[2]
+        strategy = FailingStrategy(signal_stocks_data[bad_symbol]['收盘'].iloc[0])
+
+        trades = generate_trades(signal_stocks_data, strategy, n_jobs=2, chunk_size=2, skip_errors=True)
+
+        assert bad_symbol not in trades
+        assert len(trades) == len(signal_stocks_data) - 1
+        assert bad_symbol in capsys.readouterr().out
+
+    def test_errors_propagate(self, signal_stocks_data):
+        bad_symbol = list(signal_stocks_data)[0]
+        strategy = FailingStrategy(signal_stocks_data[bad_symbol]['收盘'].iloc[0])
+
+        with pytest.raises(ValueError):
+            generate_trades(signal_stocks_data, strategy, n_jobs=2, chunk_size=1)
+
+    def test_resolve_workers(self):
+        assert resolve_workers(3) == 3
+        assert resolve_workers(0) >= 1
+
+
+class TestTwoPhaseEngines:
+    """测试两阶段回测引擎"""
+
+    def test_enhanced_engine_parallel(self, signal_stocks_data):
+        time_config = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+        strategy = TurtleTradingStrategy({'entry_period': 10, 'exit_period': 5})
+        serial = EnhancedBacktestEngine(time_config=time_config, n_jobs=1) \
+            .run_multiple_stocks_with_portfolio(signal_stocks_data, strategy)
+        parallel = EnhancedBacktestEngine(time_config=time_config, n_jobs=2, chunk_size=2) \
+            .run_multiple_stocks_with_portfolio(signal_stocks_data, strategy)
+
+        assert parallel['portfolio_summary'] == serial['portfolio_summary']
+        assert parallel['trade_history'] == serial['trade_history']
+        assert list(parallel['stock_results']) == list(signal_stocks_data)
+
+    def test_v2_engine_parallel(self, signal_stocks_data):
+        bad_symbol = list(signal_stocks_data)[1]
+        strategy = FailingStrategy(signal_stocks_data[bad_symbol]['收盘'].iloc[0])
+        serial = BacktestEngineV2(n_jobs=1).run_multiple_stocks(signal_stocks_data, strategy)
+        parallel = BacktestEngineV2(n_jobs=2, chunk_size=3).run_multiple_stocks(signal_stocks_data, strategy)
+
+        assert list(parallel) == list(serial)
+        assert bad_symbol not in parallel
+        for symbol in serial:
+            assert parallel[symbol]['trades'] == serial[symbol]['trades']
+            assert parallel[symbol]['metrics'] == serial[symbol]['metrics']
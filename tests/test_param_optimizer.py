@@ -0,0 +1,399 @@
+"""测试param_optimizer.py - 参数优化模块"""
+import pytest
+import pandas as pd
+import numpy as np
+import param_optimizer
+from param_optimizer import (
+    optimize_parameters,
+    search_parameters,
+    successive_halving,
+    optimize_strategy,
+    portfolio_engine_factory,
+    ranges_to_grid,
+    make_walk_forward_windows,
+    walk_forward_optimize,
+    _share_stocks_data,
+    _attach_stocks_data,
+)
+from optimization_store import OptimizationResultStore
+from config_manager import ConfigManager
+from config import STRATEGY_MAP
+
+
+@pytest.fixture
+def optimizer_stocks_data(random_walk_stocks):
+    """多只随机游走股票（成交额满足默认过滤条件）"""
+    stocks_data = {}
+    for seed, symbol in enumerate(['000001', '000002', '600000']):
+        df = random_walk_stocks(seed, n=200, start='2023-01-02', amount=(1000000000, 5000000000))
+        df['换手率'] = np.random.default_rng(seed + 100).uniform(0.5, 3.0, len(df))
+        stocks_data[symbol] = df
+    return stocks_data
+
+
+class TestSharedStocksData:
+    """测试共享内存打包"""
+
+    def test_round_trip(self, optimizer_stocks_data):
+        """从共享内存重建的行情与原数据一致"""
+        shm, layout = _share_stocks_data(optimizer_stocks_data)
+        try:
+            rebuilt = _attach_stocks_data(shm, layout)
+            assert list(rebuilt) == list(optimizer_stocks_data)
+            for symbol, df in optimizer_stocks_data.items():
+                assert rebuilt[symbol]['日期'].tolist() == df['日期'].tolist()
+                assert np.array_equal(rebuilt[symbol]['收盘'].to_numpy(), df['收盘'].to_numpy())
+                assert np.array_equal(rebuilt[symbol]['换手率'].to_numpy(), df['换手率'].to_numpy())
+            del rebuilt
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class TestOptimizeParameters:
+    """测试网格搜索"""
+
+    @pytest.fixture
+    def param_ranges(self):
+        return {
+            "ma_period": [10, 20],
+            "volume_multiplier": [0.5, 1.0],
+            "hold_days": [2, 3],
+        }
+
+    def test_serial_results(self, optimizer_stocks_data, param_ranges, tmp_path, monkeypatch):
+        """串行结果包含所有组合并按总收益降序"""
+        monkeypatch.chdir(tmp_path)
+
+        results_df = optimize_parameters(optimizer_stocks_data, param_ranges)
+
+        assert len(results_df) == 8
+        assert results_df['total_return'].is_monotonic_decreasing
+        assert (tmp_path / '参数优化结果.csv').exists()
+
+    def test_parallel_matches_serial(self, optimizer_stocks_data, param_ranges, tmp_path, monkeypatch):
+        """多进程结果与串行结果完全一致"""
+        monkeypatch.chdir(tmp_path)
+
+        serial = optimize_parameters(optimizer_stocks_data, param_ranges)
+        parallel = optimize_parameters(optimizer_stocks_data, param_ranges, n_jobs=2, chunk_size=3)
+
+        pd.testing.assert_frame_equal(serial, parallel)
+
+
+class TestResumableOptimization:
+    """测试结果库断点续跑"""
+
+    def test_resume_skips_evaluated(self, optimizer_stocks_data, tmp_path, monkeypatch):
+        """扩大网格后只回测新增组合，结果与全量重跑一致"""
+        monkeypatch.chdir(tmp_path)
+        store = OptimizationResultStore(tmp_path / 'results.db')
+        small = {"ma_period": [10, 20], "hold_days": [2, 3]}
+        wide = {"ma_period": [10, 20, 30], "hold_days": [2, 3]}
+
+        optimize_parameters(optimizer_stocks_data, small, store=store, chunk_size=3)
+        assert store.count() == 4
+
+        evaluated = []
+        original = param_optimizer._evaluate_param_sets
+
+        def counting(engine, stocks_data, param_sets, param_keys=None):
+            evaluated.extend(param_sets)
+            return original(engine, stocks_data, param_sets, param_keys)
+
+        monkeypatch.setattr(param_optimizer, '_evaluate_param_sets', counting)
+        resumed = optimize_parameters(optimizer_stocks_data, wide, store=store)
+
+        assert [p['ma_period'] for p in evaluated] == [30, 30]
+        assert store.count() == 6
+        monkeypatch.setattr(param_optimizer, '_evaluate_param_sets', original)
+        pd.testing.assert_frame_equal(resumed, optimize_parameters(optimizer_stocks_data, wide),
+                                      check_dtype=False)
+
+
+class TestBudgetedSearch:
+    """测试预算受限的搜索方法"""
+
+    @pytest.fixture
+    def search_ranges(self):
+        return {
+            "ma_period": [10, 15, 20, 30],
+            "volume_multiplier": [0.5, 1.0, 1.5],
+            "hold_days": [1, 2, 3, 4],
+        }
+
+    @pytest.mark.parametrize('method', ['random', 'halving', 'model'])
+    def test_budget_and_best_so_far(self, optimizer_stocks_data, search_ranges, method):
+        """消耗不超过预算，best_so_far 单调不减"""
+        results_df, history_df = search_parameters(optimizer_stocks_data, search_ranges,
+                                                   method=method, budget=9, seed=3)
+
+        assert history_df['evaluations'].iloc[-1] <= 9 + 1e-9
+        best = history_df['best_so_far'].dropna()
+        assert len(best) > 0
+        assert best.is_monotonic_increasing
+        assert results_df['total_return'].iloc[0] == pytest.approx(best.iloc[-1])
+        assert set(search_ranges) <= set(results_df.columns)
+
+    def test_random_search_no_duplicates(self, optimizer_stocks_data, search_ranges):
+        """随机搜索无放回抽样"""
+        results_df, _ = search_parameters(optimizer_stocks_data, search_ranges,
+                                          method='random', budget=20, seed=0)
+
+        assert len(results_df) == 20
+        assert not results_df.duplicated(subset=list(search_ranges)).any()
+
+    def test_halving_promotes_to_full_sample(self, optimizer_stocks_data, search_ranges):
+        """逐次减半只有最后一轮是全样本评估"""
+        results_df, history_df = successive_halving(optimizer_stocks_data, search_ranges,
+                                                    budget=6, eta=3, seed=1)
+
+        full = history_df[history_df['full_sample']]
+        assert len(full) == len(results_df)
+        assert full['rung'].nunique() == 1
+        assert history_df.groupby('rung').size().is_monotonic_decreasing
+
+    def test_days_subsample_keeps_warmup(self, optimizer_stocks_data, search_ranges):
+        """按交易日截取的子样本保留预热期，第一轮即可产生交易并区分候选"""
+        subset = param_optimizer._subsample(optimizer_stocks_data, 1 / 9, 'days', list(optimizer_stocks_data))
+        for symbol, df in subset.items():
+            assert len(df) == 200 // 9 + 1 + param_optimizer.HALVING_WARMUP_DAYS
+            assert df['日期'].iloc[-1] == optimizer_stocks_data[symbol]['日期'].iloc[-1]
+
+        _, history_df = successive_halving(optimizer_stocks_data, search_ranges, budget=6, eta=3,
+                                           resource='days', seed=1)
+        first_rung = history_df[history_df['rung'] == 0]['score']
+        assert first_rung.nunique() > 1
+
+    def test_unknown_method(self, optimizer_stocks_data, search_ranges):
+        with pytest.raises(ValueError):
+            search_parameters(optimizer_stocks_data, search_ranges, method='foo')
+
+
+class TestStrategyOptimization:
+    """测试任意策略的组合模式优化"""
+
+    @pytest.fixture
+    def engine_factory(self):
+        return portfolio_engine_factory(data_start='2023-01-01', data_end='2023-12-31',
+                                        backtest_start='2023-03-01', backtest_end='2023-12-31',
+                                        turnover_rank_top_n=0)
+
+    @pytest.mark.parametrize('strategy_key', list(STRATEGY_MAP))
+    def test_param_ranges_cover_defaults(self, strategy_key):
+        """每个策略都有可优化参数，且默认值落在范围内"""
+        ranges = ConfigManager.get_param_ranges(None, strategy_key)
+        defaults = STRATEGY_MAP[strategy_key]['params']
+
+        assert len(ranges) > 0
+        for key, spec in ranges.items():
+            assert spec['min'] <= defaults.get(key, spec['min']) <= spec['max']
+            if key.startswith('rsi_'):
+                assert spec['max'] <= 100
+
+    def test_ranges_to_grid(self):
+        """按步长取整、整数去重，并包含默认值"""
+        grid = ranges_to_grid({
+            'period': {'min': 1, 'max': 4, 'step': 1, 'type': 'integer'},
+            'ratio': {'min': 0.05, 'max': 0.2, 'step': 0.01, 'type': 'number'},
+        }, points=3, defaults={'period': 2, 'ratio': 0.1})
+
+        assert grid['period'] == [1, 2, 3, 4]
+        assert grid['ratio'] == [0.05, 0.1, 0.13, 0.2]
+
+    @pytest.mark.parametrize('strategy_key', list(STRATEGY_MAP))
+    def test_grid_within_config_ranges(self, strategy_key):
+        """按步长取整后的取值不超出 [min, max]"""
+        specs = ConfigManager.get_param_ranges(None, strategy_key)
+        grid = ranges_to_grid(specs, points=3, defaults=STRATEGY_MAP[strategy_key]['params'])
+        for key, values in grid.items():
+            assert all(specs[key]['min'] <= v <= specs[key]['max'] for v in values), (key, values)
+
+    def test_grid_skips_inverted_pairs(self, optimizer_stocks_data):
+        """turnover_min > turnover_max 的组合不评估"""
+        results_df, _ = search_parameters(
+            optimizer_stocks_data, {'turnover_min': [0.01, 5.0, 50.0], 'turnover_max': [1.0, 100.0]},
+            method='grid', budget=None)
+
+        assert len(results_df) == 4
+        assert (results_df['turnover_min'] <= results_df['turnover_max']).all()
+
+    def test_grid_over_cap_fails_fast(self, optimizer_stocks_data, engine_factory):
+        """默认网格超过上限时在回测前报错"""
+        with pytest.raises(ValueError):
+            optimize_strategy('turtle_trading', optimizer_stocks_data, method='grid',
+                              engine_factory=engine_factory)
+
+    def test_grid_search_turtle(self, optimizer_stocks_data, engine_factory):
+        """海龟策略网格搜索：评估全部组合，进度回调单调推进"""
+        progress = []
+        results_df, history_df = optimize_strategy(
+            'turtle_trading', optimizer_stocks_data,
+            param_ranges={'entry_period': [10, 20], 'exit_period': [5, 10]},
+            engine_factory=engine_factory, progress_callback=progress.append)
+
+        assert len(results_df) == 4
+        assert {'entry_period', 'exit_period', 'total_return', 'trades'} <= set(results_df.columns)
+        assert results_df['trades'].sum() > 0
+        assert [p['evaluations'] for p in progress] == [1, 2, 3, 4]
+        assert all(p['total'] == 4 for p in progress)
+        assert results_df['total_return'].iloc[0] == pytest.approx(progress[-1]['best_so_far'])
+
+    def test_matches_portfolio_backtest(self, optimizer_stocks_data, engine_factory):
+        """优化结果的总收益与直接组合回测一致"""
+        from strategy_new import GridTradingStrategy
+
+        results_df, _ = optimize_strategy(
+            'grid_trading', optimizer_stocks_data, param_ranges={'grid_levels': [5]},
+            engine_factory=engine_factory)
+        params = dict(STRATEGY_MAP['grid_trading']['params'], grid_levels=5)
+        expected = engine_factory().run_multiple_stocks_with_portfolio(
+            optimizer_stocks_data, GridTradingStrategy(params))
+
+        assert results_df['total_return'].iloc[0] == \
+            expected['portfolio_summary']['total_return_pct']
+
+    def test_param_names_from_config_ranges(self, optimizer_stocks_data, engine_factory, tmp_path):
+        """未给出网格时按 get_param_ranges 生成；结果写入结果库"""
+        store = OptimizationResultStore(tmp_path / 'opt.db')
+        results_df, _ = optimize_strategy(
+            'double_ma_cross', optimizer_stocks_data, param_names=['ma_short'], points=2,
+            engine_factory=engine_factory, store=store)
+
+        assert set(results_df['ma_short']) == {2, 5, 10}
+        assert store.count('double_ma_cross') == 3
+
+    def test_store_isolated_by_evaluator_and_settings(self, optimizer_stocks_data, engine_factory,
+                                                      tmp_path, monkeypatch):
+        """相同参数在不同评估方式或引擎设置下不命中结果库"""
+        monkeypatch.chdir(tmp_path)
+        store = OptimizationResultStore(tmp_path / 'opt.db')
+        grid = {'ma_period': [10, 20]}
+        optimize_parameters(optimizer_stocks_data, grid, store=store)
+        assert store.count('volume_breakout') == 2
+
+        # 旧版 BacktestEngine 写入的同名策略结果不会被组合模式复用
+        fresh, _ = optimize_strategy('volume_breakout', optimizer_stocks_data, param_ranges=grid,
+                                     engine_factory=engine_factory)
+        stored, _ = optimize_strategy('volume_breakout', optimizer_stocks_data, param_ranges=grid,
+                                      engine_factory=engine_factory, store=store)
+        assert stored['total_return'].tolist() == fresh['total_return'].tolist()
+        assert store.count('volume_breakout') == 4
+
+        # 回测区间、交易设置、成交额过滤、撮合方式任一不同都重新评估
+        variants = [
+            dict(backtest_start='2023-05-01'),
+            dict(trading_settings={'initial_capital': 100000, 'position_ratio': 0.5,
+                                   'commission_rate': 0.001, 'slippage': 0.0}),
+            dict(turnover_rank_top_n=2),
+            dict(event_driven=True),
+        ]
+        for i, overrides in enumerate(variants, start=1):
+            factory = portfolio_engine_factory(**{
+                'data_start': '2023-01-01', 'data_end': '2023-12-31', 'backtest_start': '2023-03-01',
+                'backtest_end': '2023-12-31', 'turnover_rank_top_n': 0, **overrides})
+            optimize_strategy('volume_breakout', optimizer_stocks_data, param_ranges=grid,
+                              engine_factory=factory, store=store)
+            assert store.count('volume_breakout') == 4 + 2 * i
+
+        # 设置相同时直接读取
+        optimize_strategy('volume_breakout', optimizer_stocks_data, param_ranges=grid,
+                          engine_factory=engine_factory, store=store)
+        assert store.count('volume_breakout') == 4 + 2 * len(variants)
+
+    def test_unknown_strategy_or_param(self, optimizer_stocks_data):
+        with pytest.raises(ValueError):
+            optimize_strategy('foo', optimizer_stocks_data)
+        with pytest.raises(ValueError):
+            optimize_strategy('turtle_trading', optimizer_stocks_data, param_names=['foo'])
+
+
+class TestWalkForward:
+    """测试滚动样本外优化"""
+
+    @pytest.fixture
+    def walk_forward_data(self, random_walk_stocks):
+        return {
+            symbol: random_walk_stocks(seed + 10, n=260, start='2023-01-02', amount=(1000000000, 5000000000))
+            for seed, symbol in enumerate(['000001', '000002', '600000', '600001'])
+        }
+
+    @pytest.fixture
+    def engine_factory(self):
+        return portfolio_engine_factory(data_start='2023-01-01', data_end='2024-12-31',
+                                        backtest_start='2023-01-02', backtest_end='2024-12-31',
+                                        turnover_rank_top_n=0)
+
+    def test_windows_tile_oos_period(self):
+        """测试窗口首尾相接覆盖 OOS 期，训练窗口紧邻其前"""
+        days = pd.bdate_range('2024-01-01', periods=100)
+        windows = make_walk_forward_windows(days, train_days=30, test_days=20,
+                                            oos_start=str(days[40].date()), oos_end=str(days[94].date()))
+
+        assert [w['test_start'] for w in windows] == [days[40], days[60], days[80]]
+        assert windows[-1]['test_end'] == days[94]
+        for w in windows:
+            start = days.get_loc(w['test_start'])
+            assert w['train_start'] == days[start - 30]
+            assert w['train_end'] == days[start - 1]
+
+    def test_skips_windows_without_full_training(self):
+        days = pd.bdate_range('2024-01-01', periods=50)
+        windows = make_walk_forward_windows(days, train_days=30, test_days=10,
+                                            oos_start=str(days[10].date()), oos_end=str(days[49].date()))
+
+        assert windows[0]['test_start'] == days[30]
+
+    def test_walk_forward_serial_and_parallel(self, walk_forward_data, engine_factory):
+        """并行与串行结果一致；样本外净值为各测试窗口收益连乘"""
+        kwargs = dict(param_ranges={'entry_period': [10, 20], 'exit_period': [5, 10]},
+                      train_days=60, test_days=40, oos_start='2023-06-01', oos_end='2023-12-29',
+                      engine_factory=engine_factory)
+        serial = walk_forward_optimize('turtle_trading', walk_forward_data, **kwargs)
+        parallel = walk_forward_optimize('turtle_trading', walk_forward_data, n_jobs=2, **kwargs)
+
+        windows = serial['windows']
+        assert len(windows) == 4
+        pd.testing.assert_frame_equal(windows, parallel['windows'])
+        assert all(set(p) == {'entry_period', 'exit_period'} for p in windows['best_params'])
+
+        equity = np.cumprod(1 + windows['test_return'] / 100)
+        assert serial['oos_equity']['净值'].tolist() == pytest.approx(equity.tolist())
+        assert serial['oos_total_return_pct'] == pytest.approx((equity.iloc[-1] - 1) * 100, abs=0.01)
+
+    def test_best_params_maximize_train_objective(self, walk_forward_data, engine_factory):
+        """每个窗口的最优参数在训练窗口上的目标值不低于其他组合"""
+        result = walk_forward_optimize(
+            'turtle_trading', walk_forward_data,
+            param_ranges={'entry_period': [10, 20, 30]},
+            train_days=60, test_days=60, oos_start='2023-06-01', oos_end='2023-12-29',
+            engine_factory=engine_factory)
+
+        single = {}
+        for entry_period in (10, 20, 30):
+            single[entry_period] = walk_forward_optimize(
+                'turtle_trading', walk_forward_data, param_ranges={'entry_period': [entry_period]},
+                train_days=60, test_days=60, oos_start='2023-06-01', oos_end='2023-12-29',
+                engine_factory=engine_factory)['windows']['train_return']
+
+        for k, row in result['windows'].iterrows():
+            assert row['train_return'] == max(single[p].iloc[k] for p in single)
+
+    def test_default_ranges_sampled_within_budget(self, walk_forward_data, engine_factory, monkeypatch):
+        """默认网格远大于预算时只抽取 budget 组参数；不限预算的超大网格直接报错"""
+        generated = []
+        original = param_optimizer._full_span_trades
+
+        def counting(strategy_class, stocks_data, param_sets):
+            generated.extend(param_sets)
+            return original(strategy_class, stocks_data, param_sets)
+
+        monkeypatch.setattr(param_optimizer, '_full_span_trades', counting)
+        kwargs = dict(train_days=60, test_days=60, oos_start='2023-06-01', oos_end='2023-12-29',
+                      engine_factory=engine_factory)
+        result = walk_forward_optimize('turtle_trading', walk_forward_data, budget=4, seed=1, **kwargs)
+
+        assert len(generated) == 4
+        assert len(result['windows']) > 0
+        with pytest.raises(ValueError):
+            walk_forward_optimize('turtle_trading', walk_forward_data, budget=None, **kwargs)
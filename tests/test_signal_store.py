@@ -0,0 +1,109 @@
+"""测试signal_store.py - 买入信号物化表"""
+import pytest
+import pandas as pd
+import numpy as np
+from signal_store import SignalStore, signal_rows
+from strategy_new import GridTradingStrategy, DoubleMACrossStrategy
+
+
+def _stock(random_walk_stocks, seed, n=200):
+    df = random_walk_stocks(seed, n=n, sigma=0.03)
+    df['涨跌幅'] = df['收盘'].pct_change() * 100
+    return df
+
+
+def _reference_scan(strategy, stocks, start_date, end_date):
+    """物化前的扫描逻辑：逐只计算信号，逐行收集"""
+    hits = []
+    for symbol, df in stocks.items():
+        signals = strategy.calculate_signals(df)
+        date_col = pd.to_datetime(signals['日期'], errors='coerce').dt.strftime('%Y-%m-%d')
+        mask = (date_col >= start_date) & (date_col <= end_date) & (signals['Buy_Signal'] == True)
+        for _, row in signals[mask].iterrows():
+            hits.append({
+                'date': pd.to_datetime(row['日期']).strftime('%Y-%m-%d'),
+                'symbol': symbol,
+                'close': round(float(row['收盘']), 2),
+                'change_pct': round(float(row['涨跌幅']), 2) if pd.notna(row.get('涨跌幅')) else None,
+                'ma5': round(float(row['MA5']), 2) if 'MA5' in signals.columns and pd.notna(row.get('MA5')) else None,
+                'ma30': round(float(row['MA30']), 2) if 'MA30' in signals.columns and pd.notna(row.get('MA30')) else None,
+                'volume': int(row['成交量']),
+                'turnover_yi': round(float(row['成交额']) / 1e8, 2),
+            })
+    hits.sort(key=lambda x: x['date'], reverse=True)
+    return hits
+
+
+@pytest.fixture
+def stocks(random_walk_stocks):
+    return {f'{600000 + seed}': _stock(random_walk_stocks, seed) for seed in range(6)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SignalStore(tmp_path / 'signals.db')
+
+
+class _Loader:
+    """记录加载了哪些股票"""
+
+    def __init__(self, stocks):
+        self.stocks = stocks
+        self.loaded = []
+
+    def __call__(self, symbol):
+        self.loaded.append(symbol)
+        return self.stocks.get(symbol)
+
+
+class TestSignalStore:
+
+    @pytest.mark.parametrize('strategy_cls', [GridTradingStrategy, DoubleMACrossStrategy])
+    def test_query_matches_full_scan(self, store, stocks, strategy_cls):
+        strategy = strategy_cls({})
+        versions = {symbol: 'v1' for symbol in stocks}
+        store.refresh('s', {}, strategy, versions, _Loader(stocks))
+        assert len(_reference_scan(strategy, stocks, '2024-01-01', '2024-12-31')) > 0
+
+        for start, end in [('2024-01-01', '2024-12-31'), ('2024-05-01', '2024-06-30'), ('2030-01-01', '2030-01-02')]:
+            expected = _reference_scan(strategy, stocks, start, end)
+            found = store.query('s', {}, start, end, limit=10)
+            assert found['scanned'] == len(stocks)
+            assert found['matched'] == len(expected)
+            assert found['stocks'] == expected[:10]
+
+    def test_incremental_refresh(self, store, stocks, random_walk_stocks):
+        """只重算数据版本变化或新增的股票；移出缓存的股票删除信号"""
+        strategy = GridTradingStrategy({})
+        versions = {symbol: 'v1' for symbol in stocks}
+        loader = _Loader(stocks)
+        assert store.refresh('grid', {}, strategy, versions, loader) == len(stocks)
+        assert store.refresh('grid', {}, strategy, versions, loader) == 0
+
+        updated = dict(stocks)
+        updated['600001'] = _stock(random_walk_stocks, 100)
+        loader = _Loader(updated)
+        versions = dict(versions, **{'600001': 'v2'})
+        del versions['600005']
+        assert store.refresh('grid', {}, strategy, versions, loader) == 1
+        assert loader.loaded == ['600001']
+
+        del updated['600005']
+        expected = _reference_scan(strategy, updated, '2024-01-01', '2024-12-31')
+        found = store.query('grid', {}, '2024-01-01', '2024-12-31', limit=1000)
+        assert found['scanned'] == 5
+        assert found['stocks'] == expected
+
+    def test_params_are_separate(self, store, stocks):
+        """不同参数组合各自计算、互不影响"""
+        versions = {symbol: 'v1' for symbol in stocks}
+        store.refresh('grid', {'grid_count': 5}, GridTradingStrategy({'grid_count': 5}), versions, _Loader(stocks))
+
+        assert store.query('grid', {}, '2024-01-01', '2024-12-31')['scanned'] == 0
+        assert store.coverage('grid', {'grid_count': 5}) == versions
+        store.clear('grid')
+        assert store.coverage('grid', {'grid_count': 5}) == {}
+
+    def test_signal_rows_without_buy_signal(self):
+        assert signal_rows('600000', pd.DataFrame({'日期': [], '收盘': []})) == []
+        assert signal_rows('600000', None) == []
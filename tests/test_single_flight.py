@@ -0,0 +1,149 @@
+"""测试single_flight.py - 并发请求合并"""
+import threading
+import pytest
+from single_flight import SingleFlight
+
+
+class Retry(Exception):
+    pass
+
+
+def _concurrent(flight, key, func, n):
+    """n 个线程同时以相同 key 调用，返回 (结果列表, 异常列表)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, func))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_waiters(flight, key, n):
+    """等待 n 个请求合并到进行中的计算上"""
+    for _ in range(500):
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters >= n:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError('请求未合并')
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def compute():
+            executions.append(1)
+            release.wait(5)
+            return {'value': 42}
+
+        threads, results, errors = _concurrent(flight, 'k', compute, 5)
+        _wait_for_waiters(flight, 'k', 4)
+        assert flight.info()['in_flight'] == 1
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert executions == [1]
+        assert errors == []
+        assert len(results) == 5 and all(result is results[0] for result in results)
+        info = flight.info()
+        assert (info['requests'], info['executions'], info['coalesced'], info['in_flight']) == (5, 1, 4, 0)
+        assert info['coalesced_pct'] == 80.0
+
+        # 计算结束后再来的请求重新执行
+        assert flight.do('k', lambda: 'again') == 'again'
+        assert flight.info()['executions'] == 2
+
+    def test_different_keys_not_coalesced(self):
+        flight = SingleFlight()
+        assert flight.do('a', lambda: 1) == 1
+        assert flight.do('b', lambda: 2) == 2
+        assert flight.info()['coalesced'] == 0
+
+    def test_error_shared_with_waiters(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def compute():
+            release.wait(5)
+            raise ValueError('没有数据')
+
+        threads, results, errors = _concurrent(flight, 'k', compute, 3)
+        _wait_for_waiters(flight, 'k', 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == []
+        assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+        assert flight.info()['errors'] == 1
+
+    def test_waiters_retry_on_leader_cancellation(self):
+        """执行者抛出 retry_on 异常时，等待者重新计算"""
+        flight = SingleFlight(retry_on=(Retry,))
+        release = threading.Event()
+        attempts = []
+
+        def compute():
+            attempts.append(1)
+            if len(attempts) == 1:
+                release.wait(5)
+                raise Retry()
+            return 'ok'
+
+        threads, results, errors = _concurrent(flight, 'k', compute, 3)
+        _wait_for_waiters(flight, 'k', 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(errors) == 1 and isinstance(errors[0], Retry)
+        assert results == ['ok', 'ok']
+        assert len(attempts) in (2, 3)  # 重新发起的两个请求可能再次合并
+        assert flight.info()['requests'] == 3
+
+    def test_waiter_cancelled_by_wait_callback(self, monkeypatch):
+        """等待期间 wait_callback 抛出的异常只结束该等待者，执行者继续完成"""
+        monkeypatch.setattr('single_flight.WAIT_CALLBACK_INTERVAL', 0.01)
+        flight = SingleFlight()
+        release = threading.Event()
+        cancel = threading.Event()
+        polls = []
+
+        def wait_callback():
+            polls.append(1)
+            if cancel.is_set():
+                raise Retry()
+
+        threads, results, errors = _concurrent(flight, 'k', lambda: release.wait(5) and 'ok', 1)
+        _wait_for_waiters(flight, 'k', 0)
+        waiter_errors = []
+
+        def wait():
+            try:
+                flight.do('k', lambda: 'unused', wait_callback=wait_callback)
+            except Retry as e:
+                waiter_errors.append(e)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        _wait_for_waiters(flight, 'k', 1)
+        cancel.set()
+        waiter.join(5)
+        assert not waiter.is_alive() and len(waiter_errors) == 1 and polls
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert results == ['ok'] and errors == []
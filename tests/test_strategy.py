@@ -108,6 +108,36 @@ class TestVolumeBreakoutStrategy:
             assert trade['卖出日期'] == df.iloc[-1]['日期']
 
 
+    def test_signal_matrix_matches_calculate_signals(self, sample_stock_data, sample_strategy_params):
+        """信号矩阵每一行与单组参数的 Buy_Signal 一致"""
+        param_sets = [
+            dict(sample_strategy_params, ma_period=ma, volume_multiplier=mult, turnover_min=0.0)
+            for ma in (10, 20) for mult in (0.5, 1.0)
+        ]
+
+        matrix = VolumeBreakoutStrategy.calculate_signal_matrix(sample_stock_data, param_sets)
+
+        assert matrix.shape == (len(param_sets), len(sample_stock_data))
+        for row, params in zip(matrix, param_sets):
+            expected = VolumeBreakoutStrategy(params).calculate_signals(sample_stock_data)['Buy_Signal']
+            assert row.tolist() == expected.tolist()
+
+    def test_get_trades_batch_matches_single(self, sample_stock_data, sample_strategy_params):
+        """批量提取的交易与逐组调用 get_trades 一致"""
+        param_sets = [
+            dict(sample_strategy_params, ma_period=ma, hold_days=hold,
+                 volume_multiplier=0.5, turnover_min=0.0)
+            for ma in (10, 20) for hold in (1, 3)
+        ]
+
+        batch = VolumeBreakoutStrategy.get_trades_batch(sample_stock_data, param_sets)
+
+        assert len(batch) == len(param_sets)
+        assert any(batch)
+        for trades, params in zip(batch, param_sets):
+            assert trades == VolumeBreakoutStrategy(params).get_trades(sample_stock_data)
+
+
 class TestSteadyTrendStrategy:
     """测试稳健型趋势跟踪策略"""
 
@@ -235,6 +265,18 @@ class TestBalancedMultiFactorStrategy:
             assert valid_scores.min() >= 0
             assert valid_scores.max() <= 1
 
+    def test_vectorized_factor_score_matches_row_score(self, sample_stock_data, sample_balanced_multi_factor_params):
+        """测试向量化评分与逐行评分一致，并输出各因子明细列"""
+        strategy = BalancedMultiFactorStrategy(sample_balanced_multi_factor_params)
+        df_signals = strategy.calculate_signals(sample_stock_data)
+
+        for col in ['Factor_Boll', 'Factor_RSI', 'Factor_MACD', 'Factor_Volume', 'Factor_Price']:
+            assert col in df_signals.columns
+
+        assert (df_signals['Factor_Score'].iloc[:20] == 0).all()
+        expected = [strategy.calculate_factor_score(df_signals, i) for i in range(20, len(df_signals))]
+        np.testing.assert_allclose(df_signals['Factor_Score'].iloc[20:].values, expected, rtol=1e-12)
+
     def test_calculate_signals(self, sample_stock_data, sample_balanced_multi_factor_params):
         """测试信号计算"""
         strategy = BalancedMultiFactorStrategy(sample_balanced_multi_factor_params)
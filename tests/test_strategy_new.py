@@ -0,0 +1,165 @@
+"""测试strategy_new.py - 新增策略模块"""
+import pytest
+import pandas as pd
+import numpy as np
+from strategy_new import GridTradingStrategy, TurtleTradingStrategy
+
+
+@pytest.fixture
+def oscillating_stock_data(random_walk_stocks):
+    """创建震荡行情数据（适合网格/突破策略）"""
+    return random_walk_stocks(11, n=400, start='2023-01-02', noisy_range=True)
+
+
+class TestGridTradingStrategy:
+    """测试网格交易策略"""
+
+    @pytest.fixture
+    def grid_params(self):
+        return {
+            'grid_levels': 5,
+            'price_range': 0.10,
+            'grid_profit': 0.03,
+            'max_positions': 3,
+            'rebalance_days': 10,
+            'stop_loss': 0.08,
+        }
+
+    def test_trade_fields_and_status(self, oscillating_stock_data, grid_params):
+        """测试交易记录结构"""
+        trades = GridTradingStrategy(grid_params).get_trades(oscillating_stock_data)
+
+        assert len(trades) > 0
+        for trade in trades:
+            assert trade['状态'] in ('网格止盈', '止损', '未平仓')
+            assert trade['卖出日期'] >= trade['买入日期']
+            if trade['状态'] == '网格止盈':
+                assert trade['收益率%'] >= 3 - 0.1 - 1e-9
+            elif trade['状态'] == '止损':
+                assert trade['收益率%'] <= -8 - 0.1 + 1e-9
+
+    def test_max_positions_respected(self, oscillating_stock_data, grid_params):
+        """同一时刻持仓网格数不超过 max_positions"""
+        grid_params['max_positions'] = 2
+        trades = GridTradingStrategy(grid_params).get_trades(oscillating_stock_data)
+
+        for trade in trades:
+            # 建仓当日已持有（且当日未平仓）的网格数
+            holding = sum(
+                1 for other in trades
+                if other is not trade
+                and other['买入日期'] <= trade['买入日期'] <= other['卖出日期']
+                and not (other['买入日期'] == trade['买入日期'])
+            )
+            assert holding < 2
+
+    def test_trades_ordered_by_exit(self, oscillating_stock_data, grid_params):
+        """已平仓交易按卖出日期排序，未平仓排在最后"""
+        trades = GridTradingStrategy(grid_params).get_trades(oscillating_stock_data)
+        closed = [t for t in trades if t['状态'] != '未平仓']
+
+        assert [t['卖出日期'] for t in closed] == sorted(t['卖出日期'] for t in closed)
+        assert all(t['状态'] == '未平仓' for t in trades[len(closed):])
+
+    def test_first_buy_uses_grid_levels(self, oscillating_stock_data, grid_params):
+        """首笔买入满足 calculate_grid_levels 给出的买入线"""
+        strategy = GridTradingStrategy(grid_params)
+        trades = strategy.get_trades(oscillating_stock_data)
+        df = oscillating_stock_data
+
+        buy_idx = int(df.index[df['日期'] == trades[0]['买入日期']][0])
+        rd = grid_params['rebalance_days']
+        reset_idx = rd + (buy_idx - rd) // rd * rd
+        levels = strategy.calculate_grid_levels(df, reset_idx)
+
+        assert any(df['收盘'].iloc[buy_idx] <= level for level in levels['buy_levels'])
+
+    def test_short_data(self, grid_params):
+        """数据不足一个重置周期时没有交易"""
+        df = pd.DataFrame({
+            '日期': pd.bdate_range('2024-01-01', periods=5),
+            '收盘': [10.0, 9.0, 8.0, 7.0, 6.0],
+            '高': [10.0] * 5,
+            '低': [6.0] * 5,
+        })
+
+        assert GridTradingStrategy(grid_params).get_trades(df) == []
+
+
+class TestTurtleTradingStrategy:
+    """测试海龟交易策略"""
+
+    @pytest.fixture
+    def turtle_params(self):
+        return {
+            'entry_period': 20,
+            'exit_period': 10,
+            'atr_period': 14,
+            'atr_stop_mult': 2.0,
+            'pyramid_atr': 0.3,
+            'max_units': 4,
+            'use_filter': False,
+        }
+
+    def _reference_trades(self, strategy, df):
+        """逐行参考实现（重构前的持仓循环）"""
+        df = strategy.calculate_signals(df)
+        trades = []
+        position = None
+        units = []
+        for i in range(max(strategy.entry_period, strategy.atr_period), len(df)):
+            row = df.iloc[i]
+            if row['Entry_Signal'] and position is None:
+                position = row
+                units = [row['收盘']]
+                continue
+            if position is not None:
+                if len(units) < strategy.max_units:
+                    if row['收盘'] > units[-1] + row['ATR'] * strategy.pyramid_atr:
+                        units.append(row['收盘'])
+                avg_price = sum(units) / len(units)
+                if row['收盘'] <= avg_price - row['ATR'] * strategy.atr_stop_mult:
+                    reason = 'ATR止损'
+                elif row['Exit_Signal']:
+                    reason = '跌破出场线'
+                else:
+                    continue
+                trades.append((position['日期'], row['日期'], avg_price, reason, len(units) - 1))
+                position = None
+                units = []
+        if position is not None:
+            trades.append((position['日期'], df.iloc[-1]['日期'], sum(units) / len(units),
+                           '未平仓', len(units) - 1))
+        return trades
+
+    def test_matches_row_loop(self, oscillating_stock_data, turtle_params):
+        """数组实现与逐行循环结果一致（含加仓次数）"""
+        strategy = TurtleTradingStrategy(turtle_params)
+        trades = strategy.get_trades(oscillating_stock_data)
+        expected = self._reference_trades(strategy, oscillating_stock_data)
+
+        assert len(trades) > 0
+        assert any(t['加仓次数'] > 0 for t in trades)
+        assert [(t['买入日期'], t['卖出日期'], t['买入价'], t['状态'], t['加仓次数'])
+                for t in trades] == expected
+
+    def test_max_units_respected(self, oscillating_stock_data, turtle_params):
+        """加仓次数不超过 max_units - 1"""
+        turtle_params['pyramid_atr'] = 0.05
+        turtle_params['max_units'] = 2
+        trades = TurtleTradingStrategy(turtle_params).get_trades(oscillating_stock_data)
+
+        assert max(t['加仓次数'] for t in trades) == 1
+
+    def test_shared_cache_for_param_sweep(self, oscillating_stock_data, turtle_params):
+        """参数扫描共享指标缓存，结果与独立计算一致"""
+        cache = {}
+        for entry_period in (10, 20):
+            for exit_period in (5, 10):
+                params = dict(turtle_params, entry_period=entry_period, exit_period=exit_period)
+                strategy = TurtleTradingStrategy(params)
+                assert strategy.get_trades(oscillating_stock_data, cache=cache) == \
+                    strategy.get_trades(oscillating_stock_data)
+
+        assert ('high_n', 10) in cache and ('low_n', 5) in cache
+        assert len([key for key in cache if key[0] == 'atr']) == 1
@@ -0,0 +1,83 @@
+"""测试streaming_backtest.py - 流式组合回测"""
+import pytest
+import pandas as pd
+import numpy as np
+from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig
+from streaming_backtest import run_streaming_backtest, LedgerSpill, current_rss_mb
+from trade_ledger import TradeLedger
+from strategy_new import TurtleTradingStrategy
+
+
+@pytest.fixture
+def stocks_data(random_walk_stocks):
+    stocks_data = {f'{600000 + seed}': random_walk_stocks(seed) for seed in range(12)}
+    # 只有预热期数据、回测区间内无行情的股票
+    stocks_data['688000'] = stocks_data['600000'].iloc[:20].copy()
+    return stocks_data
+
+
+def _engine(event_driven=False, top_n=0):
+    time_config = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+    return EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, time_config=time_config,
+                                  event_driven=event_driven, turnover_rank_top_n=top_n, n_jobs=1)
+
+
+class TestStreamingBacktest:
+    """测试流式回测与普通模式结果一致"""
+
+    @pytest.mark.parametrize('event_driven', [False, True])
+    @pytest.mark.parametrize('top_n', [0, 5])
+    def test_matches_in_memory_run(self, stocks_data, event_driven, top_n):
+        strategy = TurtleTradingStrategy({'use_filter': False})
+        expected = _engine(event_driven, top_n).run_multiple_stocks_with_portfolio(stocks_data, strategy)
+        results = run_streaming_backtest(_engine(event_driven, top_n), list(stocks_data), stocks_data.get,
+                                         strategy, chunk_size=5, memory_budget_mb=0)
+
+        for key in ('portfolio_summary', 'trade_history', 'rejected_trades', 'risk_metrics', 'round_trips'):
+            assert results[key] == expected[key], key
+        np.testing.assert_array_equal(results['daily_series']['nav'], expected['daily_series']['nav'])
+        assert results['ledger'].records() == expected['ledger'].records()
+        assert {s: r['num_trades'] for s, r in results['stock_results'].items()} == \
+            {s: r['num_trades'] for s, r in expected['stock_results'].items()}
+        assert 'trades' not in results['stock_results']['600000']
+        assert results['streaming']['chunks'] == 3
+
+    def test_spills_when_over_budget(self, stocks_data, tmp_path):
+        """超出内存预算时分块写盘并缩小加载分块，撮合后的分块也留在磁盘，结束后清理临时文件"""
+        strategy = TurtleTradingStrategy({'use_filter': False})
+        expected = _engine().run_multiple_stocks_with_portfolio(stocks_data, strategy)
+        progress = []
+        results = run_streaming_backtest(_engine(), list(stocks_data), stocks_data.get, strategy,
+                                         chunk_size=8, memory_budget_mb=1e-3, spill_dir=tmp_path,
+                                         progress_callback=lambda done, total, phase: progress.append((done, phase)))
+
+        if current_rss_mb() is None:
+            pytest.skip('无法获取进程内存')
+        assert results['streaming']['spilled_chunks'] == results['streaming']['chunks'] == 3  # 8 + 4 + 1
+        assert results['streaming']['spilled_matched_chunks'] == 3
+        assert progress == [(8, 'signals'), (12, 'signals'), (13, 'signals'), (13, 'portfolio')]
+        assert results['ledger'].records() == expected['ledger'].records()
+        assert results['portfolio_summary'] == expected['portfolio_summary']
+        assert list(tmp_path.iterdir()) == []
+
+    def test_missing_symbols(self, stocks_data):
+        """加载不到数据的股票跳过"""
+        results = run_streaming_backtest(_engine(), ['999999'], stocks_data.get,
+                                         TurtleTradingStrategy({'use_filter': False}))
+        assert results['stock_results'] == {}
+        assert len(results['ledger']) == 0
+        assert results['daily_series'] is None
+
+
+def test_ledger_spill_round_trip(tmp_path):
+    spill = LedgerSpill(tmp_path)
+    ledgers = [TradeLedger.from_records([{'收益率%': float(i)}], symbol=f'60000{i}') for i in range(3)]
+    spill.append(ledgers[0])
+    spill.spill()
+    spill.append(ledgers[1])
+    spill.append(ledgers[2])
+
+    assert [ledger.records() for ledger in spill] == [ledger.records() for ledger in ledgers]
+    assert spill.spilled_chunks == 1
+    spill.cleanup()
+    assert list(tmp_path.iterdir()) == []
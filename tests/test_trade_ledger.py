@@ -0,0 +1,165 @@
+"""测试trade_ledger.py - 列式交易账本"""
+import pytest
+import pandas as pd
+import numpy as np
+from trade_ledger import TradeLedger, LedgerRecords, CATEGORY, DATE, INT, FLOAT
+from backtest_engine_enhanced import EnhancedBacktestEngine, BacktestTimeConfig
+from strategy_new import TurtleTradingStrategy
+
+
+@pytest.fixture
+def sample_trades_by_symbol():
+    dates = pd.bdate_range('2024-01-01', periods=10)
+    return {
+        '600000': [
+            {'买入日期': dates[0], '买入价': 10.0, '卖出日期': dates[2], '卖出价': 11.0,
+             '持有天数': 2, '收益率%': 9.9, '状态': '止盈'},
+            {'买入日期': dates[3], '买入价': 11.0, '卖出日期': dates[5], '卖出价': 10.0,
+             '持有天数': 2, '收益率%': -9.2, '状态': '止损', 'portfolio_status': 'REJECTED'},
+        ],
+        '600001': [],
+        '600002': [
+            {'买入日期': dates[4], '买入价': 5.0, '卖出日期': dates[9], '卖出价': 5.5,
+             '持有天数': 5, '收益率%': 9.9, '状态': '止盈', '加仓次数': 1},
+        ],
+    }
+
+
+def _flat(trades_by_symbol):
+    return [dict(trade, symbol=symbol) for symbol, trades in trades_by_symbol.items() for trade in trades]
+
+
+class TestTradeLedger:
+    """测试账本构建与视图"""
+
+    def test_column_kinds(self, sample_trades_by_symbol):
+        """文本列为类别编码，日期为 int64 纳秒"""
+        ledger = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+
+        assert len(ledger) == 3
+        assert ledger.kinds['symbol'] == CATEGORY
+        assert ledger.kinds['状态'] == CATEGORY
+        assert ledger.kinds['买入日期'] == DATE
+        assert ledger.kinds['持有天数'] == INT
+        assert ledger.kinds['加仓次数'] == FLOAT  # 部分交易缺失
+        assert ledger.column('symbol').tolist() == [0, 0, 2]
+        assert ledger.categories['状态'] == ['止盈', '止损']
+        assert ledger.column('买入日期')[0] == pd.Timestamp('2024-01-01').value
+
+    def test_records_round_trip(self, sample_trades_by_symbol):
+        """惰性字典视图与原始记录一致（缺失的键不出现）"""
+        ledger = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+        records = ledger.records()
+
+        assert isinstance(records, LedgerRecords)
+        assert records == _flat(sample_trades_by_symbol)
+        assert 'portfolio_status' not in records[0]
+        assert records[-1]['加仓次数'] == 1.0
+        assert records[1:2] == [_flat(sample_trades_by_symbol)[1]]
+
+    def test_frame_is_zero_copy(self, sample_trades_by_symbol):
+        """DataFrame 视图的数值列与日期列共享账本内存"""
+        ledger = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+        frame = ledger.to_frame()
+
+        assert np.shares_memory(frame['收益率%'].to_numpy(), ledger.data)
+        assert np.shares_memory(frame['买入日期'].to_numpy(), ledger.data)
+        assert frame['状态'].tolist() == ['止盈', '止损', '止盈']
+        assert frame['收益率%'].sum() == pytest.approx(10.6)
+
+    def test_concat_and_split(self, sample_trades_by_symbol):
+        """按股票构建后合并与整体构建一致，拆分后还原每只股票的交易"""
+        whole = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+        parts = [TradeLedger.from_records(trades, symbol=symbol)
+                 for symbol, trades in sample_trades_by_symbol.items()]
+
+        assert TradeLedger.concat(parts).records() == whole.records()
+
+        split = whole.split_by_symbol()
+        assert list(split) == list(sample_trades_by_symbol)
+        assert len(split['600001']) == 0
+        assert split['600002'].records() == _flat({'600002': sample_trades_by_symbol['600002']})
+
+    def test_filled_matches_get_default(self, sample_trades_by_symbol):
+        """filled 与 trade.get(key, 0) 口径一致"""
+        ledger = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+
+        assert ledger.filled('加仓次数').tolist() == [0.0, 0.0, 1.0]
+        assert ledger.filled('不存在的列').tolist() == [0.0, 0.0, 0.0]
+
+    def test_select_and_merge_columns(self, sample_trades_by_symbol):
+        """按列取子集；合并部分缺失的新列时缺失的键不出现"""
+        ledger = TradeLedger.from_trades_by_symbol(sample_trades_by_symbol)
+
+        assert ledger.select_columns(['买入价', '不存在的列']).columns == ['买入价']
+        assert ledger.to_dicts(['symbol', '买入价']) == [
+            {'symbol': '600000', '买入价': 10.0}, {'symbol': '600000', '买入价': 11.0},
+            {'symbol': '600002', '买入价': 5.0}]
+
+        statuses = TradeLedger.from_records([{}, {}, {'rejection_reason': '资金不足'}])
+        merged = ledger.with_columns({'rejection_reason': statuses.data['rejection_reason']},
+                                     kinds=statuses.kinds, categories=statuses.categories,
+                                     present=statuses.present)
+        assert 'rejection_reason' not in merged.records()[0]
+        assert merged.records()[2]['rejection_reason'] == '资金不足'
+
+    def test_empty(self):
+        """空账本"""
+        ledger = TradeLedger.from_records([])
+
+        assert len(ledger) == 0
+        assert ledger.records() == []
+        assert len(ledger.to_frame()) == 0
+
+
+class TestEngineLedger:
+    """测试引擎输出的账本"""
+
+    @pytest.fixture
+    def stocks_data(self, random_walk_stocks):
+        return {f'{600000 + seed}': random_walk_stocks(seed) for seed in range(4)}
+
+    def _engine(self):
+        time_config = BacktestTimeConfig('2024-01-01', '2025-12-31', '2024-03-01', '2025-02-28')
+        return EnhancedBacktestEngine(initial_capital=100000, position_ratio=0.2, time_config=time_config)
+
+    def test_portfolio_ledger_matches_stock_results(self, stocks_data):
+        """组合回测的账本与 stock_results 中的交易（含撮合状态）一致"""
+        results = self._engine().run_multiple_stocks_with_portfolio(
+            stocks_data, TurtleTradingStrategy({'use_filter': False}))
+
+        expected = _flat({symbol: sr['trades'] for symbol, sr in results['stock_results'].items()})
+        assert len(expected) > 0
+        assert results['ledger'].records() == expected
+
+    def test_single_stock_uses_ledger(self, stocks_data):
+        """单股回测的交易、DataFrame 与逐笔成本计算一致"""
+        engine = self._engine()
+        strategy = TurtleTradingStrategy({'use_filter': False})
+        result = engine.run_single_stock('600000', stocks_data['600000'], strategy)
+
+        trades = strategy.get_trades(engine.time_config.filter_data(stocks_data['600000']))
+        expected = [engine.apply_trading_costs(trade) for trade in trades]
+        assert result['trades'] == expected
+        assert result['trades_df']['收益率%'].tolist() == [t['收益率%'] for t in expected]
+        assert result['total_return'] == pytest.approx(round(sum(t['收益率%'] for t in expected), 2))
+
+    def test_single_stock_result_is_plain_and_independent(self, stocks_data):
+        """对外的 trades 为可修改、可 JSON 序列化的列表；trades_df 写入不影响账本"""
+        from flask import Flask
+
+        result = self._engine().run_single_stock('600000', stocks_data['600000'],
+                                                 TurtleTradingStrategy({'use_filter': False}))
+        assert type(result['trades']) is list and len(result['trades']) > 0
+        with Flask(__name__).app_context():
+            from flask import json
+            assert json.loads(json.dumps(result['trades']))[0]['买入价'] == result['trades'][0]['买入价']
+
+        result['trades'][0]['买入价'] = 999.0
+        result['trades'].append({})
+        assert result['ledger'].column('买入价')[0] != 999.0
+
+        with pytest.raises(ValueError):
+            result['trades_df'].loc[0, '买入价'] = 999.0
+        assert result['ledger'].column('买入价')[0] != 999.0
+
@@ -0,0 +1,390 @@
+"""
+列式交易账本 - 用 NumPy 结构化数组保存整次回测的交易记录
+
+策略输出的交易记录是中文键的字典列表（'买入日期'、'收益率%' ...），
+在引擎、风险指标与 Excel 导出之间反复转换为 DataFrame、逐笔复制。
+TradeLedger 把它们一次性转为列式存储：
+- 数值列为 float64 / int64 / bool，日期列为 int64 纳秒
+- 股票代码、出场原因等文本列为小整数类别编码（categories 保存取值表）
+- to_frame() 返回零拷贝的只读 DataFrame 视图，records() 返回按需生成字典的惰性视图，
+  to_dicts() 返回普通的字典列表（引擎结果对外的 'trades'，可修改、可 JSON 序列化）
+
+列名沿用交易记录的中文键，frame 与原先 pd.DataFrame(trades) 的列一致。
+"""
+from collections.abc import Sequence
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# 列类型
+BOOL = 'bool'
+INT = 'int'
+FLOAT = 'float'
+DATE = 'date'
+CATEGORY = 'category'
+OBJECT = 'object'
+
+_DTYPES = {BOOL: np.bool_, INT: np.int64, FLOAT: np.float64, DATE: np.int64,
+           CATEGORY: np.int32, OBJECT: object}
+
+_NAT = np.iinfo(np.int64).min
+_MISSING = object()
+
+
+def _column_kind(values: list) -> str:
+    """根据一列（已去除缺失值）的取值推断列类型"""
+    if not values:
+        return FLOAT
+    if all(isinstance(v, (bool, np.bool_)) for v in values):
+        return BOOL
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+        return INT
+    if all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_))
+           for v in values):
+        return FLOAT
+    if all(isinstance(v, (pd.Timestamp, datetime, date, np.datetime64)) for v in values):
+        return DATE
+    try:
+        for v in values:
+            hash(v)
+    except TypeError:
+        return OBJECT
+    return CATEGORY
+
+
+class TradeLedger:
+    """
+    列式交易账本
+
+    data 为结构化数组（每笔交易一行），categories 为类别列的取值表，
+    kinds 为每列类型，present 记录部分交易缺失的列（缺失位置为 False）。
+    """
+
+    def __init__(self, data: np.ndarray, kinds: dict, categories: dict = None, present: dict = None):
+        self.data = data
+        self.kinds = kinds
+        self.categories = categories or {}
+        self.present = present or {}
+
+    # ── 构建 ─────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def from_records(cls, records: list, symbol: str = None) -> 'TradeLedger':
+        """
+        由交易记录字典列表构建账本
+
+        Args:
+            records: 交易记录列表（各记录的键可以不完全相同）
+            symbol: 提供时增加类别列 'symbol'
+        """
+        if symbol is not None:
+            return cls.from_trades_by_symbol({symbol: records})
+
+        columns = list(dict.fromkeys(key for record in records for key in record))
+        n = len(records)
+        kinds, categories, present, arrays = {}, {}, {}, {}
+        for key in columns:
+            raw = [record.get(key, _MISSING) for record in records]
+            mask = np.array([v is not _MISSING for v in raw], dtype=bool)
+            values = [v for v in raw if v is not _MISSING]
+            kind = _column_kind(values)
+            if not mask.all():
+                present[key] = mask
+                # 缺失的整数位置无法表示，整列按浮点存储
+                kind = FLOAT if kind == INT else kind
+
+            if kind == CATEGORY:
+                lookup = {}
+                codes = np.full(n, -1, dtype=np.int32)
+                for i, v in enumerate(raw):
+                    if v is not _MISSING:
+                        codes[i] = lookup.setdefault(v, len(lookup))
+                categories[key] = list(lookup)
+                arrays[key] = codes
+            elif kind == DATE:
+                column = np.full(n, _NAT, dtype=np.int64)
+                column[mask] = pd.to_datetime(pd.Series(values)).values.astype('datetime64[ns]').astype(np.int64)
+                arrays[key] = column
+            elif kind == OBJECT:
+                column = np.empty(n, dtype=object)
+                column[:] = [None if v is _MISSING else v for v in raw]
+                arrays[key] = column
+            else:
+                fill = np.nan if kind == FLOAT else 0
+                arrays[key] = np.array([fill if v is _MISSING else v for v in raw], dtype=_DTYPES[kind])
+            kinds[key] = kind
+
+        return cls._from_arrays(arrays, kinds, categories, present, n)
+
+    @classmethod
+    def from_trades_by_symbol(cls, trades_by_symbol: dict) -> 'TradeLedger':
+        """由 {symbol: 交易记录列表} 构建账本，增加类别列 'symbol'（股票顺序即编码顺序）"""
+        symbols = list(trades_by_symbol)
+        records = [trade for trades in trades_by_symbol.values() for trade in trades]
+        counts = [len(trades) for trades in trades_by_symbol.values()]
+        ledger = cls.from_records(records)
+
+        codes = np.repeat(np.arange(len(symbols), dtype=np.int32), counts)
+        return ledger.with_columns({'symbol': codes}, kinds={'symbol': CATEGORY},
+                                   categories={'symbol': symbols}, first=True)
+
+    @classmethod
+    def _from_arrays(cls, arrays: dict, kinds: dict, categories: dict, present: dict, n: int) -> 'TradeLedger':
+        dtype = np.dtype([(key, _DTYPES[kinds[key]]) for key in arrays])
+        data = np.empty(n, dtype=dtype)
+        for key, column in arrays.items():
+            data[key] = column
+        return cls(data, dict(kinds), dict(categories), dict(present))
+
+    @classmethod
+    def concat(cls, ledgers: list) -> 'TradeLedger':
+        """按顺序合并多个账本（类别列的取值表合并后重新编码）"""
+        ledgers = [ledger for ledger in ledgers if ledger is not None]
+        if not ledgers:
+            return cls.from_records([])
+        if len(ledgers) == 1:
+            return ledgers[0]
+
+        columns = list(dict.fromkeys(key for ledger in ledgers for key in ledger.columns))
+        n = sum(len(ledger) for ledger in ledgers)
+        kinds, categories, present, arrays = {}, {}, {}, {}
+        for key in columns:
+            key_kinds = {ledger.kinds[key] for ledger in ledgers if key in ledger.kinds}
+            if len(key_kinds) > 1:
+                # 各账本类型不一致时统一转为浮点（数值）或类别（其他）
+                numeric = key_kinds <= {BOOL, INT, FLOAT}
+                kind = FLOAT if numeric else OBJECT
+            else:
+                kind = key_kinds.pop()
+            missing = any(key not in ledger.kinds or key in ledger.present for ledger in ledgers)
+            if missing and kind == INT:
+                kind = FLOAT
+
+            parts, masks = [], []
+            if kind == CATEGORY:
+                lookup = {}
+                for ledger in ledgers:
+                    if key in ledger.kinds:
+                        remap = np.array([lookup.setdefault(v, len(lookup)) for v in ledger.categories[key]] + [-1],
+                                         dtype=np.int32)
+                        parts.append(remap[ledger.data[key]])  # 编码 -1 映射到末尾的 -1
+                    else:
+                        parts.append(np.full(len(ledger), -1, dtype=np.int32))
+                categories[key] = list(lookup)
+            else:
+                for ledger in ledgers:
+                    if key not in ledger.kinds:
+                        fill = {DATE: _NAT, FLOAT: np.nan, BOOL: False, INT: 0, OBJECT: None}[kind]
+                        part = np.full(len(ledger), fill, dtype=_DTYPES[kind])
+                    elif kind == OBJECT:
+                        part = np.empty(len(ledger), dtype=object)
+                        part[:] = ledger.python_values(key)
+                    else:
+                        part = ledger.data[key].astype(_DTYPES[kind])
+                    parts.append(part)
+            for ledger in ledgers:
+                if key not in ledger.kinds:
+                    masks.append(np.zeros(len(ledger), dtype=bool))
+                else:
+                    masks.append(ledger.present.get(key, np.ones(len(ledger), dtype=bool)))
+
+            arrays[key] = np.concatenate(parts)
+            kinds[key] = kind
+            if missing:
+                present[key] = np.concatenate(masks)
+
+        return cls._from_arrays(arrays, kinds, categories, present, n)
+
+    def with_columns(self, arrays: dict, kinds: dict = None, categories: dict = None,
+                     first: bool = False, present: dict = None) -> 'TradeLedger':
+        """
+        返回增加/替换若干列后的新账本（数值列类型按数组 dtype 推断）
+
+        Args:
+            arrays: {列名: 等长数组}
+            kinds: 指定列类型（如 CATEGORY 编码列）
+            categories: 类别列的取值表
+            first: 新列放在最前面（否则追加在末尾，已存在的列保持原位置）
+            present: 新列中部分交易缺失时的掩码 {列名: 布尔数组}
+        """
+        kinds = dict(kinds or {})
+        for key, column in arrays.items():
+            if key not in kinds:
+                column = np.asarray(column)
+                if column.dtype == np.bool_:
+                    kinds[key] = BOOL
+                elif np.issubdtype(column.dtype, np.integer):
+                    kinds[key] = INT
+                elif np.issubdtype(column.dtype, np.datetime64):
+                    arrays[key] = column.astype('datetime64[ns]').astype(np.int64)
+                    kinds[key] = DATE
+                else:
+                    kinds[key] = FLOAT
+
+        existing = [key for key in self.columns if key not in arrays or not first]
+        order = (list(arrays) + existing) if first else existing + [k for k in arrays if k not in self.kinds]
+        merged = {key: arrays[key] if key in arrays else self.data[key] for key in order}
+        merged_kinds = {key: kinds[key] if key in arrays else self.kinds[key] for key in order}
+        merged_categories = {key: values for key, values in self.categories.items() if key not in arrays}
+        merged_categories.update(categories or {})
+        merged_present = {key: mask for key, mask in self.present.items() if key not in arrays}
+        merged_present.update(present or {})
+        return self._from_arrays(merged, merged_kinds, merged_categories, merged_present, len(self))
+
+    # ── 访问 ─────────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def columns(self) -> list:
+        return list(self.data.dtype.names or ())
+
+    def __contains__(self, key) -> bool:
+        return key in self.kinds
+
+    def column(self, key: str) -> np.ndarray:
+        """列的存储数组视图（日期为 int64 纳秒，类别列为编码）"""
+        if key not in self.kinds:
+            raise KeyError(key)
+        return self.data[key]
+
+    def filled(self, key: str, fill: float = 0.0) -> np.ndarray:
+        """数值列，缺失的交易（或整列不存在时）取 fill，与 trade.get(key, fill) 口径一致"""
+        if key not in self.kinds:
+            return np.full(len(self), fill, dtype=float)
+        column = self.data[key]
+        if key in self.present:
+            column = np.where(self.present[key], column, fill)
+        return column
+
+    def values(self, key: str) -> np.ndarray:
+        """列的取值数组（日期为 datetime64[ns] 视图，类别列解码为 object 数组）"""
+        if key not in self.kinds:
+            raise KeyError(key)
+        kind = self.kinds[key]
+        if kind == DATE:
+            return self.data[key].view('datetime64[ns]')
+        if kind == CATEGORY:
+            lookup = np.empty(len(self.categories[key]) + 1, dtype=object)
+            lookup[:-1] = self.categories[key]
+            lookup[-1] = None
+            return lookup[self.data[key]]
+        return self.data[key]
+
+    def python_values(self, key: str) -> list:
+        """列的 Python 对象列表（日期为 pd.Timestamp，数值为 float/int，类别列为原取值）"""
+        kind = self.kinds[key]
+        if kind == DATE:
+            return [pd.NaT if v == _NAT else pd.Timestamp(v) for v in self.data[key].tolist()]
+        if kind == CATEGORY:
+            return self.values(key).tolist()
+        return self.data[key].tolist()
+
+    def select(self, rows) -> 'TradeLedger':
+        """按布尔掩码或下标选取交易行"""
+        present = {key: mask[rows] for key, mask in self.present.items()}
+        return TradeLedger(self.data[rows], dict(self.kinds), dict(self.categories), present)
+
+    def for_symbol(self, symbol: str) -> 'TradeLedger':
+        """某只股票的交易（需要 'symbol' 列）"""
+        values = self.categories.get('symbol', [])
+        if symbol not in values:
+            return self.select(np.zeros(len(self), dtype=bool))
+        return self.select(self.data['symbol'] == values.index(symbol))
+
+    def split_by_symbol(self) -> dict:
+        """按 'symbol' 列拆分为 {symbol: 子账本}（股票按类别顺序，组内保持原顺序）"""
+        codes = self.data['symbol']
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(self.categories['symbol']) + 1))
+        return {
+            symbol: self.select(order[bounds[j]:bounds[j + 1]])
+            for j, symbol in enumerate(self.categories['symbol'])
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        DataFrame 视图：数值列与日期列与账本共享内存（不复制），类别列为 pandas Categorical
+
+        共享的列为只读视图，写入 DataFrame 不会改动账本（需要修改时先 .copy()）。
+        """
+        columns = {}
+        for key in self.columns:
+            kind = self.kinds[key]
+            if kind == CATEGORY:
+                columns[key] = pd.Categorical.from_codes(self.data[key], categories=self.categories[key])
+                continue
+            column = self.data[key].view('datetime64[ns]') if kind == DATE else self.data[key].view()
+            column.setflags(write=False)
+            columns[key] = column
+        return pd.DataFrame(columns, copy=False)
+
+    def records(self) -> 'LedgerRecords':
+        """惰性字典视图：按下标访问时才生成交易记录字典"""
+        return LedgerRecords(self)
+
+    def select_columns(self, columns: list) -> 'TradeLedger':
+        """只保留指定列（不存在的列忽略）"""
+        columns = [key for key in columns if key in self.kinds]
+        return TradeLedger(
+            self.data[columns],
+            {key: self.kinds[key] for key in columns},
+            {key: values for key, values in self.categories.items() if key in columns},
+            {key: mask for key, mask in self.present.items() if key in columns},
+        )
+
+    def to_dicts(self, columns: list = None) -> list:
+        """
+        全部交易记录字典（Python 原生类型，可直接 JSON 序列化；日期为 pd.Timestamp）
+
+        Args:
+            columns: 只取这些列（默认全部列）
+        """
+        ledger = self if columns is None else self.select_columns(columns)
+        return list(ledger.records())
+
+
+class LedgerRecords(Sequence):
+    """
+    TradeLedger 的只读字典视图
+
+    行为与交易记录列表一致（len / 下标 / 切片 / 迭代 / ==），每列在首次访问时整列转换为
+    Python 对象并缓存，之后生成每条字典只做取值。
+    """
+
+    def __init__(self, ledger: TradeLedger):
+        self.ledger = ledger
+        self._columns = {}
+
+    def _python_column(self, key: str) -> list:
+        column = self._columns.get(key)
+        if column is None:
+            column = self._columns[key] = self.ledger.python_values(key)
+        return column
+
+    def __len__(self) -> int:
+        return len(self.ledger)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        present = self.ledger.present
+        return {
+            key: self._python_column(key)[index]
+            for key in self.ledger.columns
+            if key not in present or present[key][index]
+        }
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, LedgerRecords)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'LedgerRecords({len(self)} trades)'